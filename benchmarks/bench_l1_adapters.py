@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the waveform ingestion of the Sentinel-3, Envisat and ERS input adapters
+
+Synthetic input files with the waveform variables of each input adapter are written to a
+temporary directory. For each adapter the benchmark reports the time for reading the file
+and compares the previous per-record loops for power scaling, range and radar mode
+(reimplemented below) with the vectorized waveform ingestion of the adapter. NOTE: The
+adapters store the range of the first range bin and the range bin spacing, the full range
+array is only computed for the comparison.
+
+Usage:
+    python benchmarks/bench_l1_adapters.py [n_records] [n_range_bins]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+from netCDF4 import Dataset
+
+from pysiral.envisat.functions import get_envisat_window_delay
+from pysiral.envisat.l1_adapter import EnvisatSGDRNC
+from pysiral.ers.l1_adapter import ERSReaperSGDR
+from pysiral.ers.sgdrfile import ERSSGDR
+from pysiral.iotools import ReadNC
+from pysiral.l1bdata import Level1bData
+from pysiral.sentinel3.l1_adapter import Sentinel3CODAL2Wat
+
+
+# Adapter options (subset of the Level-1 pre-processor definition files)
+SENTINEL3_CFG = AttrDict(range_bin_width=0.468465715626, nominal_tracking_bin=60, instr_op_mode_list=[0, 1, 1])
+ENVISAT_CFG = AttrDict(nominal_tracking_bin=45, bin_width_meter=0.4686, radar_mode="lrm")
+ERS_CFG = AttrDict(range_bin_width=0.4545, nominal_tracking_bin=32.5, sgdr_n_blocks=20)
+
+
+def write_netcdf(filepath, dimensions, variables):
+    """ Write a netCDF file with variables: {name: (dimensions, values)} """
+    rootgrp = Dataset(str(filepath), "w")
+    for name, size in dimensions.items():
+        rootgrp.createDimension(name, size)
+    for name, (dims, values) in variables.items():
+        rootgrp.createVariable(name, values.dtype, dims)[:] = values
+    rootgrp.close()
+
+
+def write_sentinel3_file(filepath, n_records, n_range_bins):
+    rng = np.random.default_rng(1)
+    write_netcdf(filepath, dict(time_20_ku=n_records, echo_sample_ind=n_range_bins), dict(
+        waveform_20_ku=(("time_20_ku", "echo_sample_ind"),
+                        rng.integers(0, 65535, (n_records, n_range_bins)).astype(np.uint16)),
+        scale_factor_20_ku=(("time_20_ku", ), rng.uniform(1.0, 2.0, n_records)),
+        tracker_range_20_ku=(("time_20_ku", ), rng.uniform(800000., 810000., n_records)),
+        instr_op_mode_20_ku=(("time_20_ku", ), rng.integers(0, 3, n_records).astype(np.int8))))
+
+
+def write_envisat_file(filepath, n_records, n_range_bins):
+    rng = np.random.default_rng(2)
+    write_netcdf(filepath, dict(time_20=n_records, ns=n_range_bins), dict(
+        waveform_fft_20_ku=(("time_20", "ns"), rng.uniform(0., 1000., (n_records, n_range_bins))),
+        tracker_range_20_ku=(("time_20", ), rng.uniform(780000., 790000., n_records)),
+        dop_cor_20_ku=(("time_20", ), rng.normal(0., 0.1, n_records)),
+        dop_slope_cor_20_ku=(("time_20", ), rng.normal(0., 0.01, n_records)),
+        waveform_fault_id_20=(("time_20", ), rng.integers(0, 2, n_records).astype(np.int8))))
+
+
+def write_ers_file(filepath, n_records, n_range_bins):
+    rng = np.random.default_rng(3)
+    n_blocks = ERS_CFG.sgdr_n_blocks
+    n_records_per_block = n_records // n_blocks
+    dims = ("n_records_per_block", "n_blocks")
+    write_netcdf(filepath, dict(n_records_per_block=n_records_per_block, n_blocks=n_blocks, ns=n_range_bins), dict(
+        ku_wf=(dims + ("ns", ), rng.integers(0, 65535, (n_records_per_block, n_blocks, n_range_bins)).astype(np.int32)),
+        tracker_range_20hz=(dims, rng.uniform(780000., 790000., (n_records_per_block, n_blocks))),
+        alt_state_flag_20hz=(dims, rng.integers(0, 4, (n_records_per_block, n_blocks)).astype(np.int8))))
+
+
+def sentinel3_waveform_loops(nc, cfg):
+    """ Previous implementation with per-record loops """
+    wfm_counts = nc.waveform_20_ku.values
+    n_records, n_range_bins = wfm_counts.shape
+    wfm_power = np.ndarray(shape=wfm_counts.shape, dtype=np.float32)
+    waveform_scale_factor = nc.scale_factor_20_ku.values
+    for record in np.arange(n_records):
+        wfm_power[record, :] = waveform_scale_factor[record] * wfm_counts[record, :].astype(float)
+    tracker_range = nc.tracker_range_20_ku.values
+    wfm_range = np.ndarray(shape=wfm_counts.shape, dtype=np.float32)
+    for record in np.arange(n_records):
+        wfm_range[record, :] = (tracker_range[record] - cfg.nominal_tracking_bin*cfg.range_bin_width +
+                                np.arange(n_range_bins)*cfg.range_bin_width)
+    op_mode = nc.instr_op_mode_20_ku.values
+    radar_mode = np.array([cfg.instr_op_mode_list[int(val)] for val in op_mode]).astype("int8")
+    return wfm_power, wfm_range, radar_mode
+
+
+def envisat_waveform_loops(sgdr, cfg):
+    """ Previous implementation with per-record loops """
+    wfm_power = sgdr.waveform_fft_20_ku
+    n_records, n_range_bins = wfm_power.shape
+    window_delay_m = get_envisat_window_delay(sgdr.tracker_range_20_ku, sgdr.dop_cor_20_ku, sgdr.dop_slope_cor_20_ku,
+                                              nominal_tracking_bin=cfg.nominal_tracking_bin,
+                                              bin_width_meter=cfg.bin_width_meter)
+    wfm_range = np.ndarray(shape=(n_records, n_range_bins), dtype=np.float32)
+    for i in range(n_records):
+        wfm_range[i, :] = np.arange(n_range_bins)*cfg.bin_width_meter + window_delay_m[i]
+    return wfm_power, wfm_range, None
+
+
+def ers_waveform_loops(sgdr, cfg):
+    """ Previous implementation with per-record loops """
+    records_per_block, n_blocks, n_range_bins = sgdr.nc.ku_wf.shape
+    n_records = records_per_block*n_blocks
+    wfm_power = np.reshape(sgdr.nc.ku_wf, (n_records, n_range_bins)).astype(np.uint16)
+    tracker_range = sgdr.nc.tracker_range_20hz.flatten()
+    wfm_range = np.ndarray(shape=(n_records, n_range_bins), dtype=np.float32)
+    rbi = np.arange(n_range_bins)
+    for i in np.arange(n_records):
+        wfm_range[i, :] = tracker_range[i] + (rbi*cfg.range_bin_width) - (cfg.nominal_tracking_bin*cfg.range_bin_width)
+    return wfm_power, wfm_range, None
+
+
+def read_sentinel3(filepath):
+    adapter = Sentinel3CODAL2Wat(SENTINEL3_CFG)
+    adapter._read_input_netcdf(str(filepath))
+    adapter.nc.load()
+    return adapter
+
+
+def read_envisat(filepath):
+    adapter = EnvisatSGDRNC(ENVISAT_CFG)
+    adapter.sgdr = ReadNC(str(filepath), nan_fill_value=True)
+    return adapter
+
+
+def read_ers(filepath):
+    adapter = ERSReaperSGDR(ERS_CFG)
+    adapter.sgdr = ERSSGDR(ERS_CFG)
+    adapter.sgdr.filename = str(filepath)
+    adapter.sgdr.parse()
+    return adapter
+
+
+def ers_waveform_vectorized(adapter):
+    # The pre-processing of the waveforms is part of the ERS SGDR post-processing
+    adapter.sgdr.post_processing()
+    adapter._transfer_waveform_collection()
+
+
+ADAPTERS = [
+    ("sentinel3", write_sentinel3_file, read_sentinel3,
+     lambda adapter: sentinel3_waveform_loops(adapter.nc, SENTINEL3_CFG),
+     lambda adapter: adapter._set_waveform_data_group()),
+    ("envisat", write_envisat_file, read_envisat,
+     lambda adapter: envisat_waveform_loops(adapter.sgdr, ENVISAT_CFG),
+     lambda adapter: adapter._transfer_waveform_collection()),
+    ("ers", write_ers_file, read_ers,
+     lambda adapter: ers_waveform_loops(adapter.sgdr, ERS_CFG),
+     ers_waveform_vectorized)]
+
+
+def best_of(func, repeat):
+    durations, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - t0)
+    return min(durations), result
+
+
+def main(n_records=20000, n_range_bins=128, repeat=3):
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        print("Waveform ingestion of %g records with %g range bins (best of %g)" % (n_records, n_range_bins, repeat))
+        for name, write_file, read_file, waveform_loops, waveform_vectorized in ADAPTERS:
+
+            filepath = tmp_dir / ("%s.nc" % name)
+            write_file(filepath, n_records, n_range_bins)
+            read_time, adapter = best_of(lambda: read_file(filepath), repeat)
+
+            loop_time, (wfm_power, wfm_range, radar_mode) = best_of(lambda: waveform_loops(adapter), repeat)
+
+            def vectorized():
+                adapter.l1 = Level1bData()
+                waveform_vectorized(adapter)
+                return adapter.l1.waveform
+            vectorized_time, waveform = best_of(vectorized, repeat)
+
+            print("  %-10s read: %8.1f ms, waveform loops: %8.1f ms, vectorized: %8.1f ms (%.1fx)" % (
+                name, read_time*1000., loop_time*1000., vectorized_time*1000., loop_time/vectorized_time))
+
+            # Both methods must produce the same waveform group
+            np.testing.assert_array_equal(np.asarray(waveform.power), np.asarray(wfm_power))
+            np.testing.assert_array_max_ulp(waveform.range, wfm_range, maxulp=1)
+            if radar_mode is not None:
+                np.testing.assert_array_equal(waveform.radar_mode, radar_mode)
+    finally:
+        shutil.rmtree(str(tmp_dir))
+
+
+if __name__ == "__main__":
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_range_bins = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    main(n_records=n_records, n_range_bins=n_range_bins)
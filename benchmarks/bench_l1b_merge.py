@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of merging Level-1 segments
+
+Compares chained calls of `Level1bData.append` (reallocation of all record arrays for each
+segment, as previously used in `L1PreProcBase.l1_get_merged_stack`) with the preallocated
+merge of `Level1bDataMergeBuilder` for a stack of synthetic Level-1 segments.
+
+Usage:
+    python benchmarks/bench_l1b_merge.py [n_segments] [n_records_per_segment]
+"""
+
+import sys
+import copy
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from pysiral.l1bdata import Level1bData, Level1bDataMergeBuilder
+
+
+def get_l1b_segment(index, n_records, n_bins=128):
+    """ Returns a synthetic Level-1 segment with content in all data groups """
+
+    l1b = Level1bData()
+    l1b.info.set_attribute("mission_data_source", "segment_%03g" % index)
+
+    start_time = datetime(2019, 1, 1) + timedelta(seconds=index*n_records*0.05)
+    l1b.time_orbit.timestamp = np.array([start_time + timedelta(seconds=i*0.05) for i in range(n_records)])
+    latitude = np.linspace(70., 80., n_records)
+    l1b.time_orbit.set_position(np.full(n_records, float(index)), latitude, np.full(n_records, 720000.))
+
+    power = np.random.random_sample((n_records, n_bins)).astype(np.float32)
+    tracker_range = np.tile(np.arange(n_bins, dtype=np.float64)*0.2, (n_records, 1)) + 720000.
+    l1b.waveform.set_waveform_data(power, tracker_range, "sar")
+
+    l1b.correction.set_parameter("dry_troposphere", np.full(n_records, 2.3))
+    l1b.correction.set_parameter("ocean_tide_elastic", np.full(n_records, 0.1))
+    l1b.classifier.add(np.random.random_sample(n_records), "sigma0")
+    l1b.classifier.add(np.random.random_sample(n_records), "peakiness")
+    l1b.surface_type.add_flag(np.arange(n_records) % 3 == 0, "ocean")
+    l1b.update_l1b_metadata()
+    return l1b
+
+
+def merge_append(segments):
+    l1b_merged = segments[0]
+    for l1b in segments[1:]:
+        l1b_merged.append(l1b)
+    return l1b_merged
+
+
+def merge_builder(segments):
+    builder = Level1bDataMergeBuilder()
+    for l1b in segments:
+        builder.add(l1b)
+    return builder.build()
+
+
+def main(n_segments=50, n_records=2000, repeat=3):
+
+    segments = [get_l1b_segment(i, n_records) for i in range(n_segments)]
+
+    print("Merge of %g segments with %g records (best of %g)" % (n_segments, n_records, repeat))
+    results, merged = {}, {}
+    for label, merge_func in [("append", merge_append), ("builder", merge_builder)]:
+        durations = []
+        for _ in range(repeat):
+            stack = copy.deepcopy(segments)
+            t0 = time.perf_counter()
+            merged[label] = merge_func(stack)
+            durations.append(time.perf_counter() - t0)
+        results[label] = min(durations)
+        print("  %-8s: %8.1f ms" % (label, results[label]*1000.))
+    print("  speed-up: %.1fx" % (results["append"] / results["builder"]))
+
+    # Both methods must produce the same merged object
+    for data_group in Level1bData.data_groups:
+        group_append = getattr(merged["append"], data_group)
+        group_builder = getattr(merged["builder"], data_group)
+        for attribute in group_append.record_array_attributes:
+            np.testing.assert_array_equal(getattr(group_append, attribute), getattr(group_builder, attribute))
+    assert merged["append"].info.mission_data_source == merged["builder"].info.mission_data_source
+
+
+if __name__ == "__main__":
+    n_segments = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_records = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(n_segments=n_segments, n_records=n_records)
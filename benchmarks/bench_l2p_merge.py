@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the daily merge of l2i files in the Level-2 pre-processor (l2p)
+
+Synthetic l2i files of one day (one file per orbit) are written to a temporary
+directory. The benchmark reports runtime and peak memory (tracemalloc) of the previous
+merge (all l2i files fully read into memory and merged with `np.append`), the
+two-pass merge (number of valid records first, then only the variables of the
+output definition are read into preallocated arrays) and the two-pass merge with
+the decoded l2i columns from a warm l2i column cache (repeated runs).
+
+Usage:
+    python benchmarks/bench_l2p_merge.py [n_orbits] [n_records_per_orbit] [n_auxiliary_variables]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from pysiral.l2data import Level2PContainer, L2iNCFileImport, L2iColumnCache
+
+
+# Source parameters of a l2p output definition
+OUTPUT_PARAMETERS = ["time", "longitude", "latitude", "radar_mode", "radar_freeboard", "radar_freeboard_uncertainty",
+                     "freeboard", "freeboard_uncertainty", "sea_ice_type", "sea_ice_type_uncertainty", "snow_depth",
+                     "snow_depth_uncertainty", "sea_ice_thickness", "sea_ice_thickness_uncertainty"]
+
+GLOBAL_ATTRIBUTES = dict(source_mission_id="cryosat2", source_auxdata_sic="osisaf", source_auxdata_snow="warren99",
+                         source_auxdata_sitype="osisaf", source_auxdata_mss="dtu15", source_timeliness="NTC")
+
+
+def write_l2i_file(filepath, orbit, n_records, n_auxiliary_variables):
+    """ Write a l2i file with the output parameters, additional auxiliary variables
+    and invalid freeboard over ~70% of the records """
+    rng = np.random.default_rng(orbit)
+    rootgrp = Dataset(str(filepath), "w")
+    rootgrp.setncatts(GLOBAL_ATTRIBUTES)
+    rootgrp.createDimension("time", n_records)
+
+    def add_variable(name, values, dtype="f4"):
+        var = rootgrp.createVariable(name, dtype, ("time", ), zlib=True, fill_value=np.nan if dtype == "f4" else None)
+        var[:] = values
+
+    add_variable("time", orbit*6000. + np.linspace(0., 5800., n_records), dtype="f8")
+    add_variable("longitude", rng.uniform(-180., 180., n_records))
+    add_variable("latitude", rng.uniform(60., 88., n_records))
+    add_variable("radar_mode", rng.integers(0, 3, n_records).astype(np.int8), dtype="i1")
+    add_variable("surface_type", rng.integers(0, 8, n_records).astype(np.int8), dtype="i1")
+    freeboard = rng.uniform(0., 0.5, n_records)
+    freeboard[rng.uniform(size=n_records) < 0.7] = np.nan
+    names = ["radar_freeboard", "freeboard", "sea_ice_type", "snow_depth", "sea_ice_thickness", "elevation",
+             "sea_surface_anomaly"]
+    names += ["auxiliary_variable_%02g" % i for i in range(n_auxiliary_variables)]
+    for name in names:
+        add_variable(name, freeboard if name == "freeboard" else rng.normal(size=n_records))
+        add_variable(name+"_uncertainty", rng.uniform(size=n_records))
+    rootgrp.close()
+
+
+def merge_previous(l2i_files):
+    l2p = Level2PContainer("daily")
+    for l2i_file in l2i_files:
+        l2p.append_l2i(L2iNCFileImport(str(l2i_file)))
+    return l2p.get_merged_l2()
+
+
+def merge_two_pass(l2i_files, disk_cache=None):
+    l2p = Level2PContainer("daily", disk_cache=disk_cache)
+    for l2i_file in l2i_files:
+        l2p.append_l2i_file(str(l2i_file))
+    return l2p.get_merged_l2(parameters=OUTPUT_PARAMETERS)
+
+
+def profile(func, *args):
+    """ Runtime and peak memory (separate runs, tracemalloc slows down the merge) """
+    t0 = time.perf_counter()
+    result = func(*args)
+    duration = time.perf_counter() - t0
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak, result
+
+
+def main(n_orbits=15, n_records_per_orbit=100000, n_auxiliary_variables=20):
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        l2i_files = []
+        for orbit in range(n_orbits):
+            filepath = tmp_dir / ("l2i_orbit_%02g.nc" % orbit)
+            write_l2i_file(filepath, orbit, n_records_per_orbit, n_auxiliary_variables)
+            l2i_files.append(filepath)
+
+        print("Merge of %g l2i files with %g records and %g variables" % (
+            n_orbits, n_records_per_orbit, len(Dataset(str(l2i_files[0])).variables)))
+        # Fill the l2i column cache (first run)
+        disk_cache = L2iColumnCache(tmp_dir / "l2i_cache")
+        merge_two_pass(l2i_files, disk_cache)
+
+        results = []
+        for name, merge in [("previous", merge_previous), ("two-pass", merge_two_pass),
+                            ("cached", lambda files: merge_two_pass(files, disk_cache))]:
+            duration, peak, l2 = profile(merge, l2i_files)
+            print("  %-10s runtime: %8.1f ms, peak memory: %8.1f MB" % (name, duration*1000., peak/1.0e6))
+            results.append(l2)
+
+        # The merged output parameters must be identical
+        previous = results[0]
+        for l2 in results[1:]:
+            assert previous.n_records == l2.n_records
+            np.testing.assert_array_equal(previous.track.time, l2.track.time)
+            for parameter_name in OUTPUT_PARAMETERS[1:]:
+                np.testing.assert_array_equal(previous.get_parameter_by_name(parameter_name),
+                                              l2.get_parameter_by_name(parameter_name))
+    finally:
+        shutil.rmtree(str(tmp_dir))
+
+
+if __name__ == "__main__":
+    n_orbits = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    n_records_per_orbit = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    n_auxiliary_variables = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    main(n_orbits=n_orbits, n_records_per_orbit=n_records_per_orbit, n_auxiliary_variables=n_auxiliary_variables)
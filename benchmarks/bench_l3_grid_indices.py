@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the grid indices of l2i records in the Level-3 processor
+
+Synthetic l2i files with the grid indices of the `nh25kmEASE2` grid definition (added by the
+Level-2 post-processing item `pysiral.grid.L2GridIndices`) are written to a temporary directory.
+The benchmark reports the time for the grid indices of the l2i data stack from the projection of
+longitude/latitude and from the stored grid indices (including the additional time for reading
+the grid index variables) and the time saved for a monthly Level-3 run, for reading the l2i files
+from netCDF and from the l2i column cache.
+
+Usage:
+    python benchmarks/bench_l3_grid_indices.py [n_files] [n_records_per_file] [n_files_per_month]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from pysiral.grid import L2GridIndices
+from pysiral.l2data import L2iNCFileImport, L2iColumnCache
+from pysiral.l3proc import L2iDataStack
+
+
+class DummyL2(object):
+    """ The subset of the Level-2 data object required by the post-processing item """
+
+    def __init__(self, longitude, latitude):
+        self.hemisphere = "north"
+        self.longitude, self.latitude = longitude, latitude
+
+    def set_auxiliary_parameter(self, var_id, var_name, value, uncertainty=None, dtype=float):
+        setattr(self, var_id, np.asarray(value, dtype=dtype))
+
+
+def write_l2i_file(filepath, orbit, n_records, grid_indices=None):
+    """ Write a l2i file with an orbit segment north of 60N and optional grid indices """
+    rng = np.random.default_rng(orbit)
+    rootgrp = Dataset(str(filepath), "w")
+    rootgrp.setncatts(dict(source_mission_id="cryosat2", source_timeliness="NTC"))
+    rootgrp.createDimension("time", n_records)
+    phase = np.linspace(0., np.pi, n_records)
+    longitude = np.mod(rng.uniform(-180., 180.) + 80.*phase, 360.) - 180.
+    latitude = 60. + 28.*np.sin(phase)
+    for name, values, dtype in [("time", orbit*6000. + np.linspace(0., 2400., n_records), "f8"),
+                                ("longitude", longitude, "f4"), ("latitude", latitude, "f4"),
+                                ("sea_ice_thickness", rng.normal(1.5, 1.0, n_records), "f4")]:
+        rootgrp.createVariable(name, dtype, ("time", ), zlib=True)[:] = values
+    if grid_indices is not None:
+        l2 = DummyL2(rootgrp.variables["longitude"][:], rootgrp.variables["latitude"][:])
+        grid_indices.apply(l2)
+        for name in grid_indices.griddefs[0].grid_index_parameter_names:
+            rootgrp.createVariable(name, "i4", ("time", ), zlib=True)[:] = getattr(l2, name)
+    rootgrp.close()
+
+
+def best_of(func, repeat):
+    durations, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - t0)
+    return min(durations), result
+
+
+def grid_indices_time(stack, l2i_files, repeat, disk_cache=None):
+    """ Time for reading the l2i files and for the grid indices of the data stack (sum of best of per file) """
+    read_time, index_time, results = 0.0, 0.0, []
+    for l2i_file in l2i_files:
+        duration, l2i = best_of(lambda: L2iNCFileImport(str(l2i_file), disk_cache=disk_cache), repeat)
+        read_time += duration
+        duration, indices = best_of(lambda: stack.get_grid_indices(l2i), repeat)
+        index_time += duration
+        results.append(indices)
+    return read_time, index_time, results
+
+
+def main(n_files=20, n_records_per_file=50000, n_files_per_month=430, repeat=5):
+
+    grid_indices = L2GridIndices(griddefs=["nh25kmEASE2"])
+    griddef = grid_indices.griddefs[0]
+    stack = L2iDataStack(griddef, {}, stack_parameters=[])
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        files = dict(projection=[], stored=[])
+        for orbit in range(n_files):
+            for name, option in [("projection", None), ("stored", grid_indices)]:
+                filepath = tmp_dir / ("l2i_%s_%02g.nc" % (name, orbit))
+                write_l2i_file(filepath, orbit, n_records_per_file, grid_indices=option)
+                files[name].append(filepath)
+
+        print("Grid indices (%s) of %g l2i files with %g records (best of %g)" % (
+            griddef.grid_id, n_files, n_records_per_file, repeat))
+        disk_cache = L2iColumnCache(tmp_dir / "l2i_cache")
+        results = []
+        for read_mode, cache in [("netCDF", None), ("cached", disk_cache)]:
+            total_time = {}
+            for name in ["projection", "stored"]:
+                read_time, index_time, indices = grid_indices_time(stack, files[name], repeat, disk_cache=cache)
+                total_time[name] = (read_time + index_time) / n_files
+                print("  %-10s %-6s read: %6.2f ms/file, grid indices: %6.2f ms/file" % (
+                    name, read_mode, read_time*1000./n_files, index_time*1000./n_files))
+                results.append(indices)
+            saved = (total_time["projection"] - total_time["stored"]) * n_files_per_month
+            print("  %-17s time saved per monthly Level-3 run (%g l2i files): %.1f s" % (
+                read_mode, n_files_per_month, saved))
+
+        # The stored grid indices must be identical to the projection
+        for stored_indices in results[1:]:
+            for (xi, yj), (xi_stored, yj_stored) in zip(results[0], stored_indices):
+                np.testing.assert_array_equal(xi, xi_stored)
+                np.testing.assert_array_equal(yj, yj_stored)
+    finally:
+        shutil.rmtree(str(tmp_dir))
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_records_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    n_files_per_month = int(sys.argv[3]) if len(sys.argv) > 3 else 430
+    main(n_files=n_files, n_records_per_file=n_records_per_file, n_files_per_month=n_files_per_month)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the out-of-core l2i data stack of the Level-3 processor
+
+Synthetic l2i orbit segments are added to the in-memory l2i data stack and to the
+out-of-core l2i data stack (records spilled to disk per grid tile) for the `nh25kmEASE2`
+grid definition. The benchmark reports runtime and peak memory (tracemalloc) of stacking
+and gridding (average of sea ice thickness, median of radar freeboard) for the in-memory
+stack and the out-of-core stack with serial and parallel gridding of the tiles.
+
+Usage:
+    python benchmarks/bench_l3_out_of_core.py [n_files] [n_records_per_file] [workers]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+
+from pysiral import psrlcfg
+from pysiral.grid import GridDefinition
+from pysiral.l3proc import L2iDataStack, L2iTileSpillStack, L3DataGrid
+
+
+L2_PARAMETER = dict(
+    time=dict(grid_method="none", dtype="M", fillvalue=None),
+    sea_ice_thickness=dict(grid_method="average", dtype="f4", fillvalue=np.nan),
+    radar_freeboard=dict(grid_method="median", dtype="f4", fillvalue=np.nan))
+
+
+class DummyL2i(object):
+    """ A l2i orbit segment north of 60N """
+
+    def __init__(self, orbit, n_records):
+        rng = np.random.default_rng(orbit)
+        phase = np.linspace(0., np.pi, n_records)
+        self.n_records = n_records
+        self.longitude = np.mod(rng.uniform(-180., 180.) + 80.*phase, 360.) - 180.
+        self.latitude = 60. + 28.*np.sin(phase)
+        start_time = datetime(2019, 1, 1) + timedelta(hours=1.7*orbit)
+        self.time = np.array([start_time + timedelta(seconds=s) for s in np.linspace(0., 2400., n_records)])
+        self.sea_ice_thickness = rng.normal(1.5, 1.0, n_records).astype(np.float32)
+        self.radar_freeboard = rng.normal(0.2, 0.1, n_records).astype(np.float32)
+        self.mission = "cryosat2"
+        self.timeliness = "NTC"
+        self.info = AttrDict(source_auxdata_sic="sic", source_auxdata_sitype="sitype", source_auxdata_snow="snow")
+
+
+class DummyJob(object):
+
+    def __init__(self):
+        self.l2_parameter = L2_PARAMETER
+        self.l3def = AttrDict(l2_parameter=L2_PARAMETER, grid_settings=dict(minimum_valid_grid_points=2))
+        self.outputs = [AttrDict(time_dim_is_unlimited=False)]
+
+
+PERIOD = AttrDict(tcs=AttrDict(dt=datetime(2019, 1, 1)), tce=AttrDict(dt=datetime(2019, 1, 31)),
+                  duration=AttrDict(isoformat="P1M"))
+
+
+def stack_and_grid(griddef, l2i_list, stack_class, **options):
+    stack = stack_class(griddef, L2_PARAMETER, **options)
+    try:
+        for l2i in l2i_list:
+            stack.add(l2i)
+        l3grid = L3DataGrid(DummyJob(), stack, PERIOD)
+    finally:
+        stack.close()
+    return l3grid.vars
+
+
+def profile(func, *args, **kwargs):
+    """ Runtime and peak memory (separate runs, tracemalloc slows down the stacking) """
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    duration = time.perf_counter() - t0
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak, result
+
+
+def main(n_files=20, n_records_per_file=20000, workers=4):
+
+    griddef = GridDefinition()
+    griddef.set_from_griddef_file(psrlcfg.get_settings_file("grid", None, "nh25kmEASE2"))
+    l2i_list = [DummyL2i(orbit, n_records_per_file) for orbit in range(n_files)]
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        print("Stacking and gridding of %g l2i files with %g records (%s)" % (
+            n_files, n_records_per_file, griddef.grid_id))
+        spill_options = dict(spill_directory=tmp_dir, tile_size=64, memory_budget=16)
+        results = []
+        for name, stack_class, options in [
+                ("in-memory", L2iDataStack, {}),
+                ("out-of-core", L2iTileSpillStack, dict(spill_options, workers=1)),
+                ("out-of-core (%g workers)" % workers, L2iTileSpillStack, dict(spill_options, workers=workers))]:
+            duration, peak, grid_vars = profile(stack_and_grid, griddef, l2i_list, stack_class, **options)
+            print("  %-26s runtime: %8.1f s, peak memory: %8.1f MB" % (name, duration, peak/1.0e6))
+            results.append(grid_vars)
+
+        # The gridded parameters must be identical
+        for grid_vars in results[1:]:
+            for name in ["sea_ice_thickness", "radar_freeboard"]:
+                np.testing.assert_array_equal(grid_vars[name], results[0][name])
+    finally:
+        shutil.rmtree(str(tmp_dir))
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_records_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    main(n_files=n_files, n_records_per_file=n_records_per_file, workers=workers)
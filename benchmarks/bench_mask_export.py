@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the decoding of the binary land/sea source mask and the resampling of source masks
+to Level-3 grids
+
+A synthetic land/sea mask binary file (2 minute grid, 10800 x 5400 bytes after the header) is written
+to a temporary directory. The benchmark reports the time for decoding the file with `struct.unpack`
+(previous implementation) and `np.fromfile` and the time for resampling a source mask (reduced
+resolution, see `resample_factor`) to the `nh25kmEASE2` and `sh50kmEASE2` grids with and without the
+cached kd-tree neighbour information (mask option `disk_cache_dir`).
+
+Usage:
+    python benchmarks/bench_mask_export.py [resample_factor]
+"""
+
+import sys
+import time
+import struct
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+
+from pysiral import psrlcfg
+from pysiral.grid import GridDefinition
+from pysiral.mask import MaskLandSea2Min
+
+
+def decode_struct(filepath, xdim, ydim, n_bytes_header):
+    """ The previous decoding of the land/sea mask (bytes to python tuple to array) """
+    with open(str(filepath), "rb") as fh:
+        fh.seek(n_bytes_header)
+        content = fh.read(xdim*ydim)
+    mask_val = np.array(struct.unpack("<%0.fB" % (xdim * ydim), content))
+    return np.int8(mask_val.reshape((xdim, ydim)).transpose() > 0)
+
+
+def decode_fromfile(filepath, xdim, ydim, n_bytes_header):
+    mask_val = np.fromfile(str(filepath), dtype=np.uint8, count=xdim*ydim, offset=n_bytes_header)
+    return np.int8(mask_val.reshape((xdim, ydim)).transpose() > 0)
+
+
+def write_mask_file(filepath, xdim, ydim, n_bytes_header):
+    """ Land/sea flags (0: sea, 1: lakes, 2: land ice: 3: land) as blocks of 1x1 degree """
+    rng = np.random.default_rng(42)
+    blocks = rng.integers(0, 4, (360, 180)).astype(np.uint8)
+    mask = blocks[np.arange(xdim) * 360 // xdim][:, np.arange(ydim) * 180 // ydim]
+    with open(str(filepath), "wb") as fh:
+        fh.write(b"\0" * n_bytes_header)
+        fh.write(mask.tobytes())
+
+
+def main(resample_factor=4):
+
+    xdim, ydim = MaskLandSea2Min.source_shape
+    n_bytes_header = MaskLandSea2Min.n_bytes_header
+
+    class ReducedMaskLandSea2Min(MaskLandSea2Min):
+        source_shape = (xdim // resample_factor, ydim // resample_factor)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        filepath = tmp_dir / "landmask_2min.bin"
+        write_mask_file(filepath, xdim, ydim, n_bytes_header)
+
+        print("Decoding of the land/sea mask (%g x %g bytes)" % (xdim, ydim))
+        results = []
+        for name, decode in [("struct", decode_struct), ("fromfile", decode_fromfile)]:
+            t0 = time.perf_counter()
+            results.append(decode(filepath, xdim, ydim, n_bytes_header))
+            print("  %-10s %8.1f ms" % (name, (time.perf_counter() - t0) * 1000.))
+        np.testing.assert_array_equal(results[0], results[1])
+
+        # Source mask with reduced resolution
+        xdim_reduced, ydim_reduced = ReducedMaskLandSea2Min.source_shape
+        reduced_filepath = tmp_dir / "landmask.bin"
+        write_mask_file(reduced_filepath, xdim_reduced, ydim_reduced, n_bytes_header)
+        griddefs = []
+        for griddef_id in ["nh25kmEASE2", "sh50kmEASE2"]:
+            griddef = GridDefinition()
+            griddef.set_from_griddef_file(psrlcfg.get_settings_file("grid", None, griddef_id))
+            griddefs.append(griddef)
+
+        print("Resampling of the land/sea mask (%g x %g) to %s" % (
+            xdim_reduced, ydim_reduced, ", ".join(g.grid_id for g in griddefs)))
+        cache_dir = tmp_dir / "neighbour_info_cache"
+        results = []
+        for name, disk_cache_dir in [("no cache", None), ("cold cache", cache_dir), ("warm cache", cache_dir)]:
+            cfg = AttrDict(filename=reduced_filepath.name, pyresample_method="resample_gauss",
+                           pyresample_keyw=dict(radius_of_influence=25000., sigmas=6000., neighbours=16),
+                           post_processing="pp_classify", label="land/sea mask", comment="")
+            if disk_cache_dir is not None:
+                cfg["disk_cache_dir"] = str(disk_cache_dir)
+            mask = ReducedMaskLandSea2Min(str(tmp_dir), "landsea", cfg)
+            t0 = time.perf_counter()
+            target_masks = [mask.get_l3_mask(griddef) for griddef in griddefs]
+            print("  %-10s %8.1f ms" % (name, (time.perf_counter() - t0) * 1000.))
+            results.append(target_masks)
+        for target_masks in results[1:]:
+            for target_mask, reference in zip(target_masks, results[0]):
+                np.testing.assert_array_equal(target_mask, reference)
+    finally:
+        shutil.rmtree(str(tmp_dir))
+
+
+if __name__ == "__main__":
+    resample_factor = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    main(resample_factor=resample_factor)
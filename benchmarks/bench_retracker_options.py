@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the option access in the TFMRA retracker loop
+
+Compares the cost of the option look-ups per waveform (as in `cTFMRA.l2_retrack`,
+`cTFMRA.get_filtered_wfm` and `cTFMRA.filter_waveform`) for options stored in an
+AttrDict and in the compiled (slotted) option object.
+
+Usage:
+    python benchmarks/bench_retracker_options.py [n_waveforms]
+"""
+
+import sys
+import timeit
+
+from attrdict import AttrDict
+
+from pysiral.config import compile_options
+from pysiral.retracker import TFMRA_OPTION_FIELDS
+
+
+# Retracker options as in the Level-2 processor definition files
+CTFMRA_OPTIONS = {
+    "threshold": 0.5,
+    "offset": 0.0,
+    "wfm_oversampling_factor": 10,
+    "wfm_oversampling_method": "linear",
+    "wfm_smoothing_window_size": [11, 11, 21],
+    "first_maximum_normalized_threshold": [0.15, 0.15, 0.45],
+    "first_maximum_local_order": 1,
+    "range_bias": [-0.022, 0.047, 0.017],
+    "uncertainty": {"type": "fixed", "value": 0.1}}
+
+
+def tfmra_option_access(options, radar_modes):
+    """ The option look-ups of the cTFMRA retracker for each waveform """
+    value = 0.0
+    for radar_mode in radar_modes:
+        value += options.offset
+        value += options.wfm_oversampling_factor
+        value += options.wfm_smoothing_window_size[radar_mode]
+        value += options.wfm_oversampling_factor
+        value += options.first_maximum_normalized_threshold[radar_mode]
+    return value
+
+
+def main(n_waveforms=20000, repeat=5):
+
+    radar_modes = [i % 3 for i in range(n_waveforms)]
+    candidates = [
+        ("AttrDict", AttrDict(CTFMRA_OPTIONS)),
+        ("compiled", compile_options(CTFMRA_OPTIONS, fields=TFMRA_OPTION_FIELDS, name="cTFMRA"))]
+
+    print("TFMRA option access for %g waveforms (best of %g)" % (n_waveforms, repeat))
+    results = {}
+    for label, options in candidates:
+        timer = timeit.Timer(lambda: tfmra_option_access(options, radar_modes))
+        seconds = min(timer.repeat(repeat=repeat, number=1))
+        results[label] = seconds
+        print("  %-10s: %8.3f ms (%6.1f ns per access)" % (label, seconds*1000., seconds/(5.*n_waveforms)*1.e9))
+    print("  speed-up  : %.1fx" % (results["AttrDict"] / results["compiled"]))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    main(n_waveforms=n)
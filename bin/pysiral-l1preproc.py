@@ -9,14 +9,19 @@ from pysiral import get_cls, psrlcfg
 from pysiral.config import DefaultCommandLineArguments
 from pysiral.errorhandler import ErrorStatus
 from pysiral.logging import DefaultLoggingClass
-from pysiral.l1preproc import get_preproc, Level1PreProcJobDef, Level1POutputHandler
+from pysiral.l1preproc import get_preproc_from_job, Level1PreProcJobDef, Level1POutputHandler
+from pysiral.workqueue import FileWorkQueue
 
 
-def pysiral_l1preproc(job):
+def pysiral_l1preproc(job, work_queue_dir=None, work_queue_timeout=600., workers=1):
     """
     Workflow script of the pysiral l1b preprocessor.
 
     :param job: A pysiral.l1preproc.Level1PreProcJobDef instance
+    :param work_queue_dir: (optional) shared directory of a work queue. If set, the monthly periods
+        are claimed from the work queue and can be processed by any number of workers
+    :param work_queue_timeout: seconds after which periods of crashed workers are reclaimed
+    :param workers: number of worker processes for reading and post-processing of the input files
     :return: None
     """
 
@@ -28,34 +33,42 @@ def pysiral_l1preproc(job):
     input_handler_cls = get_cls(input_handler_def.module_name, input_handler_def.class_name, relaxed=False)
     input_handler = input_handler_cls(input_handler_def.options)
 
-    # 2. Get the adapter class that transfers
-    adapter_def = job.l1pprocdef.input_adapter
-    input_adapter_cls = get_cls(adapter_def.module_name, adapter_def.class_name, relaxed=False)
-    input_adapter = input_adapter_cls(adapter_def.options)
-
-    # 3. Get the output handler
+    # 2. Get the output handler
     output_handler_def = job.l1pprocdef.output_handler
     output_handler = Level1POutputHandler(output_handler_def.options)
     output_handler.cfg.update(**job.output_handler_cfg)
 
-    # 4. Get the pre-processor
-    preproc_def = job.l1pprocdef.level1_preprocessor
-    l1preproc = get_preproc(preproc_def.type, input_adapter, output_handler, preproc_def.options)
+    # 3. Get the pre-processor and the adapter class that transfers the input files
+    # NOTE: The worker processes of the parallel mode create their own pre-processor from the job definition
+    l1preproc = get_preproc_from_job(job, output_handler)
 
-    # 5. Loop over monthly periods
-    for period in job.period_segments:
+    def process_period(period):
 
-        # 5.1 Get input files
+        # 4.1 Get input files
         file_list = input_handler.get_file_for_period(period)
         if len(file_list) == 0:
             job.log.warning("No input files found for period: %s, skipping" % period.date_label)
 
-        # 5.2 Output management
+        # 4.2 Output management
         # Note: This is only relevant, if the --remove-old keyword is set
         output_handler.remove_old_if_applicable(period)
 
-        # 5.3 Run the pre-processor
-        l1preproc.process_input_files(file_list)
+        # 4.3 Run the pre-processor
+        l1preproc.process_input_files(file_list, workers=workers, job=job)
+
+    # 4. Loop over monthly periods
+    period_segments = list(job.period_segments)
+    if work_queue_dir is None:
+        for period in period_segments:
+            process_period(period)
+
+    # 4. (alternative) Claim monthly periods from the shared work queue
+    else:
+        work_queue = FileWorkQueue(work_queue_dir, stale_timeout=work_queue_timeout)
+        work_queue.create_manifest(["%03g_%s" % (i, period.label) for i, period in enumerate(period_segments)])
+        for work_item in work_queue:
+            with work_item:
+                process_period(period_segments[work_item.index])
 
     # Report processing time
     job.stopwatch.stop()
@@ -109,6 +122,9 @@ class Level1PreProcArgParser(DefaultLoggingClass):
             ("-stop", "date", "stop_date", True),
             ("-exclude-month", "exclude-month", "exclude_month", False),
             ("-hemisphere", "hemisphere", "hemisphere", False),
+            ("-work-queue-dir", "work-queue-dir", "work_queue_dir", False),
+            ("-work-queue-timeout", "work-queue-timeout", "work_queue_timeout", False),
+            ("-workers", "workers", "workers", False),
             ("--remove-old", "remove-old", "remove_old", False),
             ("--no-critical-prompt", "no-critical-prompt", "no_critical_prompt", False),
             ("--no-overwrite-protection", "no-overwrite-protection", "overwrite_protection", False),
@@ -144,4 +160,5 @@ if __name__ == "__main__":
     job = Level1PreProcJobDef.from_args(cmd_args.args)
 
     # Execute Level-1 Pre-Processor Workflow
-    pysiral_l1preproc(job)
+    pysiral_l1preproc(job, work_queue_dir=cmd_args.args.work_queue_dir,
+                      work_queue_timeout=cmd_args.args.work_queue_timeout, workers=cmd_args.args.workers)
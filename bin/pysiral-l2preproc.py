@@ -63,7 +63,7 @@ def pysiral_l2preproc():
     # Processor Initialization
     # NOTE: This is only for later cases. Not much is done here at this
     #       point
-    l2preproc = Level2PreProcessor(product_def)
+    l2preproc = Level2PreProcessor(product_def, l2i_cache_dir=args.l2i_cache_dir)
 
 #    # Loop over iterations (one per day)
     for day in days:
@@ -139,6 +139,7 @@ class Level2PreProcArgParser(DefaultLoggingClass):
             ("-l2p-output", "l2p-output", "l2p_output", False),
             ("-exclude-month", "exclude-month", "exclude_month", False),
             ("-doi", "doi", "doi", False),
+            ("-l2i-cache-dir", "l2i-cache-dir", "l2i_cache_dir", False),
             ("--remove-old", "remove-old", "remove_old", False),
             ("--no-critical-prompt", "no-critical-prompt",
              "no_critical_prompt", False),
@@ -184,6 +185,10 @@ class Level2PreProcArgParser(DefaultLoggingClass):
     def overwrite_protection(self):
         return self._args.overwrite_protection
 
+    @property
+    def l2i_cache_dir(self):
+        return self._args.l2i_cache_dir
+
     @property
     def l2i_product_dir(self):
         l2i_product_dir = self._args.l2i_product_dir
@@ -6,6 +6,7 @@ from pysiral.errorhandler import ErrorStatus
 from pysiral.datahandler import DefaultL1bDataHandler
 from pysiral.l2proc import Level2Processor, Level2ProductDefinition
 from pysiral.logging import DefaultLoggingClass
+from pysiral.workqueue import FileWorkQueue
 
 
 from pathlib import Path
@@ -73,10 +74,10 @@ def pysiral_l2proc_time_range_job(args):
     l1b_data_handler = DefaultL1bDataHandler(mission_id, hemisphere, version=args.l1b_version)
 
     # Processor Initialization
-    l2proc = Level2Processor(product_def)
+    l2proc = Level2Processor(product_def, io_pipeline_depth=args.io_pipeline_depth,
+                             checkpoint_dir=args.checkpoint_dir)
 
-    # Now loop over the month
-    for time_range in period_segments:
+    def process_period(time_range):
 
         # Do some extra logging
         l2proc.log.info("Processing period: %s" % time_range.label)
@@ -93,6 +94,20 @@ def pysiral_l2proc_time_range_job(args):
         # Process the orbits
         l2proc.process_l1b_files(l1b_files)
 
+    # Now loop over the month
+    period_segments = list(period_segments)
+    if args.work_queue_dir is None:
+        for time_range in period_segments:
+            process_period(time_range)
+
+    # Alternative: Claim the month from the shared work queue
+    else:
+        work_queue = FileWorkQueue(args.work_queue_dir, stale_timeout=args.work_queue_timeout)
+        work_queue.create_manifest(["%03g_%s" % (i, tr.label) for i, tr in enumerate(period_segments)])
+        for work_item in work_queue:
+            with work_item:
+                process_period(period_segments[work_item.index])
+
     # All done
     t1 = time.clock()
     seconds = int(t1-t0)
@@ -112,8 +127,19 @@ def pysiral_l2proc_l1b_predef_job(args):
     product_def.add_output_definition(args.l2_output, overwrite_protection=args.overwrite_protection)
 
     # Processor Initialization
-    l2proc = Level2Processor(product_def)
-    l2proc.process_l1b_files(args.l1b_predef_files)
+    l2proc = Level2Processor(product_def, io_pipeline_depth=args.io_pipeline_depth,
+                             checkpoint_dir=args.checkpoint_dir)
+
+    # Process all files or claim single files from the shared work queue
+    l1b_files = args.l1b_predef_files
+    if args.work_queue_dir is None:
+        l2proc.process_l1b_files(l1b_files)
+    else:
+        work_queue = FileWorkQueue(args.work_queue_dir, stale_timeout=args.work_queue_timeout)
+        work_queue.create_manifest(["%05g_%s" % (i, Path(f).stem) for i, f in enumerate(l1b_files)])
+        for work_item in work_queue:
+            with work_item:
+                l2proc.process_l1b_files([l1b_files[work_item.index]])
 
     # All done
     t1 = time.clock()
@@ -182,6 +208,10 @@ class Level2ProcArgParser(DefaultLoggingClass):
             ("-exclude-month", "exclude-month", "exclude_month", False),
             ("-input-version", "input-version", "input_version", False),
             ("-l2-output", "l2-output", "l2_output", False),
+            ("-io-pipeline-depth", "io-pipeline-depth", "io_pipeline_depth", False),
+            ("-checkpoint-dir", "checkpoint-dir", "checkpoint_dir", False),
+            ("-work-queue-dir", "work-queue-dir", "work_queue_dir", False),
+            ("-work-queue-timeout", "work-queue-timeout", "work_queue_timeout", False),
             ("--remove-old", "remove-old", "remove_old", False),
             ("--no-critical-prompt", "no-critical-prompt",
              "no_critical_prompt", False),
@@ -248,6 +278,22 @@ class Level2ProcArgParser(DefaultLoggingClass):
     def exclude_month(self):
         return self._args.exclude_month
 
+    @property
+    def io_pipeline_depth(self):
+        return self._args.io_pipeline_depth
+
+    @property
+    def checkpoint_dir(self):
+        return self._args.checkpoint_dir
+
+    @property
+    def work_queue_dir(self):
+        return self._args.work_queue_dir
+
+    @property
+    def work_queue_timeout(self):
+        return self._args.work_queue_timeout
+
     @property
     def overwrite_protection(self):
         return self._args.overwrite_protection
@@ -15,6 +15,7 @@ from pysiral.errorhandler import ErrorStatus
 from pysiral.l3proc import (Level3Processor, Level3ProductDefinition,
                             Level3GridDefinition, Level3OutputHandler)
 from pysiral.logging import DefaultLoggingClass
+from pysiral.workqueue import FileWorkQueue
 
 
 def pysiral_l3proc():
@@ -30,14 +31,13 @@ def pysiral_l3proc():
     period = DatePeriod(args.start, args.stop)
     if args.period == "custom":
         period_segments = [period]
-        n_periods = 1
     else:
         period_segments = period.get_segments(args.period)
-        n_periods = period_segments.n_periods
 
 
-    # Get the output grid
-    grid = Level3GridDefinition(args.l3_griddef)
+    # Get the output grid(s)
+    # NOTE: All grids are processed with a single pass over the l2i files
+    grid = [Level3GridDefinition(l3_griddef) for l3_griddef in args.l3_griddef]
 
     # Initialize the interface to the l2i products
     l2i_handler = L2iDataHandler(args.l2i_product_directory)
@@ -58,25 +58,23 @@ def pysiral_l3proc():
     product_def = Level3ProductDefinition(args.l3_settings_file, grid, output, period)
 
     # Initialize the Processor
-    l3proc = Level3Processor(product_def)
+    # NOTE: With more than one worker, the period segments are processed in parallel. For a single
+    #       period segment (or the work queue), the workers process the grid tiles of the out-of-core
+    #       l2i data stack
+    l3proc = Level3Processor(product_def, l2i_cache_dir=args.l2i_cache_dir, workers=args.workers)
 
     # Loop over all iterations
-    for i, time_range in enumerate(period_segments):
+    period_segments = list(period_segments)
+    if args.work_queue_dir is None:
+        l3proc.process_period_segments(l2i_handler, period_segments, args.period)
 
-        # Report processing period
-        msg = "# Processing %s period (%g of %g): %s"
-        msg = msg % (args.period, i+1, n_periods, time_range.date_label)
-        l3proc.log.info(msg)
-
-        # Retrieve files
-        l2i_files = l2i_handler.get_files_from_time_range(time_range)
-        l3proc.log.info("Num l2i files: %g" % len(l2i_files))
-        if len(l2i_files) == 0:
-            l3proc.log.info("Skip data period")
-            continue
-
-        # Start the Level-3 processing
-        l3proc.process_l2i_files(l2i_files, time_range)
+    # Alternative: Claim the periods from the shared work queue
+    else:
+        work_queue = FileWorkQueue(args.work_queue_dir, stale_timeout=args.work_queue_timeout)
+        work_queue.create_manifest(["%04g_%s" % (i, tr.date_label) for i, tr in enumerate(period_segments)])
+        for work_item in work_queue:
+            with work_item:
+                l3proc.process_period(l2i_handler, period_segments, work_item.index, args.period)
 
     # Final reporting
     t1 = time.clock()
@@ -146,6 +144,10 @@ class Level3ProcArgParser(DefaultLoggingClass):
             ("-period", "period", "period", False),
             ("-doi", "doi", "doi", False),
             ("-data-record-type", "data_record_type", "data_record_type", False),
+            ("-work-queue-dir", "work-queue-dir", "work_queue_dir", False),
+            ("-work-queue-timeout", "work-queue-timeout", "work_queue_timeout", False),
+            ("-l2i-cache-dir", "l2i-cache-dir", "l2i_cache_dir", False),
+            ("-workers", "workers", "workers", False),
             ("--remove-old", "remove-old", "remove_old", False),
             ("--no-critical-prompt", "no-critical-prompt",
              "no_critical_prompt", False)]
@@ -185,6 +187,22 @@ class Level3ProcArgParser(DefaultLoggingClass):
     def data_record_type(self):
         return self._args.data_record_type
 
+    @property
+    def work_queue_dir(self):
+        return self._args.work_queue_dir
+
+    @property
+    def work_queue_timeout(self):
+        return self._args.work_queue_timeout
+
+    @property
+    def l2i_cache_dir(self):
+        return self._args.l2i_cache_dir
+
+    @property
+    def workers(self):
+        return self._args.workers
+
     @property
     def l2i_product_directory(self):
         return Path(self.l3_product_basedir) / "l2i"
@@ -205,17 +223,25 @@ class Level3ProcArgParser(DefaultLoggingClass):
 
     @property
     def l3_griddef(self):
-        l3_griddef = self._args.l3_griddef
-        filename = psrlcfg.get_settings_file("grid", None, l3_griddef)
-        if filename is None:
-            msg = "Invalid griddef filename or id: %s\n" % l3_griddef
-            msg = msg + "    Recognized grid definition ids:\n"
-            for griddef_id in psrlcfg.get_setting_ids("grid"):
-                msg = msg + "    - " + griddef_id + "\n"
-            self.error.add_error("invalid-griddef", msg)
-            self.error.raise_on_error()
-        else:
-            return filename
+        """
+        Get the full grid definition file path. Multiple grid definitions are possible if
+        the command line argument is semicolon-separated list.
+        :return: A list of grid definition filenames
+        """
+
+        filenames = []
+        for l3_griddef in self._args.l3_griddef.split(";"):
+            filename = psrlcfg.get_settings_file("grid", None, l3_griddef)
+            if filename is None:
+                msg = "Invalid griddef filename or id: %s\n" % l3_griddef
+                msg = msg + "    Recognized grid definition ids:\n"
+                for griddef_id in psrlcfg.get_setting_ids("grid"):
+                    msg = msg + "    - " + griddef_id + "\n"
+                self.error.add_error("invalid-griddef", msg)
+                self.error.raise_on_error()
+            else:
+                filenames.append(filename)
+        return filenames
 
     @property
     def l3_output_file(self):
@@ -2,11 +2,11 @@
 
 """ """
 
-__all__ = ["auxdata", "bnfunc", "cryosat2", "envisat", "ers", "sentinel3", "classifier", "clocks",
+__all__ = ["auxdata", "bnfunc", "cryosat2", "envisat", "ers", "sentinel3", "checkpoint", "classifier", "clocks",
            "config", "datahandler", "errorhandler", "filter", "flag", "frb", "grid",
            "iotools", "l1bdata", "l1preproc", "l2data", "l2preproc", "l2proc", "l3proc",
-           "logging", "mask", "output", "proj", "retracker", "roi",
-           "sit", "surface_type", "validator", "waveform", "psrlcfg"]
+           "logging", "mask", "output", "pipeline", "proj", "retracker", "roi",
+           "sit", "surface_type", "validator", "waveform", "workqueue", "psrlcfg"]
 
 import warnings
 import sys
@@ -5,11 +5,16 @@ Created on Fri May 19 14:42:35 2017
 @author: Stefan
 """
 
-__all__ = ["AuxdataBaseClass", "get_all_auxdata_classes", "mss", "icechart", "rio", "sic",
-           "sitype", "snow", "region"]
+__all__ = ["AuxdataBaseClass", "AuxdataCache", "CategoricalTranslator", "get_all_auxdata_classes", "mss",
+           "icechart", "rio", "sic", "sitype", "snow", "region"]
 
 
 import re
+import copy
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from queue import Queue
 
 import numpy as np
 from attrdict import AttrDict
@@ -20,6 +25,12 @@ from pyproj import Proj
 
 from pysiral import import_submodules
 from pysiral.errorhandler import ErrorStatus
+from pysiral.iotools import ReadNC, GridDiskCache
+from pysiral.pipeline import NETCDF_IO_LOCK
+
+
+# Default number of parsed daily products kept in memory by each auxiliary data class
+DEFAULT_AUXDATA_CACHE_SIZE = 4
 
 
 class AuxdataBaseClass(object):
@@ -50,15 +61,25 @@ class AuxdataBaseClass(object):
         # --- Class internals ---
 
         # This is for auxiliary data handlers that require to read external product files for
-        # a defined period (daily, monthly, ...). The implementation currently keeps only one
-        # external product in memory at the time. The period (date list: yyyy, mm, dd) of this
-        # currently loaded product is designated as current_date  This date is compared to the
-        # requested date and if a new product is loaded upon mismatch of current & requested data
+        # a defined period (daily, monthly, ...). The period (date list: yyyy, mm, dd) of the
+        # currently used product is designated as current_date  This date is compared to the
+        # requested date and if a new product is retrieved upon mismatch of current & requested data
         # NOTE: This will be bypassed by static auxiliary data classes
-        # TODO: Load all auxiliary products for processing period in memory (allow parallel processing)
         self._current_date = [0, 0, 0]
         self._requested_date = [-1, -1, -1]
 
+        # Previously loaded products are kept in a LRU cache (key: file path). The number of products
+        # in the cache (`cache_size`) and the number of following days that are loaded in a background
+        # thread (`prefetch_days`, default: 0) can be set in the options of the auxiliary data class
+        self._cache = AuxdataCache(maxsize=self.get_option("cache_size", DEFAULT_AUXDATA_CACHE_SIZE))
+        self._prefetch_days = int(self.get_option("prefetch_days", 0))
+        self._prefetch_queue = None
+
+        # Optional: Decoded gridded products are stored as uncompressed memory-mapped
+        # arrays in this directory (auxdata option `disk_cache_dir`, default: None -> off)
+        disk_cache_dir = self.get_option("disk_cache_dir", None)
+        self._disk_cache = GridDiskCache(disk_cache_dir) if disk_cache_dir is not None else None
+
         # A dictionary with the output variables of the auxiliary data set
         self.reset_auxvars()
 
@@ -149,16 +170,52 @@ class AuxdataBaseClass(object):
     def get_empty_array(self, l2, empty_val=np.nan):
         return np.full((l2.n_records), empty_val)
 
+    def get_option(self, name, default=None):
+        """ Returns an option of the auxiliary data class or the default value if the option is not set """
+        options = self.cfg.options
+        if options is None or name not in options:
+            return default
+        return options[name]
+
+    def read_nc_grid(self, path):
+        """
+        Read the variables of a gridded netCDF product. If the disk cache is enabled, the
+        decoded variables are read from (or on first use written to) the disk cache.
+        :param path: the path to the netCDF file
+        :return: object with the file variables as attributes (ReadNC or GridDiskCacheData instance)
+        """
+        if self._disk_cache is None:
+            return ReadNC(path)
+        return self._disk_cache.read(path)
+
     def update_external_data(self):
         """ This method will check if the requested date matches current data
         and call the subclass data loader method if not """
         # Check if data for day is already loaded
         if self._requested_date != self._current_date:
-            # NOTE: The implementation of this method needs to be in the subclass
-            self.load_requested_auxdata()
+
+            # Get data from the cache or call the subclass data loader
+            cache_key = str(self.requested_filepath)
+            data = self._cache.get(cache_key)
+            if data is not None:
+                self._data = data
+                self.add_handler_message(self.__class__.__name__ + ": Use cached "+cache_key)
+            else:
+                # NOTE: The implementation of this method needs to be in the subclass
+                previous_data = getattr(self, "_data", None)
+                with NETCDF_IO_LOCK:
+                    self.load_requested_auxdata()
+                # Do not cache the previous product if loading failed
+                if self.has_data_loaded and self._data is not previous_data:
+                    self._cache.put(cache_key, self._data)
+
             self._current_date = self._requested_date
-            if self.has_data_loaded:
+            if self.has_data_loaded and data is None:
                 self.add_handler_message(self.__class__.__name__ + ": Load "+str(self.requested_filepath))
+
+            # Optional: Load the products of the following days in the background
+            if self._prefetch_days > 0:
+                self._prefetch_following_days()
         else:
             if self.has_data_loaded:
                 self.add_handler_message(self.__class__.__name__+": Data already present")
@@ -166,6 +223,72 @@ class AuxdataBaseClass(object):
                 msg = ": No Data: Loading failed in an earlier attempt"
                 self.add_handler_message(self.__class__.__name__ + msg)
 
+    def _prefetch_following_days(self):
+        """ Add the products of the days following the requested date to the prefetch queue """
+
+        # Start the prefetch thread on first use
+        if self._prefetch_queue is None:
+            self._prefetch_queue = Queue()
+            thread = threading.Thread(target=self._run_prefetch, name="%sPrefetch" % self.pyclass)
+            thread.daemon = True
+            thread.start()
+
+        requested_date = date(*self._requested_date)
+        for i in range(1, self._prefetch_days+1):
+            prefetch_date = requested_date + timedelta(days=i)
+            self._prefetch_queue.put([prefetch_date.year, prefetch_date.month, prefetch_date.day])
+
+    def _run_prefetch(self):
+        """ Prefetch thread: Load products into the cache with a copy of this instance, thus the
+        internal state of the instance is not changed """
+        while True:
+            requested_date = self._prefetch_queue.get()
+            # NOTE: Prefetching is optional, any error will be raised when the product is requested. This
+            #       includes the SystemExit of the error handler, which would otherwise end the thread
+            try:
+                self._prefetch(requested_date)
+            except BaseException:
+                continue
+
+    def _prefetch(self, requested_date):
+        """
+        Loads the product of the requested date into the cache. The reservation of the cache key is
+        released for any result other than a product in the cache.
+        :param requested_date: date list (yyyy, mm, dd)
+        :return: None
+        """
+        cache_key, is_reserved, is_cached = None, False, False
+        try:
+            handler = self._get_prefetch_handler(requested_date)
+            cache_key = str(handler.requested_filepath)
+            is_reserved = self._cache.reserve(cache_key)
+            if not is_reserved:
+                return
+            with NETCDF_IO_LOCK:
+                handler.load_requested_auxdata()
+            if handler.has_data_loaded:
+                self._cache.put(cache_key, handler._data, prefetched=True)
+                is_cached = True
+        finally:
+            if is_reserved and not is_cached:
+                self._cache.release(cache_key)
+
+    def _get_prefetch_handler(self, requested_date):
+        """
+        Returns a copy of this instance for loading the product of the requested date in the prefetch thread.
+        NOTE: The configuration object is copied as well, since some subclasses modify the configuration
+              for the requested date (e.g. the filenaming of the automatic product change in `OsiSafSIC`)
+        :param requested_date: date list (yyyy, mm, dd)
+        :return: auxiliary data handler instance
+        """
+        handler = copy.copy(self)
+        handler._cfg = copy.deepcopy(self._cfg)
+        handler.error = ErrorStatus(self.pyclass)
+        handler.msgs = []
+        handler._data = None
+        handler.set_requested_date(*requested_date)
+        return handler
+
     def update_l2(self, l2):
         """ Automatically add all auxiliary variables to a Level-2 data object"""
         for auxvar in self._auxvars:
@@ -176,6 +299,11 @@ class AuxdataBaseClass(object):
     def pyclass(self):
         return self.__class__.__name__
 
+    @property
+    def cache_statistics(self):
+        """ Returns a dictionary with the statistics of the product cache """
+        return self._cache.statistics
+
     @property
     def cfg(self):
         return self._cfg
@@ -248,6 +376,70 @@ class AuxdataBaseClass(object):
         return self._auxvars.keys()
 
 
+class AuxdataCache(object):
+    """
+    A thread-safe LRU cache for parsed auxiliary data products. Keys that are currently
+    loaded by the prefetch thread are reserved and requests for these keys wait until
+    loading has finished.
+    """
+
+    def __init__(self, maxsize=DEFAULT_AUXDATA_CACHE_SIZE):
+        self.maxsize = max(int(maxsize), 1)
+        self._items = OrderedDict()
+        self._reserved = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    def get(self, key):
+        """ Returns the cached item (or None). Waits if the item is currently being prefetched """
+        with self._lock:
+            event = self._reserved.get(key, None)
+        if event is not None:
+            event.wait()
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, item, prefetched=False):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            if prefetched:
+                self.prefetched += 1
+            event = self._reserved.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def reserve(self, key):
+        """ Reserve a key for loading. Returns False if the key is already cached or reserved """
+        with self._lock:
+            if key in self._items or key in self._reserved:
+                return False
+            self._reserved[key] = threading.Event()
+            return True
+
+    def release(self, key):
+        """ Release a reserved key without adding an item (e.g. if loading failed) """
+        with self._lock:
+            event = self._reserved.pop(key, None)
+        if event is not None:
+            event.set()
+
+    @property
+    def statistics(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, prefetched=self.prefetched,
+                        size=len(self._items), maxsize=self.maxsize)
+
+
 class AuxClassConfig(object):
     """ A container for configuration data for any auxilary data handler class"""
 
@@ -353,6 +545,61 @@ class GridTrackInterpol(object):
         # track_var = self.get_from_grid_variable(*args, **kwargs)
 
 
+class CategoricalTranslator(object):
+    """
+    Translation of categorical values (flags, codes) of auxiliary data products with a dense lookup array.
+
+    The translator is defined by a dict {code: value}, where value can be a scalar or a sequence of
+    fixed length (e.g. one value per ice class). The dict is compiled once into a lookup array indexed
+    by `code - min(code)` and the translation of all track points is a single indexing operation.
+    Codes that are not in the dict (including non-integer and NaN values) are set to the fill value.
+
+    Usage:
+
+        translator = CategoricalTranslator({2: 0.0, 3: 1.0, 4: 0.5}, fill_value=np.nan)
+        myi_fraction = translator(ice_type_flags)
+    """
+
+    def __init__(self, translator, fill_value=np.nan, dtype=np.float64):
+        """
+        :param translator: dict with integer codes as keys and scalar or sequences as values
+        :param fill_value: value for all codes that are not in the translator dict
+        :param dtype: data type of the translated values
+        """
+        codes = np.array(sorted(translator.keys()), dtype=np.int64)
+        values = np.array([translator[code] for code in codes], dtype=dtype)
+        self.fill_value = fill_value
+        self._code_offset = codes[0]
+        self._table = np.full((codes[-1]-codes[0]+1, ) + values.shape[1:], fill_value, dtype=dtype)
+        self._table[codes-self._code_offset] = values
+
+    def __call__(self, codes):
+        """
+        Translate an array of codes
+        :param codes: array of codes (any shape, integer, float or numeric strings)
+        :return: array of translated values with shape codes.shape (+ shape of translator values)
+        """
+
+        # Codes may be float (e.g. with NaN's) or numeric strings
+        codes = np.asarray(codes)
+        if codes.dtype.kind not in "iu":
+            codes = np.asarray(codes, dtype=np.float64)
+            is_code = np.isfinite(codes)
+            is_code[is_code] = codes[is_code] == np.rint(codes[is_code])
+            codes = np.where(is_code, codes, self._code_offset-1).astype(np.int64)
+
+        # Codes outside the range of the lookup array are set to the fill value
+        index = codes.astype(np.int64) - self._code_offset
+        is_valid = np.logical_and(index >= 0, index < self._table.shape[0])
+        values = self._table[np.where(is_valid, index, 0)]
+        values[~is_valid] = self.fill_value
+        return values
+
+    @property
+    def table(self):
+        return np.array(self._table)
+
+
 def get_all_auxdata_classes():
     """
     Get a list of all auxiliary data classes
@@ -197,17 +197,35 @@ class IC(AuxdataBaseClass):
 
 
 class ICA(AuxdataBaseClass):
+    """
+    AARI ice charts (total & partial concentrations and stages of development) on the 2 km EASE2 grid.
+
+    The seven chart parameters of a chart date are decoded once into a stacked (7, ny, nx) array of
+    chart codes in the smallest integer dtype that holds them (about 200 MB per chart date for int8),
+    which is kept in the product cache of the auxdata base class. The available chart dates are
+    indexed once (first use) from the local repository and the track is sampled with a single
+    fancy indexing operation for all parameters.
+    """
+
+    # Order of the chart parameters in the stacked array
+    CHART_PARAMETERS = ["CT", "CA", "CB", "CC", "SA", "SB", "SC"]
+
+    # Chart code of flagged pixels in the total concentration (CT) chart
+    FLAG_CODE = -5
+
+    # Search order of chart dates (day offset to requested date)
+    CHART_DATE_OFFSETS = [0, -1, 1, -2, 2, -3, 3, 4, -4, 5, -5, 6, -6, 7, -7]
+
+    # 2 km EASE2 grid: upper left pixel center & pixel size
+    GRID_ORIGIN = (-5399000., 5399000.)
+    GRID_PIXEL_SIZE = (2000., -2000.)
 
     def __init__(self, *args, **kwargs):
 
         super(ICA, self).__init__(*args, **kwargs) #MUOKS20170517
-        self._data_ct = None
-        self._data_ca = None
-        self._data_cb = None
-        self._data_cc = None
-        self._data_sa = None
-        self._data_sb = None
-        self._data_sc = None
+        self._data = None
+        self._chart_dates = None
+        self._ease_proj = pyproj.Proj('+proj=laea +lat_0=90 +lon_0=0 +ellps=WGS84 +datum=WGS84 +units=m')
         self.error.caller_id = self.__class__.__name__
 
     def get_l2_track_vars(self, l2):
@@ -239,144 +257,89 @@ class ICA(AuxdataBaseClass):
         self._requested_date = [year, month, day]
 
     def _get_data(self, l2):
-        """ Loads file from local repository only if needed """
+        """ Get the stacked chart parameters from the cache or load the tif files only if needed """
         if self._requested_date == self._current_date:
             # Data already loaded, nothing to do
             self.add_handler_message("ICA: tif already present")
             return
-        paths, timedelta = self._get_local_repository_filename(l2)
-        #print 'AARI PATHS 0', paths[0]
 
-        # Validation
-        if not Path(paths[0]).is_file():
-            self._msg = "ICA: File not found: %s " % paths[0]
+        # Get the closest available chart date
+        chart_date = self._get_chart_date(datetime.date(*self._requested_date))
+        if chart_date is None:
+            self._msg = "ICA: No chart within 7 days of %04g-%02g-%02g" % tuple(self._requested_date)
             self.error.add_error("auxdata_missing_sic", self._msg)
             return
 
-        self._data_ct = get_tif_image_data(paths[0])
-        self._data_ca = get_tif_image_data(paths[1])
-        self._data_cb = get_tif_image_data(paths[2])
-        self._data_cc = get_tif_image_data(paths[3])
-        self._data_sa = get_tif_image_data(paths[4])
-        self._data_sb = get_tif_image_data(paths[5])
-        self._data_sc = get_tif_image_data(paths[6])
-        flagged = np.where(self._data_ct == -5)
-        # NOTE August 2017 exception added for missing AARI years
-        try:
-            self._data_ct[flagged] = np.nan
-            self._data_ca[flagged] = np.nan
-            self._data_cb[flagged] = np.nan
-            self._data_cc[flagged] = np.nan
-            self._data_sa[flagged] = np.nan
-            self._data_sb[flagged] = np.nan
-            self._data_sc[flagged] = np.nan
-        except TypeError:
-            #print 'No AARI icechart for this day'
-            pass
-        # This step is important for calculation of image coordinates
-        #self._data.ice_conc = np.flipud(self._data.ice_conc)
-        #self._data_ct = np.flipud(self._data_ct)
-        #self._data_ca = np.flipud(self._data_ca)
-        #self._data_cb = np.flipud(self._data_cb)
-        #self._data_cc = np.flipud(self._data_cc)
-        #self._data_sa = np.flipud(self._data_sa)
-        #self._data_sb = np.flipud(self._data_sb)
-        #self._data_sc = np.flipud(self._data_sc)
-        self.add_handler_message("ICA: Loaded IC file: %s (and corresponding CABC, SABC" % paths[0])
+        # Decode the chart parameters only once per chart date
+        cache_key = chart_date.isoformat()
+        self._data = self._cache.get(cache_key)
+        if self._data is None:
+            paths = self._get_chart_filepaths(chart_date)
+            self._data = get_compact_chart_data([get_tif_image_data(path) for path in paths])
+            self._cache.put(cache_key, self._data)
+            self.add_handler_message("ICA: Loaded IC file: %s (and corresponding CABC, SABC" % paths[0])
+        else:
+            self.add_handler_message("ICA: Use cached chart of %s" % cache_key)
         self._current_date = self._requested_date
 
-    def _get_local_repository_filename(self, l2):
-
-
-        time = datetime.datetime(int(self.year),int(self.month),int(self.day))
-
-        path = Path(self.cfg.local_repository)
-
-        other_icevars = ['CA','CB','CC','SA','SB','SC']
-        for delta in [0, -1, 1, -2, 2, -3, 3, 4, -4, 5, -5, 6, -6, 7, -7]:
-            fnames = []
-            datestring = (time + datetime.timedelta(delta)).strftime('%Y%m%d')
-            year = datestring[:4]
-            month = datestring[4:6]
-            str_filename = path / str(year) / str(month) / "merged_aari_"+datestring+"_CT.tif"
-            if str_filename.is_file():
-                timedelta = delta
-                fnames.append(str_filename)
-                for o in other_icevars:
-                    fnames.append(path / str(year) / str(month) / 'merged_aari_'+datestring+'_'+o+'.tif')
-                return fnames, timedelta
-                break
-            else:
-                fnames = ['', '', '', '', '', '']
-                timedelta = np.nan
-        return fnames, timedelta
-
-    def XXYYGrids(self):
-        ### Returns 2 km EASE2 grid XX and YY values
-
-        import numpy as np
-
-        vec_Y = np.arange(5400000, -5400000, -2000) - 1000
-        vec_X = np.arange(-5400000, 5400000, 2000) + 1000
-        [XX, YY] = np.meshgrid(vec_X, vec_Y)
-        return XX,YY
+    def _get_chart_date(self, requested_date):
+        """ Returns the closest chart date within 7 days of the requested date (or None) """
+
+        # Index of all available chart dates (only created once)
+        if self._chart_dates is None:
+            self._chart_dates = set()
+            path = Path(self.cfg.local_repository)
+            for filepath in path.glob("*/*/merged_aari_*_CT.tif"):
+                try:
+                    chart_date = datetime.datetime.strptime(filepath.name[12:20], "%Y%m%d").date()
+                except ValueError:
+                    continue
+                self._chart_dates.add(chart_date)
+
+        for delta in self.CHART_DATE_OFFSETS:
+            chart_date = requested_date + datetime.timedelta(delta)
+            if chart_date in self._chart_dates:
+                return chart_date
+        return None
+
+    def _get_chart_filepaths(self, chart_date):
+        """ Returns the list of tif files of all chart parameters for a chart date """
+        datestring = chart_date.strftime('%Y%m%d')
+        path = Path(self.cfg.local_repository) / datestring[:4] / datestring[4:6]
+        return [path / ("merged_aari_%s_%s.tif" % (datestring, parameter)) for parameter in self.CHART_PARAMETERS]
 
     def _get_sic_ic_track(self, l2):
-        # Convert grid/track coordinates to grid projection coordinates
-        # kwargs = self.cfg.option[l2.hemisphere].projection
-        #p = Proj(**kwargs)
-        data_ct = list()
-        data_ca = list()
-        data_cb = list()
-        data_cc = list()
-        data_sa = list()
-        data_sb = list()
-        data_sc = list()
-
-        EASE_proj = pyproj.Proj('+proj=laea +lat_0=90 +lon_0=0 +ellps=WGS84 +datum=WGS84 +units=m')
-        latlon_proj = pyproj.Proj('+proj=latlong +ellps=WGS84 +datum=WGS84 +no_defs')
-
-        vec_x, vec_y =  pyproj.transform(latlon_proj, EASE_proj, l2.track.longitude, l2.track.latitude)
-
-        # Convert track projection coordinates to image coordinates
-        XX, YY = self.XXYYGrids()
-        xOrigin = XX[0][0]
-        yOrigin = YY[0][0]
-        pixelWidth = XX[0][1]-XX[0][0]
-        pixelHeight = YY[1][0]-YY[0][0]
-
-        for coords in zip(vec_x,vec_y):
-            x = coords[0]
-            y = coords[1]
-            xOffset = int((x - xOrigin) / pixelWidth)
-            yOffset = int((y - yOrigin) / pixelHeight)
-
-            try:
-                stuf =  self._data_ct[yOffset][xOffset]
-                data_ct.append(str(self._data_ct[yOffset][xOffset]))
-                data_ca.append((self._data_ca[yOffset][xOffset]))
-                data_cb.append((self._data_cb[yOffset][xOffset]))
-                data_cc.append((self._data_cc[yOffset][xOffset]))
-                data_sa.append((self._data_sa[yOffset][xOffset]))
-                data_sb.append((self._data_sb[yOffset][xOffset]))
-                data_sc.append((self._data_sc[yOffset][xOffset]))
-            except TypeError:
-                #print 'No AARI icechart for this day'
-                data_ct.append(None)
-                data_ca.append(None)
-                data_cb.append(None)
-                data_cc.append(None)
-                data_sa.append(None)
-                data_sb.append(None)
-                data_sc.append(None)
-
-        return [data_ct,data_ca,data_cb,data_cc,data_sa,data_sb,data_sc]
+        """ Sample all chart parameters along the track (out of grid or flagged: NaN) """
+
+        # Convert track coordinates to image coordinates
+        vec_x, vec_y = self._ease_proj(np.asarray(l2.track.longitude), np.asarray(l2.track.latitude))
+        x_offset = np.trunc((vec_x - self.GRID_ORIGIN[0]) / self.GRID_PIXEL_SIZE[0]).astype(int)
+        y_offset = np.trunc((vec_y - self.GRID_ORIGIN[1]) / self.GRID_PIXEL_SIZE[1]).astype(int)
+
+        # Sample all parameters with one indexing operation
+        n_parameters, ny, nx = self._data.shape
+        is_valid = (x_offset >= 0) & (x_offset < nx) & (y_offset >= 0) & (y_offset < ny)
+        track_data = np.full((n_parameters, len(x_offset)), np.nan, dtype=np.float32)
+        track_data[:, is_valid] = self._data[:, y_offset[is_valid], x_offset[is_valid]]
+        track_data[:, track_data[0, :] == self.FLAG_CODE] = np.nan
+        return track_data
+
+
+def get_compact_chart_data(charts):
+    """ Stack the chart code arrays and store them in the smallest integer dtype that
+    holds all codes (non-integer charts are stored as float32) """
+    data = np.stack(charts)
+    if data.dtype.kind not in "iu":
+        return data.astype(np.float32)
+    vmin, vmax = int(data.min()), int(data.max())
+    for dtype in [np.int8, np.uint8, np.int16, np.uint16, np.int32]:
+        if np.iinfo(dtype).min <= vmin and vmax <= np.iinfo(dtype).max:
+            return data.astype(dtype, copy=False)
+    return data
 
 
 def get_tif_image_data(path):
     """ Open the tif file and return its content """
     im = Image.open(str(path))
-    pixel_list = im.getdata()
-    width, height = im.size
-    data = np.reshape(pixel_list, (width, height))
+    data = np.asarray(im)
     return data
\ No newline at end of file
@@ -33,41 +33,63 @@ Important Note:
 """
 
 from pysiral.auxdata import AuxdataBaseClass
-from pysiral.iotools import ReadNC
+from pysiral.pipeline import NETCDF_IO_LOCK
 
+import os
+import hashlib
 import scipy.ndimage as ndimage
 import numpy as np
+from netCDF4 import Dataset
+from pathlib import Path
 
 
 class DTU1MinGrid(AuxdataBaseClass):
     """
     Parsing Routine for DTU 1 minute global mean sea surface height files
+
+    The mean sea surface is evaluated with cubic splines. The spline coefficients are computed
+    only once for latitude bands (`latitude_band_size` in degrees, default: 5) that cover the
+    latitude range of the processor settings. If the auxdata option `disk_cache_dir` is set,
+    the coefficients are stored as float32 arrays (one file per latitude band). Later runs
+    memory-map only the bands of the latitude range instead of reading and filtering the
+    global grid again.
     """
 
+    # Number of additional rows for the computation of the spline coefficients of a latitude band
+    # (the influence of rows outside the band decays with 0.268^n for cubic splines)
+    SPLINE_FILTER_HALO = 32
+
+    # The cubic spline evaluation requires two rows of coefficients on each side
+    SPLINE_EVAL_HALO = 2
+
     def __init__(self, *args, **kwargs):
 
         super(DTU1MinGrid, self).__init__(*args, **kwargs)
 
-        # Read as standard netcdf
-        dtu_grid = ReadNC(self.cfg.filename)
+        # Read the grid coordinates
+        with NETCDF_IO_LOCK:
+            rootgrp = Dataset(str(self.cfg.filename))
+            self.longitude = np.array(rootgrp.variables["lon"][:])
+            latitude = np.array(rootgrp.variables["lat"][:])
+            rootgrp.close()
 
         # Cut to ROI regions (latitude only)
         # -> no need for world mss
         lat_range = self.cfg.options.latitude_range
 
         # Get the indices for the latitude subset
-        latitude_indices = np.where(np.logical_and(dtu_grid.lat >= lat_range[0], dtu_grid.lat <= lat_range[1]))[0]
+        latitude_indices = np.where(np.logical_and(latitude >= lat_range[0], latitude <= lat_range[1]))[0]
 
-        # Crop data to subset
-        self.elevation = dtu_grid.mss[latitude_indices, :]
-        self.longitude = dtu_grid.lon
-        self.latitude = dtu_grid.lat[latitude_indices]
+        # Get the latitude bands that cover the subset (including the rows required for evaluation)
+        band_size = int(round(self.get_option("latitude_band_size", 5.0) / (latitude[1]-latitude[0])))
+        row_min = max(latitude_indices[0] - self.SPLINE_EVAL_HALO, 0)
+        row_max = min(latitude_indices[-1] + self.SPLINE_EVAL_HALO, len(latitude)-1)
+        bands = np.arange(row_min // band_size, row_max // band_size + 1)
 
-        # Convert elevations to WGS84
-        delta_h1 = egm2top_delta_h(self.latitude)
-        delta_h = egm2wgs_delta_h(self.latitude)
-        for i in np.arange(len(self.latitude)):
-            self.elevation[i, :] += (delta_h[i]-delta_h1[i])
+        # Spline coefficients for the latitude bands (rows: band_index*band_size -> ...)
+        self._spline_coefs = np.concatenate([self._get_band_spline_coefs(band, band_size, latitude)
+                                             for band in bands])
+        self.latitude = latitude[bands[0]*band_size:bands[0]*band_size+self._spline_coefs.shape[0]]
 
     def get_l2_track_vars(self, l2):
 
@@ -89,11 +111,62 @@ class DTU1MinGrid(AuxdataBaseClass):
         iy = (latitude - mss_lat_min)/mss_lat_step
 
         # Extract and return the elevation along the track
-        mss_track_elevation = ndimage.map_coordinates(self.elevation, [iy, ix])
+        # NOTE: The spline coefficients are precomputed
+        mss_track_elevation = ndimage.map_coordinates(self._spline_coefs, [iy, ix], order=3, prefilter=False)
 
         # Register auxdata variable
         self.register_auxvar("mss", "mean_sea_surface", mss_track_elevation, None)
 
+    def _get_band_spline_coefs(self, band, band_size, latitude):
+        """ Returns the spline coefficients of a latitude band from the disk cache (if enabled) or
+        computes the coefficients """
+
+        disk_cache_dir = self.get_option("disk_cache_dir", None)
+        if disk_cache_dir is None:
+            return self._compute_band_spline_coefs(band, band_size, latitude)
+
+        # Cache files are keyed by the mss file (path, modification time) and the band definition
+        filepath = Path(self.cfg.filename).resolve()
+        file_id = "%s:%d:%d:%d" % (str(filepath), filepath.stat().st_mtime_ns, band_size, self.SPLINE_FILTER_HALO)
+        key = hashlib.sha1(file_id.encode("utf-8")).hexdigest()[:16]
+        cache_filepath = Path(disk_cache_dir) / ("%s_spline_coefs_%s_band%03d.npy" % (filepath.stem, key, band))
+        if not cache_filepath.is_file():
+            cache_filepath.parent.mkdir(parents=True, exist_ok=True)
+            spline_coefs = self._compute_band_spline_coefs(band, band_size, latitude)
+            tmp_filepath = cache_filepath.with_name(cache_filepath.name + ".%d.tmp" % os.getpid())
+            with open(str(tmp_filepath), "wb") as fhandle:
+                np.save(fhandle, spline_coefs)
+            os.replace(str(tmp_filepath), str(cache_filepath))
+        return np.load(str(cache_filepath), mmap_mode="r")
+
+    def _compute_band_spline_coefs(self, band, band_size, latitude):
+        """ Compute the cubic spline coefficients (float32) for the rows of a latitude band """
+
+        # Read the band with additional rows on both sides
+        n_rows = len(latitude)
+        band_start, band_stop = band*band_size, min((band+1)*band_size, n_rows)
+        read_start = max(band_start-self.SPLINE_FILTER_HALO, 0)
+        read_stop = min(band_stop+self.SPLINE_FILTER_HALO, n_rows)
+        with NETCDF_IO_LOCK:
+            rootgrp = Dataset(str(self.cfg.filename))
+            elevation = np.ma.getdata(rootgrp.variables["mss"][read_start:read_stop, :]).astype(np.float64)
+            rootgrp.close()
+
+        # Convert elevations to WGS84
+        band_latitude = latitude[read_start:read_stop]
+        delta_h1 = egm2top_delta_h(band_latitude)
+        delta_h = egm2wgs_delta_h(band_latitude)
+        elevation += (delta_h-delta_h1)[:, np.newaxis]
+
+        # Compute the spline coefficients (same as the prefilter of ndimage.map_coordinates)
+        try:
+            spline_coefs = ndimage.spline_filter(elevation, order=3, output=np.float64, mode="constant")
+        except TypeError:
+            # scipy < 1.6: no mode keyword
+            spline_coefs = ndimage.spline_filter(elevation, order=3, output=np.float64)
+        spline_coefs = spline_coefs[band_start-read_start:band_stop-read_start, :]
+        return spline_coefs.astype(np.float32)
+
 
 def egm2wgs_delta_h(phi):
     aegm = 6378136.460000
@@ -95,7 +95,7 @@ class OsiSafSIC(AuxdataBaseClass):
             return
 
         # --- Read the data ---
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
         # --- Pre-process the data ---
         # Remove time dimension
@@ -186,7 +186,7 @@ class IfremerSIC(AuxdataBaseClass):
             self.error.add_error("auxdata_missing_sic", msg)
             return
 
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
         self._data.ice_conc = self._data.concentration[0, :, :]
         flagged = np.where(np.logical_or(self._data.ice_conc < 0, self._data.ice_conc > 100))
         self._data.ice_conc[flagged] = 0
@@ -35,8 +35,7 @@ Important Note:
 
 """
 
-from pysiral.auxdata import AuxdataBaseClass, GridTrackInterpol
-from pysiral.iotools import ReadNC
+from pysiral.auxdata import AuxdataBaseClass, GridTrackInterpol, CategoricalTranslator
 
 import scipy.ndimage as ndimage
 from pyproj import Proj
@@ -44,6 +43,16 @@ import numpy as np
 from pathlib import Path
 
 
+# Translation of OSI-SAF ice type flags into myi fraction
+# flag_meanings: -1: fill value, 1: open_water, 2: first_year_ice, 3: multi_year_ice, 4: ambiguous
+OSISAF_SITYPE_TRANSLATOR = CategoricalTranslator({2: 0.0, 3: 1.0, 4: 0.5}, fill_value=np.nan)
+
+# Translation of OSI-SAF ice type confidence level into myi fraction uncertainty
+# flag_meaning: 0: unprocessed, 1: erroneous, 2: unreliable, 3: acceptable, 4: good, 5: excellent
+OSISAF_CONFIDENCE_LEVEL_TRANSLATOR = CategoricalTranslator({1: 1., 2: 0.5, 3: 0.2, 4: 0.1, 5: 0.0},
+                                                           fill_value=np.nan)
+
+
 class OsiSafSIType(AuxdataBaseClass):
     """ This is a class for the OSI-403 product with variables ice_type and confidence_level """
 
@@ -88,7 +97,7 @@ class OsiSafSIType(AuxdataBaseClass):
             return
 
         # --- Read the data ---
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
         # Report
         self.add_handler_message("OsiSafSIType: Loaded SIType file: %s" % path)
@@ -102,19 +111,11 @@ class OsiSafSIType(AuxdataBaseClass):
         sitype = grid2track.get_from_grid_variable(self._data.ice_type[0, :, :], flipud=True)
         confidence_level = grid2track.get_from_grid_variable(self._data.confidence_level[0, :, :], flipud=True)
 
-        # set fill values to flag 0 -> nan
-        fillvalues = np.where(sitype == -1)[0]
-        sitype[fillvalues] = 0
-
-        # --- Translate sitype codes into myi fraction ---
-        # flag_meanings: -1: fill value, 1: open_water, 2: first_year_ice, 3: multi_year_ice, 4: ambiguous
-        translator = np.array([np.nan, np.nan, 0.0, 1.0, 0.5])
-        sitype = np.array([translator[value] for value in sitype])
+        # Translate sitype codes into myi fraction (fill value & open water -> nan)
+        sitype = OSISAF_SITYPE_TRANSLATOR(sitype)
 
         # Translate confidence level into myi fraction uncertainty
-        # flag_meaning: 0: unprocessed, 1: erroneous, 2: unreliable, 3: acceptable, 4: good, 5: excellent
-        translator = np.array([np.nan, 1., 0.5, 0.2, 0.1, 0.0])
-        sitype_uncertainty = np.array([translator[value] for value in confidence_level])
+        sitype_uncertainty = OSISAF_CONFIDENCE_LEVEL_TRANSLATOR(confidence_level)
 
         return sitype, sitype_uncertainty
 
@@ -179,7 +180,7 @@ class OsiSafSITypeCDR(AuxdataBaseClass):
             return
 
         # Read and prepare input data
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
     def _get_sitype_track(self, l2):
         """ Extract ice type and ice type uncertainty along the track """
@@ -192,10 +193,7 @@ class OsiSafSITypeCDR(AuxdataBaseClass):
         uncertainty = grid2track.get_from_grid_variable(self._data.uncertainty[0, :, :], flipud=True)
 
         # Convert flags to myi fraction
-        translator = np.array([np.nan, np.nan, 0.0, 1.0, 0.5, np.nan])
-        fillvalues = np.where(sitype == -1)[0]
-        sitype[fillvalues] = 5
-        sitype = np.array([translator[value] for value in sitype])
+        sitype = OSISAF_SITYPE_TRANSLATOR(sitype)
 
         # Uncertainty in product is in %
         sitype_uncertainty = uncertainty / 100.
@@ -277,7 +275,7 @@ class ICDCNasaTeam(AuxdataBaseClass):
             return
 
         # Bulk read the netcdf file
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
         # There are multiple myi concentrations fields in the product
         # The one used here is defined in the auxdata definition file
@@ -41,7 +41,6 @@ Important Note:
 
 from pysiral.auxdata import AuxdataBaseClass, GridTrackInterpol
 from pysiral.filter import idl_smooth
-from pysiral.iotools import ReadNC
 
 import scipy.ndimage as ndimage
 
@@ -273,7 +272,7 @@ class Warren99AMSR2Clim(AuxdataBaseClass):
             return
 
         # Read the data
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
         # This step is important for calculation of image coordinates
         self.add_handler_message(self.__class__.__name__+": Loaded snow file: %s" % path)
@@ -411,7 +410,7 @@ class ICDCSouthernClimatology(AuxdataBaseClass):
             return
 
         # Store the netCDF data object
-        self._data = ReadNC(path)
+        self._data = self.read_nc_grid(path)
 
 
     def _get_snow_track(self, l2):
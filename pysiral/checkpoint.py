@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint files for incremental Level-2 reprocessing
+
+The Level-2 processor can store the state of the Level-2 data object after the
+computation intensive stages (waveform retracking and sea surface height estimation)
+in checkpoint files. A rerun of the Level-2 processor, e.g. with modified freeboard,
+snow or thickness settings, can then resume from the latest valid checkpoint and only
+executes the downstream stages.
+
+Each checkpoint is keyed by a hash of the content of the l1p file and of all Level-2
+settings that are used up to and including the checkpoint stage. Any change of the
+l1p file or of these settings therefore invalidates the checkpoint.
+
+The snow auxiliary data is only used by the stages after the sea surface height
+estimation. Snow auxdata handlers are therefore not part of the key and are
+executed again when resuming from a checkpoint.
+
+NOTE: The content of auxiliary data files is not part of the key. Checkpoints
+      must be removed manually if auxiliary data files are changed in place.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+
+from pysiral import psrlcfg
+from pysiral.logging import DefaultLoggingClass
+
+
+# Level-2 settings sections that are used up to (and including) each checkpoint stage
+# NOTE: The order of the stages is the order of the Level-2 processing chain
+L2_CHECKPOINT_STAGES = OrderedDict([
+    ("retracking", ["hemisphere", "corrections", "l1b_pre_filtering", "transfer_from_l1p", "auxdata",
+                    "surface_type", "validator", "retracker"]),
+    ("ssh", ["hemisphere", "corrections", "l1b_pre_filtering", "transfer_from_l1p", "auxdata",
+             "surface_type", "validator", "retracker", "ssa"])])
+
+# Auxiliary data types that are not used before the last checkpoint stage. These are
+# excluded from the checkpoint key and must be re-run by the Level-2 processor after resuming
+L2_CHECKPOINT_EXCLUDED_AUXDATA = ["snow"]
+
+# Size of the chunks for computing the hash of l1p files
+_HASH_CHUNK_SIZE = 2**20
+
+
+class Level2Checkpoint(object):
+    """ Container for the content of a checkpoint file """
+
+    def __init__(self, stage, key, l2):
+        self.stage = stage
+        self.key = key
+        self.l2 = l2
+
+
+class Level2CheckpointHandler(DefaultLoggingClass):
+    """
+    Writes and reads checkpoint files of the Level-2 processor.
+    """
+
+    def __init__(self, directory, l2def):
+        """
+        :param directory: the directory for the checkpoint files (will be created if necessary)
+        :param l2def: the Level-2 processor definition (AttrDict)
+        """
+        super(Level2CheckpointHandler, self).__init__(self.__class__.__name__)
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._settings_hash = {}
+        for stage, section_names in L2_CHECKPOINT_STAGES.items():
+            self._settings_hash[stage] = get_settings_hash(l2def, section_names)
+        # The hash of the l1p file is computed only once per file
+        self._l1p_file_hash = (None, None)
+
+    def write(self, l1b_file, stage, l2):
+        """
+        Write the state of the Level-2 data object after a given processing stage
+        :param l1b_file: the path to the l1p file
+        :param stage: the name of the processing stage (see L2_CHECKPOINT_STAGES)
+        :param l2: the Level2Data object
+        :return: None
+        """
+        key = self.get_key(l1b_file, stage)
+        filepath = self.get_filepath(l1b_file, stage)
+        checkpoint = Level2Checkpoint(stage, key, l2)
+
+        # Write to temporary file first to never leave a partial checkpoint file
+        tmp_filepath = filepath.with_suffix(".tmp")
+        with open(str(tmp_filepath), "wb") as fhandle:
+            pickle.dump(checkpoint, fhandle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_filepath), str(filepath))
+        self.log.info("- Write %s checkpoint: %s" % (stage, filepath.name))
+
+    def get_latest(self, l1b_file):
+        """
+        Return the checkpoint of the latest processing stage that is valid for the l1p file
+        and the current Level-2 settings
+        :param l1b_file: the path to the l1p file
+        :return: Level2Checkpoint instance or None (no valid checkpoint)
+        """
+        for stage in reversed(list(L2_CHECKPOINT_STAGES.keys())):
+            filepath = self.get_filepath(l1b_file, stage)
+            if not filepath.is_file():
+                continue
+            try:
+                with open(str(filepath), "rb") as fhandle:
+                    checkpoint = pickle.load(fhandle)
+            except Exception as ex:
+                self.log.warning("! Invalid checkpoint file %s: %s" % (filepath.name, str(ex)))
+                continue
+            if not isinstance(checkpoint, Level2Checkpoint):
+                continue
+            if checkpoint.key != self.get_key(l1b_file, stage) or checkpoint.stage != stage:
+                continue
+            self.log.info("- Resume from %s checkpoint: %s" % (stage, filepath.name))
+            return checkpoint
+        return None
+
+    def get_key(self, l1b_file, stage):
+        """ The checkpoint key: hash of l1p file, upstream settings & pysiral version """
+        hash_obj = hashlib.sha1()
+        hash_obj.update(self.get_l1p_file_hash(l1b_file).encode("utf-8"))
+        hash_obj.update(self._settings_hash[stage].encode("utf-8"))
+        hash_obj.update(psrlcfg.version.encode("utf-8"))
+        return hash_obj.hexdigest()
+
+    def get_filepath(self, l1b_file, stage):
+        """ The checkpoint filename contains the key, thus the checkpoints of different settings
+        can coexist in the same directory """
+        key = self.get_key(l1b_file, stage)
+        filename = "%s_%s_%s.l2ckpt" % (Path(l1b_file).stem, stage, key[:16])
+        return self._directory / filename
+
+    def get_l1p_file_hash(self, l1b_file):
+        # NOTE: Local copy, since the handler may be used by the reader thread of the I/O pipeline
+        l1b_file = str(l1b_file)
+        cached = self._l1p_file_hash
+        if cached[0] != l1b_file:
+            cached = (l1b_file, get_file_hash(l1b_file))
+            self._l1p_file_hash = cached
+        return cached[1]
+
+    @property
+    def directory(self):
+        return Path(self._directory)
+
+
+def get_file_hash(filepath):
+    """ Returns the sha1 hash of the content of a file """
+    hash_obj = hashlib.sha1()
+    with open(str(filepath), "rb") as fhandle:
+        for chunk in iter(lambda: fhandle.read(_HASH_CHUNK_SIZE), b""):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def get_settings_hash(l2def, section_names):
+    """
+    Returns the sha1 hash of selected sections of the Level-2 processor definition
+    :param l2def: the Level-2 processor definition (dict-like)
+    :param section_names: list of section names (missing sections are included as None)
+        Auxdata types in L2_CHECKPOINT_EXCLUDED_AUXDATA are not part of the hash.
+    :return: hex digest
+    """
+    settings = []
+    for name in section_names:
+        section = l2def.get(name, None)
+        if name == "auxdata" and section is not None:
+            section = [auxdata_dict for auxdata_dict in section
+                       if list(auxdata_dict.keys())[0] not in L2_CHECKPOINT_EXCLUDED_AUXDATA]
+        settings.append((name, section))
+    settings_str = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(settings_str.encode("utf-8")).hexdigest()
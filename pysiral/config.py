@@ -17,6 +17,8 @@ Created on Mon Jul 06 10:38:41 2015
 
 import re
 import yaml
+from collections import OrderedDict
+from collections.abc import Mapping
 
 import numpy as np
 
@@ -212,6 +214,57 @@ class DefaultCommandLineArguments(object):
                 "help": 'enable writing Level-2 output to unique directory ' +
                         '(default)'},
 
+            # number of orbits in the I/O queues of the Level-2 processor
+            "io-pipeline-depth": {
+                "action": "store",
+                "dest": "io_pipeline_depth",
+                "type": int,
+                "default": 0,
+                "required": False,
+                "help": 'read l1p & write l2 files in background threads with given queue depth (default: 0 -> off)'},
+
+            # directory for checkpoint files of the Level-2 processor
+            "checkpoint-dir": {
+                "action": "store",
+                "dest": "checkpoint_dir",
+                "default": None,
+                "required": False,
+                "help": 'write/resume from checkpoints after retracking & ssh estimation (default: None -> off)'},
+
+            # shared directory of the work queue for sharded processor runs
+            "work-queue-dir": {
+                "action": "store",
+                "dest": "work_queue_dir",
+                "default": None,
+                "required": False,
+                "help": 'share the processing items with other workers via a work queue in this directory (default: None -> off)'},
+
+            # time after which work queue items of crashed workers are reclaimed
+            "work-queue-timeout": {
+                "action": "store",
+                "dest": "work_queue_timeout",
+                "type": float,
+                "default": 600.,
+                "required": False,
+                "help": 'seconds without heartbeat after which items of other workers are reclaimed (default: 600)'},
+
+            # directory of the on-disk cache for decoded l2i columns (l2preproc & l3proc)
+            "l2i-cache-dir": {
+                "action": "store",
+                "dest": "l2i_cache_dir",
+                "default": None,
+                "required": False,
+                "help": 'cache decoded l2i columns in this directory (default: None -> off)'},
+
+            # number of parallel worker processes
+            "workers": {
+                "action": "store",
+                "dest": "workers",
+                "type": int,
+                "default": 1,
+                "required": False,
+                "help": 'number of parallel worker processes (default: 1 -> serial processing)'},
+
             "period": {
                 "action": "store",
                 "dest": "period",
@@ -238,7 +291,7 @@ class DefaultCommandLineArguments(object):
                 "dest": "l3_griddef",
                 "default": None,
                 "required": True,
-                "help": "l3 grid definition id or filename"},
+                "help": "l3 grid definition id or filename (semicolon-separated list for multiple grids)"},
 
             "l3-output": {
                 "action": "store",
@@ -294,3 +347,188 @@ def get_yaml_config(filename, output="attrdict"):
     return content_dict
 
 
+
+
+class OptionField(object):
+    """
+    Declaration of a single algorithm option: the accepted python type(s), the default
+    value and whether the option must be given in the processor definition file.
+    Use `dict` for nested option trees and `tuple` for lists.
+    """
+
+    __slots__ = ("types", "default", "required", "fields")
+
+    def __init__(self, types, default=None, required=False, fields=None):
+        """
+        :param types: python type or tuple of python types
+        :param default: default value (used if the option is missing)
+        :param required: flag whether the option must be specified
+        :param fields: (optional) option declaration for nested option trees
+        """
+        self.types = types if isinstance(types, tuple) else (types, )
+        self.default = default
+        self.required = required
+        self.fields = fields
+
+    def validate(self, name, value):
+        """
+        Convert a value from the option tree into its frozen representation and verify
+        its type.
+        :param name: option name (used for error messages)
+        :param value: the option value
+        :return: the validated and frozen option value
+        """
+
+        # Undefined options are always accepted
+        if value is None:
+            return None
+
+        # Implicit conversion of integers, if floats are requested (`1` in yaml files)
+        if float in self.types and int not in self.types:
+            if isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+
+        value = freeze_option_value(value, fields=self.fields, name=name)
+
+        # Validate the type of the frozen value
+        valid_types = tuple(AlgorithmOptions if t is dict else t for t in self.types)
+        if not isinstance(value, valid_types):
+            type_names = ", ".join([t.__name__ for t in self.types])
+            msg = "Invalid type of option `%s`: %s (expected: %s)"
+            raise ValueError(msg % (name, type(value).__name__, type_names))
+
+        return value
+
+
+class AlgorithmOptions(object):
+    """
+    Base class of read-only algorithm option objects. The actual classes are created
+    by `compile_options` with one slot per option, which makes attribute access
+    significantly faster than the (recursive) look-up of AttrDict instances. The class
+    supports the subset of the mapping interface that is used for option dictionaries
+    (`in`, `get`, `keys`, `items` and item access).
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("algorithm options are read-only (%s)" % name)
+
+    def __contains__(self, name):
+        """ Options are considered absent if they are not defined or None """
+        return name in self._fields and getattr(self, name) is not None
+
+    def __getitem__(self, name):
+        if name not in self._fields:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        fields = ", ".join(["%s=%r" % (name, getattr(self, name)) for name in self._fields])
+        return "%s(%s)" % (self.__class__.__name__, fields)
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self._fields else default
+
+    def keys(self):
+        return list(self._fields)
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self._fields]
+
+    def as_dict(self):
+        """ Returns the options as (nested) python dictionary """
+        output = OrderedDict()
+        for name, value in self.items():
+            if isinstance(value, AlgorithmOptions):
+                value = value.as_dict()
+            elif isinstance(value, tuple):
+                value = [v.as_dict() if isinstance(v, AlgorithmOptions) else v for v in value]
+            output[name] = value
+        return output
+
+
+# Cache for the dynamically created option classes
+# NOTE: One class per option name and set of fields
+_OPTIONS_CLASSES = {}
+
+
+def _get_options_class(name, fields):
+    """
+    Returns the slotted option class for a given set of fields
+    :param name: the class name
+    :param fields: tuple of field names
+    :return: subclass of AlgorithmOptions
+    """
+    key = (name, fields)
+    options_class = _OPTIONS_CLASSES.get(key, None)
+    if options_class is None:
+        options_class = type(name, (AlgorithmOptions, ), {"__slots__": fields, "_fields": fields})
+        _OPTIONS_CLASSES[key] = options_class
+    return options_class
+
+
+def freeze_option_value(value, fields=None, name="options"):
+    """
+    Converts a value of an option tree into its immutable representation:
+    mappings are compiled to AlgorithmOptions and lists to tuples.
+    :param value: Any option value
+    :param fields: (optional) option declaration in the case of mappings
+    :param name: option name (used for class naming and error messages)
+    :return: frozen option value
+    """
+    if isinstance(value, AlgorithmOptions):
+        return value
+    if isinstance(value, Mapping):
+        return compile_options(value, fields=fields, name=name)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_option_value(item, name=name) for item in value)
+    return value
+
+
+def compile_options(opt_dict, fields=None, name="options"):
+    """
+    Compiles an option tree (e.g. the `options` of an algorithm in the Level-2 processor
+    definition) into a read-only, slotted option object. If a declaration of the fields
+    is given, missing options are set to their defaults and the types of all declared options
+    are validated. Options that are not declared are transferred unchecked.
+    :param opt_dict: options as dictionary or AttrDict (None for empty options)
+    :param fields: dictionary {option_name: OptionField} (optional)
+    :param name: name of the options (e.g. the algorithm class name)
+    :return: AlgorithmOptions instance
+    """
+
+    opt_dict = {} if opt_dict is None else dict(opt_dict.items())
+    fields = {} if fields is None else fields
+
+    # Declared options first (in order of the declaration)
+    values = OrderedDict()
+    for field_name, field in fields.items():
+        if field_name in opt_dict:
+            value = opt_dict.pop(field_name)
+        elif field.required:
+            raise ValueError("Missing mandatory option `%s` [%s]" % (field_name, name))
+        else:
+            value = field.default
+        values[field_name] = field.validate(field_name, value)
+
+    # Transfer options without declaration
+    for field_name, value in opt_dict.items():
+        if not isinstance(field_name, str) or not field_name.isidentifier():
+            raise ValueError("Invalid option name `%s` [%s]" % (str(field_name), name))
+        values[field_name] = freeze_option_value(value, name=field_name)
+
+    # Create the option object
+    class_name = "".join([part[:1].upper()+part[1:] for part in re.split(r"\W|_", name)]) + "Options"
+    options_class = _get_options_class(class_name, tuple(values.keys()))
+    options = options_class.__new__(options_class)
+    for field_name, value in values.items():
+        object.__setattr__(options, field_name, value)
+    return options
@@ -3,7 +3,6 @@ from pathlib import Path
 
 import xarray
 import numpy as np
-from scipy import interpolate
 from cftime import num2pydate
 
 from pysiral import __version__ as pysiral_version
@@ -11,7 +10,7 @@ from pysiral.classifier import CS2OCOGParameter, CS2LTPP, CS2PulsePeakiness
 from pysiral.clocks import StopWatch, UTCTAIConverter
 from pysiral.cryosat2 import cs2_procstage2timeliness
 from pysiral.errorhandler import ErrorStatus
-from pysiral.helper import parse_datetime_str
+from pysiral.helper import Interp1HzTo20Hz, parse_datetime_str
 from pysiral.l1bdata import Level1bData
 from pysiral.logging import DefaultLoggingClass
 from pysiral.surface_type import ESA_SURFACE_TYPE_DICT
@@ -32,6 +31,16 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         # Init main class variables
         self.nc = None
 
+        # Record subset of the 20Hz variables (list of slices, None: all records), values of
+        # 20Hz variables that have already been read and statistics of the bytes read
+        self._record_slices = None
+        self._values_20Hz = {}
+        self._bytes_read = 0
+        self._bytes_full = 0
+
+        # Interpolation of 1Hz variables to the 20Hz records (computed once per file)
+        self._interp_1Hz_to_20Hz = None
+
     @staticmethod
     def translate_opmode2radar_mode(op_mode):
         """ Converts the ESA operation mode str in the pysiral compliant version """
@@ -77,22 +86,93 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
                 timer.stop()
                 return self.empty
 
-        # Polar ocean check passed, now fill the rest of the l1 data groups
+        # Polar ocean check passed, get the records of the polar ocean segments
+        # NOTE: Only these records will be read from the 20Hz variables
+        self._set_record_subset(polar_ocean_check)
+        if self._record_slices is not None and len(self._record_slices) == 0:
+            self.log.info("- No polar ocean records")
+            timer.stop()
+            return self.empty
+
+        # Fill the rest of the l1 data groups
         self._set_l1_data_groups()
 
+        # The values of the 20Hz variables are only needed for the extraction of the record subset
+        # NOTE: Release them to not keep the arrays in memory until the next input file is read
+        self._values_20Hz = {}
+        self._interp_1Hz_to_20Hz = None
+
+        # Metadata of a record subset needs to be updated
+        if self._record_slices is not None:
+            self.l1.info.set_attribute("is_orbit_subset", True)
+            self.l1.info.set_attribute("n_records", self.l1.time_orbit.latitude.size)
+            self.l1.update_l1b_metadata()
+
         timer.stop()
         self.log.info("- Created L1 object in %.3f seconds" % timer.get_seconds())
+        if self._bytes_full > 0:
+            msg = "- Read %.1f MB of %.1f MB from 20Hz variables (%.1f%% saved)"
+            saved_percent = 100. * (1. - float(self._bytes_read) / float(self._bytes_full))
+            self.log.info(msg % (self._bytes_read / 1.0e6, self._bytes_full / 1.0e6, saved_percent))
 
         # Return the l1 object
         return self.l1
 
     @staticmethod
-    def get_wfm_range(window_delay, n_range_bins):
+    def get_polar_ocean_records(latitude, is_ocean, polar_ocean_cfg):
+        """
+        Returns the indices of the records that can be part of the polar ocean segments of the
+        Level-1 pre-processor: Records above the polar latitude threshold between the first and
+        last ocean record (per hemisphere if the input file covers both hemispheres).
+        :param latitude: 20Hz latitude
+        :param is_ocean: 20Hz ocean flag
+        :param polar_ocean_cfg: The polar ocean settings of the Level-1 pre-processor
+        :return: Sorted index array
+        """
+
+        # Polar regions in the same way as the Level-1 pre-processor
+        polar_threshold = polar_ocean_cfg.get("polar_latitude_threshold")
+        if polar_ocean_cfg.get("input_file_is_single_hemisphere", True):
+            polar_masks = [np.abs(latitude) >= polar_threshold]
+        else:
+            hemisphere_masks = {"north": latitude >= polar_threshold, "south": latitude <= -1.0*polar_threshold}
+            polar_masks = [hemisphere_masks[hemisphere] for hemisphere in polar_ocean_cfg.get("target_hemisphere")]
+
+        # Trim the polar records to the outer ocean records
+        records = []
+        for polar_mask in polar_masks:
+            polar_records = np.where(polar_mask)[0]
+            ocean_index = np.where(is_ocean[polar_records])[0]
+            if len(ocean_index) == 0:
+                continue
+            records.append(polar_records[ocean_index[0]:ocean_index[-1]+1])
+
+        if len(records) == 0:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(records))
+
+    @staticmethod
+    def get_index_slices(indices):
         """
-        Returns the range for each waveform bin based on the window delay and the number of range bins
+        Converts a sorted index array into a list of slices of contiguous index ranges
+        :param indices: sorted index array
+        :return: list of slices
+        """
+        if len(indices) == 0:
+            return []
+        breaks = np.where(np.diff(indices) > 1)[0]
+        starts = np.concatenate(([indices[0]], indices[breaks+1]))
+        stops = np.concatenate((indices[breaks], [indices[-1]])) + 1
+        return [slice(int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+    @staticmethod
+    def get_wfm_range_parameters(window_delay, n_range_bins):
+        """
+        Returns the range of the first waveform bin and the range bin spacing based on the window delay
+        and the number of range bins
         :param window_delay: The two-way delay to the center of the range window in seconds
         :param n_range_bins: The number of range bins (256: sar, 512: sin)
-        :return: The range for each waveform bin as array (time, ns)
+        :return: The range of the first range bin for each waveform (time) and the range bin spacing
         """
         lightspeed = 299792458.0
         bandwidth = 320000000.0
@@ -102,34 +182,22 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         window_size = (n_range_bins * lightspeed) / (4.0 * bandwidth)
         first_bin_offset = window_size / 2.0
         # Calculate the range increment for each bin
-        range_increment = np.arange(n_range_bins) * lightspeed / (4.0 * bandwidth)
-
-        # Reshape the arrays
-        range_offset = np.tile(range_increment, (window_delay.shape[0], 1)) - first_bin_offset
-        window_range = np.tile(central_window_range, (n_range_bins, 1)).transpose()
-
-        # Compute the range for each bin and return
-        wfm_range = window_range + range_offset
-        return wfm_range
+        bin_spacing = lightspeed / (4.0 * bandwidth)
+        return central_window_range - first_bin_offset, bin_spacing
 
-    @staticmethod
-    def interp_1Hz_to_20Hz(variable_1Hz, time_1Hz, time_20Hz, **kwargs):
+    def interp_1Hz_to_20Hz(self, variables_1Hz, **kwargs):
         """
-        Computes a simple linear interpolation to transform a 1Hz into a 20Hz variable
-        :param variable_1Hz: an 1Hz variable array
-        :param time_1Hz: 1Hz reference time
-        :param time_20Hz: 20 Hz reference time
-        :return: the interpolated 20Hz variable
+        Computes a simple linear interpolation to transform 1Hz into 20Hz variables. The interpolation
+        weights are computed only once for the 1Hz and 20Hz time axes of the current file (and record subset)
+        :param variables_1Hz: an 1Hz variable array or a stacked array of 1Hz variables (one variable per row)
+        :param kwargs: keywords for pysiral.helper.Interp1HzTo20Hz.__call__
+        :return: the interpolated 20Hz variable(s), error status (per variable)
         """
-        error_status = False
-        try:
-            f = interpolate.interp1d(time_1Hz, variable_1Hz, bounds_error=False, **kwargs)
-            variable_20Hz = f(time_20Hz)
-        except ValueError:
-            fill_value = np.nan
-            variable_20Hz = np.full(time_20Hz.shape, fill_value)
-            error_status = True
-        return variable_20Hz, error_status
+        if self._interp_1Hz_to_20Hz is None:
+            time_1Hz = self.nc.time_cor_01.values
+            time_20Hz = self._get_20Hz_values("time_20_ku")
+            self._interp_1Hz_to_20Hz = Interp1HzTo20Hz(time_1Hz, time_20Hz)
+        return self._interp_1Hz_to_20Hz(variables_1Hz, **kwargs)
 
     def _read_input_netcdf(self, filepath, attributes_only=False):
         """ Read the netCDF file via xarray """
@@ -141,6 +209,62 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
             self.log.warning(msg)
             return
 
+    def _set_record_subset(self, polar_ocean_check):
+        """
+        Computes the slices of records that need to be read from the 20Hz variables. Only the 20Hz latitude,
+        time and the 1Hz surface type are read for the entire orbit, all other 20Hz variables (e.g. the
+        waveforms) are read only for the records that will not be removed by the Level-1 pre-processor
+        (option `read_polar_ocean_subset`, default: True)
+        :param polar_ocean_check: The polar ocean check of the Level-1 pre-processor (or None)
+        :return: None
+        """
+
+        # Reset the subset & statistics
+        self._record_slices = None
+        self._values_20Hz = {}
+        self._bytes_read = 0
+        self._bytes_full = 0
+        self._interp_1Hz_to_20Hz = None
+
+        # The polar ocean settings are required to compute the subset
+        if polar_ocean_check is None or not self.cfg.get("read_polar_ocean_subset", True):
+            return
+
+        # Get the 20Hz ocean flag and the polar ocean records
+        latitude = self._get_20Hz_values("lat_20_ku")
+        surface_type_20Hz = self._get_surface_type_20Hz()
+        is_ocean = surface_type_20Hz == ESA_SURFACE_TYPE_DICT["ocean"]
+        records = self.get_polar_ocean_records(latitude, is_ocean, polar_ocean_check.cfg)
+
+        # Only use the subset if records are actually removed
+        # NOTE: The variables that have been read for the entire orbit are subsetted in memory
+        if len(records) < len(latitude):
+            self._record_slices = self.get_index_slices(records)
+            self._values_20Hz = {name: values[records] for name, values in self._values_20Hz.items()}
+            self._interp_1Hz_to_20Hz = None
+
+    def _get_20Hz_values(self, variable_name):
+        """
+        Returns the values of a 20Hz variable (first dimension: time_20_ku) for the record subset
+        :param variable_name: The name of the variable in the netCDF file
+        :return: numpy array
+        """
+        # Each variable is only read once
+        if variable_name in self._values_20Hz:
+            return self._values_20Hz[variable_name]
+
+        variable = getattr(self.nc, variable_name)
+        if self._record_slices is None:
+            values = variable.values
+        elif len(self._record_slices) == 1:
+            values = variable[self._record_slices[0]].values
+        else:
+            values = np.concatenate([variable[record_slice].values for record_slice in self._record_slices])
+        self._bytes_read += values.nbytes
+        self._bytes_full += variable.size * values.dtype.itemsize
+        self._values_20Hz[variable_name] = values
+        return values
+
     def _set_input_file_metadata(self):
         """ Fill the product info """
 
@@ -200,23 +324,23 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         # NOTE: Here it is critical that the xarray does not automatically decodes time since it is
         #       difficult to work with the numpy datetime64 date format. Better to compute datetimes using
         #       a know num2pydate conversion
-        tai_datetime = num2pydate(self.nc.time_20_ku.values, units=self.nc.time_20_ku.units)
+        tai_datetime = num2pydate(self._get_20Hz_values("time_20_ku"), units=self.nc.time_20_ku.units)
         converter = UTCTAIConverter()
         utc_timestamp = converter.tai2utc(tai_datetime, check_all=False)
         self.l1.time_orbit.timestamp = utc_timestamp
 
         # Set the geolocation
         self.l1.time_orbit.set_position(
-            self.nc.lon_20_ku.values,
-            self.nc.lat_20_ku.values,
-            self.nc.alt_20_ku.values,
-            self.nc.orb_alt_rate_20_ku.values)
+            self._get_20Hz_values("lon_20_ku"),
+            self._get_20Hz_values("lat_20_ku"),
+            self._get_20Hz_values("alt_20_ku"),
+            self._get_20Hz_values("orb_alt_rate_20_ku"))
 
         # Set antenna attitude
         self.l1.time_orbit.set_antenna_attitude(
-            self.nc.off_nadir_pitch_angle_str_20_ku.values,
-            self.nc.off_nadir_roll_angle_str_20_ku.values,
-            self.nc.off_nadir_yaw_angle_str_20_ku.values)
+            self._get_20Hz_values("off_nadir_pitch_angle_str_20_ku"),
+            self._get_20Hz_values("off_nadir_roll_angle_str_20_ku"),
+            self._get_20Hz_values("off_nadir_yaw_angle_str_20_ku"))
 
     def _set_waveform_data_group(self):
         """
@@ -230,14 +354,14 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         # Get the waveform
         # NOTE: Convert the waveform units to Watts. From the documentation:is applied as follows:
         #       pwr_waveform_20_ku(time, ns) * echo_scale_factor_20_ku(time, ns) * 2 ^ echo_scale_pwr_20_ku(time)
-        wfm_linear = self.nc.pwr_waveform_20_ku.values
+        wfm_linear = self._get_20Hz_values("pwr_waveform_20_ku")
 
         # Get the shape of the waveform array
         dim_time, dim_ns = wfm_linear.shape
 
         # Scaling parameter are 1D -> Replicate to same shape as waveform array
-        echo_scale_factor = self.nc.echo_scale_factor_20_ku.values
-        echo_scale_pwr = self.nc.echo_scale_pwr_20_ku.values
+        echo_scale_factor = self._get_20Hz_values("echo_scale_factor_20_ku")
+        echo_scale_pwr = self._get_20Hz_values("echo_scale_pwr_20_ku")
         echo_scale_factor = np.tile(echo_scale_factor, (dim_ns, 1)).transpose()
         echo_scale_pwr = np.tile(echo_scale_pwr, (dim_ns, 1)).transpose()
 
@@ -249,23 +373,23 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         #   Calibrated 2-way window delay: distance from CoM to middle range window (at sample ns/2 from 0).
         #   It includes all the range corrections given in the variable instr_cor_range and in the
         #   variable uso_cor_20_ku. This is a 2-way time and 2-way corrections are applied.
-        window_delay = self.nc.window_del_20_ku.values
+        window_delay = self._get_20Hz_values("window_del_20_ku")
 
-        # Convert window delay to range for each waveform range bin
-        wfm_range = self.get_wfm_range(window_delay, dim_ns)
+        # Convert window delay to the range of the first range bin and the range bin spacing
+        first_bin_range, bin_spacing = self.get_wfm_range_parameters(window_delay, dim_ns)
 
         # Make sure that parameter are float and not double
         # -> Import for cythonized algorithm parts (ctfrma specifically uses floats)
+        # NOTE: The range for each range bin is computed as float on demand by the waveform container
         wfm_power = wfm_power.astype(np.float32)
-        wfm_range = wfm_range.astype(np.float32)
 
         # Set the waveform
         op_mode = str(self.nc.attrs["sir_op_mode"].strip().lower())
         radar_mode = self.translate_opmode2radar_mode(op_mode)
-        self.l1.waveform.set_waveform_data(wfm_power, wfm_range, radar_mode)
+        self.l1.waveform.set_parametric_waveform_data(wfm_power, first_bin_range, bin_spacing, radar_mode)
 
         # Get the valid flags
-        measurement_confident_flag = self.nc.flag_mcd_20_ku.values
+        measurement_confident_flag = self._get_20Hz_values("flag_mcd_20_ku")
         valid_flag = measurement_confident_flag == 0
         self.l1.waveform.set_valid_flag(valid_flag)
 
@@ -276,16 +400,16 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         :return: None
         """
 
-        # Get the reference times for interpolating the range corrections from 1Hz -> 20Hz
-        time_1Hz =  self.nc.time_cor_01.values
-        time_20Hz = self.nc.time_20_ku.values
+        # Stack all range correction variables defined in the processor definition file
+        # and interpolate them from 1Hz -> 20Hz in one step
+        keys = list(self.cfg.range_correction_targets.keys())
+        pds_var_names = [self.cfg.range_correction_targets[key] for key in keys]
+        variables_1Hz = np.array([getattr(self.nc, pds_var_name).values for pds_var_name in pds_var_names])
+        variables_20Hz, error_status = self.interp_1Hz_to_20Hz(variables_1Hz)
 
-        # Loop over all range correction variables defined in the processor definition file
-        for key in self.cfg.range_correction_targets.keys():
-            pds_var_name = self.cfg.range_correction_targets[key]
-            variable_1Hz = getattr(self.nc, pds_var_name)
-            variable_20Hz, error_status = self.interp_1Hz_to_20Hz(variable_1Hz.values, time_1Hz, time_20Hz)
-            if error_status:
+        # Transfer the range corrections
+        for key, pds_var_name, variable_20Hz, error in zip(keys, pds_var_names, variables_20Hz, error_status):
+            if error:
                 msg = "- Error in 20Hz interpolation for variable `%s` -> set only dummy" % pds_var_name
                 self.log.warning(msg)
             self.l1.correction.set_parameter(key, variable_20Hz)
@@ -298,21 +422,27 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         :return: None
         """
 
-        # Get the reference times for interpolating the flag from 1Hz -> 20Hz
-        time_1Hz =  self.nc.time_cor_01.values
-        time_20Hz = self.nc.time_20_ku.values
+        # Get the 20Hz surface type flag
+        surface_type_20Hz = self._get_surface_type_20Hz()
+
+        # Set the flag
+        for key in ESA_SURFACE_TYPE_DICT.keys():
+            flag = surface_type_20Hz == ESA_SURFACE_TYPE_DICT[key]
+            self.l1.surface_type.add_flag(flag, key)
+
+    def _get_surface_type_20Hz(self):
+        """
+        Interpolates the 1Hz surface type flag to the 20Hz records (nearest neighbour)
+        :return: 20Hz surface type flag
+        """
 
         # Interpolate 1Hz surface type flag to 20 Hz
         surface_type_1Hz = self.nc.surf_type_01.values
-        surface_type_20Hz, error_status = self.interp_1Hz_to_20Hz(surface_type_1Hz, time_1Hz, time_20Hz, kind="nearest")
+        surface_type_20Hz, error_status = self.interp_1Hz_to_20Hz(surface_type_1Hz, kind="nearest")
         if error_status:
             msg = "- Error in 20Hz interpolation for variable `surf_type_01` -> set only dummy"
             self.log.warning(msg)
-
-        # Set the flag
-        for key in ESA_SURFACE_TYPE_DICT.keys():
-            flag = surface_type_20Hz == ESA_SURFACE_TYPE_DICT[key]
-            self.l1.surface_type.add_flag(flag, key)
+        return surface_type_20Hz
 
     def _set_classifier_group(self):
         """
@@ -325,13 +455,13 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         """
         # Loop over all classifier variables defined in the processor definition file
         for key in self.cfg.classifier_targets.keys():
-            variable_20Hz = getattr(self.nc, self.cfg.classifier_targets[key])
+            variable_20Hz = self._get_20Hz_values(self.cfg.classifier_targets[key])
             self.l1.classifier.add(variable_20Hz, key)
 
         # Calculate Parameters from waveform counts
         # XXX: This is a legacy of the CS2AWI IDL processor
         #      Threshold defined for waveform counts not power in dB
-        wfm_counts = self.nc.pwr_waveform_20_ku.values
+        wfm_counts = self._get_20Hz_values("pwr_waveform_20_ku")
 
         # Calculate the OCOG Parameter (CryoSat-2 notation)
         ocog = CS2OCOGParameter(wfm_counts)
@@ -349,7 +479,7 @@ class ESACryoSat2PDSBaselineD(DefaultLoggingClass):
         self.l1.classifier.add(ltpp.ltpp, "late_tail_to_peak_power")
 
         # Get satellite velocity vector (classifier needs to be vector -> manual extraction needed)
-        satellite_velocity_vector = self.nc.sat_vel_vec_20_ku.values
+        satellite_velocity_vector = self._get_20Hz_values("sat_vel_vec_20_ku")
         self.l1.classifier.add(satellite_velocity_vector[:, 0], "satellite_velocity_x")
         self.l1.classifier.add(satellite_velocity_vector[:, 1], "satellite_velocity_y")
         self.l1.classifier.add(satellite_velocity_vector[:, 2], "satellite_velocity_z")
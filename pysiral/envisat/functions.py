@@ -18,11 +18,8 @@ def mdsr_timestamp_to_datetime(mdsr_time):
 
 
 def get_envisat_wfm_range(window_delay_meter, n_range_bins, bin_width_meter=BIN_WIDTH_METER):
-    n_records = len(window_delay_meter)
-    wfm_range = np.ndarray(shape=(n_records, n_range_bins), dtype=np.float32)
-    for i in range(n_records):
-        wfm_range[i, :] = np.arange(n_range_bins)*bin_width_meter + window_delay_meter[i]
-    return wfm_range
+    wfm_range = np.asarray(window_delay_meter)[:, np.newaxis] + np.arange(n_range_bins)*bin_width_meter
+    return wfm_range.astype(np.float32)
 
 
 def get_envisat_window_delay(tracker_range, doppler_correction, slope_doppler_correction,
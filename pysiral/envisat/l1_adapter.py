@@ -7,13 +7,13 @@ __author__ = "Stefan Hendricks"
 
 import re
 import numpy as np
-from scipy import interpolate
 from cftime import num2pydate
 
 from pysiral import psrlcfg
 from pysiral.clocks import StopWatch
-from pysiral.envisat.functions import (get_envisat_window_delay, get_envisat_wfm_range)
+from pysiral.envisat.functions import get_envisat_window_delay
 from pysiral.errorhandler import ErrorStatus
+from pysiral.helper import Interp1HzTo20Hz, interpolate_nans
 from pysiral.iotools import ReadNC
 from pysiral.l1bdata import Level1bData
 from pysiral.logging import DefaultLoggingClass
@@ -135,7 +135,6 @@ class EnvisatSGDRNC(DefaultLoggingClass):
         # "waveform samples (I2+Q2, 1/2048 FFT power unit): 18 Hz Ku band";
         # "the echo is corrected for the intermediate frequency filter effect";
         wfm_power = self.sgdr.waveform_fft_20_ku
-        n_records, n_range_bins = wfm_power.shape
 
         # Compute the window delay and the range values
         window_delay_m = get_envisat_window_delay(
@@ -145,13 +144,11 @@ class EnvisatSGDRNC(DefaultLoggingClass):
             nominal_tracking_bin=self.cfg.nominal_tracking_bin,
             bin_width_meter=self.cfg.bin_width_meter)
 
-        # Compute the range value for each range bin of the 18hz waveform
-        wfm_range = get_envisat_wfm_range(
-            window_delay_m, n_range_bins,
-            bin_width_meter=self.cfg.bin_width_meter)
-
         # Transfer data to the waveform group
-        self.l1.waveform.set_waveform_data(wfm_power, wfm_range, self.cfg.radar_mode)
+        # NOTE: The range of each range bin of the 18hz waveform is defined by the window delay (range of
+        #       the first range bin) and the range bin width
+        self.l1.waveform.set_parametric_waveform_data(wfm_power, window_delay_m, self.cfg.bin_width_meter,
+                                                      self.cfg.radar_mode)
 
         # Set valid flag to exclude calibration data
         # (see section 3.5 of Reaper handbook)
@@ -170,17 +167,15 @@ class EnvisatSGDRNC(DefaultLoggingClass):
         """
 
         # Get the reference times for interpolating the range corrections from 1Hz -> 20Hz
-        time_1Hz =  np.array(self.sgdr.time_01)
+        time_1Hz = np.array(self.sgdr.time_01)
         time_20Hz = np.array(self.sgdr.time_20)
 
-        # Loop over all range correction in config file
+        # Get all range correction variables in config file
         grc_dict = self.cfg.range_correction_targets
-        for name in grc_dict.keys():
-
-            # Get the variable
-            target_parameter = grc_dict[name]
-            if target_parameter is None:
-                continue
+        names = [name for name in grc_dict.keys() if grc_dict[name] is not None]
+        target_parameters = [grc_dict[name] for name in names]
+        corrections = {}
+        for target_parameter in target_parameters:
             correction = np.array(getattr(self.sgdr, target_parameter))
 
             # Debug code
@@ -195,29 +190,35 @@ class EnvisatSGDRNC(DefaultLoggingClass):
                 msg = msg % (target_parameter)
                 self.log.warning(msg)
 
-            # Some of the Envisat range corrections are 1Hz others 20Hz
-            # -> Those with "_01" in the variable name need to be
-            # extrapolated to 20 Hz
-            error = False
-            if re.search(self.cfg.variable_identifier_1Hz, target_parameter):
-                correction, error = self.interp_1Hz_to_20Hz(correction, time_1Hz, time_20Hz,
-                                                            fill_on_error_value=0.0)
-            if error:
-                msg = "Failing to create 20Hz range correction variable for %s" % target_parameter
-                self.log.warning(msg)
-
-            # Interpolate NaN's or return a zero-filled array for all-nan input variables
-            correction_filtered = self.find_and_interpolate_nans(correction, fill_on_error_value=0.0)
-
-            # Debug code
-            # -> in this case discard the variable
-            n_nans = len(np.where(np.isnan(correction_filtered))[0])
-            if n_nans > 0:
-                msg = "Remaining NaN's after filtering in %s" % target_parameter
-                self.log.warning(msg)
-
-            # Set the parameter
-            self.l1.correction.set_parameter(name, correction_filtered)
+            corrections[target_parameter] = correction
+
+        # Some of the Envisat range corrections are 1Hz others 20Hz
+        # -> Those with "_01" in the variable name need to be extrapolated to 20 Hz
+        # NOTE: The variables of both groups are stacked and processed in one step. NaN's are interpolated
+        #       and all-nan input variables are returned as zero-filled arrays
+        is_1Hz = [re.search(self.cfg.variable_identifier_1Hz, target_parameter) is not None
+                  for target_parameter in target_parameters]
+        corrections_filtered = {}
+        parameters_1Hz = [parameter for parameter, flag in zip(target_parameters, is_1Hz) if flag]
+        if len(parameters_1Hz) > 0:
+            interpolator = Interp1HzTo20Hz(time_1Hz, time_20Hz, extrapolate=True)
+            variables_1Hz = np.array([corrections[parameter] for parameter in parameters_1Hz])
+            variables_20Hz, error_status = interpolator(variables_1Hz, fill_nans=True, fill_on_error_value=0.0)
+            for parameter, variable_20Hz, error in zip(parameters_1Hz, variables_20Hz, error_status):
+                if error:
+                    msg = "Failing to create 20Hz range correction variable for %s" % parameter
+                    self.log.warning(msg)
+                corrections_filtered[parameter] = variable_20Hz
+
+        parameters_20Hz = [parameter for parameter, flag in zip(target_parameters, is_1Hz) if not flag]
+        if len(parameters_20Hz) > 0:
+            variables_20Hz = np.array([corrections[parameter] for parameter in parameters_20Hz])
+            variables_20Hz, _ = interpolate_nans(variables_20Hz, fill_on_error_value=0.0)
+            corrections_filtered.update(zip(parameters_20Hz, variables_20Hz))
+
+        # Set the parameter
+        for name, target_parameter in zip(names, target_parameters):
+            self.l1.correction.set_parameter(name, corrections_filtered[target_parameter])
 
     def _transfer_classifiers(self):
         """
@@ -238,49 +239,6 @@ class EnvisatSGDRNC(DefaultLoggingClass):
             flag = surface_type == ESA_SURFACE_TYPE_DICT[key]
             self.l1.surface_type.add_flag(flag, key)
 
-    @staticmethod
-    def find_and_interpolate_nans(variable, fill_on_error_value=np.nan):
-        """
-        Replace NaN's in variable with linear interpolated values
-        :param variable:
-        :return: interpolated variable
-        """
-        is_nan = np.isnan(variable)
-        n_nans = len(np.where(is_nan)[0])
-        if n_nans == 0:
-            variable_filtered = variable
-        else:
-            x = np.arange(len(variable))
-            valid = np.where(np.logical_not(is_nan))[0]
-            try:
-                f = interpolate.interp1d(x[valid], variable[valid], fill_value="extrapolate",
-                                         bounds_error=False)
-                variable_filtered = f(x)
-            except ValueError:
-                variable_filtered = np.full(variable.shape, fill_on_error_value)
-        return variable_filtered
-
-    @staticmethod
-    def interp_1Hz_to_20Hz(variable_1Hz, time_1Hz, time_20Hz, fill_on_error_value=np.nan, **kwargs):
-        """
-        Computes a simple linear interpolation to transform a 1Hz into a 20Hz variable
-        :param variable_1Hz: an 1Hz variable array
-        :param time_1Hz: 1Hz reference time
-        :param time_20Hz: 20 Hz reference time
-        :return: the interpolated 20Hz variable
-        """
-        error_status = False
-        try:
-            is_valid = np.logical_and(np.isfinite(time_1Hz), np.isfinite(variable_1Hz))
-            valid_indices = np.where(is_valid)[0]
-            f = interpolate.interp1d(time_1Hz[valid_indices], variable_1Hz[valid_indices],
-                                     fill_value="extrapolate", bounds_error=False, **kwargs)
-            variable_20Hz = f(time_20Hz)
-        except ValueError:
-            variable_20Hz = np.full(time_20Hz.shape, fill_on_error_value)
-            error_status = True
-        return variable_20Hz, error_status
-
     @property
     def empty(self):
         """
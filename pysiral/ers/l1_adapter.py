@@ -13,7 +13,6 @@ from pysiral import psrlcfg
 from pysiral.clocks import StopWatch
 from pysiral.errorhandler import ErrorStatus
 from pysiral.ers.sgdrfile import ERSSGDR
-from pysiral.flag import ORCondition
 from pysiral.l1bdata import Level1bData
 from pysiral.logging import DefaultLoggingClass
 from pysiral.surface_type import ESA_SURFACE_TYPE_DICT
@@ -137,18 +136,18 @@ class ERSReaperSGDR(DefaultLoggingClass):
         """ Transfers the waveform data (power & range for each range bin) """
 
         # Transfer the reformed 18Hz waveforms
-        self.l1.waveform.set_waveform_data(
+        # NOTE: The range of each range bin is defined by the window delay (range of the first range bin)
+        #       and the range bin width
+        self.l1.waveform.set_parametric_waveform_data(
             self.sgdr.wfm_power,
-            self.sgdr.wfm_range,
+            self.sgdr.wfm_window_delay,
+            self.sgdr.wfm_bin_spacing,
             self.sgdr.radar_mode)
 
         # Set valid flag to exclude calibration data
         # (see section 3.5 of Reaper handbook)
         tracking_state = self.sgdr.nc.alt_state_flag_20hz.flatten()
-        valid = ORCondition()
-        valid.add(tracking_state == 2)
-        valid.add(tracking_state == 3)
-        self.l1.waveform.set_valid_flag(valid.flag)
+        self.l1.waveform.set_valid_flag(np.isin(tracking_state, [2, 3]))
 
     def _transfer_range_corrections(self):
         """
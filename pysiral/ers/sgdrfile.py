@@ -80,16 +80,19 @@ class ERSSGDR(object):
         # "The tracker_range_20hz is the range measured by the onboard tracker
         #  as the window delay, corrected for instrumental effects and
         #  CoG offset"
+        # -> The range of the first range bin follows from the nominal tracking bin
         tracker_range = self.nc.tracker_range_20hz.flatten()
-        self.wfm_range = np.ndarray(shape=target_shape, dtype=np.float32)
-
         rbw = self.settings.range_bin_width
         ntb = self.settings.nominal_tracking_bin
-        rbi = np.arange(n_range_bins)
+        self.wfm_window_delay = tracker_range - (ntb*rbw)
+        self.wfm_bin_spacing = rbw
 
-        # Loop over each waveform
-        for i in np.arange(n_records):
-            self.wfm_range[i, :] = tracker_range[i] + (rbi*rbw) - (ntb*rbw)
+    @property
+    def wfm_range(self):
+        """ The range of each range bin of each waveform (n_records, n_range_bins) """
+        n_range_bins = self.wfm_power.shape[1]
+        wfm_range = self.wfm_window_delay[:, np.newaxis] + np.arange(n_range_bins)*self.wfm_bin_spacing
+        return wfm_range.astype(np.float32)
 
     def _validate(self):
         pass
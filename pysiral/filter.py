@@ -5,23 +5,26 @@ Created on Sat Apr 23 15:30:53 2016
 @author: Stefan
 """
 
+from pysiral.config import OptionField, compile_options
 from pysiral.logging import DefaultLoggingClass
 from pysiral.flag import FlagContainer, ORCondition
 
 from scipy.interpolate import interp1d
 from astropy.convolution import convolve
-from attrdict import AttrDict
 import numpy as np
 
 
 class FilterBaseClass(DefaultLoggingClass):
 
+    # Declaration of the filter options ({option_name: OptionField}, see pysiral.config)
+    OPTION_FIELDS = None
+
     def __init__(self):
         super(FilterBaseClass, self).__init__(self.__class__.__name__)
         self._flag = None
 
     def set_options(self, **opt_dict):
-        self._options = AttrDict(**opt_dict)
+        self._options = compile_options(opt_dict, fields=self.OPTION_FIELDS, name=self.__class__.__name__)
 
     def apply_filter(self, *args, **kwargs):
         self._apply_filter(*args, **kwargs)
@@ -42,6 +45,12 @@ class L1bBackscatterDriftCorrection(FilterBaseClass):
     applies a monthly linear correction based on the drift factor and
     base period. """
 
+    OPTION_FIELDS = {
+        "l1b_data_group": OptionField(str, required=True),
+        "l1b_parameter_name": OptionField(str, required=True),
+        "backscatter_base_period": OptionField(tuple, required=True),
+        "backscatter_drift_factor": OptionField(float, required=True)}
+
     def __init__(self):
         super(L1bBackscatterDriftCorrection, self).__init__()
         self.log.name = self.__class__.__name__
@@ -69,6 +78,11 @@ class L2ParameterValidRange(FilterBaseClass):
     Requires l2 data container and target (either: "afrb", "rfrb")
     """
 
+    OPTION_FIELDS = {
+        "valid_minimum_point_value": OptionField(float, required=True),
+        "valid_maximum_point_value": OptionField(float, required=True),
+        "filter_target": OptionField(str)}
+
     def __init__(self):
         super(L2ParameterValidRange, self).__init__()
 
@@ -78,6 +78,21 @@ class GridDefinition(DefaultLoggingClass):
         lon, lat = self.proj(xx, yy, inverse=True)
         return lon, lat
 
+    def get_nesting_factor(self, griddef):
+        """ Returns the integer factor n if each grid cell of this grid consists of n x n grid cells
+        of the (finer) grid definition `griddef` with same projection and extent, else None """
+        if griddef.proj_dict != self.proj_dict:
+            return None
+        extent, nested_extent = self.extent, griddef.extent
+        if any(extent[key] != nested_extent[key] for key in ["xoff", "yoff", "xsize", "ysize"]):
+            return None
+        factor = int(round(float(extent.dx) / nested_extent.dx))
+        if factor < 2:
+            return None
+        is_nested = [extent.dx == factor * nested_extent.dx, extent.dy == factor * nested_extent.dy,
+                     extent.numx * factor == nested_extent.numx, extent.numy * factor == nested_extent.numy]
+        return factor if all(is_nested) else None
+
     def set_extent(self, **kwargs):
         self._extent_dict = kwargs
 
@@ -162,3 +177,51 @@ class GridDefinition(DefaultLoggingClass):
     @property
     def netcdf_vardef(self):
         return self._metadata["netcdf_grid_description"]
+
+    @property
+    def grid_index_parameter_names(self):
+        """ Names of the l2 parameters with the persisted grid indices (see L2GridIndices) """
+        return "grid_xi_%s" % self.grid_id, "grid_yj_%s" % self.grid_id
+
+
+class L2GridIndices(DefaultLoggingClass):
+    """ A Level-2 post-processor item class for storing the grid indices of the l2 records
+    for a list of grid definitions. The Level-3 processor uses the grid indices of l2i files
+    instead of the projection of longitude/latitude if the grid id matches. The indices are
+    added as auxiliary parameters `grid_xi_{grid_id}` & `grid_yj_{grid_id}` (int32, -1 for
+    invalid positions) and need to be listed in the l2i output definition. """
+
+    def __init__(self, **cfg):
+        super(L2GridIndices, self).__init__(self.__class__.__name__)
+        self.error = ErrorStatus(caller_id=self.__class__.__name__)
+        self.cfg = cfg
+        self.griddefs = [self._get_griddef(griddef) for griddef in cfg.get("griddefs", [])]
+
+    def _get_griddef(self, griddef_id_or_filename):
+        """ Returns the grid definition for a grid definition id (e.g. nh25kmEASE2) or filename """
+        from pysiral import psrlcfg
+        filename = psrlcfg.get_settings_file("grid", None, griddef_id_or_filename)
+        if filename is None:
+            msg = "Invalid griddef filename or id: %s" % griddef_id_or_filename
+            self.error.add_error("invalid-griddef", msg)
+            self.error.raise_on_error()
+        griddef = GridDefinition()
+        griddef.set_from_griddef_file(filename)
+        return griddef
+
+    def apply(self, l2):
+        """
+        API class for the Level-2 processor. Functionality is to compute the grid indices of all
+        records for each grid definition (grid definitions of the other hemisphere are skipped)
+        :param l2: A Level-2 data instance
+        :return: None, Level-2 object is change in place
+        """
+        for griddef in self.griddefs:
+            if griddef.hemisphere not in ["n/a", l2.hemisphere]:
+                continue
+            xi, yj = griddef.grid_indices(l2.longitude, l2.latitude)
+            valid = np.logical_and(np.isfinite(xi), np.isfinite(yj))
+            for var_name, indices in zip(griddef.grid_index_parameter_names, [xi, yj]):
+                value = np.full(indices.shape, -1, dtype=np.int32)
+                value[valid] = indices[valid]
+                l2.set_auxiliary_parameter(var_name, var_name, value, dtype=np.int32)
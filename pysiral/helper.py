@@ -59,6 +59,143 @@ def rle(inarray):
         return(z, p, ia[i])
 
 
+def interpolate_nans(values, x=None, fill_on_error_value=np.nan):
+    """
+    Replaces NaN's with a linear interpolation between the closest valid values (linear extrapolation
+    based on the first/last two valid values at the edges). Variables with less than two valid values
+    are set to `fill_on_error_value`.
+    :param values: 1D array or 2D array (one variable per row)
+    :param x: (ascending) coordinate of the values (default: array index)
+    :param fill_on_error_value: value for variables that cannot be interpolated
+    :return: the filtered values, error flag (per row for 2D input)
+    """
+
+    # Always work on a 2D copy of the input
+    is_1d = np.ndim(values) == 1
+    values = np.array(values, dtype=np.float64, ndmin=2)
+    n_rows, n_cols = values.shape
+    x = np.arange(n_cols, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # Variables that are free of NaN's do not need to be processed
+    is_valid = np.logical_not(np.isnan(values))
+    n_valid = np.sum(is_valid, axis=1)
+    is_error = np.logical_and(n_valid < 2, n_valid < n_cols)
+    rows = np.where(np.logical_and(n_valid < n_cols, np.logical_not(is_error)))[0]
+
+    if len(rows) > 0:
+
+        valid = is_valid[rows]
+        row_index = np.arange(len(rows))
+        columns = np.arange(n_cols)
+
+        # Index of the previous and next valid value for each element (-1/n_cols: none)
+        prev_index = np.maximum.accumulate(np.where(valid, columns, -1), axis=1)
+        next_index = np.minimum.accumulate(np.where(valid, columns, n_cols)[:, ::-1], axis=1)[:, ::-1]
+
+        # The first/last two valid values are used for the extrapolation at the edges
+        first = np.argmax(valid, axis=1)
+        last = n_cols - 1 - np.argmax(valid[:, ::-1], axis=1)
+        second = next_index[row_index, first+1]
+        second_last = prev_index[row_index, last-1]
+        is_leading, is_trailing = prev_index < 0, next_index >= n_cols
+        i0 = np.where(is_leading, first[:, np.newaxis], np.where(is_trailing, second_last[:, np.newaxis], prev_index))
+        i1 = np.where(is_leading, second[:, np.newaxis], np.where(is_trailing, last[:, np.newaxis], next_index))
+
+        # Linear interpolation for all NaN elements
+        row_values = values[rows]
+        y0, y1 = np.take_along_axis(row_values, i0, axis=1), np.take_along_axis(row_values, i1, axis=1)
+        x0, x1 = x[i0], x[i1]
+        is_nan = np.logical_not(valid)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interpolated = y0 + (x[np.newaxis, :] - x0) * (y1 - y0) / (x1 - x0)
+        row_values[is_nan] = interpolated[is_nan]
+        values[rows] = row_values
+
+    values[is_error, :] = fill_on_error_value
+
+    if is_1d:
+        return values[0], bool(is_error[0])
+    return values, is_error
+
+
+class Interp1HzTo20Hz(object):
+    """
+    Linear interpolation of 1Hz variables to a 20Hz time axis. The interpolation indices and weights are
+    computed once from the time axes and are then applied to a stacked array of all 1Hz variables
+    (one variable per row) in a single operation.
+    """
+
+    def __init__(self, time_1Hz, time_20Hz, extrapolate=False):
+        """
+        :param time_1Hz: 1Hz reference time
+        :param time_20Hz: 20Hz reference time
+        :param extrapolate: Flag if values outside the 1Hz time range are extrapolated (else: NaN)
+        """
+
+        time_1Hz = np.asarray(time_1Hz, dtype=np.float64)
+        time_20Hz = np.asarray(time_20Hz, dtype=np.float64)
+        self.extrapolate = extrapolate
+        self.n_records = time_20Hz.shape[0]
+
+        # Only valid 1Hz time stamps can be used (sorted in ascending order)
+        valid_index = np.where(np.isfinite(time_1Hz))[0]
+        self._index_1Hz = valid_index[np.argsort(time_1Hz[valid_index], kind="mergesort")]
+        self._time_1Hz = time_1Hz[self._index_1Hz]
+
+        # The interpolation requires at least two 1Hz records
+        self._index, self._weight, self._is_outside = None, None, None
+        self.error = len(self._time_1Hz) < 2
+        if self.error:
+            return
+
+        # Index of the 1Hz interval for each 20Hz record and the weight of the upper interval boundary
+        index = np.searchsorted(self._time_1Hz, time_20Hz, side="right") - 1
+        self._index = np.clip(index, 0, len(self._time_1Hz)-2)
+        time_lower, time_upper = self._time_1Hz[self._index], self._time_1Hz[self._index+1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._weight = np.where(time_upper > time_lower, (time_20Hz - time_lower) / (time_upper - time_lower), 0.0)
+        self._is_outside = np.logical_or(time_20Hz < self._time_1Hz[0], time_20Hz > self._time_1Hz[-1])
+
+    def __call__(self, variables_1Hz, fill_nans=False, fill_on_error_value=np.nan, kind="linear"):
+        """
+        Interpolate 1Hz variables to the 20Hz time axis
+        :param variables_1Hz: 1D array or 2D array (one variable per row)
+        :param fill_nans: Flag if NaN's in the 1Hz variables are replaced by interpolated values (else: NaN's
+            propagate to the neighbouring 20Hz records)
+        :param fill_on_error_value: Value for variables that cannot be interpolated
+        :param kind: "linear" or "nearest"
+        :return: the 20Hz variable(s), error flag (per row for 2D input)
+        """
+
+        is_1d = np.ndim(variables_1Hz) == 1
+        variables = np.array(variables_1Hz, dtype=np.float64, ndmin=2)
+        n_variables = variables.shape[0]
+
+        if self.error:
+            variables_20Hz = np.full((n_variables, self.n_records), fill_on_error_value)
+            is_error = np.ones(n_variables, dtype=bool)
+        else:
+            variables = variables[:, self._index_1Hz]
+            is_error = np.zeros(n_variables, dtype=bool)
+            if fill_nans:
+                variables, is_error = interpolate_nans(variables, x=self._time_1Hz,
+                                                       fill_on_error_value=fill_on_error_value)
+            if kind == "nearest":
+                variables_20Hz = variables[:, self._index + (self._weight > 0.5)]
+            elif kind == "linear":
+                variables_20Hz = (variables[:, self._index] * (1.0 - self._weight) +
+                                  variables[:, self._index+1] * self._weight)
+            else:
+                raise ValueError("Unknown interpolation kind: %s [linear|nearest]" % str(kind))
+            if not self.extrapolate:
+                variables_20Hz[:, self._is_outside] = np.nan
+            variables_20Hz[is_error, :] = fill_on_error_value
+
+        if is_1d:
+            return variables_20Hz[0], bool(is_error[0])
+        return variables_20Hz, is_error
+
+
 def month_iterator(start_year, start_month, end_year, end_month):
     """ returns an iterator over months """
     start = datetime(start_year, start_month, 1)
@@ -8,9 +8,17 @@ TODO: Evaluate usefulness (or move to internal module)
 
 """
 
+import os
+import re
 import glob
+import json
+import socket
+import hashlib
 import tempfile
 import uuid
+from collections import OrderedDict
+from datetime import datetime
+
 import numpy as np
 
 from dateperiods import DatePeriod
@@ -18,11 +26,16 @@ from dateperiods import DatePeriod
 from pysiral import psrlcfg
 from pysiral.errorhandler import ErrorStatus
 from pysiral.output import NCDateNumDef, PysiralOutputFilenaming
+from pysiral.pipeline import NETCDF_IO_LOCK
 from cftime import num2pydate
 from netCDF4 import Dataset
 from pathlib import Path
 
 
+# Format of datetime global attributes in the json sidecar of the disk cache
+DATETIME_ATTRIBUTE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
 #TODO: Replace by xarray
 class ReadNC(object):
     """
@@ -138,6 +151,157 @@ class NCMaskedGridData(object):
             return None
 
 
+class GridDiskCache(object):
+    """
+    On-disk cache for decoded variables of gridded netCDF products. Each variable is stored
+    as an uncompressed `.npy` file that is opened as copy-on-write memory map, thus different
+    runs and parallel workers share the same pages instead of decoding the source file again.
+
+    The cache files are keyed by the source path, its modification time and the variable
+    name. A json sidecar with the list of variables and the global attributes is written
+    after all variables and marks the cache entry of a source file as complete.
+
+    NOTE: Only numerical and datetime64 variables are cached. Subclasses can change the
+          decoded content that is written to the cache by overwriting `_decode`.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def read(self, path):
+        """
+        Returns the variables of a netCDF file from the cache or decodes the file and
+        adds its variables to the cache.
+        :param path: the path to the netCDF file
+        :return: GridDiskCacheData instance
+        """
+        file_key = self.get_file_key(path)
+        sidecar = self._read_sidecar(file_key)
+        if sidecar is None:
+            content = self._decode(path)
+            sidecar = self._write(path, file_key, content)
+        return self._load(path, file_key, sidecar)
+
+    def get_file_key(self, path):
+        """ The key of the source file (path & modification time) """
+        path = Path(path).resolve()
+        file_id = "%s:%d" % (str(path), path.stat().st_mtime_ns)
+        return "%s_%s" % (path.stem, hashlib.sha1(file_id.encode("utf-8")).hexdigest()[:16])
+
+    def get_variable_filepath(self, file_key, variable_name, suffix=""):
+        return self.directory / ("%s_%s%s.npy" % (file_key, variable_name, suffix))
+
+    def _decode(self, path):
+        """ Returns the decoded content of the source file that is written to the cache (ReadNC instance) """
+        with NETCDF_IO_LOCK:
+            return ReadNC(path)
+
+    def _read_sidecar(self, file_key):
+        try:
+            with open(str(self.directory / ("%s.json" % file_key)), "r") as fhandle:
+                sidecar = json.load(fhandle)
+        except (IOError, ValueError):
+            return None
+        # All variable files must exist
+        for variable in sidecar["variables"]:
+            if not self.get_variable_filepath(file_key, variable["name"]).is_file():
+                return None
+        return sidecar
+
+    def _write(self, path, file_key, content):
+        """ Write all numerical variables & the sidecar (temporary files first, parallel workers
+        may write the same entry) """
+
+        hostname = re.sub(r"[^\w-]", "_", socket.gethostname())
+        tmp_suffix = ".%s_%d.tmp" % (hostname, os.getpid())
+        variables = []
+        for variable_name in content.keys:
+            value = getattr(content, variable_name)
+            if not isinstance(value, np.ndarray) or value.dtype.kind not in "biufcM":
+                continue
+            arrays = [("", np.ma.getdata(value))]
+            is_masked = np.ma.isMaskedArray(value)
+            has_mask_file = is_masked and np.ma.is_masked(value)
+            if has_mask_file:
+                arrays.append(("_mask", np.ma.getmaskarray(value)))
+            for suffix, array in arrays:
+                filepath = self.get_variable_filepath(file_key, variable_name, suffix)
+                tmp_filepath = filepath.with_name(filepath.name + tmp_suffix)
+                with open(str(tmp_filepath), "wb") as fhandle:
+                    np.save(fhandle, np.ascontiguousarray(array))
+                os.replace(str(tmp_filepath), str(filepath))
+            variables.append(dict(name=variable_name, masked=bool(is_masked), mask_file=bool(has_mask_file),
+                                  dtype=str(value.dtype), shape=list(value.shape)))
+
+        attributes = OrderedDict()
+        for attribute_name in content.attributes:
+            attributes[attribute_name] = self._encode_attribute(getattr(content, attribute_name))
+
+        sidecar = dict(source=str(Path(path).resolve()), mtime_ns=Path(path).stat().st_mtime_ns,
+                       variables=variables, attributes=attributes)
+        sidecar_filepath = self.directory / ("%s.json" % file_key)
+        tmp_filepath = sidecar_filepath.with_name(sidecar_filepath.name + tmp_suffix)
+        with open(str(tmp_filepath), "w") as fhandle:
+            json.dump(sidecar, fhandle, indent=1)
+        os.replace(str(tmp_filepath), str(sidecar_filepath))
+        return sidecar
+
+    def _load(self, path, file_key, sidecar):
+        data = GridDiskCacheData(path)
+        for attribute_name, value in sidecar.get("attributes", {}).items():
+            data.add_attribute(attribute_name, self._decode_attribute(value))
+        for variable in sidecar["variables"]:
+            name = variable["name"]
+            # Copy-on-write: In-place modifications by the auxdata classes are not written to the cache
+            value = np.load(str(self.get_variable_filepath(file_key, name)), mmap_mode="c")
+            if variable["masked"]:
+                mask = np.ma.nomask
+                if variable["mask_file"]:
+                    mask = np.load(str(self.get_variable_filepath(file_key, name, "_mask")), mmap_mode="c")
+                value = np.ma.array(value, mask=mask, copy=False)
+            data.add_parameter(name, value)
+        return data
+
+    @staticmethod
+    def _encode_attribute(value):
+        """ json representation of a global attribute (numpy types & datetimes are tagged) """
+        if isinstance(value, datetime):
+            return {"datetime": value.strftime(DATETIME_ATTRIBUTE_FORMAT)}
+        if isinstance(value, np.ndarray):
+            return {"ndarray": value.tolist(), "dtype": str(value.dtype)}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def _decode_attribute(value):
+        if isinstance(value, dict) and "datetime" in value:
+            return datetime.strptime(value["datetime"], DATETIME_ATTRIBUTE_FORMAT)
+        if isinstance(value, dict) and "ndarray" in value:
+            return np.array(value["ndarray"], dtype=value["dtype"])
+        return value
+
+
+class GridDiskCacheData(object):
+    """ Container for variables from the disk cache (mimics the interface of ReadNC) """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.keys = []
+        self.parameters = []
+        self.attributes = []
+
+    def add_parameter(self, name, value):
+        setattr(self, name, value)
+        self.keys.append(name)
+        self.parameters.append(name)
+
+    def add_attribute(self, name, value):
+        setattr(self, name, value)
+        self.attributes.append(name)
+
+
 def get_temp_png_filename():
     return Path(tempfile.gettempdir()) / str(uuid.uuid4())+".png"
 
@@ -356,7 +356,13 @@ class Level1bData(DefaultLoggingClass):
             power[i, :] = orig_power[i, start[i]:stop[i]]
             range[i, :] = orig_range[i, start[i]:stop[i]]
         # Push to waveform container
-        self.waveform.set_waveform_data(power, range, self.radar_modes)
+        # (parametric range: the range of the first bin changes with the start index)
+        if self.waveform.is_parametric_range:
+            bin_spacing = self.waveform.bin_spacing
+            window_delay = self.waveform.window_delay + start * bin_spacing
+            self.waveform.set_parametric_waveform_data(power, window_delay, bin_spacing, self.radar_modes)
+        else:
+            self.waveform.set_waveform_data(power, range, self.radar_modes)
 
     def get_parameter_by_name(self, data_group, parameter_name):
         """ API method to retrieve any parameter from any data group """
@@ -408,6 +414,92 @@ class Level1bData(DefaultLoggingClass):
         return ";".join(radar_mode_list)
 
 
+class Level1bDataMergeBuilder(object):
+    """
+    Merges a list of adjacent Level-1 segments into a single Level1bData object.
+
+    Chained calls of `Level1bData.append` reallocate all record arrays for each segment. The
+    builder collects the segments first and then copies the record arrays of each data group
+    into preallocated arrays with the total number of records. The metadata is updated only
+    once for the merged object. The first segment is used as the merged object (same as
+    `Level1bData.append`).
+
+    Usage:
+
+        builder = Level1bDataMergeBuilder()
+        for l1b in l1b_segments:
+            builder.add(l1b)
+        l1b_merged = builder.build()
+    """
+
+    def __init__(self):
+        self._segments = []
+
+    def add(self, l1b):
+        """ Add a Level-1 segment (segments will be merged in the order they are added) """
+        self._segments.append(l1b)
+
+    def build(self):
+        """
+        Merge all segments
+        :return: The merged Level1bData object (None if no segments have been added)
+        """
+
+        if len(self._segments) == 0:
+            return None
+
+        l1b_merged = self._segments[0]
+        if len(self._segments) == 1:
+            return l1b_merged
+
+        # Total number of records
+        n_records = int(np.sum([len(l1b.time_orbit._timestamp) for l1b in self._segments]))
+
+        # The range representation of the waveforms (parametric or full) must be the same for all segments
+        waveforms = [l1b.waveform for l1b in self._segments]
+        if len(set([waveform.is_parametric_range for waveform in waveforms])) > 1:
+            for waveform in waveforms:
+                waveform.set_full_range()
+
+        # Copy the record arrays of all data groups into preallocated arrays
+        for data_group in Level1bData.data_groups:
+            groups = [getattr(l1b, data_group) for l1b in self._segments]
+            merged_group = groups[0]
+            for attribute in merged_group.record_array_attributes:
+                arrays = [np.asarray(getattr(group, attribute)) for group in groups]
+                setattr(merged_group, attribute, self.concatenate(arrays, n_records))
+
+        # Update the metadata (only once)
+        l1b_merged.info.set_attribute("is_merged_orbit", True)
+        l1b_merged.info.set_attribute("n_records", n_records)
+        mission_data_source = ";".join([l1b.info.mission_data_source for l1b in self._segments])
+        l1b_merged.info.set_attribute("mission_data_source", mission_data_source)
+        l1b_merged.update_l1b_metadata()
+
+        return l1b_merged
+
+    @staticmethod
+    def concatenate(arrays, n_records):
+        """
+        Copy a list of record arrays into a preallocated array (same result as np.append/np.concatenate)
+        :param arrays: list of arrays with records as first dimension
+        :param n_records: total number of records
+        :return: merged array
+        """
+        shape = (n_records, ) + arrays[0].shape[1:]
+        merged = np.empty(shape, dtype=np.result_type(*arrays))
+        i0 = 0
+        for array in arrays:
+            i1 = i0 + array.shape[0]
+            merged[i0:i1] = array
+            i0 = i1
+        return merged
+
+    @property
+    def n_segments(self):
+        return len(self._segments)
+
+
 class L1bdataNCFile(Level1bData):
 
     def __init__(self, filename):
@@ -490,10 +582,18 @@ class L1bdataNCFile(Level1bData):
         datagroup = self.nc.groups["waveform"]
 
         # Set waveform (measurement is nadir)
-        self.waveform.set_waveform_data(
-            datagroup.variables["power"][:],
-            datagroup.variables["range"][:],
-            datagroup.variables["radar_mode"][:])
+        # NOTE: l1p files of earlier versions contain the full range array
+        if "range" in datagroup.variables:
+            self.waveform.set_waveform_data(
+                datagroup.variables["power"][:],
+                datagroup.variables["range"][:],
+                datagroup.variables["radar_mode"][:])
+        else:
+            self.waveform.set_parametric_waveform_data(
+                datagroup.variables["power"][:],
+                datagroup.variables["window_delay"][:],
+                datagroup.variables["bin_spacing"][:],
+                datagroup.variables["radar_mode"][:])
         # Set the valid flag
         is_valid = datagroup.variables["is_valid"][:].astype(bool)
         self.waveform.set_valid_flag(is_valid)
@@ -672,6 +772,11 @@ class L1bTimeOrbit(object):
         return ["longitude", "latitude", "altitude", "altitude_rate",
                 "antenna_pitch", "antenna_roll", "antenna_yaw"]
 
+    @property
+    def record_array_attributes(self):
+        """ Names of the instance attributes with record arrays (used for merging) """
+        return ["_"+parameter for parameter in self.parameter_list]
+
     @property
     def dimdict(self):
         """ Returns dictionary with dimensions"""
@@ -704,7 +809,7 @@ class L1bTimeOrbit(object):
             self._altitude_rate = dummy_val
 
         # Set a dummy value for pitch, roll & yaw for backward compability
-        if self.antenna_pitch is None:
+        if self._antenna_pitch is None:
             self.set_antenna_attitude(dummy_val, dummy_val, dummy_val)
 
     def set_antenna_attitude(self, pitch, roll, yaw):
@@ -780,6 +885,11 @@ class L1bRangeCorrections(object):
     def parameter_list(self):
         return self._parameter_list
 
+    @property
+    def record_array_attributes(self):
+        """ Names of the instance attributes with record arrays (used for merging) """
+        return self.parameter_list
+
     @property
     def n_records(self):
         parameter, name = self.get_parameter_by_index(0)
@@ -849,6 +959,11 @@ class L1bClassifiers(object):
             parameter_list.extend(self._list[key])
         return parameter_list
 
+    @property
+    def record_array_attributes(self):
+        """ Names of the instance attributes with record arrays (used for merging) """
+        return self.parameter_list
+
     @property
     def n_records(self):
         parameter_list = self.parameter_list
@@ -894,12 +1009,23 @@ class L1bClassifiers(object):
 
 
 class L1bWaveforms(object):
-    """ Container for Echo Power Waveforms """
+    """
+    Container for Echo Power Waveforms
+
+    The range of the waveform bins can be stored in two ways:
+
+    1. parametric (default for all input adapters): the range of the first range bin (window delay) and
+       the range bin spacing for each record. The full range array (n_records, n_bins) is only computed
+       when the `range` property is accessed. Single waveforms can be accessed with `get_range_bins`.
+    2. full range array (n_records, n_bins) as in l1p files of earlier versions of pysiral
+    """
 
     _valid_radar_modes = ["lrm", "sar", "sin"]
-    _parameter_list = ["power", "range", "radar_mode", "is_valid"]
     _attribute_list = ["echo_power_unit"]
 
+    # Data type of the range arrays (the cythonized retrackers require float32)
+    range_dtype = np.float32
+
     def __init__(self, info):
         self._info = info  # Pointer to Metadate object
         # Attributes
@@ -908,6 +1034,8 @@ class L1bWaveforms(object):
         # Parameter
         self._power = None
         self._range = None
+        self._window_delay = None
+        self._bin_spacing = None
         self._radar_mode = None
         self._is_valid = None
 
@@ -917,8 +1045,25 @@ class L1bWaveforms(object):
 
     @property
     def range(self):
+        """ The range for each range bin (n_records, n_bins) """
+        if self.is_parametric_range:
+            return self.get_range_bins(slice(None))
         return np.copy(self._range)
 
+    @property
+    def window_delay(self):
+        """ The range of the first range bin for each record in meter (parametric range only) """
+        return np.copy(self._window_delay)
+
+    @property
+    def bin_spacing(self):
+        """ The range bin spacing for each record in meter (parametric range only) """
+        return np.copy(self._bin_spacing)
+
+    @property
+    def is_parametric_range(self):
+        return self._window_delay is not None
+
     @property
     def radar_mode(self):
         return self._radar_mode
@@ -929,7 +1074,14 @@ class L1bWaveforms(object):
 
     @property
     def parameter_list(self):
-        return self._parameter_list
+        if self.is_parametric_range:
+            return ["power", "window_delay", "bin_spacing", "radar_mode", "is_valid"]
+        return ["power", "range", "radar_mode", "is_valid"]
+
+    @property
+    def record_array_attributes(self):
+        """ Names of the instance attributes with record arrays (used for merging) """
+        return ["_"+parameter for parameter in self.parameter_list]
 
     @property
     def n_range_bins(self):
@@ -953,19 +1105,70 @@ class L1bWaveforms(object):
         dimdict = OrderedDict([("n_records", shape[0]), ("n_bins", shape[1])])
         return dimdict
 
+    def get_range_bins(self, index):
+        """
+        Returns the range of the range bins for a single or a selection of waveforms
+        :param index: record index (int) or array of record indices
+        :return: range array with shape (n_bins) or (len(index), n_bins)
+        """
+        if not self.is_parametric_range:
+            return np.array(self._range[index, :])
+        bin_index = np.arange(self.n_range_bins)
+        window_delay = np.asarray(self._window_delay[index])[..., np.newaxis]
+        bin_spacing = np.asarray(self._bin_spacing[index])[..., np.newaxis]
+        return (window_delay + bin_index * bin_spacing).astype(self.range_dtype)
+
     def set_waveform_data(self, power, range, radar_mode):
+        """
+        Set the waveform power and the range as full array of the same shape
+        :param power: waveform power (n_records, n_bins)
+        :param range: range of each range bin (n_records, n_bins)
+        :param radar_mode: radar mode name or radar mode flag for each record
+        :return: None
+        """
         # Validate input
         if power.shape != range.shape:
             raise ValueError("power and range must be of same shape", power.shape, range.shape)
+        self._set_power(power)
+
+        # Assign values
+        self._range = range
+        self._window_delay = None
+        self._bin_spacing = None
+
+        self._set_radar_mode(radar_mode)
+
+    def set_parametric_waveform_data(self, power, window_delay, bin_spacing, radar_mode):
+        """
+        Set the waveform power and the range by the range of the first range bin and the range bin spacing
+        :param power: waveform power (n_records, n_bins)
+        :param window_delay: range of the first range bin in meter (n_records)
+        :param bin_spacing: range bin spacing in meter (float or array with n_records)
+        :param radar_mode: radar mode name or radar mode flag for each record
+        :return: None
+        """
+        self._set_power(power)
+
+        # Assign values (the window delay is kept as double since the range values are large)
+        window_delay = np.array(window_delay, dtype=np.float64)
+        bin_spacing = np.asarray(bin_spacing, dtype=np.float64)
+        if window_delay.shape != (power.shape[0], ):
+            raise ValueError("window delay must be of dimension (n_records)", window_delay.shape)
+        self._window_delay = window_delay
+        self._bin_spacing = np.array(np.broadcast_to(bin_spacing, window_delay.shape))
+        self._range = None
+
+        self._set_radar_mode(radar_mode)
+
+    def _set_power(self, power):
         if len(power.shape) != 2:
             raise ValueError("power and range arrays must be of dimension (n_records, n_bins)")
 
-            # Validate number of records
+        # Validate number of records
         self._info.check_n_records(power.shape[0])
-
-        # Assign values
         self._power = power
-        self._range = range
+
+    def _set_radar_mode(self, radar_mode):
 
         # Create radar mode arrays
         if type(radar_mode) is str and radar_mode in self._valid_radar_modes:
@@ -986,15 +1189,32 @@ class L1bWaveforms(object):
         self._info.check_n_records(len(valid_flag))
         self._is_valid = valid_flag
 
+    def set_full_range(self):
+        """ Convert the parametric range to the full range array (e.g. for merging with l1p data
+        of earlier versions) """
+        if self.is_parametric_range:
+            self.set_waveform_data(self._power, self.range, self._radar_mode)
+
     def append(self, annex):
+        if self.is_parametric_range != annex.is_parametric_range:
+            self.set_full_range()
+            annex.set_full_range()
         self._power = np.concatenate((self._power, annex.power), axis=0)
-        self._range = np.concatenate((self._range, annex.range), axis=0)
+        if self.is_parametric_range:
+            self._window_delay = np.append(self._window_delay, annex.window_delay)
+            self._bin_spacing = np.append(self._bin_spacing, annex.bin_spacing)
+        else:
+            self._range = np.concatenate((self._range, annex.range), axis=0)
         self._radar_mode = np.append(self._radar_mode, annex.radar_mode)
         self._is_valid = np.append(self._is_valid, annex.is_valid)
 
     def set_subset(self, subset_list):
         self._power = self._power[subset_list, :]
-        self._range = self._range[subset_list, :]
+        if self.is_parametric_range:
+            self._window_delay = self._window_delay[subset_list]
+            self._bin_spacing = self._bin_spacing[subset_list]
+        else:
+            self._range = self._range[subset_list, :]
         self._radar_mode = self._radar_mode[subset_list]
         self._is_valid = self._is_valid[subset_list]
 
@@ -1004,6 +1224,9 @@ class L1bWaveforms(object):
         :param range_delta:
         :return:
         """
+        if self.is_parametric_range:
+            self._window_delay += range_delta
+            return
         range_delta_reshaped = np.repeat(range_delta, self.n_range_bins)
         range_delta_reshaped = range_delta_reshaped.reshape(self.n_records, self.n_range_bins)
         self._range += range_delta_reshaped
@@ -1017,19 +1240,26 @@ class L1bWaveforms(object):
         is_valid[indices_map] = self.is_valid
         self.set_valid_flag(is_valid)
 
-        # Power/range: set gaps to nan
+        # Power: set gaps to nan
         power = np.full((corrected_n_records, self.n_range_bins), np.nan)
         power[indices_map, :] = self.power
-        range = np.full((corrected_n_records, self.n_range_bins), np.nan)
-        range[indices_map, :] = self.range
 
         # Radar map: set gaps to lrm
         radar_mode = np.full((corrected_n_records), 1,
                              dtype=self.radar_mode.dtype)
         radar_mode[indices_map] = self.radar_mode
 
-        # And set new values
-        self.set_waveform_data(power, range, radar_mode)
+        # Range: set gaps to nan and set new values
+        if self.is_parametric_range:
+            window_delay = np.full((corrected_n_records), np.nan)
+            window_delay[indices_map] = self._window_delay
+            bin_spacing = np.full((corrected_n_records), np.nan)
+            bin_spacing[indices_map] = self._bin_spacing
+            self.set_parametric_waveform_data(power, window_delay, bin_spacing, radar_mode)
+        else:
+            range = np.full((corrected_n_records, self.n_range_bins), np.nan)
+            range[indices_map, :] = self.range
+            self.set_waveform_data(power, range, radar_mode)
 
     def _get_wfm_shape(self, index):
         shape = np.shape(self._power)
@@ -1,6 +1,8 @@
 
 import sys
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from attrdict import AttrDict
 from pathlib import Path
 from operator import attrgetter
@@ -11,6 +13,7 @@ from pysiral import get_cls, psrlcfg
 from pysiral.clocks import StopWatch
 from pysiral.config import get_yaml_config
 from pysiral.helper import (ProgressIndicator, get_first_array_index, get_last_array_index, rle)
+from pysiral.l1bdata import Level1bDataMergeBuilder
 from pysiral.errorhandler import ErrorStatus
 from pysiral.logging import DefaultLoggingClass
 from pysiral.output import L1bDataNC
@@ -48,6 +51,29 @@ def get_preproc(type, input_adapter, output_handler, cfg):
     return cls(input_adapter, output_handler, cfg)
 
 
+def get_preproc_from_job(job, output_handler=None):
+    """
+    A function returning the pre-processor and its input adapter as defined in the Level-1 processor
+    definition of a job. The pre-processor class is either given by its type or by `module_name` and
+    `class_name` in the pre-processor definition
+    :param job: A Level1PreProcJobDef instance
+    :param output_handler: (optional) output handler (None: e.g. for the worker processes of the parallel mode)
+    :return: Initialized pre-processor class
+    """
+
+    # Get the adapter class that transfers the input files into L1bData objects
+    adapter_def = job.l1pprocdef.input_adapter
+    input_adapter_cls = get_cls(adapter_def.module_name, adapter_def.class_name, relaxed=False)
+    input_adapter = input_adapter_cls(adapter_def.options)
+
+    # Get the pre-processor
+    preproc_def = job.l1pprocdef.level1_preprocessor
+    if "class_name" in preproc_def:
+        preproc_cls = get_cls(preproc_def.module_name, preproc_def.class_name, relaxed=False)
+        return preproc_cls(input_adapter, output_handler, preproc_def.options)
+    return get_preproc(preproc_def.type, input_adapter, output_handler, preproc_def.options)
+
+
 class L1PreProcBase(DefaultLoggingClass):
 
     def __init__(self, cls_name, input_adapter, output_handler, cfg):
@@ -68,10 +94,15 @@ class L1PreProcBase(DefaultLoggingClass):
         # The stack of Level-1 objects is a simple list
         self.l1_stack = []
 
-    def process_input_files(self, input_file_list):
+    def process_input_files(self, input_file_list, workers=1, job=None):
         """
         Main entry point for the Level-Preprocessor.
         :param input_file_list: A list full filepath for the pre-processor
+        :param workers: Number of worker processes for reading, segment extraction and post-processing
+            of the input files (default: 1 -> serial processing). The merging and export of the segments
+            is always done in the parent process in the order of the input files.
+        :param job: The Level1PreProcJobDef instance (required for more than one worker). The worker
+            processes create the input adapter and pre-processor from the job definition.
         :return: None
         """
 
@@ -84,34 +115,13 @@ class L1PreProcBase(DefaultLoggingClass):
         # Init helpers
         prgs = ProgressIndicator(n_input_files)
 
-        # A class that is passed to the input adapter to check if the pre-processsor wants the
-        # content of the current file
-        polar_ocean_check = L1PreProcPolarOceanCheck(self.__class__.__name__, self.polar_ocean_props)
-
         # orbit segments may or may not be connected, therefore the list of input file
-        # needs to be processed sequentially.
-        for i, input_file in enumerate(input_file_list):
-
-            # Step 1: Read Input
-            # Map the entire orbit segment into on Level-1 data object. This is the task
-            # of the input adaptor. The input handler gets only the filename and the target
-            # region to assess whether it is necessary to parse and transform the file content
-            # for the sake of computational efficiency.
-            self.log.info("+ Process input file %s" % prgs.get_status_report(i))
-            l1 = self.input_adapter.get_l1(input_file, polar_ocean_check)
-            if l1 is None:
-                self.log.info("- No polar ocean data for curent job -> skip file")
-                continue
+        # needs to be merged sequentially.
+        for i, l1_segments in enumerate(self._iter_l1_segments(input_file_list, workers, job)):
 
-            # Step 2: Extract and subset
-            # The input files may contain unwanted data (low latitude/land segments). It is the job of the
-            # L1PReProc children class to return only the relevant segments over polar ocean as a list of l1 objects.
-            l1_segments = self.extract_polar_ocean_segments(l1)
-
-            # Step 3: Post-processing
-            # Computational expensive post-processing (e.g. computation of waveform shape parameters) can now be
-            # executed as the the Level-1 segments are cropped to the minimal length.
-            self.l1_post_processing(l1_segments)
+            self.log.info("+ Merge segments of input file %s" % prgs.get_status_report(i))
+            if l1_segments is None:
+                continue
 
             # Step 4: Merge orbit segments
             # Add the list of orbit segments to the l1 data stack and merge those that are connected
@@ -123,6 +133,78 @@ class L1PreProcBase(DefaultLoggingClass):
         l1_merged = self.l1_get_merged_stack()
         self.l1_export_to_netcdf(l1_merged)
 
+    def get_l1_segments(self, input_file, polar_ocean_check):
+        """
+        Read an input file and return the post-processed polar ocean segments (Step 1-3 of the pre-processor).
+        This method does not depend on the state of the l1 stack and can be run in worker processes.
+        :param input_file: full filepath of the input file
+        :param polar_ocean_check: L1PreProcPolarOceanCheck instance
+        :return: A list of Level-1 data objects or None (no polar ocean data in input file)
+        """
+
+        # Step 1: Read Input
+        # Map the entire orbit segment into on Level-1 data object. This is the task
+        # of the input adaptor. The input handler gets only the filename and the target
+        # region to assess whether it is necessary to parse and transform the file content
+        # for the sake of computational efficiency.
+        self.log.info("+ Process input file %s" % input_file)
+        l1 = self.input_adapter.get_l1(input_file, polar_ocean_check)
+        if l1 is None:
+            self.log.info("- No polar ocean data for curent job -> skip file")
+            return None
+
+        # Step 2: Extract and subset
+        # The input files may contain unwanted data (low latitude/land segments). It is the job of the
+        # L1PReProc children class to return only the relevant segments over polar ocean as a list of l1 objects.
+        l1_segments = self.extract_polar_ocean_segments(l1)
+
+        # Step 3: Post-processing
+        # Computational expensive post-processing (e.g. computation of waveform shape parameters) can now be
+        # executed as the the Level-1 segments are cropped to the minimal length.
+        self.l1_post_processing(l1_segments)
+
+        return l1_segments
+
+    def _iter_l1_segments(self, input_file_list, workers, job):
+        """
+        Generator of the post-processed l1 segments for each input file (in the order of the input files)
+        :param input_file_list: A list full filepath for the pre-processor
+        :param workers: Number of worker processes (1: serial processing in this process)
+        :param job: The Level1PreProcJobDef instance (only used for more than one worker)
+        :return: generator of l1 segment lists (or None)
+        """
+
+        # Serial mode
+        if workers <= 1:
+            # A class that is passed to the input adapter to check if the pre-processsor wants the
+            # content of the current file
+            polar_ocean_check = L1PreProcPolarOceanCheck(self.__class__.__name__, self.polar_ocean_props)
+            for input_file in input_file_list:
+                yield self.get_l1_segments(input_file, polar_ocean_check)
+            return
+
+        if job is None:
+            msg = "The job definition is required for the parallel mode (workers=%g)" % workers
+            self.error.add_error("missing-job-definition", msg)
+            self.error.raise_on_error()
+
+        # Parallel mode: The workers process the input files in any order, but the results are
+        # returned in the order of the input files. The number of pending input files is limited
+        # to keep the number of l1 segments in memory small.
+        # NOTE: Only the job definition is passed to the worker processes, which create their own
+        #       input adapter and pre-processor.
+        self.log.info("Process input files with %g worker processes" % workers)
+        max_pending = 2 * workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_l1_segments_worker,
+                                 initargs=(job, )) as executor:
+            pending = deque()
+            for input_file in input_file_list:
+                pending.append(executor.submit(_get_l1_segments_in_worker, input_file))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+
     def l1_post_processing(self, l1_segments):
         """
         Apply the post-processing procedures defined in the l1p processor definition file.
@@ -205,10 +287,10 @@ class L1PreProcBase(DefaultLoggingClass):
         Note: This operation leaves the state of the Level-1 stack untouched
         :return: Level-1 data object
         """
-        l1_merged = self.l1_stack[0]
-        for l1 in self.l1_stack[1:]:
-            l1_merged.append(l1)
-        return l1_merged
+        merge_builder = Level1bDataMergeBuilder()
+        for l1 in self.l1_stack:
+            merge_builder.add(l1)
+        return merge_builder.build()
 
     def l1_export_to_netcdf(self, l1):
         """
@@ -784,6 +866,22 @@ class L1PreProcPolarOceanCheck(DefaultLoggingClass):
         return True
 
 
+# Pre-processor and polar ocean check instances in the worker processes of the parallel mode
+_L1_SEGMENTS_WORKER = None
+
+
+def _init_l1_segments_worker(job):
+    global _L1_SEGMENTS_WORKER
+    preproc = get_preproc_from_job(job)
+    polar_ocean_check = L1PreProcPolarOceanCheck(preproc.__class__.__name__, preproc.polar_ocean_props)
+    _L1_SEGMENTS_WORKER = (preproc, polar_ocean_check)
+
+
+def _get_l1_segments_in_worker(input_file):
+    preproc, polar_ocean_check = _L1_SEGMENTS_WORKER
+    return preproc.get_l1_segments(input_file, polar_ocean_check)
+
+
 class Level1PreProcJobDef(DefaultLoggingClass):
     """ A class that contains the information for the Level-1 pre-processor JOB (not the pre-processor class!) """
 
@@ -7,11 +7,13 @@ Created on Fri Jul 24 16:30:24 2015
 
 from pysiral import psrlcfg
 from pysiral.errorhandler import ErrorStatus
-from pysiral.iotools import ReadNC
+from pysiral.iotools import ReadNC, GridDiskCache
 from pysiral.logging import DefaultLoggingClass
 from pysiral.l1bdata import L1bMetaData, L1bTimeOrbit
 
 import numpy as np
+from cftime import num2pydate
+from netCDF4 import Dataset
 from datetime import datetime
 from geopy.distance import great_circle
 from collections import OrderedDict
@@ -74,6 +76,11 @@ class Level2Data(object):
         # Create Level2 Data Groups
         self._create_l2_data_items()
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # An unpickled object (e.g. from a Level-2 processor checkpoint) is a new dataset
+        self._creation_time = datetime.now()
+
     def set_surface_type(self, surface_type):
         self.surface_type = surface_type
 
@@ -121,12 +128,12 @@ class Level2Data(object):
             parameter.set_bias(bias, bias_value)
         setattr(self, target, parameter)
 
-    def set_auxiliary_parameter(self, var_id, var_name, value, uncertainty=None):
+    def set_auxiliary_parameter(self, var_id, var_name, value, uncertainty=None, dtype=float):
         """ Adds an auxiliary parameter to the data object"""
 
         # Use L2Elevation Array
         # TODO: This is to cumbersome, replace by xarray at due time
-        param = L2ElevationArray(shape=(self.n_records))
+        param = L2ElevationArray(shape=(self.n_records), dtype=dtype)
         # Allow value to be None
         # NOTE: In this case an empty value will be generated
         if value is None:
@@ -626,7 +633,9 @@ class L2ElevationArray(np.ndarray):
     def __new__(subtype, shape, dtype=float, buffer=None, offset=0,
                 strides=None, order=None, info=None):
         obj = np.ndarray.__new__(
-            subtype, shape, dtype, buffer, offset, strides, order)*np.nan
+            subtype, shape, dtype, buffer, offset, strides, order)
+        # Integer arrays (e.g. grid indices) cannot be initialized with NaN
+        obj = obj*np.nan if obj.dtype.kind == "f" else np.zeros_like(obj)
         obj.uncertainty = np.zeros(shape=shape, dtype=float)
         obj.bias = np.ones(shape=shape, dtype=float)*0.1
         obj.source_class = "n/a"
@@ -645,6 +654,15 @@ class L2ElevationArray(np.ndarray):
         self.long_name = getattr(obj, 'long_name', None)
         self.unit = getattr(obj, 'unit', None)
 
+    def __reduce__(self):
+        # Add the attributes to the pickled state of the ndarray (lost otherwise)
+        reconstruct, arguments, state = super(L2ElevationArray, self).__reduce__()
+        return reconstruct, arguments, state + (self.__dict__,)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state[-1])
+        super(L2ElevationArray, self).__setstate__(state[:-1])
+
     def __getslice__(self, i, j):
         r = np.ndarray.__getslice__(self, i, j)
         r.uncertainty = r.uncertainty[i:j]
@@ -670,20 +688,39 @@ class L2ElevationArray(np.ndarray):
 
 class Level2PContainer(DefaultLoggingClass):
 
-    def __init__(self, period):
+    def __init__(self, period, disk_cache=None):
+        """
+        Container for merging l2i data into a l2p product
+        :param period: the period of the l2p product
+        :param disk_cache: (optional) L2iColumnCache instance for reading the decoded columns of l2i files
+        """
         super(Level2PContainer, self).__init__(self.__class__.__name__)
         self.error = ErrorStatus()
         self._period = period
+        self._disk_cache = disk_cache
         self._l2i_stack = []
+        self._l2i_headers = []
 
     def append_l2i(self, l2i):
         self._l2i_stack.append(l2i)
 
-    def get_merged_l2(self):
-        """ Returns a Level2Data object with data from all l2i objects """
+    def append_l2i_file(self, filename, valid_mask="freeboard"):
+        """ First pass of the two-pass merge: Register a l2i file with its number
+        of valid records. Only the valid mask variable is read from the file,
+        the data is read with `get_merged_l2` into preallocated arrays """
+        self._l2i_headers.append(L2iNCFileHeader(filename, valid_mask=valid_mask, disk_cache=self._disk_cache))
+
+    def get_merged_l2(self, parameters=None):
+        """ Returns a Level2Data object with data from all l2i objects
+        or l2i files. For l2i files, the list of parameters can be limited
+        to the variables that are required for the output (time, position
+        and the parameter uncertainties are always included) """
 
         # Merge the parameter
-        data = self._get_merged_data(valid_mask="freeboard")
+        if self.n_l2i_files > 0:
+            data = self._get_merged_data_from_files(parameters=parameters)
+        else:
+            data = self._get_merged_data(valid_mask="freeboard")
 
         # There are rare occasion, where no valid freeboard data is found for an entire day
         if len(data["longitude"]) == 0:
@@ -693,8 +730,8 @@ class Level2PContainer(DefaultLoggingClass):
         timeorbit = Level2iTimeOrbit()
         timeorbit.from_l2i_stack(data)
 
-        # Use the first l2i object in stack to retrieve metadata
-        l2i = self._l2i_stack[0]
+        # Use the first l2i object or file in stack to retrieve metadata
+        l2i = self._l2i_headers[0] if self.n_l2i_files > 0 else self._l2i_stack[0]
 
         # Set up a metadata container
         metadata = Level2iMetadata()
@@ -710,7 +747,7 @@ class Level2PContainer(DefaultLoggingClass):
 
         # Retrieve the following constant attributes from the first
         # l2i object in the stack
-        info = self.l2i_stack[0].info
+        info = l2i.info
 
         # Old notation (for backward compatibility)
         #TODO: This will soon be obsolete
@@ -747,7 +784,7 @@ class Level2PContainer(DefaultLoggingClass):
 
         # 1. Get the list of parameters
         # (assuming all l2i files share the same)
-        parameter_list_all = l2i.parameter_list
+        parameter_list_all = [p for p in l2i.parameter_list if p in data]
 
         # 2. Exclude variables that end with `_uncertainty`
         parameter_list = [p for p in parameter_list_all if not re.search("_uncertainty", p)]
@@ -798,6 +835,43 @@ class Level2PContainer(DefaultLoggingClass):
                 data[parameter] = np.append(data[parameter], stack_data)
         return data
 
+    def _get_merged_data_from_files(self, parameters=None):
+        """ Second pass of the two-pass merge: Returns a dict with the merged
+        valid records of the l2i files. The arrays are allocated with the number
+        of valid records from the first pass and only the variables in the list
+        of parameters are read from the files. """
+
+        # Variables to read (file variables that are not part of the parameter
+        # list are skipped, the list of variables is taken from the first file)
+        header = self._l2i_headers[0]
+        parameter_list = header.get_parameter_list(parameters)
+
+        # Allocate the output arrays with the dtypes of the first file
+        # NOTE: The output dtype is identical to the dtype of the incremental merge
+        n_records = sum(l2i_header.n_valid_records for l2i_header in self._l2i_headers)
+        # NOTE: The time from the l2i column cache is already decoded (datetime64)
+        data = {}
+        for parameter_name, dtype in header.get_dtypes(parameter_list).items():
+            if np.dtype(dtype).kind != "M":
+                dtype = np.result_type(np.float32, dtype)
+            data[parameter_name] = np.empty(n_records, dtype=dtype)
+
+        # Fill the arrays
+        i0 = 0
+        for l2i_header in self._l2i_headers:
+            i1 = i0 + l2i_header.n_valid_records
+            l2i_header.read_valid_records(parameter_list, data, i0, i1)
+            i0 = i1
+
+        # Convert time to datetime objects
+        time_parameter_name = header.time_parameter_name
+        time = data[time_parameter_name]
+        if time.dtype.kind == "M":
+            data[time_parameter_name] = time.astype(object)
+        else:
+            data[time_parameter_name] = num2pydate(time, header.time_def.units, header.time_def.calendar)
+        return data
+
     def _get_empty_data_group(self, parameter_list):
         data = {}
         for parameter_name in parameter_list:
@@ -812,6 +886,10 @@ class Level2PContainer(DefaultLoggingClass):
     def n_l2i_objects(self):
         return len(self.l2i_stack)
 
+    @property
+    def n_l2i_files(self):
+        return len(self._l2i_headers)
+
     @property
     def period(self):
         return self._period
@@ -826,10 +904,121 @@ class AttributeList(object):
         setattr(self, name, value)
 
 
+class L2iColumnCache(GridDiskCache):
+    """
+    On-disk cache of the decoded columns of l2i files that is shared by the Level-2 pre-processor
+    and the Level-3 processor (one memory-mapped `.npy` file per variable, keyed by the l2i path and
+    its modification time, see pysiral.iotools.GridDiskCache). In addition to the netCDF decoding,
+    the time variable is cached as decoded datetime64 values. Repeated runs for the same l2i files
+    (e.g. overlapping periods of running-window products) therefore skip the netCDF decoding and
+    the time conversion.
+
+    NOTE: The orbit filter, the nan mask transfer and the projection depend on the processor
+          settings and are not cached.
+    """
+
+    def _decode(self, path):
+        from pysiral.output import NCDateNumDef
+        content = super(L2iColumnCache, self)._decode(path)
+        time_def = NCDateNumDef()
+        for time_parameter_name in ["time", "timestamp"]:
+            if time_parameter_name not in content.keys:
+                continue
+            dt = num2pydate(getattr(content, time_parameter_name), time_def.units, time_def.calendar)
+            setattr(content, time_parameter_name, np.array(dt, dtype="datetime64[us]"))
+        return content
+
+
+class L2iNCFileHeader(object):
+    """ Dimensions, valid records, variable names and global attributes of a l2i
+    file without reading the data (first pass of the l2p merge) """
+
+    def __init__(self, filename, valid_mask="freeboard", disk_cache=None):
+        from pysiral.output import NCDateNumDef
+        self.filename = filename
+        self.time_def = NCDateNumDef()
+        self.info = AttributeList()
+        self.attribute_list = []
+        self.parameter_list = []
+        self.n_records = 0
+        self.valid_indices = None
+        self.disk_cache = disk_cache
+        self._columns = None
+        self._parse(valid_mask)
+
+    def _parse(self, valid_mask):
+
+        # Decoded columns from the l2i column cache (optional)
+        if self.disk_cache is not None:
+            content = self.disk_cache.read(self.filename)
+            self._columns = content
+        else:
+            content = ReadNC(self.filename, global_attrs_only=True)
+
+        for attribute_name in content.attributes:
+            self.attribute_list.append(attribute_name)
+            self.info.set_attribute(attribute_name, getattr(content, attribute_name))
+
+        if self._columns is not None:
+            self.parameter_list = list(self._columns.parameters)
+            valid_mask_parameter = getattr(self._columns, valid_mask)
+        else:
+            with Dataset(str(self.filename)) as nc:
+                self.parameter_list = list(nc.variables.keys())
+                valid_mask_parameter = nc.variables[valid_mask][:]
+
+        # NOTE: masked values of the valid mask parameter are not valid
+        self.n_records = len(valid_mask_parameter)
+        self.valid_indices = np.where(np.isfinite(valid_mask_parameter))[0]
+
+    def get_parameter_list(self, parameters=None):
+        """ Returns the variables of the file that are required for the list of
+        output parameters. All variables are required if no parameter list is
+        given or if a parameter is not a file variable (e.g. a property of the
+        Level2Data object that is computed from other parameters) """
+        if parameters is None:
+            return list(self.parameter_list)
+        required = {self.time_parameter_name, "longitude", "latitude"}
+        for parameter_name in parameters:
+            parameter_name = re.sub("_uncertainty$|_bias$", "", parameter_name)
+            if parameter_name in ["time", "timestamp"]:
+                continue
+            if parameter_name not in self.parameter_list:
+                return list(self.parameter_list)
+            required.update([parameter_name, parameter_name+"_uncertainty"])
+        return [p for p in self.parameter_list if p in required]
+
+    def get_dtypes(self, parameter_list):
+        if self._columns is not None:
+            return OrderedDict([(name, getattr(self._columns, name).dtype) for name in parameter_list])
+        with Dataset(str(self.filename)) as nc:
+            return OrderedDict([(name, nc.variables[name].dtype) for name in parameter_list])
+
+    def read_valid_records(self, parameter_list, data, i0, i1):
+        """ Reads the valid records of all parameters into data[name][i0:i1] """
+        if self._columns is not None:
+            for parameter_name in parameter_list:
+                values = np.ma.getdata(getattr(self._columns, parameter_name))
+                data[parameter_name][i0:i1] = values[self.valid_indices]
+            return
+        with Dataset(str(self.filename)) as nc:
+            for parameter_name in parameter_list:
+                values = np.ma.getdata(nc.variables[parameter_name][:])
+                data[parameter_name][i0:i1] = values[self.valid_indices]
+
+    @property
+    def n_valid_records(self):
+        return len(self.valid_indices)
+
+    @property
+    def time_parameter_name(self):
+        return "time" if "time" in self.parameter_list else "timestamp"
+
+
 class L2iNCFileImport(object):
     # TODO: Needs proper implementation
 
-    def __init__(self, filename):
+    def __init__(self, filename, disk_cache=None):
         from pysiral.output import NCDateNumDef
         self.filename = filename
         self._n_records = 0
@@ -837,12 +1026,16 @@ class L2iNCFileImport(object):
         self.info = AttributeList()
         self.attribute_list = []
         self.parameter_list = []
+        self.disk_cache = disk_cache
         self._parse()
 
     def _parse(self):
-        from cftime import num2pydate
 
-        content = ReadNC(self.filename)
+        # Decoded columns from the l2i column cache (optional)
+        if self.disk_cache is not None:
+            content = self.disk_cache.read(self.filename)
+        else:
+            content = ReadNC(self.filename)
 
         for attribute_name in content.attributes:
             self.attribute_list.append(attribute_name)
@@ -863,7 +1056,11 @@ class L2iNCFileImport(object):
             time = self.time
             time_parameter_name = "timestamp"
         self._time_parameter_name = time_parameter_name
-        dt = num2pydate(time, self.time_def.units, self.time_def.calendar)
+        if time.dtype.kind == "M":
+            # Already decoded by the l2i column cache
+            dt = time.astype(object)
+        else:
+            dt = num2pydate(time, self.time_def.units, self.time_def.calendar)
         setattr(self, "time", dt)
         self.time = self.time
 
@@ -8,7 +8,7 @@ Created on Fri Aug 11 17:07:02 2017
 
 from pysiral import psrlcfg
 from pysiral.errorhandler import ErrorStatus
-from pysiral.l2data import Level2PContainer, L2iNCFileImport
+from pysiral.l2data import Level2PContainer, L2iColumnCache
 from pysiral.logging import DefaultLoggingClass
 from pysiral.output import Level2Output, OutputHandlerBase
 
@@ -20,7 +20,12 @@ from pathlib import Path
 
 class Level2PreProcessor(DefaultLoggingClass):
 
-    def __init__(self, product_def):
+    def __init__(self, product_def, l2i_cache_dir=None):
+        """
+        :param product_def: Level2PreProcProductDefinition instance
+        :param l2i_cache_dir: (optional) directory of the on-disk cache for decoded l2i columns
+            (shared with the Level-3 processor, see pysiral.l2data.L2iColumnCache)
+        """
         super(Level2PreProcessor, self).__init__(self.__class__.__name__)
         self.error = ErrorStatus()
 
@@ -32,27 +37,35 @@ class Level2PreProcessor(DefaultLoggingClass):
             self.error.raise_on_error()
         self._job = product_def
 
+        # Optional cache for decoded l2i columns
+        self._l2i_cache = L2iColumnCache(l2i_cache_dir) if l2i_cache_dir is not None else None
+
     def process_l2i_files(self, l2i_files, period):
         """ Reads all l2i files and merges the valid data into a l2p
         summary file """
 
-        # l2p: Container for storing l2i objects
-        l2p = Level2PContainer(period)
+        # l2p: Container for merging l2i files
+        l2p = Level2PContainer(period, disk_cache=self._l2i_cache)
 
-        # Add all l2i objects to the l2p container.
-        # NOTE: Only memory is the limit
+        # Add all l2i files to the l2p container.
+        # NOTE: This is the first pass of the merge that only reads the
+        #       number of valid records (the data is read with the merge)
         for l2i_file in l2i_files:
             try:
-                l2i = L2iNCFileImport(l2i_file)
+                l2p.append_l2i_file(l2i_file)
             except Exception as ex:
                 msg = "Error (%s) in l2i file: %s"
                 msg = msg % (ex, Path(l2i_file).name)
                 self.log.error(msg)
                 continue
-            l2p.append_l2i(l2i)
 
-        # Merge the l2i object to a single L2Data object
-        l2 = l2p.get_merged_l2()
+        if l2p.n_l2i_files == 0:
+            self.log.warning("- No valid l2i files found, skip day")
+            return
+
+        # Merge the valid records of the l2i files into a single L2Data object
+        # (only the variables of the output definition are read)
+        l2 = l2p.get_merged_l2(parameters=self.output_parameters)
         if l2 is None:
             self.log.warning("- No valid freeboard data found for, skip day")
             return
@@ -65,6 +78,14 @@ class Level2PreProcessor(DefaultLoggingClass):
     def job(self):
         return self._job
 
+    @property
+    def output_parameters(self):
+        """ The names of the source parameters of the output variables """
+        parameters = []
+        for parameter_name, attribute_dict in self.job.output_handler.variable_def:
+            parameters.append(attribute_dict.get("var_source_name", parameter_name))
+        return parameters
+
 
 class Level2PreProcProductDefinition(DefaultLoggingClass):
 
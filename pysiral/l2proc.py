@@ -14,7 +14,8 @@ from dateperiods import DatePeriod
 from pathlib import Path
 
 from pysiral import get_cls, psrlcfg
-from pysiral.config import get_yaml_config
+from pysiral.checkpoint import Level2CheckpointHandler, L2_CHECKPOINT_EXCLUDED_AUXDATA
+from pysiral.config import get_yaml_config, compile_options
 from pysiral.errorhandler import ErrorStatus, PYSIRAL_ERROR_CODES
 from pysiral.datahandler import DefaultAuxdataClassHandler
 from pysiral.l1bdata import L1bdataNCFile
@@ -22,6 +23,7 @@ from pysiral.l2data import Level2Data
 from pysiral.logging import DefaultLoggingClass
 from pysiral.ssh import get_l2_ssh_class
 from pysiral.output import (Level2Output, DefaultLevel2OutputHandler, get_output_class)
+from pysiral.pipeline import PrefetchReader, WriteBehindQueue, NETCDF_IO_LOCK
 from pysiral.surface_type import get_surface_type_class
 from pysiral.retracker import get_retracker_class
 from pysiral.filter import get_filter
@@ -32,8 +34,18 @@ from pysiral.sit import get_sit_algorithm
 
 class Level2Processor(DefaultLoggingClass):
 
-    def __init__(self, product_def, auxclass_handler=None):
-        """ Setup of the Level-2 Processor """
+    def __init__(self, product_def, auxclass_handler=None, io_pipeline_depth=0, checkpoint_dir=None):
+        """
+        Setup of the Level-2 Processor
+        :param product_def: Level2ProductDefinition instance
+        :param auxclass_handler: (optional) auxiliary data class handler
+        :param io_pipeline_depth: If > 0, the next l1p file is read and the Level-2 output files
+            are written in background threads with a maximum of `io_pipeline_depth` orbits waiting
+            in each queue (0: serial processing)
+        :param checkpoint_dir: (optional) directory for checkpoint files after the retracking and
+            sea surface height stages. Orbits with a valid checkpoint are resumed from the latest
+            checkpoint (None: no checkpoints)
+        """
 
         super(Level2Processor, self).__init__(self.__class__.__name__)
 
@@ -63,6 +75,14 @@ class Level2Processor(DefaultLoggingClass):
         # List of Level-1b input files
         self._l1b_files = []
 
+        # Depth of the I/O queues (0: no I/O pipeline)
+        self._io_pipeline_depth = int(io_pipeline_depth)
+
+        # Optional checkpoints of the processing stages
+        self._checkpoints = None
+        if checkpoint_dir is not None:
+            self._checkpoints = Level2CheckpointHandler(checkpoint_dir, self._l2def)
+
         # pysiral config
         self._config = psrlcfg
 
@@ -125,6 +145,7 @@ class Level2Processor(DefaultLoggingClass):
     def run(self):
         """ Run the processor """
         self._l2_processing_of_orbit_files()
+        self._report_auxdata_cache_statistics()
         self._l2proc_summary_to_file()
         self._clean_up()
 
@@ -142,6 +163,16 @@ class Level2Processor(DefaultLoggingClass):
             export_folder = output.get_full_export_path(time_range.start)
             self.report.write_to_file(output_id, export_folder)
 
+    def _report_auxdata_cache_statistics(self):
+        """ Add the product cache statistics of the auxiliary data handlers to the report """
+        for auxhandler_id, auxdata_type in self.registered_auxdata_handlers:
+            statistics = getattr(self._auxhandlers[auxhandler_id], "cache_statistics", None)
+            if statistics is None or statistics["hits"] + statistics["misses"] == 0:
+                continue
+            self.report.add_auxdata_cache_statistics(auxhandler_id, statistics)
+            self.log.info("Auxdata cache %s: %g hits, %g misses, %g prefetched" % (
+                auxhandler_id, statistics["hits"], statistics["misses"], statistics["prefetched"]))
+
     def _clean_up(self):
         """ All procedures that need to be reset after a run """
         self.report.clean_up()
@@ -221,9 +252,13 @@ class Level2Processor(DefaultLoggingClass):
     def _l2_processing_of_orbit_files(self):
         """ Orbit-wise level2 processing """
 
-        # TODO: Evaluate parallelization
         self.log.info("Start Orbit Processing")
 
+        # Optional: Overlap file I/O and processing
+        if self._io_pipeline_depth > 0:
+            self._l2_processing_of_orbit_files_pipelined()
+            return
+
         n_files = len(self._l1b_files)
 
         # loop over l1bdata preprocessed orbits
@@ -232,88 +267,189 @@ class Level2Processor(DefaultLoggingClass):
             # Log the current position in the file stack
             self.log.info("+ [ %g of %g ] (%.2f%%)" % (i+1, n_files, float(i+1)/float(n_files)*100.))
 
-            # Read the the level 1b file (l1bdata netCDF is required)
-            l1b = self._read_l1b_file(l1b_file)
-            source_primary_filename = Path(l1b_file).parts[-1]
+            # Read the the level 1b file (l1bdata netCDF is required) or a valid checkpoint
+            l1b, checkpoint = self._read_orbit_input(l1b_file)
 
-            # Apply the geophysical range corrections on the waveform range
-            # bins in the l1b data container
-            # TODO: move to level1bData class
-            self._apply_range_corrections(l1b)
+            # Compute the Level-2 parameters (None if the orbit has been discarded)
+            l2 = self._l2_processing_of_orbit(l1b, l1b_file, checkpoint=checkpoint)
+            if l2 is None:
+                continue
 
-            # Apply a pre-filter of the l1b data (can be none)
-            self._apply_l1b_prefilter(l1b)
+            # Create output files
+            self._create_l2_outputs(l2)
 
-            # Initialize the orbit level-2 data container
-            # TODO: replace by proper product metadata transfer
-            try:
-                period = DatePeriod(l1b.info.start_time, l1b.info.stop_time)
-            except SystemExit:
-                msg = "Computation of data period caused exception"
-                self.log.warning("[invalid-l1b]", msg)
-                continue
-            l2 = Level2Data(l1b.info, l1b.time_orbit, period=period)
+            # Add data to orbit stack
+            self._add_to_orbit_collection(l2)
 
-            # Transfer l1p parameter to the l2 data object (if applicable)
-            # NOTE: This is only necessary, if parameters from the l1p files (classifiers) should
-            #       be present in the l2i product
-            self._transfer_l1p_vars(l1b, l2)
+    def _l2_processing_of_orbit_files_pipelined(self):
+        """
+        Orbit-wise level2 processing with I/O pipeline: A reader thread parses the next l1p file(s)
+        and a writer thread writes the Level-2 output, while the current orbit is processed.
+        The number of l1p and l2 data objects in memory is limited by the queue depth.
+        NOTE: Level-2 data objects are not added to the orbit collection in this mode, since
+              this would defeat the memory limit.
+        """
 
-            # Get auxiliary data from all registered auxdata handlers
-            error_status, error_codes = self._get_auxiliary_data(l2)
-            if True in error_status:
-                self._discard_l1b_procedure(error_codes, l1b_file)
-                continue
+        depth = self._io_pipeline_depth
+        n_files = len(self._l1b_files)
+        self.log.info("I/O pipeline enabled (queue depth: %g)" % depth)
 
-            # Surface type classification (ocean, ice, lead, ...)
-            # (ice type classification comes later)
-            self._classify_surface_types(l1b, l2)
+        # The netCDF library is not thread-safe: Reader and writer thread share a lock
+        # (also used for loading auxiliary data files)
+        io_lock = NETCDF_IO_LOCK
 
-            # Validate surface type classification
-            # yes/no decision on continuing with orbit
-            error_status, error_codes = self._validate_surface_types(l2)
-            if error_status:
-                self._discard_l1b_procedure(error_codes, l1b_file)
-                continue
+        reader = PrefetchReader(self._l1b_files, self._read_orbit_input, depth=depth, lock=io_lock)
+        writer = WriteBehindQueue(self._create_l2_outputs, depth=depth, lock=io_lock)
+        with reader, writer:
+            for i, (l1b_file, (l1b, checkpoint)) in enumerate(reader):
+
+                # Log the current position in the file stack
+                self.log.info("+ [ %g of %g ] (%.2f%%)" % (i+1, n_files, float(i+1)/float(n_files)*100.))
+
+                # Compute the Level-2 parameters (None if the orbit has been discarded)
+                l2 = self._l2_processing_of_orbit(l1b, l1b_file, checkpoint=checkpoint)
+                if l2 is None:
+                    continue
+
+                # Add to the write-behind queue (will raise errors of previous outputs)
+                writer.submit(l2)
+
+    def _l2_processing_of_orbit(self, l1b, l1b_file, checkpoint=None):
+        """
+        Level-2 processing of a single orbit
+        :param l1b: the parsed l1p data (L1bdataNCFile), None if resumed from checkpoint
+        :param l1b_file: the path to the l1p file
+        :param checkpoint: (optional) Level2Checkpoint instance to resume from
+        :return: Level2Data object or None if orbit has been discarded
+        """
+
+        source_primary_filename = Path(l1b_file).parts[-1]
 
-            # Get elevation by retracking of different surface types
-            # adds parameter elevation to l2
-            error_status, error_codes = self._waveform_retracking(l1b, l2)
-            if error_status:
+        # Resume from a checkpoint or compute all stages up to waveform retracking
+        if checkpoint is None:
+            l2 = self._l2_retracking_of_orbit(l1b, l1b_file)
+            if l2 is None:
+                return None
+            self._write_checkpoint(l1b_file, "retracking", l2)
+        else:
+            l2 = checkpoint.l2
+            # Auxiliary data that is not part of the checkpoint key may have changed
+            error_status, error_codes = self._get_auxiliary_data(l2, L2_CHECKPOINT_EXCLUDED_AUXDATA)
+            if True in error_status:
                 self._discard_l1b_procedure(error_codes, l1b_file)
-                continue
+                return None
 
-            # Compute the sea surface anomaly (from mss and lead tie points)
-            # adds parameter ssh, ssa, afrb to l2
+        # Compute the sea surface anomaly (from mss and lead tie points)
+        # adds parameter ssh, ssa, afrb to l2
+        if checkpoint is None or checkpoint.stage == "retracking":
             self._estimate_sea_surface_height(l2)
+            self._write_checkpoint(l1b_file, "ssh", l2)
 
-            # Compute the radar freeboard and its uncertainty
-            self._get_altimeter_freeboard(l1b, l2)
+        # NOTE: The l1p data is not available when resuming from a checkpoint (l1b=None).
+        #       Stages after the sea surface height estimation must therefore only use
+        #       the Level-2 data object.
 
-            # get radar(-derived) from altimeter freeboard
-            self._get_freeboard_from_radar_freeboard(l1b, l2)
+        # Compute the radar freeboard and its uncertainty
+        self._get_altimeter_freeboard(l1b, l2)
 
-            # Apply freeboard filter
-            self._apply_freeboard_filter(l2)
+        # get radar(-derived) from altimeter freeboard
+        self._get_freeboard_from_radar_freeboard(l1b, l2)
 
-            # Convert to thickness
-            self._convert_freeboard_to_thickness(l2)
+        # Apply freeboard filter
+        self._apply_freeboard_filter(l2)
 
-            # Filter thickness
-            self._apply_thickness_filter(l2)
+        # Convert to thickness
+        self._convert_freeboard_to_thickness(l2)
 
-            # Post processing
-            self._post_processing_items(l2)
+        # Filter thickness
+        self._apply_thickness_filter(l2)
 
-            # Create output files
-            l2.set_metadata(auxdata_source_dict=self.l2_auxdata_source_dict,
-                            source_primary_filename=source_primary_filename,
-                            l2_algorithm_id=self.l2def.id,
-                            l2_version_tag=self.l2def.version_tag)
-            self._create_l2_outputs(l2)
+        # Post processing
+        self._post_processing_items(l2)
 
-            # Add data to orbit stack
-            self._add_to_orbit_collection(l2)
+        # Set the metadata for the output files
+        l2.set_metadata(auxdata_source_dict=self.l2_auxdata_source_dict,
+                        source_primary_filename=source_primary_filename,
+                        l2_algorithm_id=self.l2def.id,
+                        l2_version_tag=self.l2def.version_tag)
+
+        return l2
+
+    def _l2_retracking_of_orbit(self, l1b, l1b_file):
+        """
+        Level-2 processing stages of a single orbit up to (and including) waveform retracking
+        :param l1b: the parsed l1p data (L1bdataNCFile)
+        :param l1b_file: the path to the l1p file
+        :return: Level2Data object or None if orbit has been discarded
+        """
+
+        # Apply the geophysical range corrections on the waveform range
+        # bins in the l1b data container
+        # TODO: move to level1bData class
+        self._apply_range_corrections(l1b)
+
+        # Apply a pre-filter of the l1b data (can be none)
+        self._apply_l1b_prefilter(l1b)
+
+        # Initialize the orbit level-2 data container
+        # TODO: replace by proper product metadata transfer
+        try:
+            period = DatePeriod(l1b.info.start_time, l1b.info.stop_time)
+        except SystemExit:
+            msg = "Computation of data period caused exception"
+            self.log.warning("[invalid-l1b]", msg)
+            return None
+        l2 = Level2Data(l1b.info, l1b.time_orbit, period=period)
+
+        # Transfer l1p parameter to the l2 data object (if applicable)
+        # NOTE: This is only necessary, if parameters from the l1p files (classifiers) should
+        #       be present in the l2i product
+        self._transfer_l1p_vars(l1b, l2)
+
+        # Get auxiliary data from all registered auxdata handlers
+        error_status, error_codes = self._get_auxiliary_data(l2)
+        if True in error_status:
+            self._discard_l1b_procedure(error_codes, l1b_file)
+            return None
+
+        # Surface type classification (ocean, ice, lead, ...)
+        # (ice type classification comes later)
+        self._classify_surface_types(l1b, l2)
+
+        # Validate surface type classification
+        # yes/no decision on continuing with orbit
+        error_status, error_codes = self._validate_surface_types(l2)
+        if error_status:
+            self._discard_l1b_procedure(error_codes, l1b_file)
+            return None
+
+        # Get elevation by retracking of different surface types
+        # adds parameter elevation to l2
+        error_status, error_codes = self._waveform_retracking(l1b, l2)
+        if error_status:
+            self._discard_l1b_procedure(error_codes, l1b_file)
+            return None
+
+        return l2
+
+    def _read_orbit_input(self, l1b_file):
+        """
+        Returns the input for the processing of an orbit: Either the latest valid checkpoint
+        or (if no checkpoint exists or checkpoints are disabled) the l1p data.
+        :param l1b_file: the path to the l1p file
+        :return: tuple (l1b, checkpoint), with either l1b or checkpoint being None
+        """
+        if self._checkpoints is not None:
+            checkpoint = self._checkpoints.get_latest(l1b_file)
+            if checkpoint is not None:
+                return None, checkpoint
+        return self._read_l1b_file(l1b_file), None
+
+    def _write_checkpoint(self, l1b_file, stage, l2):
+        """ Write the checkpoint of a processing stage (if checkpoints are enabled) """
+        if self._checkpoints is None:
+            return
+        self._checkpoints.write(l1b_file, stage, l2)
 
     def _read_l1b_file(self, l1b_file):
         """ Read a L1b data file (l1bdata netCDF) """
@@ -385,8 +521,11 @@ class Level2Processor(DefaultLoggingClass):
                 if verbose:
                     self.log.info("- Transfered l1p variable: %s.%s" % (data_group, var_name))
 
-    def _get_auxiliary_data(self, l2):
-        """ Transfer along-track data from all registered auxdata handler to the l2 data object """
+    def _get_auxiliary_data(self, l2, auxdata_types=None):
+        """ Transfer along-track data from all registered auxdata handler to the l2 data object
+        :param l2: the Level2Data object
+        :param auxdata_types: (optional) list of auxdata types to limit the handlers (None: all handlers)
+        """
 
         # Loop over all auxilary data types. Each type must have:
         # a) entry in the l2 processing definition under the root.auxdata
@@ -398,6 +537,9 @@ class Level2Processor(DefaultLoggingClass):
 
         for (auxdata_id, auxdata_type) in self.registered_auxdata_handlers:
 
+            if auxdata_types is not None and auxdata_type not in auxdata_types:
+                continue
+
             # Get the class
             auxclass = self._auxhandlers[auxdata_id]
 
@@ -707,6 +849,32 @@ class Level2ProductDefinition(DefaultLoggingClass):
         except Exception as ex:
             self.error.add_error("invalid-l2-settings", str(ex))
             self.error.raise_on_error()
+        self._validate_algorithm_options()
+
+    def _validate_algorithm_options(self):
+        """
+        Compile the options of retracker and filter algorithms once when loading the settings file.
+        Missing mandatory options or options of the wrong type are thus reported before the
+        first orbit is processed.
+        """
+
+        # Collect the algorithm definitions (module name, algorithm definition)
+        algorithm_defs = [("pysiral.retracker", retracker_def) for retracker_def in self._l2def.retracker.values()]
+        filter_defs = list(self._l2def.get("l1b_pre_filtering", {}).values())
+        for filter_target in ["freeboard", "thickness"]:
+            filter_defs.extend(self._l2def.get("filter", {}).get(filter_target, {}).values())
+        algorithm_defs.extend([("pysiral.filter", filter_def) for filter_def in filter_defs])
+
+        # Compile the options with the option declaration of the algorithm class
+        for module_name, algorithm_def in algorithm_defs:
+            pyclass = get_cls(module_name, algorithm_def["pyclass"])
+            if pyclass is None:
+                continue
+            try:
+                compile_options(algorithm_def["options"], fields=pyclass.OPTION_FIELDS, name=algorithm_def["pyclass"])
+            except ValueError as ex:
+                self.error.add_error("invalid-l2-settings", str(ex))
+        self.error.raise_on_error()
 
     @property
     def run_tag(self):
@@ -735,6 +903,9 @@ class L2ProcessorReport(DefaultLoggingClass):
         self.l2_settings_file = "none"
         self.l1b_repository = "none"
 
+        # Cache statistics of the auxiliary data handlers
+        self.auxdata_cache_statistics = OrderedDict()
+
         # Counter for error codes
         # XXX: This is a first quick implementation of error codes
         #      (see pysiral.error_handler modules for more info) and
@@ -752,6 +923,10 @@ class L2ProcessorReport(DefaultLoggingClass):
         except:
             self.log.warning("Unknown error code (%s), ignoring" % error_code)
 
+    def add_auxdata_cache_statistics(self, auxhandler_id, statistics):
+        """ Add the cache statistics (dict with hits, misses, prefetched) of an auxdata handler """
+        self.auxdata_cache_statistics[auxhandler_id] = statistics
+
     def write_to_file(self, output_id, directory):
         """ Write a summary file to the defined export directory """
 
@@ -783,6 +958,14 @@ class L2ProcessorReport(DefaultLoggingClass):
             fhandle.write(lfmt % ("Level-2 settings", self.l2_settings_file))
             fhandle.write(lfmt % ("l1b repository", self.l1b_repository))
 
+            # Efficiency of the auxiliary data cache
+            if len(self.auxdata_cache_statistics) > 0:
+                fhandle.write("\n# Auxiliary Data Cache\n\n")
+                for auxhandler_id, statistics in self.auxdata_cache_statistics.items():
+                    cache_str = "%g hits, %g misses, %g prefetched" % (
+                        statistics["hits"], statistics["misses"], statistics["prefetched"])
+                    fhandle.write(lfmt % (auxhandler_id, cache_str))
+
             # List discarded files and reason (error code & description)
             fhandle.write("\n# Detailed Error Breakdown\n\n")
             msg = "  No %s output generated for %g l1b files due " + \
@@ -805,6 +988,7 @@ class L2ProcessorReport(DefaultLoggingClass):
         """ Remove all non-persistent parameter """
         self.data_period = None
         self.l1b_repository = "none"
+        self.auxdata_cache_statistics = OrderedDict()
         self._init_error_counters()
 
     def _init_error_counters(self):
@@ -9,36 +9,116 @@ from pysiral.config import get_yaml_config
 from pysiral.errorhandler import ErrorStatus
 from pysiral.grid import GridDefinition
 from pysiral.logging import DefaultLoggingClass
-from pysiral.l2data import L2iNCFileImport
+from pysiral.l2data import L2iNCFileImport, L2iColumnCache
 from pysiral.mask import L3Mask
 from pysiral.output import OutputHandlerBase, Level3Output
-from pysiral.flag import ORCondition
 from pysiral.surface_type import SurfaceType
 from pysiral.sit import frb2sit_errprop
 
-from scipy import stats
 from scipy.ndimage.filters import maximum_filter
+from logbook import StreamHandler
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from datetime import datetime, date
 from pathlib import Path
 import itertools
+import io
+import shutil
+import tempfile
 import uuid
 import numpy as np
 import sys
 import re
+import traceback
 
 
 # %% Level 3 Processor
 
 class Level3Processor(DefaultLoggingClass):
 
-    def __init__(self, product_def):
+    def __init__(self, product_def, l2i_cache_dir=None, workers=1):
+        """
+        :param product_def: Level3ProductDefinition instance
+        :param l2i_cache_dir: (optional) directory of the on-disk cache for decoded l2i columns
+            (shared with the Level-2 pre-processor, see pysiral.l2data.L2iColumnCache)
+        :param workers: Number of worker processes for the period segments (see process_period_segments)
+            or for the grid tiles of the out-of-core l2i data stack of a single period (1: serial processing)
+        """
         super(Level3Processor, self).__init__(self.__class__.__name__)
         self.error = ErrorStatus(caller_id=self.__class__.__name__)
         self._job = product_def
+        self._workers = workers
         self._l3_progress_percent = 0.0
 
+        # Flag for processor instances in the worker processes of process_period_segments
+        self._is_period_worker = False
+
+        # Optional cache for decoded l2i columns
+        self._l2i_cache = L2iColumnCache(l2i_cache_dir) if l2i_cache_dir is not None else None
+
+    def process_period_segments(self, l2i_handler, period_segments, period_id):
+        """
+        Process all period segments. The period segments are independent and are processed in
+        parallel by worker processes if the number of workers is larger than one. The log
+        messages of each period segment are collected in the worker processes and written
+        in the order of the period segments (output filenames do not depend on the processing order).
+        :param l2i_handler: pysiral.datahandler.L2iDataHandler instance
+        :param period_segments: list of time ranges
+        :param period_id: The id of the period (e.g. month) for the log messages
+        :return: None
+        """
+
+        period_segments = list(period_segments)
+        n_periods = len(period_segments)
+
+        # Serial mode
+        if self._workers <= 1 or n_periods <= 1:
+            for i in range(n_periods):
+                self.process_period(l2i_handler, period_segments, i, period_id)
+            return
+
+        # Parallel mode: The worker processes inherit the processor, the l2i handler and the
+        # period segments and only the index of the period segment is passed for each task
+        workers = min(self._workers, n_periods)
+        self.log.info("Process %g %s periods with %g worker processes" % (n_periods, period_id, workers))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_l3_period_worker,
+                                 initargs=(self, l2i_handler, period_segments, period_id)) as executor:
+            for i, (log_messages, error_traceback) in enumerate(
+                    executor.map(_process_l3_period_in_worker, range(n_periods))):
+                sys.stdout.write(log_messages)
+                sys.stdout.flush()
+                if error_traceback is not None:
+                    msg = "Processing of %s period %s failed in worker process:\n%s"
+                    raise RuntimeError(msg % (period_id, period_segments[i].date_label, error_traceback))
+
+    def process_period(self, l2i_handler, period_segments, i, period_id):
+        """
+        Process a single period segment
+        :param l2i_handler: pysiral.datahandler.L2iDataHandler instance
+        :param period_segments: list of time ranges
+        :param i: The index of the period segment
+        :param period_id: The id of the period (e.g. month) for the log messages
+        :return: None
+        """
+
+        # Report processing period
+        time_range = period_segments[i]
+        msg = "# Processing %s period (%g of %g): %s"
+        msg = msg % (period_id, i+1, len(period_segments), time_range.date_label)
+        self.log.info(msg)
+
+        # Retrieve files
+        l2i_files = l2i_handler.get_files_from_time_range(time_range)
+        self.log.info("Num l2i files: %g" % len(l2i_files))
+        if len(l2i_files) == 0:
+            self.log.info("Skip data period")
+            return
+
+        # Start the Level-3 processing
+        self.process_l2i_files(l2i_files, time_range)
+
     def process_l2i_files(self, l2i_files, period):
         """
         The main call for the Level-3 processor
@@ -53,82 +133,212 @@ class Level3Processor(DefaultLoggingClass):
 
         # Store
         self._period = period
+        self._l3_progress_percent = 0.0
 
-        # Initialize the stack for the l2i orbit files
+        # Initialize the stacks for the l2i orbit files (one for each grid that is not aggregated
+        # from a nested finer grid)
         self.log.info("Initialize l2i data stack")
-        stack = L2iDataStack(self._job.grid, self._job.l2_parameter)
+        stack_parameters, statistics = self._get_l2i_stack_definition()
+        quantile_sketch = self._job.l3def.grid_settings.get("quantile_sketch", None)
+        grid_sources = self._get_grid_sources()
+        stack_class, stack_options = self._get_l2i_stack_class()
+        stacks = {}
+        for grid_index, (grid, source_index, factor) in enumerate(grid_sources):
+            if source_index is None:
+                stacks[grid_index] = stack_class(grid, self._job.l2_parameter, stack_parameters=stack_parameters,
+                                                 statistics=statistics, quantile_sketch=quantile_sketch,
+                                                 **stack_options)
 
-        self.log.info("Parsing products (prefilter active: %s)" % (str(self._job.l3def.l2i_prefilter.active)))
+        try:
+            self.log.info("Parsing products (prefilter active: %s)" % (str(self._job.l3def.l2i_prefilter.active)))
 
-        # Parse all orbit files and add to the stack
-        for i, l2i_file in enumerate(l2i_files):
+            # Parse all orbit files and add to the stack
+            for i, l2i_file in enumerate(l2i_files):
 
-            self._log_progress(i)
+                self._log_progress(i)
 
-            # Parse l2i source file
-            try:
-                l2i = L2iNCFileImport(l2i_file)
-            except AttributeError:
-                self.log.warning("Attribute Error encountered in %s" % l2i_file)
-                continue
+                # Parse l2i source file
+                try:
+                    l2i = L2iNCFileImport(l2i_file, disk_cache=self._l2i_cache)
+                except AttributeError:
+                    self.log.warning("Attribute Error encountered in %s" % l2i_file)
+                    continue
 
-            # Apply the orbit filter (for masking descending or ascending orbit segments)
-            # NOTE: This tag may not be present in all level-3 settings files, as it has
-            #       been added as a test case
-            try:
-                orbitfilter = self._job.l3def.orbit_filter
-                orbitfilter_is_active = orbitfilter.active
-            except AttributeError:
-                orbitfilter_is_active = False
+                # Apply the orbit filter (for masking descending or ascending orbit segments)
+                # NOTE: This tag may not be present in all level-3 settings files, as it has
+                #       been added as a test case
+                try:
+                    orbitfilter = self._job.l3def.orbit_filter
+                    orbitfilter_is_active = orbitfilter.active
+                except AttributeError:
+                    orbitfilter_is_active = False
+
+                if orbitfilter_is_active:
+
+                    # Display warning if filter is active
+                    self.log.warning("Orbit filter is active [%s]" % str(orbitfilter.mask_orbits))
+
+                    # Get indices to filter
+                    if orbitfilter.mask_orbits == "ascending":
+                        indices = np.where(np.ediff1d(l2i.latitude) > 0.)[0]
+                    elif orbitfilter.mask_orbits == "descending":
+                        indices = np.where(np.ediff1d(l2i.latitude) < 0.)[0]
+                    else:
+                        self.log.error(
+                            "Invalid orbit filter target, needs to be [ascending, descending], Skipping filter ...")
+                        indices = []
+
+                    # Filter geophysical parameters only
+                    targets = l2i.parameter_list
+                    non_targets = ["longitude", "latitude", "timestamp", "time", "surface_type"]
+                    for grid in self._job.grids:
+                        non_targets.extend(grid.grid_index_parameter_names)
+                    for non_target in non_targets:
+                        try:
+                            targets.remove(non_target)
+                        except ValueError:
+                            pass
+                    l2i.mask_variables(indices, targets)
+
+                # Prefilter l2i product
+                # Note: In the l2i product only the minimum set of nan are used
+                #       for different parameters (e.g. the radar freeboard mask
+                #       does not equal the thickness mask). This leads to
+                #       inconsistent results during gridding and therefore it is
+                #       highly recommended to harmonize the mask for thickness
+                #       and the different freeboard levels
+                prefilter = self._job.l3def.l2i_prefilter
+                if prefilter.active:
+                    l2i.transfer_nan_mask(prefilter.nan_source, prefilter.nan_targets)
+                # Add to stack(s)
+                for stack in stacks.values():
+                    stack.add(l2i)
+
+            for grid_index, (grid, source_index, factor) in enumerate(grid_sources):
+
+                # Aggregate the stack of nested grids from the finer grid
+                if source_index is not None:
+                    self.log.info("Aggregate l2i data stack of %s from %s (%gx%g grid cells)" % (
+                        grid.grid_id, grid_sources[source_index][0].grid_id, factor, factor))
+                    stack = stacks[source_index].get_aggregated(grid, factor)
+                else:
+                    stack = stacks[grid_index]
+                    self.log.info("Grid indices stored in l2i files used for %g of %g files (%s)" % (
+                        stack.n_l2i_grid_indices, stack.l2i_count, grid.grid_id))
 
-            if orbitfilter_is_active:
+                # Initialize the data grid
+                self.log.info("Initialize l3 data grid (%s)" % grid.grid_id)
+                l3 = L3DataGrid(self._job, stack, period)
 
-                # Display warning if filter is active
-                self.log.warning("Orbit filter is active [%s]" % str(orbitfilter.mask_orbits))
+                # Apply the processing items
+                self._apply_processing_items(l3)
 
-                # Get indices to filter
-                if orbitfilter.mask_orbits == "ascending":
-                    indices = np.where(np.ediff1d(l2i.latitude) > 0.)[0]
-                elif orbitfilter.mask_orbits == "descending":
-                    indices = np.where(np.ediff1d(l2i.latitude) < 0.)[0]
-                else:
-                    self.log.error(
-                        "Invalid orbit filter target, needs to be [ascending, descending], Skipping filter ...")
-                    indices = []
-
-                # Filter geophysical parameters only
-                targets = l2i.parameter_list
-                for non_target in ["longitude", "latitude", "timestamp", "time", "surface_type"]:
-                    try:
-                        targets.remove(non_target)
-                    except ValueError:
-                        pass
-                l2i.mask_variables(indices, targets)
-
-            # Prefilter l2i product
-            # Note: In the l2i product only the minimum set of nan are used
-            #       for different parameters (e.g. the radar freeboard mask
-            #       does not equal the thickness mask). This leads to
-            #       inconsistent results during gridding and therefore it is
-            #       highly recommended to harmonize the mask for thickness
-            #       and the different freeboard levels
-            prefilter = self._job.l3def.l2i_prefilter
-            if prefilter.active:
-                l2i.transfer_nan_mask(prefilter.nan_source, prefilter.nan_targets)
-            # Add to stack
-            stack.add(l2i)
-
-        # Initialize the data grid
-        self.log.info("Initialize l3 data grid")
-        l3 = L3DataGrid(self._job, stack, period)
-
-        # Apply the processing items
-        self._apply_processing_items(l3)
-
-        # Write output(s)
-        for output_handler in self._job.outputs:
-            output = Level3Output(l3, output_handler)
-            self.log.info("Write %s product: %s" % (output_handler.id, output.export_filename))
+                # Write output(s)
+                for output_handler in self._job.outputs:
+                    output = Level3Output(l3, output_handler)
+                    self.log.info("Write %s product: %s" % (output_handler.id, output.export_filename))
+
+                if source_index is not None:
+                    stack.close()
+
+        finally:
+            # Remove the spill files of the out-of-core l2i data stacks
+            for stack in stacks.values():
+                stack.close()
+
+    def _get_l2i_stack_definition(self):
+        """
+        Returns the l2 parameters that need to be stacked (all values per grid cell) and the running grid cell
+        statistics. Without the streaming mode (option `grid_settings.streaming` in the Level-3 processor
+        definition) all l2 parameters are stacked. In streaming mode only parameters of grid methods and
+        processing items that cannot be computed from running grid cell statistics are stacked.
+        :return: list of stack parameters, dictionary {parameter name: list of statistics} or None
+        """
+
+        l2_parameter = self._job.l2_parameter
+        if not self._job.l3def.grid_settings.get("streaming", False):
+            return list(l2_parameter.keys()), None
+
+        stack_parameters, statistics = [], {}
+
+        def add_statistics(parameter_name, statistic_ids):
+            statistics.setdefault(parameter_name, [])
+            statistics[parameter_name].extend([s for s in statistic_ids if s not in statistics[parameter_name]])
+
+        def add_stack_parameters(parameter_names):
+            stack_parameters.extend([p for p in parameter_names if p not in stack_parameters])
+
+        # Grid methods
+        for parameter_name in l2_parameter.keys():
+            if l2_parameter[parameter_name]["grid_method"] == "none":
+                continue
+            statistic_ids = L3DataGrid.get_streaming_statistics(l2_parameter[parameter_name])
+            if statistic_ids is not None:
+                add_statistics(parameter_name, statistic_ids)
+            else:
+                add_stack_parameters([parameter_name])
+
+        # Processing items
+        for pitem in self._job.l3def.get("processing_items", None) or []:
+            pp_class = get_cls(pitem["module_name"], pitem["class_name"], relaxed=False)
+            if pp_class.l2_streaming_statistics is None:
+                add_stack_parameters(pp_class.get_l2_stack_parameters(**pitem["options"]))
+            else:
+                for parameter_name, statistic_ids in pp_class.l2_streaming_statistics.items():
+                    add_statistics(parameter_name, statistic_ids)
+
+        # Only l2 parameters are stacked
+        stack_parameters = [p for p in stack_parameters if p in l2_parameter]
+        self.log.info("Streaming mode: stacked l2 parameters: [%s]" % ", ".join(stack_parameters))
+        return stack_parameters, statistics
+
+    def _get_l2i_stack_class(self):
+        """
+        Returns the class of the l2i data stack and its options. With the option `grid_settings.out_of_core.active`
+        in the Level-3 processor definition, the stacked records are spilled to disk per grid tile
+        (see L2iTileSpillStack), otherwise all records are kept in memory. The number of workers of the
+        processor (if larger than one) overrides the number of workers for the grid tiles. The grid tiles
+        are always processed serially in the worker processes of the period segments (no nested process pools).
+        :return: L2iDataStack or L2iTileSpillStack, dictionary with options for the out-of-core stack
+        """
+        out_of_core = self._job.l3def.grid_settings.get("out_of_core", None)
+        if out_of_core is None or not out_of_core.get("active", False):
+            return L2iDataStack, {}
+        stack_options = dict(out_of_core)
+        stack_options.pop("active")
+        if self._is_period_worker:
+            stack_options["workers"] = 1
+        elif self._workers > 1:
+            stack_options["workers"] = self._workers
+        self.log.info("Out-of-core mode: spill l2i data stack to disk [%s]" % ", ".join(
+            "%s=%s" % (key, str(value)) for key, value in sorted(stack_options.items())))
+        return L2iTileSpillStack, stack_options
+
+    def _get_grid_sources(self):
+        """
+        Returns the source of the l2i data stack for each grid of the Level-3 job. With the option
+        `grid_settings.aggregate_nested_grids` in the Level-3 processor definition, the stack of a grid
+        is aggregated from the stack of the finest grid that it nests (see
+        pysiral.grid.GridDefinition.get_nesting_factor). All other grids are stacked from the l2i files.
+        :return: list of (grid definition, index of the source grid or None, nesting factor or None)
+        """
+        grids = self._job.grids
+        aggregate_nested_grids = self._job.l3def.grid_settings.get("aggregate_nested_grids", False)
+        grid_sources = [(grid, None, None) for grid in grids]
+        if not aggregate_nested_grids:
+            return grid_sources
+
+        # Grids are only aggregated from grids that are stacked from the l2i files
+        for grid_index in sorted(range(len(grids)), key=lambda i: grids[i].extent.dx):
+            grid = grids[grid_index]
+            for source_index in sorted(range(len(grids)), key=lambda i: grids[i].extent.dx):
+                if grid_sources[source_index][1] is not None:
+                    continue
+                factor = grid.get_nesting_factor(grids[source_index])
+                if factor is not None:
+                    grid_sources[grid_index] = (grid, source_index, factor)
+                    break
+        return grid_sources
 
     def _log_progress(self, i):
         """ Concise logging on the progress of l2i stack creation """
@@ -164,19 +374,69 @@ class Level3Processor(DefaultLoggingClass):
             processing_items.apply()
 
 
+# Level-3 processor instance (and l2i handler, period segments & period id) in the worker
+# processes of the parallel mode of Level3Processor.process_period_segments
+_L3_PERIOD_WORKER = None
+
+
+def _init_l3_period_worker(l3proc, l2i_handler, period_segments, period_id):
+    global _L3_PERIOD_WORKER
+    # No nested process pools: The grid tiles are processed serially in the worker processes
+    # (also if the number of workers for the grid tiles is set in the Level-3 processor definition)
+    l3proc._workers = 1
+    l3proc._is_period_worker = True
+    _L3_PERIOD_WORKER = (l3proc, l2i_handler, period_segments, period_id)
+
+
+def _process_l3_period_in_worker(i):
+    """ Process a period segment and return the log messages and the traceback of an
+    exception during processing (None if successful) """
+    l3proc, l2i_handler, period_segments, period_id = _L3_PERIOD_WORKER
+    log_messages = io.StringIO()
+    log_handler = StreamHandler(log_messages)
+    error_traceback = None
+    # All log messages (also of logging classes created during processing) go to the buffer
+    with redirect_stdout(log_messages), log_handler.applicationbound():
+        try:
+            l3proc.process_period(l2i_handler, period_segments, i, period_id)
+        # NOTE: Errors of the error handler end with SystemExit (pysiral.errorhandler.ErrorStatus.raise_on_error)
+        except BaseException:
+            error_traceback = traceback.format_exc()
+        finally:
+            _pop_application_handlers(log_handler)
+    return log_messages.getvalue(), error_traceback
+
+
+def _pop_application_handlers(log_handler):
+    """ Pop the log handlers that have been pushed on top of `log_handler` (each logging class
+    pushes a handler, see pysiral.logging.DefaultLoggingClass) """
+    for handler in list(log_handler.stack_manager.iter_context_objects()):
+        if handler is log_handler:
+            break
+        handler.pop_application()
+
+
 # %% Data Containers
 
 class L2iDataStack(DefaultLoggingClass):
 
-    def __init__(self, griddef, l2_parameter):
+    def __init__(self, griddef, l2_parameter, stack_parameters=None, statistics=None, quantile_sketch=None):
         """ A container for stacking l2i variables (geophysical parameter at sensor resolution) in L3 grid cells.
         For each parameters a (numx, numy) array is created, with an list containing all l2i data points that
         fall into the grid cell area. This list can be averaged or used for histogram computation in later stages
         of the Level-3 processor.
 
+        Optionally, running statistics per grid cell can be computed instead of (or in addition to) the stack
+        (streaming mode). The memory of the running statistics does not depend on the number of l2i files.
+
         Args:
             griddef (obj): pysiral.grid.GridDefinition or inheritated objects
             l2_parameter (str list): list of l2i parameter names
+            stack_parameters (str list): list of stacked parameter names (default: all l2i parameters)
+            statistics (dict): {parameter name: list of statistics} for the running grid cell statistics
+                (see L2iGridStatistics, default: None)
+            quantile_sketch (dict): options for the quantile sketch of the running grid cell statistics
+                (see GridCellQuantileSketch, default: None)
 
         Returns:
             class instance
@@ -189,10 +449,19 @@ class L2iDataStack(DefaultLoggingClass):
 
         # A list of level-2 parameters to be stacked
         self.l2_parameter = l2_parameter
+        if stack_parameters is None:
+            stack_parameters = list(l2_parameter.keys())
+        self.stack_parameters = stack_parameters
+
+        # Running statistics per grid cell (streaming mode)
+        self.statistics = None
+        if statistics is not None:
+            self.statistics = L2iGridStatistics(griddef, statistics, quantile_sketch=quantile_sketch)
 
         # Statistics
         self._n_records = 0
         self._l2i_count = 0
+        self._n_l2i_grid_indices = 0
         self.start_time = []
         self.stop_time = []
         self.mission = []
@@ -203,6 +472,9 @@ class L2iDataStack(DefaultLoggingClass):
         # on auxdata remains the same)
         self._l2i_info = None
 
+        # Cache for the stacked records as flat arrays grouped by grid cell
+        self._cell_records = {}
+
         # Create parameter stacks
         self._initialize_stacks()
 
@@ -214,7 +486,7 @@ class L2iDataStack(DefaultLoggingClass):
         self.stack = {}
 
         # create a stack for each l2 parameter
-        for parameter_name in self.l2_parameter.keys():
+        for parameter_name in self.stack_parameters:
             self.stack[parameter_name] = self.parameter_stack
 
     def add(self, l2i):
@@ -238,26 +510,112 @@ class L2iDataStack(DefaultLoggingClass):
         self.timeliness.append(l2i.timeliness)
         self._l2i_count += 1
         self._n_records += l2i.n_records
+        self._cell_records = {}
 
         self._l2i_info = l2i.info
 
         # Get projection coordinates for l2i locations
-        xi, yj = self.griddef.grid_indices(l2i.longitude, l2i.latitude)
+        xi, yj = self.get_grid_indices(l2i)
+        if all(hasattr(l2i, name) for name in self.griddef.grid_index_parameter_names):
+            self._n_l2i_grid_indices += 1
+
+        # Update the running statistics
+        if self.statistics is not None:
+            self.statistics.add(l2i, xi, yj)
 
         # Stack the l2 parameter in the corresponding grid cells
-        for i in np.arange(l2i.n_records):
+        if len(self.stack_parameters) == 0:
+            return
+        self._add_records(l2i, xi, yj)
+
+    def _add_records(self, l2i, xi, yj):
+        """ Add the records of the stacked l2 parameters to the lists of the grid cells """
+        in_grid = self.get_in_grid(xi, yj)
+        for i in np.flatnonzero(in_grid):
 
             # Add the surface type per default
             # (will not be gridded, therefore not in list of l2 parameter)
             x, y = int(xi[i]), int(yj[i])
 
-            for parameter_name in self.l2_parameter.keys():
+            for parameter_name in self.stack_parameters:
                 try:
                     data = getattr(l2i, parameter_name)
                     self.stack[parameter_name][y][x].append(data[i])
                 except AttributeError:
                     pass
 
+    def get_in_grid(self, xi, yj):
+        """ Returns a boolean array that is True for grid indices inside the grid (grid indices of invalid
+        positions are NaN or -1 for stored grid indices) """
+        numx, numy = self.griddef.extent.numx, self.griddef.extent.numy
+        xi, yj = np.asarray(xi), np.asarray(yj)
+        return np.logical_and.reduce([np.isfinite(xi), np.isfinite(yj), xi >= 0, xi < numx, yj >= 0, yj < numy])
+
+    def get_grid_indices(self, l2i):
+        """
+        Returns the grid indices of the l2i records. Grid indices stored in the l2i file for the grid id
+        of the grid definition (see pysiral.grid.L2GridIndices) are used instead of the projection of
+        longitude/latitude.
+        :param l2i: l2i object (currently: pysiral.l2data.L2iNCFileImport)
+        :return: x and y grid indices of the l2i records
+        """
+        try:
+            xi, yj = [getattr(l2i, name) for name in self.griddef.grid_index_parameter_names]
+        except AttributeError:
+            return self.griddef.grid_indices(l2i.longitude, l2i.latitude)
+        return np.ma.getdata(xi), np.ma.getdata(yj)
+
+    def get_aggregated(self, griddef, factor):
+        """
+        Returns the l2i data stack of a coarser grid definition by aggregating the stacked records and the
+        running grid cell statistics of n x n grid cells of this stack (nested grids, see
+        pysiral.grid.GridDefinition.get_nesting_factor). The records of a coarse grid cell are ordered
+        by the grid cells of this stack.
+        :param griddef: grid definition of the coarser grid
+        :param factor: nesting factor n
+        :return: L2iDataStack instance
+        """
+        stack = L2iDataStack(griddef, self.l2_parameter, stack_parameters=self.stack_parameters)
+        for name in ["_n_records", "_l2i_count", "_n_l2i_grid_indices", "start_time", "stop_time", "mission",
+                     "timeliness", "_l2i_info"]:
+            setattr(stack, name, getattr(self, name))
+        if self.statistics is not None:
+            stack.statistics = self.statistics.get_aggregated(griddef, factor)
+        for parameter_name in self.stack_parameters:
+            target = stack.stack[parameter_name]
+            for yj, row in enumerate(self.stack[parameter_name]):
+                target_row = target[yj // factor]
+                for xi, records in enumerate(row):
+                    target_row[xi // factor].extend(records)
+        return stack
+
+    def has_parameter(self, parameter_name):
+        """ Returns True if the parameter is either stacked or has running grid cell statistics """
+        if parameter_name in self.stack_parameters:
+            return True
+        return self.statistics is not None and parameter_name in self.statistics.parameter_names
+
+    def get_cell_records(self, parameter_name):
+        """
+        Returns the stacked records of a l2 parameter as flat arrays grouped by grid cell. The records
+        are sorted by the flat grid cell index (yj * numx + xi) and have the order of the stack within
+        each grid cell. Stacked parameters of the same l2i records therefore share the grid cell index.
+        :param parameter_name: name of the stacked l2 parameter
+        :return: flat grid cell index and values of all records
+        """
+        if parameter_name not in self._cell_records:
+            stack = self.stack[parameter_name]
+            cell_stacks = list(itertools.chain.from_iterable(stack))
+            n_records = np.array([len(records) for records in cell_stacks], dtype=np.int64)
+            cell_index = np.repeat(np.arange(self.n_cells), n_records)
+            values = np.array(list(itertools.chain.from_iterable(cell_stacks)))
+            self._cell_records[parameter_name] = (cell_index, values)
+        return self._cell_records[parameter_name]
+
+    def close(self):
+        """ Release resources of the stack (no resources for the in-memory stack) """
+        pass
+
     @property
     def n_total_records(self):
         return self._n_records
@@ -266,6 +624,11 @@ class L2iDataStack(DefaultLoggingClass):
     def l2i_count(self):
         return self._l2i_count
 
+    @property
+    def n_l2i_grid_indices(self):
+        """ The number of l2i files with stored grid indices for the grid id """
+        return self._n_l2i_grid_indices
+
     @property
     def parameter_stack(self):
         dimx, dimy = self.griddef.extent.numx, self.griddef.extent.numy
@@ -275,6 +638,633 @@ class L2iDataStack(DefaultLoggingClass):
     def l2i_info(self):
         return self._l2i_info
 
+    @property
+    def shape(self):
+        return self.griddef.extent.numy, self.griddef.extent.numx
+
+    @property
+    def n_cells(self):
+        return self.griddef.extent.numx * self.griddef.extent.numy
+
+
+class L2iTileSpillStack(L2iDataStack):
+    """
+    Out-of-core variant of the l2i data stack. The records of the stacked l2 parameters are partitioned
+    by grid tiles (tile_size x tile_size grid cells) and buffered in memory. If the buffer exceeds the
+    memory budget, the records are appended to binary spill files per tile and parameter (raw arrays of
+    the flat grid cell index and the values, datetime objects as datetime64[us]).
+
+    Each tile is gridded independently (optionally in parallel worker processes). The gridded parameters
+    and the records of the grid cells (`get_cell_records`) are identical to the in-memory l2i data stack.
+
+    NOTE: Records outside the grid are ignored
+    """
+
+    def __init__(self, griddef, l2_parameter, stack_parameters=None, statistics=None, quantile_sketch=None,
+                 spill_directory=None, tile_size=64, memory_budget=256, workers=1):
+        """
+        See L2iDataStack for the other arguments
+        :param spill_directory: parent directory of the spill files (default: system temp directory)
+        :param tile_size: number of grid cells in x and y direction of each tile
+        :param memory_budget: maximum size of the in-memory record buffer in MB
+        :param workers: number of worker processes for gridding the tiles (1: serial processing)
+        """
+        self.tile_size = tile_size
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self._spill_root = spill_directory
+        if spill_directory is not None:
+            Path(spill_directory).mkdir(parents=True, exist_ok=True)
+        self.spill_directory = Path(tempfile.mkdtemp(prefix="l2i_spill_", dir=spill_directory))
+
+        # Record buffer {(tile index, parameter name): list of (cell index, values)}
+        self._buffer = {}
+        self._buffer_size = 0
+        self._dtypes = {}
+        self._tiles = set()
+
+        super(L2iTileSpillStack, self).__init__(griddef, l2_parameter, stack_parameters=stack_parameters,
+                                                statistics=statistics, quantile_sketch=quantile_sketch)
+
+    def _initialize_stacks(self):
+        """ No per grid cell lists (the records are in the spill files) """
+        self.stack = {}
+
+    def _add_records(self, l2i, xi, yj):
+        """ Add the records of the stacked l2 parameters to the buffer of the grid tiles """
+        xi, yj = np.asarray(xi), np.asarray(yj)
+        in_grid = self.get_in_grid(xi, yj)
+        xi, yj = xi[in_grid].astype(np.int64), yj[in_grid].astype(np.int64)
+        for parameter_name in self.stack_parameters:
+            try:
+                values = getattr(l2i, parameter_name)
+            except AttributeError:
+                continue
+            if np.ma.isMaskedArray(values) and values.dtype.kind == "f":
+                values = values.filled(np.nan)
+            self._add_cell_records(parameter_name, xi, yj, np.asarray(values)[in_grid])
+
+    def _add_cell_records(self, parameter_name, xi, yj, values):
+        """ Partition records of a l2 parameter by grid tile and add them to the buffer """
+
+        # The dtype of the spill file is defined by the first records
+        if values.dtype.kind == "O":
+            values = values.astype("datetime64[us]")
+        dtype = self._dtypes.setdefault(parameter_name, values.dtype)
+        values = values.astype(dtype, copy=False)
+
+        cell_index = (yj * self.griddef.extent.numx + xi).astype(np.int32)
+        tile_index = (yj // self.tile_size) * self.n_tiles_x + xi // self.tile_size
+        order = np.argsort(tile_index, kind="stable")
+        tiles, tile_start = np.unique(tile_index[order], return_index=True)
+        for tile, indices in zip(tiles, np.split(order, tile_start[1:])):
+            self._buffer.setdefault((tile, parameter_name), []).append((cell_index[indices], values[indices]))
+            self._buffer_size += cell_index[indices].nbytes + values[indices].nbytes
+            self._tiles.add(tile)
+
+        if self._buffer_size > self.memory_budget * 1.0e6:
+            self.flush()
+
+    def flush(self):
+        """ Append the buffered records to the spill files """
+        for (tile, parameter_name), chunks in self._buffer.items():
+            cell_index, values = zip(*chunks)
+            for filepath, data in zip(self._get_spill_filepaths(tile, parameter_name), [cell_index, values]):
+                with open(str(filepath), "ab") as fh:
+                    np.concatenate(data).tofile(fh)
+        self._buffer = {}
+        self._buffer_size = 0
+
+    def get_tile_records(self, tile, parameter_name):
+        """
+        Returns the records of a l2 parameter in a grid tile sorted by grid cell (order of the stack
+        within each grid cell)
+        :param tile: tile index
+        :param parameter_name: name of the stacked l2 parameter
+        :return: flat grid cell index and values of all records of the tile
+        """
+        self.flush()
+        return _read_spill_tile(self._get_spill_filepaths(tile, parameter_name), self._dtypes.get(parameter_name))
+
+    def get_cell_records(self, parameter_name):
+        """
+        Returns the stacked records of a l2 parameter as flat arrays grouped by grid cell from the spill files
+        (see L2iDataStack.get_cell_records)
+        :param parameter_name: name of the stacked l2 parameter
+        :return: flat grid cell index and values of all records
+        """
+        if parameter_name not in self._cell_records:
+            records = [self.get_tile_records(tile, parameter_name) for tile in sorted(self._tiles)]
+            records = [r for r in records if len(r[0]) > 0]
+            if len(records) == 0:
+                self._cell_records[parameter_name] = (np.empty(0, dtype=np.int64), np.empty(0))
+                return self._cell_records[parameter_name]
+            cell_index, values = [np.concatenate(data) for data in zip(*records)]
+            order = np.argsort(cell_index, kind="stable")
+            cell_index, values = cell_index[order], values[order]
+            if values.dtype.kind == "M":
+                values = values.astype(object)
+            self._cell_records[parameter_name] = (cell_index, values)
+        return self._cell_records[parameter_name]
+
+    def get_gridded_parameter(self, parameter_name, pardef, minimum_valid_grid_points):
+        """
+        Grids a stacked l2 parameter tile by tile (see L3DataGrid.grid_l2_parameter)
+        :param parameter_name: name of the stacked l2 parameter
+        :param pardef: l2 parameter definition (grid_method, ...)
+        :param minimum_valid_grid_points: minimum number of valid records per grid cell
+        :return: flat grid cell index and list of gridded values
+        """
+        self.flush()
+        pardef = dict(pardef)
+        args = [(self._get_spill_filepaths(tile, parameter_name), self._dtypes.get(parameter_name), pardef,
+                 minimum_valid_grid_points) for tile in sorted(self._tiles)]
+        if self.workers <= 1:
+            results = [_grid_spill_tile(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_grid_spill_tile, *zip(*args)))
+        cell_index = np.concatenate([result[0] for result in results] or [np.empty(0, dtype=np.int64)])
+        values = list(itertools.chain.from_iterable(result[1] for result in results))
+        return cell_index, values
+
+    def get_aggregated(self, griddef, factor):
+        """
+        Returns the out-of-core l2i data stack of a coarser grid definition by aggregating n x n grid cells
+        of this stack (see L2iDataStack.get_aggregated). The records of a coarse grid cell are ordered by
+        the tiles and grid cells of this stack.
+        :param griddef: grid definition of the coarser grid
+        :param factor: nesting factor n
+        :return: L2iTileSpillStack instance
+        """
+        stack = L2iTileSpillStack(griddef, self.l2_parameter, stack_parameters=self.stack_parameters,
+                                  spill_directory=self._spill_root, tile_size=self.tile_size,
+                                  memory_budget=self.memory_budget, workers=self.workers)
+        for name in ["_n_records", "_l2i_count", "_n_l2i_grid_indices", "start_time", "stop_time", "mission",
+                     "timeliness", "_l2i_info"]:
+            setattr(stack, name, getattr(self, name))
+        if self.statistics is not None:
+            stack.statistics = self.statistics.get_aggregated(griddef, factor)
+        for parameter_name in self.stack_parameters:
+            for tile in sorted(self._tiles):
+                cell_index, values = self.get_tile_records(tile, parameter_name)
+                yj, xi = np.divmod(cell_index.astype(np.int64), self.griddef.extent.numx)
+                stack._add_cell_records(parameter_name, xi // factor, yj // factor, values)
+        return stack
+
+    def close(self):
+        """ Remove the spill files """
+        self._buffer = {}
+        shutil.rmtree(str(self.spill_directory), ignore_errors=True)
+
+    def _get_spill_filepaths(self, tile, parameter_name):
+        """ Spill files of the grid cell index and the values of a l2 parameter in a tile """
+        basename = "tile_%06g_%s" % (tile, parameter_name)
+        return self.spill_directory / (basename + "_cell.bin"), self.spill_directory / (basename + "_values.bin")
+
+    @property
+    def n_tiles_x(self):
+        return int(np.ceil(self.griddef.extent.numx / float(self.tile_size)))
+
+    @property
+    def n_tiles_y(self):
+        return int(np.ceil(self.griddef.extent.numy / float(self.tile_size)))
+
+
+def _read_spill_tile(filepaths, dtype):
+    """ Read the records of a tile spill file sorted by grid cell (stable, keeps the order of the records) """
+    cell_filepath, values_filepath = filepaths
+    if dtype is None or not cell_filepath.is_file():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=dtype)
+    cell_index = np.fromfile(str(cell_filepath), dtype=np.int32).astype(np.int64)
+    values = np.fromfile(str(values_filepath), dtype=dtype)
+    order = np.argsort(cell_index, kind="stable")
+    return cell_index[order], values[order]
+
+
+def _grid_spill_tile(filepaths, dtype, pardef, minimum_valid_grid_points):
+    """ Grid the records of a tile spill file (can be run in worker processes) """
+    cell_index, values = _read_spill_tile(filepaths, dtype)
+    if values.dtype.kind == "M":
+        values = values.astype(object)
+    cells, cell_start = np.unique(cell_index, return_index=True)
+    gridded_cells, gridded_values = [], []
+    for cell, data in zip(cells, np.split(values, cell_start[1:])):
+        valid = np.where(np.isfinite(data))[0]
+        if len(valid) < minimum_valid_grid_points:
+            continue
+        gridded_cells.append(cell)
+        gridded_values.append(get_grid_cell_value(data, valid, pardef))
+    return np.array(gridded_cells, dtype=np.int64), gridded_values
+
+
+def get_grid_cell_value(data, valid, pardef):
+    """
+    Returns the gridded value of the l2 records of a grid cell (see L3DataGrid.grid_l2_parameter)
+    :param data: values of the l2 parameter in the grid cell
+    :param valid: indices of the finite values
+    :param pardef: l2 parameter definition (grid_method, ...)
+    :return: gridded value
+    """
+    grid_method = pardef["grid_method"]
+    if grid_method == "average":
+        return np.nanmean(data)
+    elif grid_method == "average_uncertainty":
+        return np.abs(np.sqrt(1. / np.sum(data[valid])))
+    elif grid_method == "unique":
+        return np.unique(data)
+    elif grid_method == "median":
+        return np.nanmedian(data)
+    elif grid_method == "quantile":
+        return np.nanquantile(data, pardef["quantile"])
+    raise ValueError("Invalid grid method (%s)" % str(grid_method))
+
+
+class L2iGridStatistics(object):
+    """
+    Running statistics of l2i parameters per grid cell. The statistics are updated with each
+    l2i file and only the accumulators (one value per grid cell and statistic) are kept in memory.
+
+    Available statistics:
+
+        count: number of finite values
+        sum: sum of finite values
+        sum_squares: sum of squares of finite values
+        weight: sum of inverse squares of finite values (inverse variance weight of uncertainties)
+        count_negative: number of values below zero
+        flag_count: number of values per flag value (e.g. surface type, exact quantiles of integer values)
+        quantiles: approximate quantiles of finite values (see GridCellQuantileSketch)
+
+    NOTE: Records outside the grid are ignored
+    """
+
+    statistic_ids = ["count", "sum", "sum_squares", "weight", "count_negative", "flag_count", "quantiles"]
+
+    def __init__(self, griddef, statistics, quantile_sketch=None):
+        """
+        :param griddef: pysiral.grid.GridDefinition or inheritated objects
+        :param statistics: dictionary {parameter name: list of statistics}
+        :param quantile_sketch: dictionary with options for the quantile sketch (see GridCellQuantileSketch)
+        """
+
+        self.error = ErrorStatus(caller_id=self.__class__.__name__)
+        self.griddef = griddef
+        self.statistics = statistics
+        self.quantile_sketch = quantile_sketch
+        for parameter_name, statistic_ids in statistics.items():
+            for statistic_id in statistic_ids:
+                if statistic_id not in self.statistic_ids:
+                    msg = "Invalid grid cell statistic `%s` for %s" % (statistic_id, parameter_name)
+                    self.error.add_error("invalid-l3-statistic", msg)
+        self.error.raise_on_error()
+
+        # Accumulators: {(parameter name, statistic): array}
+        # NOTE: The flag count accumulator is a dictionary {flag value: array}
+        self._n_records = np.zeros(self.n_cells, dtype=np.int64)
+        self._accumulators = {}
+        for parameter_name, statistic_ids in statistics.items():
+            for statistic_id in statistic_ids:
+                if statistic_id == "flag_count":
+                    accumulator = {}
+                elif statistic_id == "quantiles":
+                    accumulator = GridCellQuantileSketch(self.n_cells, **(quantile_sketch or {}))
+                else:
+                    accumulator = np.zeros(self.n_cells)
+                self._accumulators[(parameter_name, statistic_id)] = accumulator
+
+    def add(self, l2i, xi, yj):
+        """
+        Update the statistics with the records of a l2i object
+        :param l2i: l2i object (currently: pysiral.l2data.L2iNCFileImport)
+        :param xi: x grid indices of the l2i records
+        :param yj: y grid indices of the l2i records
+        :return: None
+        """
+
+        cell_index = self.get_cell_index(xi, yj)
+        in_grid = cell_index >= 0
+        cell_index = cell_index[in_grid]
+        self._n_records += np.bincount(cell_index, minlength=self.n_cells)
+
+        for (parameter_name, statistic_id), accumulator in self._accumulators.items():
+
+            # Missing parameters are ignored (same as for the l2i data stack)
+            try:
+                values = getattr(l2i, parameter_name)
+            except AttributeError:
+                continue
+            if np.ma.isMaskedArray(values) and values.dtype.kind == "f":
+                values = values.filled(np.nan)
+            values = np.asarray(values)[in_grid]
+
+            if statistic_id == "flag_count":
+                for flag_value in np.unique(values):
+                    count = np.bincount(cell_index[values == flag_value], minlength=self.n_cells)
+                    accumulator[flag_value] = accumulator.get(flag_value, 0) + count
+                continue
+
+            if statistic_id == "quantiles":
+                accumulator.add(cell_index, values)
+                continue
+
+            is_finite = np.isfinite(values)
+            if statistic_id == "count":
+                weights = is_finite
+            elif statistic_id == "sum":
+                weights = np.where(is_finite, values, 0.0)
+            elif statistic_id == "sum_squares":
+                weights = np.where(is_finite, values.astype(np.float64) ** 2., 0.0)
+            elif statistic_id == "weight":
+                with np.errstate(divide="ignore"):
+                    weights = np.where(is_finite, 1. / values.astype(np.float64) ** 2., 0.0)
+            else:
+                weights = values < 0.0
+            accumulator += np.bincount(cell_index, weights=weights, minlength=self.n_cells)
+
+    def get(self, parameter_name, statistic_id):
+        """
+        Returns the statistic of a parameter on the grid
+        :param parameter_name: name of the l2 parameter
+        :param statistic_id: name of the statistic (see `statistic_ids`, use `get_flag_count` for flag counts)
+        :return: array with dimensions (numy, numx)
+        """
+        accumulator = self._accumulators[(parameter_name, statistic_id)]
+        return accumulator.reshape(self.shape)
+
+    def get_flag_count(self, parameter_name, flag_value):
+        """
+        Returns the number of values with a given flag value on the grid
+        :param parameter_name: name of the l2 parameter
+        :param flag_value: flag value
+        :return: array with dimensions (numy, numx)
+        """
+        accumulator = self._accumulators[(parameter_name, "flag_count")]
+        return accumulator.get(flag_value, np.zeros(self.n_cells)).reshape(self.shape)
+
+    def get_quantile(self, parameter_name, q):
+        """
+        Returns the q-th quantile of a parameter on the grid. Quantiles are approximate if computed from
+        the quantile sketch and exact if computed from the flag counts (integer parameters)
+        :param parameter_name: name of the l2 parameter
+        :param q: quantile (0 <= q <= 1)
+        :return: array with dimensions (numy, numx) (NaN for grid cells without finite values)
+        """
+        sketch = self._accumulators.get((parameter_name, "quantiles"), None)
+        if sketch is not None:
+            return sketch.quantile(q).reshape(self.shape)
+
+        # The flag counts are the weights of each flag value
+        flag_counts = self._accumulators[(parameter_name, "flag_count")]
+        cell_index, values, weights = [], [], []
+        for flag_value, count in flag_counts.items():
+            cells = np.flatnonzero(count)
+            cell_index.append(cells)
+            values.append(np.full(cells.shape, flag_value, dtype=np.float64))
+            weights.append(count[cells])
+        quantile = GridCellQuantileSketch.get_weighted_quantile(
+            np.concatenate(cell_index or [[]]).astype(np.int64), np.concatenate(values or [[]]),
+            np.concatenate(weights or [[]]), q, self.n_cells)
+        return quantile.reshape(self.shape)
+
+    def get_aggregated(self, griddef, factor):
+        """
+        Returns the running grid cell statistics of a coarser grid definition by aggregating n x n grid cells
+        (nested grids, see pysiral.grid.GridDefinition.get_nesting_factor). All statistics except the quantile
+        sketch are sums and identical to the statistics of the coarser grid (up to floating point summation
+        order). The centroids of the quantile sketch are merged and compressed (see GridCellQuantileSketch).
+        :param griddef: grid definition of the coarser grid
+        :param factor: nesting factor n
+        :return: L2iGridStatistics instance
+        """
+        statistics = L2iGridStatistics(griddef, self.statistics, quantile_sketch=self.quantile_sketch)
+        yj, xi = np.divmod(np.arange(self.n_cells), self.griddef.extent.numx)
+        cell_map = (yj // factor) * griddef.extent.numx + xi // factor
+
+        def aggregate(values):
+            return np.bincount(cell_map, weights=values, minlength=statistics.n_cells)
+
+        statistics._n_records = aggregate(self._n_records).astype(np.int64)
+        for key, accumulator in self._accumulators.items():
+            if isinstance(accumulator, dict):
+                statistics._accumulators[key] = {flag_value: aggregate(count)
+                                                 for flag_value, count in accumulator.items()}
+            elif isinstance(accumulator, GridCellQuantileSketch):
+                statistics._accumulators[key] = accumulator.get_aggregated(cell_map, statistics.n_cells)
+            else:
+                statistics._accumulators[key] = aggregate(accumulator)
+        return statistics
+
+    def get_cell_index(self, xi, yj):
+        """ Returns the flat grid cell index (-1 for records outside the grid) """
+        numx, numy = self.griddef.extent.numx, self.griddef.extent.numy
+        xi, yj = np.asarray(xi), np.asarray(yj)
+        in_grid = np.logical_and.reduce([np.isfinite(xi), np.isfinite(yj), xi >= 0, xi < numx, yj >= 0, yj < numy])
+        cell_index = np.full(xi.shape, -1, dtype=np.int64)
+        cell_index[in_grid] = yj[in_grid].astype(np.int64) * numx + xi[in_grid].astype(np.int64)
+        return cell_index
+
+    @property
+    def parameter_names(self):
+        return list(self.statistics.keys())
+
+    @property
+    def n_records(self):
+        """ The number of records per grid cell with dimensions (numy, numx) """
+        return self._n_records.reshape(self.shape)
+
+    @property
+    def shape(self):
+        return self.griddef.extent.numy, self.griddef.extent.numx
+
+    @property
+    def n_cells(self):
+        return self.griddef.extent.numx * self.griddef.extent.numy
+
+
+class GridCellQuantileSketch(object):
+    """
+    Bounded-memory quantile sketch for all grid cells. This is a variant of the merging t-digest
+    with a uniform scale function on flat numpy buffers (grid cell index, centroid mean, centroid weight).
+
+    New values are added as centroids with weight 1. The centroid buffers grow with amortized doubling of their
+    capacity and the number of centroids per grid cell is updated for the grid cells of the added values. Only
+    grid cells with a number of centroids above the buffer size (max(2 * compression, exact_max_count))
+    are compressed. The compression merges consecutive
+    centroids (sorted by mean) into bins of equal cumulative weight N/compression (N: number of values
+    in the grid cell). Centroids with weights of at least N/compression are not merged. Thus
+    all centroids have weights below 2N/compression and a grid cell has at most ~2*compression
+    centroids after compression.
+
+    Quantiles are computed from the centroids with each centroid representing `weight` values at the
+    centroid mean and linear interpolation between ranks (same as numpy.quantile for uncompressed cells).
+
+    Error bounds:
+
+        - Grid cells with up to `exact_max_count` values are never compressed and the quantiles are
+          exact (exactness switch: increase `exact_max_count` to get exact results for larger cells)
+        - For compressed grid cells the estimate is the mean of the centroid containing the requested rank.
+          If the value ranges of the centroids do not overlap, the rank of the estimate in the sorted values
+          deviates by less than the centroid weight, i.e. the quantile error is below 2/compression
+          (4% for the default compression of 50). Centroid value ranges can overlap if values are added after a
+          compression and the bound is then empirical. Typical quantile errors are below 1/compression.
+    """
+
+    def __init__(self, n_cells, compression=50, exact_max_count=100):
+        """
+        :param n_cells: number of grid cells
+        :param compression: number of centroid bins per grid cell for compression
+        :param exact_max_count: maximum number of values per grid cell with exact quantiles
+        """
+        self.n_cells = n_cells
+        self.compression = compression
+        self.exact_max_count = exact_max_count
+        self.buffer_size = max(2 * compression, exact_max_count)
+        # Centroid buffers: Only the first `n_centroids` entries are valid
+        self.n_centroids = 0
+        self._cell_index = np.empty(self.buffer_size, dtype=np.int64)
+        self._mean = np.empty(self.buffer_size, dtype=np.float64)
+        self._weight = np.empty(self.buffer_size, dtype=np.float64)
+        self._cell_n_centroids = np.zeros(n_cells, dtype=np.int64)
+
+    def add(self, cell_index, values):
+        """
+        Add values to the sketch (non-finite values are ignored)
+        :param cell_index: flat grid cell index of each value
+        :param values: values
+        :return: None
+        """
+        values = np.asarray(values, dtype=np.float64)
+        is_finite = np.isfinite(values)
+        self._add_centroids(cell_index[is_finite], values[is_finite], np.ones(np.count_nonzero(is_finite)))
+
+    def get_aggregated(self, cell_map, n_cells):
+        """
+        Returns the sketch of a coarser grid with the centroids of the grid cells merged into the
+        target grid cells
+        :param cell_map: target grid cell index for each grid cell of this sketch
+        :param n_cells: number of target grid cells
+        :return: GridCellQuantileSketch instance
+        """
+        sketch = GridCellQuantileSketch(n_cells, compression=self.compression, exact_max_count=self.exact_max_count)
+        cell_index, mean, weight = self.centroids
+        sketch._add_centroids(cell_map[cell_index], mean, weight)
+        return sketch
+
+    def _add_centroids(self, cell_index, mean, weight):
+        """ Add centroids and compress the grid cells that exceed the buffer size """
+
+        # Append the centroids to the buffers (the capacity is at least doubled if exceeded)
+        n_centroids = self.n_centroids + len(cell_index)
+        if n_centroids > len(self._cell_index):
+            capacity = max(n_centroids, 2 * len(self._cell_index))
+            for name in ["_cell_index", "_mean", "_weight"]:
+                buffer = getattr(self, name)
+                extended_buffer = np.empty(capacity, dtype=buffer.dtype)
+                extended_buffer[:self.n_centroids] = buffer[:self.n_centroids]
+                setattr(self, name, extended_buffer)
+        self._cell_index[self.n_centroids:n_centroids] = cell_index
+        self._mean[self.n_centroids:n_centroids] = mean
+        self._weight[self.n_centroids:n_centroids] = weight
+        self.n_centroids = n_centroids
+
+        # Update the number of centroids of the grid cells of the added centroids
+        cells, cell_n_added = np.unique(cell_index, return_counts=True)
+        self._cell_n_centroids[cells] += cell_n_added
+        compressed_cells = cells[self._cell_n_centroids[cells] > self.buffer_size]
+        if len(compressed_cells) > 0:
+            self._compress(compressed_cells)
+
+    def quantile(self, q):
+        """
+        Returns the q-th quantile for all grid cells
+        :param q: quantile (0 <= q <= 1)
+        :return: flat array with the quantile per grid cell (NaN for grid cells without values)
+        """
+        cell_index, mean, weight = self.centroids
+        return self.get_weighted_quantile(cell_index, mean, weight, q, self.n_cells)
+
+    @property
+    def centroids(self):
+        """ Returns the valid parts of the centroid buffers (grid cell index, mean, weight) """
+        n = self.n_centroids
+        return self._cell_index[:n], self._mean[:n], self._weight[:n]
+
+    def _compress(self, compressed_cells):
+        """ Merge the centroids of the selected grid cells (see class documentation) """
+
+        # Get the centroids of all cells to be compressed sorted by grid cell and mean
+        is_compressed_cell = np.zeros(self.n_cells, dtype=bool)
+        is_compressed_cell[compressed_cells] = True
+        buffer_cell_index, buffer_mean, buffer_weight = self.centroids
+        is_compressed = is_compressed_cell[buffer_cell_index]
+        cell_index, mean, weight = buffer_cell_index[is_compressed], buffer_mean[is_compressed], \
+            buffer_weight[is_compressed]
+        order = np.lexsort((mean, cell_index))
+        cell_index, mean, weight = cell_index[order], mean[order], weight[order]
+
+        # Cumulative weight at the upper end of each centroid within its grid cell
+        cell_weight = np.bincount(cell_index, weights=weight, minlength=self.n_cells)
+        cumulative_weight = np.cumsum(weight) - (np.cumsum(cell_weight) - cell_weight)[cell_index]
+
+        # Centroid bins with equal weight, centroids that are heavier than the bin weight are not merged
+        bin_weight = cell_weight[cell_index] / float(self.compression)
+        is_heavy = weight >= bin_weight
+        centroid_bin = np.ceil(cumulative_weight / bin_weight)
+        is_new_group = np.ones(cell_index.shape, dtype=bool)
+        is_new_group[1:] = np.logical_or.reduce([cell_index[1:] != cell_index[:-1],
+                                                 centroid_bin[1:] != centroid_bin[:-1],
+                                                 is_heavy[1:], is_heavy[:-1]])
+        group = np.cumsum(is_new_group) - 1
+
+        # Merge the centroids
+        group_weight = np.bincount(group, weights=weight)
+        group_mean = np.bincount(group, weights=weight * mean) / group_weight
+        group_cell_index = cell_index[is_new_group]
+
+        # Write the uncompressed and merged centroids back into the buffers
+        is_kept = ~is_compressed
+        n_kept = np.count_nonzero(is_kept)
+        self.n_centroids = n_kept + len(group_cell_index)
+        for buffer, kept_values, group_values in [(self._cell_index, buffer_cell_index[is_kept], group_cell_index),
+                                                  (self._mean, buffer_mean[is_kept], group_mean),
+                                                  (self._weight, buffer_weight[is_kept], group_weight)]:
+            buffer[:n_kept] = kept_values
+            buffer[n_kept:self.n_centroids] = group_values
+        cells, cell_n_centroids = np.unique(group_cell_index, return_counts=True)
+        self._cell_n_centroids[cells] = cell_n_centroids
+
+    @staticmethod
+    def get_weighted_quantile(cell_index, values, weights, q, n_cells):
+        """
+        Computes the q-th quantile per grid cell of values with integer weights (a value with weight n
+        represents n identical values). The quantile is linearly interpolated between ranks (same as
+        numpy.quantile for weights of 1).
+        :param cell_index: flat grid cell index of each value
+        :param values: values
+        :param weights: integer weights of the values
+        :param q: quantile (0 <= q <= 1)
+        :param n_cells: number of grid cells
+        :return: flat array with the quantile per grid cell (NaN for grid cells without values)
+        """
+
+        order = np.lexsort((values, cell_index))
+        cell_index, values, weights = cell_index[order], values[order], weights[order]
+        cell_weight = np.bincount(cell_index, weights=weights, minlength=n_cells)
+        cumulative_weight = np.cumsum(weights)
+        cell_offset = np.cumsum(cell_weight) - cell_weight
+
+        quantile = np.full(n_cells, np.nan)
+        has_values = cell_weight > 0
+        position = q * (cell_weight[has_values] - 1.)
+        lower_rank, upper_rank = np.floor(position), np.ceil(position)
+
+        # The value of rank r is the value of the first entry with cumulative weight larger than r
+        offset = cell_offset[has_values]
+        lower = values[np.searchsorted(cumulative_weight, offset + lower_rank, side="right")]
+        upper = values[np.searchsorted(cumulative_weight, offset + upper_rank, side="right")]
+        quantile[has_values] = lower + (upper - lower) * (position - lower_rank)
+        return quantile
+
 
 class L3DataGrid(DefaultLoggingClass):
     """
@@ -282,6 +1272,9 @@ class L3DataGrid(DefaultLoggingClass):
     (averaged l2i parameter, grid cell statistics)
     """
 
+    # Grid methods for stacked l2 parameters (see get_grid_cell_value)
+    stack_grid_methods = ["average", "average_uncertainty", "unique", "median", "quantile"]
+
     def __init__(self, job, stack, period, doi=""):
 
         super(L3DataGrid, self).__init__(self.__class__.__name__)
@@ -291,7 +1284,7 @@ class L3DataGrid(DefaultLoggingClass):
         # Grid size definition
         self._doi = doi
         self._data_record_type = "none"
-        self._griddef = job.grid
+        self._griddef = stack.griddef
         self._l3def = job.l3def
         self._period = period
         self._external_masks = {}
@@ -404,6 +1397,25 @@ class L3DataGrid(DefaultLoggingClass):
 
             self.log.info("Gridding parameter: %s [%s]" % (name, grid_method))
 
+            # Streaming mode: Use running grid cell statistics
+            pardef = self.l3def.l2_parameter[name]
+            if name not in self.l2.stack_parameters:
+                self._grid_l2_parameter_from_statistics(name, pardef, settings.minimum_valid_grid_points)
+                continue
+
+            if grid_method not in self.stack_grid_methods:
+                msg = "Invalid grid method (%s) for %s"
+                msg = msg % (str(grid_method), name)
+                self.error.add_error("invalid-l3def", msg)
+                self.error.raise_on_error()
+
+            # Out-of-core mode: Grid the tiles of the spill files
+            if isinstance(self.l2, L2iTileSpillStack):
+                cell_index, values = self.l2.get_gridded_parameter(name, pardef, settings.minimum_valid_grid_points)
+                for yj, xi, value in zip(*np.unravel_index(cell_index, self.l2.shape), values):
+                    self.vars[name][yj, xi] = value
+                continue
+
             for xi, yj in self.grid_indices:
 
                 data = np.array(self.l2.stack[name][yj][xi])
@@ -413,21 +1425,50 @@ class L3DataGrid(DefaultLoggingClass):
                 if len(valid) < settings.minimum_valid_grid_points:
                     continue
 
-                # TODO: Think of a dicts with lambdas to make this more concise
-                if grid_method == "average":
-                    self.vars[name][yj, xi] = np.nanmean(data)
-                elif grid_method == "average_uncertainty":
-                    value = np.abs(np.sqrt(1. / np.sum(data[valid])))
-                    self.vars[name][yj, xi] = value
-                elif grid_method == "unique":
-                    self.vars[name][yj, xi] = np.unique(data)
-                elif grid_method == "median":
-                    self.vars[name][yj, xi] = np.nanmedian(data)
-                else:
-                    msg = "Invalid grid method (%s) for %s"
-                    msg = msg % (str(grid_method), name)
-                    self.error.add_error("invalid-l3def", msg)
-                    self.error.raise_on_error()
+                self.vars[name][yj, xi] = get_grid_cell_value(data, valid, pardef)
+
+    @staticmethod
+    def get_streaming_statistics(pardef):
+        """
+        Returns the running grid cell statistics that are required for the grid method of a l2 parameter
+        (streaming mode, see L2iGridStatistics)
+        :param pardef: l2 parameter definition (grid_method, dtype, ...)
+        :return: list of statistics or None if the grid method requires the l2 stack
+        """
+        grid_method = pardef["grid_method"]
+        if grid_method in ["average", "average_uncertainty"]:
+            return ["count", "sum"]
+        if grid_method in ["median", "quantile"]:
+            # Integer parameters have exact quantiles from the flag counts
+            is_integer = np.dtype(pardef["dtype"]).kind in "iu"
+            return ["count", "flag_count" if is_integer else "quantiles"]
+        return None
+
+    def _grid_l2_parameter_from_statistics(self, name, pardef, minimum_valid_grid_points):
+        """ Compute a gridded l2i parameter from the running grid cell statistics
+        (same grid methods as `grid_l2_parameter`) """
+
+        grid_method = pardef["grid_method"]
+        statistics = self.l2.statistics
+        count = statistics.get(name, "count")
+        is_valid = count >= minimum_valid_grid_points
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if grid_method == "average":
+                value = statistics.get(name, "sum") / count
+            elif grid_method == "average_uncertainty":
+                value = np.abs(np.sqrt(1. / statistics.get(name, "sum")))
+            elif grid_method == "median":
+                value = statistics.get_quantile(name, 0.5)
+            elif grid_method == "quantile":
+                value = statistics.get_quantile(name, pardef["quantile"])
+            else:
+                msg = "Invalid grid method (%s) for %s in streaming mode"
+                msg = msg % (str(grid_method), name)
+                self.error.add_error("invalid-l3def", msg)
+                self.error.raise_on_error()
+
+        self.vars[name][is_valid] = value[is_valid]
 
     def get_parameter_by_name(self, name):
         try:
@@ -533,10 +1574,12 @@ class L3DataGrid(DefaultLoggingClass):
         return str(uuid.uuid4())
 
     def _get_attr_startdt(self, dtfmt):
-        return self.metadata.start_period.strftime(dtfmt)
+        # NOTE: The requested period and not the actual data coverage, so that output filenames only
+        #       depend on the period segment
+        return self.metadata.time_coverage_start.strftime(dtfmt)
 
     def _get_attr_stopdt(self, dtfmt):
-        return self.info.stop_time.strftime(dtfmt)
+        return self.metadata.time_coverage_end.strftime(dtfmt)
 
     def _get_attr_geospatial_lat_min(self, *args):
         latitude = self.vars["latitude"]
@@ -797,6 +1840,13 @@ class Level3OutputHandler(OutputHandlerBase):
     def get_filename_from_data(self, l3):
         """ Return the filename for a defined level-3 data object
         based on tag filenaming in output definition file """
+        filename_template = self.get_filename_template()
+        filename = self.fill_template_string(filename_template, l3)
+        return filename
+
+    def get_filename_template(self):
+        """ Return the filename template of the output definition
+        for the period of the output handler """
 
         # Get the filenaming definition (depending on period definition)
         try:
@@ -814,9 +1864,7 @@ class Level3OutputHandler(OutputHandlerBase):
             msg = msg % (str(self._period), self.output_def_filename)
             self.error.add_error("invalid-outputdef", msg)
             self.error.raise_on_error()
-
-        filename = self.fill_template_string(filename_template, l3)
-        return filename
+        return filename_template
 
     def get_directory_from_data(self, l3, create=True):
         """ Return the output directory based on information provided
@@ -919,19 +1967,22 @@ class Level3ProductDefinition(DefaultLoggingClass):
 
         Arguments:
             l3_settings_file (str): Full filename to l3 settings file
-            grid (pysiral.grid.GridDefinition): Output grid class
+            grid (pysiral.grid.GridDefinition): Output grid class or list of output grid classes
+                (all grids are processed with a single pass over the l2i files)
             output (Level-3 compliant output handler from pysiral.output)
         """
         super(Level3ProductDefinition, self).__init__(self.__class__.__name__)
         self.error = ErrorStatus(caller_id=self.__class__.__name__)
         self._l3_settings_file = l3_settings_file
         self._output = output
-        self._grid = grid
+        self._grids = grid if isinstance(grid, (list, tuple)) else [grid]
         self._period = period
         self._parse_l3_settings()
+        self._validate_output_filenaming()
 
         # Report settings to log handler
-        self.log.info("Output grid id: %s" % str(self._grid.grid_id))
+        for grid in self._grids:
+            self.log.info("Output grid id: %s" % str(grid.grid_id))
         for output in self._output:
             msg = "L3 product directory (%s): %s"
             msg = msg % (str(output.id), str(output.basedir))
@@ -945,12 +1996,30 @@ class Level3ProductDefinition(DefaultLoggingClass):
             self.error.add_error("l3settings-parser-error", str(ex))
             self.error.raise_on_error()
 
+    def _validate_output_filenaming(self):
+        """ The outputs of all grids are written with the same output handlers. The filenames
+        must therefore contain the grid id if more than one grid is processed """
+        if len(self._grids) < 2:
+            return
+        for output in self._output:
+            filename_template = output.get_filename_template()
+            attribute_names = [attr[0] for attr in output.get_template_attrs(filename_template)]
+            if "grid_id" not in attribute_names:
+                msg = "Filenaming `%s` of output [%s] lacks {grid_id} (required for %g grids)"
+                msg = msg % (filename_template, str(output.id), len(self._grids))
+                self.error.add_error("l3-multigrid-filenaming", msg)
+        self.error.raise_on_error()
+
     def validate(self):
         pass
 
     @property
     def grid(self):
-        return self._grid
+        return self._grids[0]
+
+    @property
+    def grids(self):
+        return list(self._grids)
 
     @property
     def outputs(self):
@@ -1016,6 +2085,11 @@ class Level3ProcessorItem(DefaultLoggingClass):
     and applied in the Level3Processor
     """
 
+    # Running grid cell statistics of l2 parameters that are used instead of the l2 stack in streaming mode
+    # ({parameter name: list of statistics}, see L2iGridStatistics). None: The processing item requires
+    # the l2 stack
+    l2_streaming_statistics = None
+
     def __init__(self, l3grid, **cfg):
         """
         Initizalizes the Level-3 processor item and performs checks if all option input parameters are available.
@@ -1056,7 +2130,7 @@ class Level3ProcessorItem(DefaultLoggingClass):
 
         # Check Level-2 stack parameter
         for l2_var_name in self.l2_variable_dependencies:
-            if not l2_var_name in self.l3grid.l2.stack:
+            if not self.l3grid.l2.has_parameter(l2_var_name):
                 msg = "Level-3 processor item %s requires l2 stack parameter [%s], which does not exist"
                 msg = msg % (self.__class__.__name__, l2_var_name)
                 self.error.add_error("l3procitem-missing-l2stackitem", msg)
@@ -1086,6 +2160,16 @@ class Level3ProcessorItem(DefaultLoggingClass):
                 self.error.raise_on_error()
             setattr(self, option_name, option_value)
 
+    @classmethod
+    def get_l2_stack_parameters(cls, **cfg):
+        """
+        Returns the list of l2 parameters that are required in the l2 stack for the processing item. Processing
+        items with l2 variable dependencies that depend on the options need to overwrite this method.
+        :param cfg: The option dictionary/treedict from the config settings file
+        :return: list of l2 parameter names
+        """
+        return list(cls.l2_variable_dependencies)
+
     def _add_l3_variables(self):
         """
         This method initializes the output variables for a given processing item to the l3grid. All processor item
@@ -1097,6 +2181,17 @@ class Level3ProcessorItem(DefaultLoggingClass):
             vardef = self.l3_output_variables[variable_name]
             self.l3grid.add_grid_variable(variable_name, vardef["fill_value"], vardef["dtype"])
 
+    def _set_cell_values(self, variable_name, cell_index, values):
+        """
+        Sets the values of a Level-3 grid variable for a list of grid cells
+        :param variable_name: The name of the Level-3 grid variable
+        :param cell_index: flat grid cell indices (yj * numx + xi, see L2iDataStack.get_cell_records)
+        :param values: The values for each grid cell
+        :return:
+        """
+        yj, xi = np.unravel_index(cell_index, self.l3grid.l2.shape)
+        self.l3grid.vars[variable_name][yj, xi] = values
+
 
 class Level3SurfaceTypeStatistics(Level3ProcessorItem):
     """ A Level-3 processor item to compute surface type stastics """
@@ -1112,6 +2207,7 @@ class Level3SurfaceTypeStatistics(Level3ProcessorItem):
                                ice_fraction=dict(dtype="f4", fill_value=np.nan),
                                negative_thickness_fraction=dict(dtype="f4", fill_value=np.nan),
                                is_land=dict(dtype="i2", fill_value=-1))
+    l2_streaming_statistics = dict(surface_type=["flag_count"], sea_ice_thickness=["count_negative"])
 
     def __init__(self, *args, **kwargs):
         """
@@ -1138,64 +2234,64 @@ class Level3SurfaceTypeStatistics(Level3ProcessorItem):
           - negative thickness fraction (n_sit<0 / n_sit)
         """
 
-        # Loop over all grid indices
+        # Number of records per grid cell and surface type from either the running grid cell statistics
+        # (streaming mode) or the l2 stack
+        if self.l3grid.l2.statistics is not None:
+            counts = self._get_counts_from_statistics()
+        else:
+            counts = self._get_counts_from_stack()
+        n_total_waveforms, n_leads, n_ice, n_land, n_negative_thicknesses = counts
+        n_valid_waveforms = n_leads + n_ice
+
+        # Only grid cells with data
+        cell_index = np.flatnonzero(n_total_waveforms > 0)
+
+        # NOTE: The land flag is the number of land waveforms with flipped grid indices
+        #       (legacy behaviour)
+        yj, xi = np.unravel_index(cell_index, self.l3grid.l2.shape)
+        self.l3grid.vars["is_land"][xi, yj] = n_land[cell_index]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fractions = dict(n_total_waveforms=n_total_waveforms,
+                             n_valid_waveforms=n_valid_waveforms,
+                             valid_fraction=n_valid_waveforms / n_total_waveforms,
+                             lead_fraction=n_leads / n_valid_waveforms,
+                             ice_fraction=n_ice / n_valid_waveforms,
+                             negative_thickness_fraction=n_negative_thicknesses / n_ice)
+        for name, values in fractions.items():
+            values = np.where(np.isfinite(values), values, np.nan)
+            self._set_cell_values(name, cell_index, values[cell_index])
+
+    def _get_counts_from_stack(self):
+        """
+        Returns the number of all records, lead, sea ice and land records and the number of negative
+        thickness values for each grid cell from the l2 stack
+        :return: list of flat arrays (one value per grid cell)
+        """
+        stack = self.l3grid.l2
         stflags = self._surface_type_dict
-        for xi, yj in self.l3grid.grid_indices:
-
-            # Extract the list of surface types inm the grid cell
-            surface_type = np.array(self.l3grid.l2.stack["surface_type"][yj][xi])
-
-            # Stack can be empty
-            if len(surface_type) == 0:
-                continue
-
-            # Create a land flag
-            is_land = len(np.where(surface_type == stflags["land"])[0] > 0)
-            self.l3grid.vars["is_land"][xi, yj] = is_land
-
-            # Compute total waveforms in grid cells
-            n_total_waveforms = len(surface_type)
-            self.l3grid.vars["n_total_waveforms"][yj, xi] = n_total_waveforms
-
-            # Compute valid waveforms
-            # Only positively identified waveforms (either lead or ice)
-            valid_waveform = ORCondition()
-            valid_waveform.add(surface_type == stflags["lead"])
-            valid_waveform.add(surface_type == stflags["sea_ice"])
-            n_valid_waveforms = valid_waveform.num
-            self.l3grid.vars["n_valid_waveforms"][yj, xi] = n_valid_waveforms
-
-            # Fractions of leads on valid_waveforms
-            try:
-                valid_fraction = float(n_valid_waveforms) / float(n_total_waveforms)
-            except ZeroDivisionError:
-                valid_fraction = np.nan
-            self.l3grid.vars["valid_fraction"][yj, xi] = valid_fraction
-
-            # Fractions of leads on valid_waveforms
-            n_leads = len(np.where(surface_type == stflags["lead"])[0])
-            try:
-                lead_fraction = float(n_leads) / float(n_valid_waveforms)
-            except ZeroDivisionError:
-                lead_fraction = np.nan
-            self.l3grid.vars["lead_fraction"][yj, xi] = lead_fraction
-
-            # Fractions of leads on valid_waveforms
-            n_ice = len(np.where(surface_type == stflags["sea_ice"])[0])
-            try:
-                ice_fraction = float(n_ice) / float(n_valid_waveforms)
-            except ZeroDivisionError:
-                ice_fraction = np.nan
-            self.l3grid.vars["ice_fraction"][yj, xi] = ice_fraction
-
-            # Fractions of negative thickness values
-            sit = np.array(self.l3grid.l2.stack["sea_ice_thickness"][yj][xi])
-            n_negative_thicknesses = len(np.where(sit < 0.0)[0])
-            try:
-                negative_thickness_fraction = float(n_negative_thicknesses) / float(n_ice)
-            except ZeroDivisionError:
-                negative_thickness_fraction = np.nan
-            self.l3grid.vars["negative_thickness_fraction"][yj, xi] = negative_thickness_fraction
+        cell_index, surface_type = stack.get_cell_records("surface_type")
+        n_total_waveforms = np.bincount(cell_index, minlength=stack.n_cells)
+        n_leads, n_ice, n_land = [np.bincount(cell_index, weights=surface_type == stflags[name],
+                                              minlength=stack.n_cells)
+                                  for name in ["lead", "sea_ice", "land"]]
+        cell_index, sea_ice_thickness = stack.get_cell_records("sea_ice_thickness")
+        n_negative_thicknesses = np.bincount(cell_index, weights=sea_ice_thickness < 0.0, minlength=stack.n_cells)
+        return n_total_waveforms, n_leads, n_ice, n_land, n_negative_thicknesses
+
+    def _get_counts_from_statistics(self):
+        """
+        Returns the number of all records, lead, sea ice and land records and the number of negative
+        thickness values for each grid cell from the running grid cell statistics
+        :return: list of flat arrays (one value per grid cell)
+        """
+        statistics = self.l3grid.l2.statistics
+        stflags = self._surface_type_dict
+        n_total_waveforms = statistics.n_records.ravel()
+        n_leads, n_ice, n_land = [statistics.get_flag_count("surface_type", stflags[name]).ravel()
+                                  for name in ["lead", "sea_ice", "land"]]
+        n_negative_thicknesses = statistics.get("sea_ice_thickness", "count_negative").ravel()
+        return n_total_waveforms, n_leads, n_ice, n_land, n_negative_thicknesses
 
 
 class Level3TemporalCoverageStatistics(Level3ProcessorItem):
@@ -1235,54 +2331,57 @@ class Level3TemporalCoverageStatistics(Level3ProcessorItem):
         end_date = date(tce.year, tce.month, tce.day)
         period_n_days = (end_date - start_date).days + 1
 
-        # Links
-        stack = self.l3grid.l2.stack
-
-        # Loop over all grid cells
-        for xi, yj in self.l3grid.grid_indices:
-
-            # Get the day of observation for each entry in the Level-2 stack
-            times = np.array(stack["time"][yj][xi])
-            day_of_observation = np.array([date(t.year, t.month, t.day) for t in times])
-
-            # The statistic is computed for sea ice thickness -> remove data points without valid sea ice thickness
-            sea_ice_thickness = np.array(stack["sea_ice_thickness"][yj][xi])
-            day_of_observation = day_of_observation[np.isfinite(sea_ice_thickness)]
-
-            # Validity check
-            #  - must have data
-            if len(day_of_observation) == 0:
-                continue
-
-            # Compute the number of days for each observation with respect to the start of the period
-            day_number = [(day - start_date).days for day in day_of_observation]
-
-            # Compute the set of days with observations available
-            days_with_observations = np.unique(day_number)
-            first_day, last_day = np.amin(days_with_observations), np.amax(days_with_observations)
-
-            # Compute the uniformity factor
-            # The uniformity factor is derived from a Kolmogorov-Smirnov (KS) test for goodness of fit that tests
-            # the list of against a uniform distribution. The definition of the uniformity factor is that is
-            # reaches 1 for uniform distribution of observations and gets smaller for non-uniform distributions
-            # It is therefore defined as 1-D with D being the result of KS test
-            ks_test_result = stats.kstest(day_number, stats.uniform(loc=0.0, scale=period_n_days).cdf)
-            uniformity_factor = 1.0 - ks_test_result[0]
-            self.l3grid.vars["temporal_coverage_uniformity_factor"][yj, xi] = uniformity_factor
-
-            # Compute the day fraction (number of days with actual data coverage/days of period)
-            day_fraction = float(len(days_with_observations)) / float(period_n_days)
-            self.l3grid.vars["temporal_coverage_day_fraction"][yj, xi] = day_fraction
-
-            # Compute the period in days that is covered between the first and last day of observation
-            # normed by the length of the period
-            period_fraction = float(last_day - first_day + 1) / float(period_n_days)
-            self.l3grid.vars["temporal_coverage_period_fraction"][yj, xi] = period_fraction
+        # Get the records of all grid cells as flat arrays
+        # The statistic is computed for sea ice thickness -> remove data points without valid sea ice thickness
+        stack = self.l3grid.l2
+        cell_index, times = stack.get_cell_records("time")
+        _, sea_ice_thickness = stack.get_cell_records("sea_ice_thickness")
+        is_valid = np.isfinite(sea_ice_thickness.astype(float))
+        if not np.any(is_valid):
+            return
 
-            # Compute the temporal center of the actual data coverage in units of period length
-            # -> optimum 0.5
-            weighted_center = np.mean(day_number) / float(period_n_days)
-            self.l3grid.vars["temporal_coverage_weighted_center"][yj, xi] = weighted_center
+        # Compute the number of days for each observation with respect to the start of the period
+        # and sort the records by grid cell and day number
+        day_of_observation = times[is_valid].astype("datetime64[us]").astype("datetime64[D]")
+        day_number = (day_of_observation - np.datetime64(start_date)).astype(np.int64)
+        cell_index = cell_index[is_valid]
+        order = np.lexsort((day_number, cell_index))
+        cell_index, day_number = cell_index[order], day_number[order]
+
+        # Grid cells with data, start index and number of records of each grid cell
+        cells, cell_start, n_records = np.unique(cell_index, return_index=True, return_counts=True)
+        rank = np.arange(len(day_number)) - np.repeat(cell_start, n_records)
+        n = np.repeat(n_records, n_records).astype(float)
+
+        # Compute the uniformity factor
+        # The uniformity factor is derived from a Kolmogorov-Smirnov (KS) test for goodness of fit that tests
+        # the list of against a uniform distribution. The definition of the uniformity factor is that is
+        # reaches 1 for uniform distribution of observations and gets smaller for non-uniform distributions
+        # It is therefore defined as 1-D with D being the result of KS test. D is the maximum distance between
+        # the empirical distribution function of the sorted day numbers and the uniform cumulative distribution
+        # function in each grid cell (same as scipy.stats.kstest)
+        uniform_cdf = np.clip(day_number / float(period_n_days), 0.0, 1.0)
+        distance = np.maximum((rank + 1.) / n - uniform_cdf, uniform_cdf - rank / n)
+        uniformity_factor = 1.0 - np.maximum.reduceat(distance, cell_start)
+        self._set_cell_values("temporal_coverage_uniformity_factor", cells, uniformity_factor)
+
+        # Compute the day fraction (number of days with actual data coverage/days of period)
+        is_new_day = np.ones(day_number.shape, dtype=bool)
+        is_new_day[1:] = np.logical_or(cell_index[1:] != cell_index[:-1], day_number[1:] != day_number[:-1])
+        n_days_with_observations = np.add.reduceat(is_new_day.astype(np.int64), cell_start)
+        day_fraction = n_days_with_observations / float(period_n_days)
+        self._set_cell_values("temporal_coverage_day_fraction", cells, day_fraction)
+
+        # Compute the period in days that is covered between the first and last day of observation
+        # normed by the length of the period
+        first_day, last_day = day_number[cell_start], day_number[cell_start + n_records - 1]
+        period_fraction = (last_day - first_day + 1) / float(period_n_days)
+        self._set_cell_values("temporal_coverage_period_fraction", cells, period_fraction)
+
+        # Compute the temporal center of the actual data coverage in units of period length
+        # -> optimum 0.5
+        weighted_center = np.add.reduceat(day_number, cell_start) / n_records / float(period_n_days)
+        self._set_cell_values("temporal_coverage_weighted_center", cells, weighted_center)
 
 
 class Level3StatusFlag(Level3ProcessorItem):
@@ -1515,6 +2614,7 @@ class Level3GridUncertainties(Level3ProcessorItem):
                                freeboard_l3_uncertainty=dict(dtype="f4", fill_value=np.nan),
                                sea_ice_thickness_l3_uncertainty=dict(dtype="f4", fill_value=np.nan),
                                sea_ice_draft_l3_uncertainty=dict(dtype="f4", fill_value=np.nan))
+    l2_streaming_statistics = dict(radar_freeboard_uncertainty=["weight"])
 
     def __init__(self, *args, **kwargs):
         """
@@ -1533,62 +2633,71 @@ class Level3GridUncertainties(Level3ProcessorItem):
         rho_w = self.water_density
         sd_corr_fact = self.snow_depth_correction_factor
 
-        # Loop over grid items
-        for xi, yj in self.l3grid.grid_indices:
+        # Only grid cells with data
+        l3vars = self.l3grid.vars
+        has_data = ~np.isnan(l3vars["sea_ice_thickness"])
+
+        # Get parameters
+        frb = l3vars["freeboard"][has_data]
+        sd = l3vars["snow_depth"][has_data]
+        rho_i = l3vars["sea_ice_density"][has_data]
+        rho_s = l3vars["snow_density"][has_data]
+
+        # Get systematic error components
+        sd_unc = l3vars["snow_depth_uncertainty"][has_data]
+        rho_i_unc = l3vars["sea_ice_density_uncertainty"][has_data]
+        rho_s_unc = l3vars["snow_density_uncertainty"][has_data]
+
+        # Get random uncertainty
+        # Note: this applies only to the radar freeboard uncertainty.
+        #       Thus we need to recalculate the sea ice freeboard uncertainty
+
+        # Compute radar freeboard uncertainty as error or the mean from values with individual
+        # error components (error of a weighted mean)
+        weight = self._get_radar_freeboard_uncertainty_weight()[has_data]
+        with np.errstate(divide="ignore"):
+            rfrb_unc = 1. / np.sqrt(weight)
+        l3vars["radar_freeboard_l3_uncertainty"][has_data] = rfrb_unc
 
-            # Check of data exists
-            if np.isnan(self.l3grid.vars["sea_ice_thickness"][yj, xi]):
-                continue
+        # Calculate the level-3 freeboard uncertainty with updated radar freeboard uncertainty
+        deriv_snow = sd_corr_fact
+        frb_unc = np.sqrt((deriv_snow * sd_unc) ** 2. + rfrb_unc ** 2.)
+        l3vars["freeboard_l3_uncertainty"][has_data] = frb_unc
 
-            # Get parameters
-            frb = self.l3grid.vars["freeboard"][yj, xi]
-            sd = self.l3grid.vars["snow_depth"][yj, xi]
-            rho_i = self.l3grid.vars["sea_ice_density"][yj, xi]
-            rho_s = self.l3grid.vars["snow_density"][yj, xi]
-
-            # Get systematic error components
-            sd_unc = self.l3grid.vars["snow_depth_uncertainty"][yj, xi]
-            rho_i_unc = self.l3grid.vars["sea_ice_density_uncertainty"][yj, xi]
-            rho_s_unc = self.l3grid.vars["snow_density_uncertainty"][yj, xi]
-
-            # Get random uncertainty
-            # Note: this applies only to the radar freeboard uncertainty.
-            #       Thus we need to recalculate the sea ice freeboard uncertainty
-
-            # Get the stack of radar freeboard uncertainty values and remove NaN's
-            # rfrb_unc = self.l3["radar_freeboard_uncertainty"][yj, xi]
-            rfrb_uncs = np.array(self.l3grid.l2.stack["radar_freeboard_uncertainty"][yj][xi])
-            rfrb_uncs = rfrb_uncs[~np.isnan(rfrb_uncs)]
-
-            # Compute radar freeboard uncertainty as error or the mean from values with individual
-            # error components (error of a weighted mean)
-            weight = np.nansum(1. / rfrb_uncs ** 2.)
-            rfrb_unc = 1. / np.sqrt(weight)
-            self.l3grid.vars["radar_freeboard_l3_uncertainty"][yj, xi] = rfrb_unc
+        # Calculate the level-3 thickness uncertainty
+        errprop_args = [frb, sd, rho_w, rho_i, rho_s, frb_unc, sd_unc, rho_i_unc, rho_s_unc]
+        sit_l3_unc = frb2sit_errprop(*errprop_args)
+
+        # Cap the uncertainty
+        # (very large values may appear in extreme cases)
+        sit_l3_unc = np.where(sit_l3_unc > self.max_l3_uncertainty, self.max_l3_uncertainty, sit_l3_unc)
 
-            # Calculate the level-3 freeboard uncertainty with updated radar freeboard uncertainty
-            deriv_snow = sd_corr_fact
-            frb_unc = np.sqrt((deriv_snow * sd_unc) ** 2. + rfrb_unc ** 2.)
-            self.l3grid.vars["freeboard_l3_uncertainty"][yj, xi] = frb_unc
+        # Assign Level-3 uncertainty
+        l3vars["sea_ice_thickness_l3_uncertainty"][has_data] = sit_l3_unc
 
-            # Calculate the level-3 thickness uncertainty
-            errprop_args = [frb, sd, rho_w, rho_i, rho_s, frb_unc, sd_unc, rho_i_unc, rho_s_unc]
-            sit_l3_unc = frb2sit_errprop(*errprop_args)
+        # Compute sea ice draft uncertainty
+        if not "sea_ice_draft" in l3vars:
+            return
 
-            # Cap the uncertainty
-            # (very large values may appear in extreme cases)
-            if sit_l3_unc > self.max_l3_uncertainty:
-                sit_l3_unc = self.max_l3_uncertainty
+        sid_l3_unc = np.sqrt(sit_l3_unc ** 2. + frb_unc ** 2.)
+        l3vars["sea_ice_draft_l3_uncertainty"][has_data] = sid_l3_unc
 
-            # Assign Level-3 uncertainty
-            self.l3grid.vars["sea_ice_thickness_l3_uncertainty"][yj, xi] = sit_l3_unc
+    def _get_radar_freeboard_uncertainty_weight(self):
+        """ Returns the sum of the inverse squared radar freeboard uncertainties for all grid cells
+        with dimensions (numy, numx) (from the l2 stack or the running grid cell statistics in streaming mode) """
 
-            # Compute sea ice draft uncertainty
-            if not "sea_ice_draft" in self.l3grid.vars:
-                continue
+        statistics = self.l3grid.l2.statistics
+        if statistics is not None:
+            return statistics.get("radar_freeboard_uncertainty", "weight")
 
-            sid_l3_unc = np.sqrt(sit_l3_unc ** 2. + frb_unc ** 2.)
-            self.l3grid.vars["sea_ice_draft_l3_uncertainty"][yj, xi] = sid_l3_unc
+        # Get the stack of radar freeboard uncertainty values and remove NaN's
+        stack = self.l3grid.l2
+        cell_index, rfrb_uncs = stack.get_cell_records("radar_freeboard_uncertainty")
+        is_valid = ~np.isnan(rfrb_uncs)
+        with np.errstate(divide="ignore"):
+            weights = 1. / rfrb_uncs[is_valid].astype(np.float64) ** 2.
+        weight = np.bincount(cell_index[is_valid], weights=weights, minlength=stack.n_cells)
+        return weight.reshape(stack.shape)
 
 
 class Level3ParameterMask(Level3ProcessorItem):
@@ -1699,7 +2808,13 @@ class Level3GriddedClassifiers(Level3ProcessorItem):
         self._surface_type_dict = SurfaceType.SURFACE_TYPE_DICT
 
         # Statistical function dictionary
-        self._stat_functions = dict(mean=lambda x: np.nanmean(x), sdev=lambda x: np.nanstd(x))
+        # (functions of the flat grid cell index and values of the records and the number of grid cells)
+        self._stat_functions = dict(mean=self.get_grouped_mean, sdev=self.get_grouped_sdev)
+
+    @classmethod
+    def get_l2_stack_parameters(cls, **cfg):
+        """ The classifier parameters are required in the l2 stack in addition to the surface type """
+        return list(cls.l2_variable_dependencies) + list(cfg.get("parameters", []))
 
     def apply(self):
         """
@@ -1708,15 +2823,15 @@ class Level3GriddedClassifiers(Level3ProcessorItem):
         """
 
         # Get surface type flag
-        surface_type = self.l3grid.l2.stack["surface_type"]
+        _, surface_type = self.l3grid.l2.get_cell_records("surface_type")
         target_surface_types = self.surface_types
         target_surface_types.append("all")
 
         # Loop over all parameters
         for parameter_name in self.parameters:
-            # Get the stack
+            # Get the stacked records
             try:
-             classifier_stack = self.l3grid.l2.stack[parameter_name]
+                cell_index, classifier_values = self.l3grid.l2.get_cell_records(parameter_name)
             except KeyError:
                 msg = "Level-3 processor item %s requires l2 stack parameter [%s], which does not exist"
                 msg = msg % (self.__class__.__name__, parameter_name)
@@ -1727,15 +2842,17 @@ class Level3GriddedClassifiers(Level3ProcessorItem):
             for statistic in self.statistics:
                 # Loop over target surface types
                 for target_surface_type in target_surface_types:
-                    self._compute_grid_variable(parameter_name, classifier_stack, surface_type, target_surface_type,
-                                                statistic)
+                    self._compute_grid_variable(parameter_name, cell_index, classifier_values, surface_type,
+                                                target_surface_type, statistic)
 
-    def _compute_grid_variable(self, parameter_name, classifier_stack, surface_type, target_surface_type, statistic):
+    def _compute_grid_variable(self, parameter_name, cell_index, classifier_values, surface_type,
+                               target_surface_type, statistic):
         """
         Computes gridded surface type statistics for all grid cells
         :param parameter_name: The name of the classifier (for output name generation)
-        :param classifier_stack: The Level-2 stack for the given classifier
-        :param surface_type: The Level-2 stack of surface type
+        :param cell_index: The flat grid cell index of the Level-2 records
+        :param classifier_values: The Level-2 records of the given classifier
+        :param surface_type: The Level-2 records of surface type
         :param target_surface_type: The name of the target surface type
         :param statistic: The name of the statistic to be computed
         :return:
@@ -1745,26 +2862,54 @@ class Level3GriddedClassifiers(Level3ProcessorItem):
         grid_var_name = "stat_%s_%s_%s" % (parameter_name, target_surface_type, statistic)
         self.l3grid.add_grid_variable(grid_var_name, np.nan, "f4")
 
-        # Loop over all grid cells
-        for xi, yj in self.l3grid.grid_indices:
+        # Get the surface type target subset
+        if target_surface_type == "all":
+            subset = np.ones(cell_index.shape, dtype=bool)
+        else:
+            try:
+                surface_type_target_flag = self._surface_type_dict[target_surface_type]
+                subset = surface_type == surface_type_target_flag
+            except KeyError:
+                msg = "Surface type %s does not exist" % target_surface_type
+                self.error.add_error("l3procitem-incorrect-option", msg)
+                self.error.raise_on_error()
 
-            classifier_grid_values = np.array(classifier_stack[yj][xi])
-            surface_type_flags = np.array(surface_type[yj][xi])
+        # A minimum of two values is needed to compute statistics
+        n_cells = self.l3grid.l2.n_cells
+        cells = np.flatnonzero(np.bincount(cell_index[subset], minlength=n_cells) >= 2)
+        result = self._stat_functions[statistic](cell_index[subset], classifier_values[subset], n_cells)
+        self._set_cell_values(grid_var_name, cells, result[cells])
 
-            # Get the surface type target subset
-            if target_surface_type == "all":
-                subset = np.arange(len(classifier_grid_values))
-            else:
-                try:
-                    surface_type_target_flag = self._surface_type_dict[target_surface_type]
-                    subset = np.where(surface_type_flags == surface_type_target_flag)[0]
-                except KeyError:
-                    msg = "Surface type %s does not exist" % target_surface_type
-                    self.error.add_error("l3procitem-incorrect-option", msg)
-                    self.error.raise_on_error()
-
-            # A minimum of two values is needed to compute statistics
-            if len(subset) < 2:
-                continue
-            result = self._stat_functions[statistic](classifier_grid_values[subset])
-            self.l3grid.vars[grid_var_name][yj][xi] = result
+    @staticmethod
+    def get_grouped_mean(cell_index, values, n_cells):
+        """
+        Computes the mean of finite values per grid cell (same as numpy.nanmean)
+        :param cell_index: flat grid cell index of each value
+        :param values: values
+        :param n_cells: number of grid cells
+        :return: flat array with the mean per grid cell (NaN for grid cells without finite values)
+        """
+        values = values.astype(np.float64)
+        is_finite = np.isfinite(values)
+        count = np.bincount(cell_index[is_finite], minlength=n_cells)
+        total = np.bincount(cell_index[is_finite], weights=values[is_finite], minlength=n_cells)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return total / count
+
+    @classmethod
+    def get_grouped_sdev(cls, cell_index, values, n_cells):
+        """
+        Computes the standard deviation of finite values per grid cell (same as numpy.nanstd)
+        :param cell_index: flat grid cell index of each value
+        :param values: values
+        :param n_cells: number of grid cells
+        :return: flat array with the standard deviation per grid cell (NaN for grid cells without finite values)
+        """
+        values = values.astype(np.float64)
+        is_finite = np.isfinite(values)
+        count = np.bincount(cell_index[is_finite], minlength=n_cells)
+        mean = cls.get_grouped_mean(cell_index, values, n_cells)
+        residuals = (values[is_finite] - mean[cell_index[is_finite]]) ** 2.
+        variance = np.bincount(cell_index[is_finite], weights=residuals, minlength=n_cells)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(variance / count)
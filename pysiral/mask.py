@@ -16,10 +16,14 @@ from pysiral.iotools import ReadNC
 from collections import OrderedDict
 from netCDF4 import Dataset
 
-from pyresample import image, geometry, kd_tree
+from pyresample import geometry, kd_tree
 import numpy as np
-import struct
 from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import socket
 
 
 def MaskSourceFile(mask_name, mask_cfg):
@@ -57,6 +61,11 @@ class MaskSourceBase(DefaultLoggingClass):
         self._area_def = None
         self._post_flipud = False
 
+        # Optional on-disk cache of the kd-tree neighbour information per source/target grid pair
+        # (mask option `disk_cache_dir`, default: None -> off)
+        disk_cache_dir = cfg.get("disk_cache_dir", None)
+        self._neighbour_info_cache = NeighbourInfoDiskCache(disk_cache_dir) if disk_cache_dir is not None else None
+
     def set_mask(self, mask, area_def):
         """ Set grid definition for the mask source grid using pyresample.
         The argument area_def needs to have the attributes needed as arguments
@@ -82,33 +91,55 @@ class MaskSourceBase(DefaultLoggingClass):
         The argument griddef is needs to be a pysiral.grid.GridDefinition
         instance """
 
+        # Resample the mask
+        target_mask = self.get_l3_mask(griddef)
+
+        # Write the mask to a netCDF file
+        # (the filename will be automatically generated if not specifically
+        # passed to this method
+        if nc_filepath is None:
+            nc_filename = "%s_%s.nc" % (self.mask_name, griddef.grid_id)
+            nc_filepath = Path(self.mask_dir) / nc_filename
+        self.log.info("Export mask file: %s" % nc_filepath)
+        self._write_netcdf(nc_filepath, griddef, target_mask)
+
+    def get_l3_mask(self, griddef):
+        """ Returns the source mask resampled to the grid definition (including
+        the optional post-processing). The argument griddef needs to be a
+        pysiral.grid.GridDefinition instance """
+
         # Get the area definition for the grid
         if not isinstance(griddef, GridDefinition):
             msg = "griddef needs to be of type pysiral.grid.GridDefinition"
             self.error.add_error("value-error", msg)
+            self.error.raise_on_error()
+        target_area_def = griddef.pyresample_area_def
 
-        # Resample the mask
+        # Options for the kd-tree neighbour search and the resampling
+        # NOTE: Both methods are the pyresample functions `ImageContainerNearest.resample`
+        #       & `kd_tree.resample_gauss` split into the neighbour search and sampling
+        keyw = dict(self.cfg.pyresample_keyw)
+        fill_value = keyw.pop("fill_value", 0)
         if self.cfg.pyresample_method == "ImageContainerNearest":
-            resample = image.ImageContainerNearest(
-                    self.source_mask, self.source_area_def,
-                    **self.cfg.pyresample_keyw)
-            resample_result = resample.resample(griddef.pyresample_area_def)
-            target_mask = resample_result.image_data
-
+            resample_type, neighbours, weight_funcs, with_uncert = "nn", 1, None, False
         elif self.cfg.pyresample_method == "resample_gauss":
-
-            result, stddev, count = kd_tree.resample_gauss(
-                    self.source_area_def, self.source_mask,
-                    griddef.pyresample_area_def, with_uncert=True,
-                    **self.cfg.pyresample_keyw)
-            target_mask = result
-
+            sigma = float(keyw.pop("sigmas"))
+            neighbours = keyw.pop("neighbours", 8)
+            resample_type, with_uncert = "custom", True
+            weight_funcs = lambda r: np.exp(-r ** 2 / sigma ** 2)
         else:
             msg = "Unrecognized opt pyresample_method: %s need to be %s" % (
                     str(self.cfg.pyresample_method),
                     "(ImageContainerNearest, resample_gauss)")
             self.error.add_error("invalid-pr-method", msg)
-            self.error.add_error()
+            self.error.raise_on_error()
+
+        # Resample the mask
+        neighbour_info = self.get_neighbour_info(target_area_def, neighbours=neighbours, **keyw)
+        result = kd_tree.get_sample_from_neighbour_info(
+                resample_type, target_area_def.shape, self.source_mask, *neighbour_info,
+                weight_funcs=weight_funcs, fill_value=fill_value, with_uncert=with_uncert)
+        target_mask = result[0] if with_uncert else result
 
         # pyresample may use masked arrays -> set nan's to missing data
         try:
@@ -120,14 +151,35 @@ class MaskSourceBase(DefaultLoggingClass):
             pp_method = getattr(self, self.cfg.post_processing)
             target_mask = pp_method(target_mask, griddef)
 
-        # Write the mask to a netCDF file
-        # (the filename will be automatically generated if not specifically
-        # passed to this method
-        if nc_filepath is None:
-            nc_filename = "%s_%s.nc" % (self.mask_name, griddef.grid_id)
-            nc_filepath = Path(self.mask_dir) / nc_filename
-        self.log.info("Export mask file: %s" % nc_filepath)
-        self._write_netcdf(nc_filepath, griddef, target_mask)
+        return target_mask
+
+    def get_neighbour_info(self, target_area_def, radius_of_influence, neighbours=8, epsilon=0,
+                           reduce_data=True, nprocs=1, segments=None):
+        """ Returns the kd-tree neighbour information of the source mask grid for the target
+        area definition (see pyresample.kd_tree.get_neighbour_info), from the on-disk
+        cache if available """
+
+        neighbour_keyw = dict(radius_of_influence=radius_of_influence, neighbours=neighbours,
+                              epsilon=epsilon, reduce_data=reduce_data, segments=segments)
+
+        # Compute the neighbour information without cache
+        if self._neighbour_info_cache is None:
+            return kd_tree.get_neighbour_info(self.source_area_def, target_area_def, nprocs=nprocs,
+                                              **neighbour_keyw)
+
+        key = self._neighbour_info_cache.get_key(self.source_key, self.source_area_def,
+                                                 target_area_def, **neighbour_keyw)
+        neighbour_info = self._neighbour_info_cache.read(key)
+        if neighbour_info is None:
+            self.log.info("Compute kd-tree neighbour information (%s -> %s)" % (
+                self.mask_name, target_area_def.area_id))
+            neighbour_info = kd_tree.get_neighbour_info(self.source_area_def, target_area_def, nprocs=nprocs,
+                                                        **neighbour_keyw)
+            self._neighbour_info_cache.write(key, neighbour_info)
+        else:
+            self.log.info("Use cached kd-tree neighbour information (%s -> %s)" % (
+                self.mask_name, target_area_def.area_id))
+        return neighbour_info
 
     def _write_netcdf(self, nc_filepath, griddef, mask):
         """ Write a netCDF file with the mask in the target
@@ -156,7 +208,7 @@ class MaskSourceBase(DefaultLoggingClass):
         rootgrp.setncattr("grid_id", griddef.grid_id)
 
         # Write dimensions
-        dims = dimdict.keys()
+        dims = list(dimdict.keys())
         for key in dims:
             rootgrp.createDimension(key, dimdict[key])
 
@@ -198,6 +250,16 @@ class MaskSourceBase(DefaultLoggingClass):
     def mask_dir(self):
         return str(self._mask_dir)
 
+    @property
+    def mask_filepath(self):
+        return Path(self.mask_dir) / self.cfg.filename
+
+    @property
+    def source_key(self):
+        """ Identifies the source mask (name, source file & modification time) """
+        path = Path(self.mask_filepath).resolve()
+        return "%s:%s:%d" % (self.mask_name, str(path), path.stat().st_mtime_ns)
+
     @property
     def source_mask(self):
         return self._mask
@@ -213,6 +275,10 @@ class MaskLandSea2Min(MaskSourceBase):
     There seems to be a few issues with the land ice mask in some places,
     therefore we limit the mask to 0: sea, 1: mixed, 2: non-sea (land) """
 
+    # Dimensions (longitude, latitude) of the mask & header size of the binary file
+    source_shape = (10800, 5400)
+    n_bytes_header = 1392
+
     def __init__(self, mask_dir, mask_name, cfg):
         super(MaskLandSea2Min, self).__init__(mask_dir, mask_name, cfg)
         self.construct_source_mask()
@@ -221,18 +287,11 @@ class MaskLandSea2Min(MaskSourceBase):
         """ Read the binary file and set the mask """
 
         # Settings for the binary file
-        xdim, ydim = 10800, 5400
-        mask_struct_fmt = "<%0.fB" % (xdim * ydim)
-        n_bytes_header = 1392
-
-        # Read the content of the landmask in a string
-        with open(str(self.mask_filepath), "rb") as fh:
-            # Skip header
-            fh.seek(n_bytes_header)
-            content = fh.read(xdim*ydim)
-
-        # decode string & order to array
-        mask_val = np.array(struct.unpack(mask_struct_fmt, content))
+        xdim, ydim = self.source_shape
+
+        # Read the content of the landmask (bytes after the header) & order to array
+        mask_val = np.fromfile(str(self.mask_filepath), dtype=np.uint8, count=xdim*ydim,
+                               offset=self.n_bytes_header)
         mask = mask_val.reshape((xdim, ydim))
         mask = mask.transpose()
 
@@ -269,10 +328,6 @@ class MaskLandSea2Min(MaskSourceBase):
         # Return as byte array (also needs to be flipped)
         return np.flipud(pp_mask.astype(np.int8))
 
-    @property
-    def mask_filepath(self):
-        return Path(self.mask_dir) / self.cfg.filename
-
 
 class MaskW99Valid(MaskSourceBase):
     """ A valid mask for the Warren climatology  """
@@ -309,9 +364,78 @@ class MaskW99Valid(MaskSourceBase):
         # Done
         return resampled_mask
 
-    @property
-    def mask_filepath(self):
-        return Path(self.mask_dir) / self.cfg.filename
+
+class NeighbourInfoDiskCache(object):
+    """
+    On-disk cache for the kd-tree neighbour information of pyresample (valid input index,
+    valid output index, index array and distance array, see pyresample.kd_tree.get_neighbour_info)
+    per source/target grid pair. Each array is stored as an uncompressed `.npy` file that is opened
+    as read-only memory map, thus the neighbour search only runs once for regenerating masks
+    for several grids or reruns.
+
+    The cache entries are keyed by the source mask (name, source file & modification time),
+    the source & target area definitions and the options of the neighbour search. A json sidecar
+    is written after all arrays and marks the cache entry as complete.
+    """
+
+    array_names = ["valid_input_index", "valid_output_index", "index_array", "distance_array"]
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get_key(self, source_key, source_area_def, target_area_def, **neighbour_keyw):
+        """ The key of the source/target grid pair and the options of the neighbour search """
+        key_dict = dict(source=source_key, source_area_def=self.get_area_def_description(source_area_def),
+                        target_area_def=self.get_area_def_description(target_area_def),
+                        neighbour_keyw=neighbour_keyw)
+        key_hash = hashlib.sha1(json.dumps(key_dict, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        name = re.sub(r"[^\w-]", "_", "%s_%s" % (source_key.split(":")[0], target_area_def.area_id))
+        return "%s_%s" % (name, key_hash)
+
+    @staticmethod
+    def get_area_def_description(area_def):
+        """ Description of an area definition (None for swath/grid definitions with longitude/latitude
+        arrays, which are identified by the source key) """
+        if not isinstance(area_def, geometry.AreaDefinition):
+            return None
+        return dict(proj=str(area_def.proj_str), shape=[int(n) for n in area_def.shape],
+                    area_extent=[float(value) for value in area_def.area_extent])
+
+    def get_array_filepath(self, key, array_name):
+        return self.directory / ("%s_%s.npy" % (key, array_name))
+
+    def read(self, key):
+        """ Returns the neighbour information for the key (memory maps) or None if not in the cache """
+        try:
+            with open(str(self.directory / ("%s.json" % key)), "r") as fhandle:
+                json.load(fhandle)
+        except (IOError, ValueError):
+            return None
+        filepaths = [self.get_array_filepath(key, array_name) for array_name in self.array_names]
+        if not all(filepath.is_file() for filepath in filepaths):
+            return None
+        return tuple(np.load(str(filepath), mmap_mode="r") for filepath in filepaths)
+
+    def write(self, key, neighbour_info):
+        """ Write the arrays & the sidecar (temporary files first, parallel processes may write
+        the same entry) """
+        hostname = re.sub(r"[^\w-]", "_", socket.gethostname())
+        tmp_suffix = ".%s_%d.tmp" % (hostname, os.getpid())
+        arrays = []
+        for array_name, array in zip(self.array_names, neighbour_info):
+            array = np.ma.getdata(array)
+            filepath = self.get_array_filepath(key, array_name)
+            tmp_filepath = filepath.with_name(filepath.name + tmp_suffix)
+            with open(str(tmp_filepath), "wb") as fhandle:
+                np.save(fhandle, np.ascontiguousarray(array))
+            os.replace(str(tmp_filepath), str(filepath))
+            arrays.append(dict(name=array_name, dtype=str(array.dtype), shape=list(array.shape)))
+        sidecar_filepath = self.directory / ("%s.json" % key)
+        tmp_filepath = sidecar_filepath.with_name(sidecar_filepath.name + tmp_suffix)
+        with open(str(tmp_filepath), "w") as fhandle:
+            json.dump(dict(arrays=arrays), fhandle, indent=1)
+        os.replace(str(tmp_filepath), str(sidecar_filepath))
 
 
 class L3Mask(DefaultLoggingClass):
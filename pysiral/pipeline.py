@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Helper classes for overlapping file I/O with processing (prefetching of input
+files and write-behind of output files in background threads)
+
+The classes are intended for the orbit loops of the processors, where reading
+the next input file and writing the output of the previous orbit can be done
+while the current orbit is processed. Both classes use bounded queues, thus
+the number of data objects held in memory is capped by the queue depth.
+
+Exceptions in the background threads (including SystemExit caused by
+`ErrorStatus.raise_on_error`) are re-raised in the calling thread:
+
+    - PrefetchReader: when the item that caused the exception is requested,
+      i.e. at the same position as in a serial loop
+    - WriteBehindQueue: at the next `submit` or `close` after the exception.
+      Only the exception of the first failed item (in order of submission) is
+      raised, all later items are discarded.
+"""
+
+import sys
+import threading
+from queue import Queue, Empty, Full
+
+
+# The netCDF library is not thread-safe: All netCDF file access in background threads
+# (and the corresponding access in the main thread) must hold this lock
+NETCDF_IO_LOCK = threading.RLock()
+
+# Marks the end of the item stream in the queues
+_END_OF_QUEUE = object()
+
+# Timeout (seconds) for blocking queue operations to check for shutdown requests
+_POLL_INTERVAL = 0.1
+
+
+class PrefetchReader(object):
+    """
+    Iterator that returns (item, read_func(item)) for a list of items, while a
+    background thread already reads the next item(s).
+    """
+
+    def __init__(self, items, read_func, depth=1, lock=None):
+        """
+        :param items: list of items (e.g. file names)
+        :param read_func: function with the item as single argument
+        :param depth: maximum number of read results waiting in the queue
+        :param lock: (optional) lock that is held during `read_func` (e.g. to prevent concurrent
+            netCDF access by reader and writer threads)
+        """
+        self._items = list(items)
+        self._read_func = read_func
+        self._lock = lock
+        self._queue = Queue(maxsize=max(int(depth), 1))
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="PrefetchReader")
+        self._thread.daemon = True
+        self._started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __iter__(self):
+        self._start()
+        while True:
+            entry = self._get()
+            if entry is _END_OF_QUEUE:
+                break
+            item, result, exc_info = entry
+            if exc_info is not None:
+                self.close()
+                _reraise(exc_info)
+            yield item, result
+
+    def close(self):
+        """ Stop the reader thread and discard all prefetched results """
+        self._stop_event.set()
+        if not self._started:
+            return
+        while self._thread.is_alive():
+            self._drain()
+            self._thread.join(_POLL_INTERVAL)
+        self._drain()
+
+    def _start(self):
+        if not self._started:
+            self._started = True
+            self._thread.start()
+
+    def _run(self):
+        for item in self._items:
+            if self._stop_event.is_set():
+                return
+            try:
+                if self._lock is not None:
+                    with self._lock:
+                        result = self._read_func(item)
+                else:
+                    result = self._read_func(item)
+            except BaseException:
+                self._put((item, None, sys.exc_info()))
+                return
+            self._put((item, result, None))
+        self._put(_END_OF_QUEUE)
+
+    def _put(self, entry):
+        """ Blocking put, which is cancelled by a shutdown request """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(entry, timeout=_POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def _get(self):
+        while True:
+            try:
+                return self._queue.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                if not self._thread.is_alive() and self._queue.empty():
+                    return _END_OF_QUEUE
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                return
+
+
+class WriteBehindQueue(object):
+    """
+    Executes `write_func(item)` for each submitted item in a background thread in order of
+    submission. `submit` blocks if `depth` items are already waiting to be written.
+    """
+
+    def __init__(self, write_func, depth=1, lock=None):
+        """
+        :param write_func: function with the item as single argument
+        :param depth: maximum number of items waiting in the queue
+        :param lock: (optional) lock that is held during `write_func`
+        """
+        self._write_func = write_func
+        self._lock = lock
+        self._queue = Queue(maxsize=max(int(depth), 1))
+        self._exc_info = None
+        self._n_written = 0
+        self._thread = threading.Thread(target=self._run, name="WriteBehindQueue")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # NOTE: Items submitted before an exception in the calling thread are still written,
+        #       but that exception has priority over errors of the write-behind thread
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown()
+        return False
+
+    def submit(self, item):
+        """
+        Add an item to the write queue (blocks if the queue is full)
+        :param item: argument for the write function
+        :return: None
+        """
+        self.raise_on_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("write-behind queue has already been closed")
+        self._queue.put(item)
+
+    def close(self):
+        """ Write all pending items and raise the exception of the first failed item (if any) """
+        self._shutdown()
+        self.raise_on_error()
+
+    def raise_on_error(self):
+        if self._exc_info is not None:
+            _reraise(self._exc_info)
+
+    @property
+    def n_written(self):
+        return int(self._n_written)
+
+    def _shutdown(self):
+        if self._thread.is_alive():
+            self._queue.put(_END_OF_QUEUE)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_QUEUE:
+                return
+            # Discard all items after the first error
+            if self._exc_info is not None:
+                continue
+            try:
+                if self._lock is not None:
+                    with self._lock:
+                        self._write_func(item)
+                else:
+                    self._write_func(item)
+                self._n_written += 1
+            except BaseException:
+                self._exc_info = sys.exc_info()
+
+
+def _reraise(exc_info):
+    """ Raise an exception from a different thread with its original traceback """
+    exc_type, exc_value, traceback = exc_info
+    raise exc_value.with_traceback(traceback)
@@ -14,9 +14,9 @@ except:
     CYTFMRA_OK = False
 
 
+from pysiral.config import OptionField, compile_options
 from pysiral.flag import ANDCondition, FlagContainer
 
-from attrdict import AttrDict
 import numpy as np
 import sys
 
@@ -25,12 +25,29 @@ from scipy.interpolate import interp1d
 import bottleneck as bn
 
 
+# Option declaration of the TFMRA retracker family (lists are [lrm, sar, sin])
+TFMRA_OPTION_FIELDS = {
+    "threshold": OptionField((float, dict), default=0.5),
+    "offset": OptionField(float, default=0.0),
+    "wfm_oversampling_factor": OptionField(int, default=10),
+    "wfm_oversampling_method": OptionField(str, default="linear"),
+    "wfm_smoothing_window_size": OptionField(tuple, default=(11, 11, 51)),
+    "first_maximum_normalized_threshold": OptionField(tuple, default=(0.15, 0.15, 0.45)),
+    "first_maximum_local_order": OptionField(int, default=1),
+    "range_bias": OptionField(tuple),
+    "uncertainty": OptionField(dict)}
+
+
 class BaseRetracker(object):
     """
     Main Retracker Class (all retrackers must be of instance BaseRetracker)
     # TODO: API clean-up is sorely needed.
     """
 
+    # Declaration of the retracker options ({option_name: OptionField}). If set, the
+    # options are validated and completed with default values in `set_options`
+    OPTION_FIELDS = None
+
     def __init__(self):
         self._indices = None
         self._classifier = None
@@ -47,8 +64,9 @@ class BaseRetracker(object):
         self.auxdata_output = []
 
     def set_options(self, **opt_dict):
-        # TODO: Create options object, respectively use __init__
-        self._options = AttrDict(opt_dict)
+        # NOTE: The options are compiled into a read-only object with slots, since they
+        #       are accessed for each waveform in the retracker loops
+        self._options = compile_options(opt_dict, fields=self.OPTION_FIELDS, name=self.__class__.__name__)
 
     def set_indices(self, indices):
         # TODO: Validation
@@ -140,6 +158,8 @@ class SICCI2TfmraEnvisat(BaseRetracker):
 
     DOCSTR = r"Threshold first maximum retracker (TFMRA)"
 
+    OPTION_FIELDS = dict(TFMRA_OPTION_FIELDS, threshold=OptionField((float, dict), default=dict(type="fixed", value=0.5)))
+
     def __init__(self):
         super(SICCI2TfmraEnvisat, self).__init__()
 
@@ -172,6 +192,7 @@ class SICCI2TfmraEnvisat(BaseRetracker):
         lew = lew1+lew2
         sitype = self._l2.sitype
         tfmra_threshold = self.get_tfmra_threshold(sigma0, lew, sitype, indices)
+        offset = self._options.offset
 
         for i in indices:
 
@@ -193,7 +214,7 @@ class SICCI2TfmraEnvisat(BaseRetracker):
             tfmra_range, tfmra_power = self.get_threshold_range(filt_rng, filt_wfm, fmi, tfmra_threshold[i])
 
             # Mandatory return function
-            self._range[i] = tfmra_range + self._options.offset
+            self._range[i] = tfmra_range + offset
             self._power[i] = tfmra_power * norm
 
         if "uncertainty" in self._options:
@@ -405,6 +426,8 @@ class TFMRA(BaseRetracker):
 
     DOCSTR = r"Threshold first maximum retracker (TFMRA)"
 
+    OPTION_FIELDS = TFMRA_OPTION_FIELDS
+
     def __init__(self):
         super(TFMRA, self).__init__()
 
@@ -430,6 +453,9 @@ class TFMRA(BaseRetracker):
     def l2_retrack(self, rng, wfm, indices, radar_mode, is_valid):
         """ API Calling method """
 
+        tfmra_threshold = self._options.threshold
+        offset = self._options.offset
+
         for i in indices:
 
             # Get the filtered waveform, index of first maximum & norm
@@ -443,12 +469,11 @@ class TFMRA(BaseRetracker):
                 return
 
             # Get track point and its power
-            tfmra_threshold = self._options.threshold
             tfmra_range, tfmra_power = self.get_threshold_range(
                 filt_rng, filt_wfm, fmi, tfmra_threshold)
 
             # Mandatory return function
-            self._range[i] = tfmra_range + self._options.offset
+            self._range[i] = tfmra_range + offset
             self._power[i] = tfmra_power * norm
 
         # Apply a radar mode dependent range bias if option is in
@@ -608,6 +633,8 @@ class cTFMRA(BaseRetracker):
 
     DOCSTR = r"Threshold first maximum retracker (TFMRA)"
 
+    OPTION_FIELDS = TFMRA_OPTION_FIELDS
+
     def __init__(self):
         super(cTFMRA, self).__init__()
 
@@ -637,6 +664,7 @@ class cTFMRA(BaseRetracker):
         # auxiliary parameter
         tfmra_threshold = self.get_tfmra_threshold(indices)
         self.register_auxdata_output("tfmrathr", "tfmra_threshold", tfmra_threshold)
+        offset = self._options.offset
 
         # Loop over all waveforms
         # TODO: This is a candidate for multi-processing
@@ -659,7 +687,7 @@ class cTFMRA(BaseRetracker):
             tfmra_range, tfmra_power = self.get_threshold_range(filt_rng, filt_wfm, fmi, tfmra_threshold[i])
 
             # Set the values
-            self._range[i] = tfmra_range + self._options.offset
+            self._range[i] = tfmra_range + offset
             self._power[i] = tfmra_power * norm
 
         # Apply a radar mode dependent range bias if option is in
@@ -4,14 +4,13 @@ import xmltodict
 
 import xarray
 import numpy as np
-from scipy import interpolate
 from cftime import num2pydate
 from pathlib import Path
 
 from pysiral import __version__ as pysiral_version
 from pysiral.clocks import StopWatch
 from pysiral.errorhandler import ErrorStatus
-from pysiral.helper import parse_datetime_str
+from pysiral.helper import Interp1HzTo20Hz, parse_datetime_str
 from pysiral.l1bdata import Level1bData
 from pysiral.logging import DefaultLoggingClass
 from pysiral.surface_type import ESA_SURFACE_TYPE_DICT
@@ -38,6 +37,9 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         # Init main class variables
         self.nc = None
 
+        # Interpolation of 1Hz variables to the 20Hz records (computed once per file)
+        self._interp_1Hz_to_20Hz = None
+
         # Debug variables
         self.timer = None
 
@@ -93,24 +95,17 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         # Return the l1 object
         return self.l1
 
-    @staticmethod
-    def interp_1Hz_to_20Hz(variable_1Hz, time_1Hz, time_20Hz, **kwargs):
+    def interp_1Hz_to_20Hz(self, variables_1Hz, **kwargs):
         """
-        Computes a simple linear interpolation to transform a 1Hz into a 20Hz variable
-        :param variable_1Hz: an 1Hz variable array
-        :param time_1Hz: 1Hz reference time
-        :param time_20Hz: 20 Hz reference time
-        :return: the interpolated 20Hz variable
+        Computes a simple linear interpolation to transform 1Hz into 20Hz variables. The interpolation
+        weights are computed only once for the 1Hz and 20Hz time axes of the current file
+        :param variables_1Hz: an 1Hz variable array or a stacked array of 1Hz variables (one variable per row)
+        :param kwargs: keywords for pysiral.helper.Interp1HzTo20Hz.__call__
+        :return: the interpolated 20Hz variable(s), error status (per variable)
         """
-        error_status = False
-        try:
-            f = interpolate.interp1d(time_1Hz, variable_1Hz, bounds_error=False, **kwargs)
-            variable_20Hz = f(time_20Hz)
-        except ValueError:
-            fill_value = np.nan
-            variable_20Hz = np.full(time_20Hz.shape, fill_value)
-            error_status = True
-        return variable_20Hz, error_status
+        if self._interp_1Hz_to_20Hz is None:
+            self._interp_1Hz_to_20Hz = Interp1HzTo20Hz(self.nc.time_01.values, self.nc.time_20_ku.values)
+        return self._interp_1Hz_to_20Hz(variables_1Hz, **kwargs)
 
     @staticmethod
     def parse_sentinel3_l1b_xml_header(filename):
@@ -154,6 +149,7 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         :param filepath: The full filepath to the netCDF file
         :return: none
         """
+        self._interp_1Hz_to_20Hz = None
         try:
             self.nc = xarray.open_dataset(filepath, decode_times=False, mask_and_scale=True)
         except:
@@ -242,11 +238,11 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
 
         # Set antenna attitude
         # NOTE: This are only available in 1Hz and need to be interpolated
-        time_01, time_20 = self.nc.time_01.values, self.nc.time_20_ku.values
-        pitch_angle_20, stat = self.interp_1Hz_to_20Hz(self.nc.off_nadir_pitch_angle_pf_01.values, time_01, time_20)
-        roll_angle_20, stat = self.interp_1Hz_to_20Hz(self.nc.off_nadir_roll_angle_pf_01.values, time_01, time_20)
-        yaw_angle_20, stat = self.interp_1Hz_to_20Hz(self.nc.off_nadir_yaw_angle_pf_01.values, time_01, time_20)
-        self.l1.time_orbit.set_antenna_attitude(pitch_angle_20, roll_angle_20, yaw_angle_20)
+        angles_01 = np.array([self.nc.off_nadir_pitch_angle_pf_01.values,
+                              self.nc.off_nadir_roll_angle_pf_01.values,
+                              self.nc.off_nadir_yaw_angle_pf_01.values])
+        angles_20, stat = self.interp_1Hz_to_20Hz(angles_01)
+        self.l1.time_orbit.set_antenna_attitude(*angles_20)
 
     def _set_waveform_data_group(self):
         """
@@ -260,7 +256,6 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         # Get the waveform
         # NOTE: The waveform is given in counts
         wfm_counts = self.nc.waveform_20_ku.values
-        n_records, n_range_bins = wfm_counts.shape
 
         # Convert the waveform to power
         # TODO: This needs to be verified. Currently using the scale factor and documentation in netcdf unclear
@@ -269,30 +264,24 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         #  It is corrected for AGC instrumental errors (agc_cor_20_ku) and internal calibration (sig0_cal_20_ku)"
         # NOTE: Make sure type of waveform is float and not double
         #       (double will cause issues with cythonized retrackers)
-        wfm_power = np.ndarray(shape=wfm_counts.shape, dtype=np.float32)
         waveform_scale_factor = self.nc.scale_factor_20_ku.values
-        for record in np.arange(n_records):
-            wfm_power[record, :] = waveform_scale_factor[record] * wfm_counts[record, :].astype(float)
+        wfm_power = (waveform_scale_factor[:, np.newaxis] * wfm_counts.astype(float)).astype(np.float32)
 
         # Get the window delay
         # "The tracker_range_20hz is the range measured by the onboard tracker
         #  as the window delay, corrected for instrumental effects and
         #  CoG offset"
+        # -> The range of the first range bin follows from the nominal tracking bin
         tracker_range_20hz = self.nc.tracker_range_20_ku.values
-        wfm_range = np.ndarray(shape=wfm_counts.shape, dtype=np.float32)
-        range_bin_index = np.arange(n_range_bins)
-        for record in np.arange(n_records):
-            wfm_range[record, :] = tracker_range_20hz[record] + \
-                (range_bin_index*self.cfg.range_bin_width) - \
-                (self.cfg.nominal_tracking_bin*self.cfg.range_bin_width)
+        first_bin_range = tracker_range_20hz - (self.cfg.nominal_tracking_bin*self.cfg.range_bin_width)
 
         # Set the operation mode
         op_mode = self.nc.instr_op_mode_20_ku.values
-        op_mode_translator = self.cfg.instr_op_mode_list
-        radar_mode = np.array([op_mode_translator[int(val)] for val in op_mode]).astype("int8")
+        op_mode_translator = np.array(self.cfg.instr_op_mode_list, dtype=np.int8)
+        radar_mode = op_mode_translator[op_mode.astype(int)]
 
         # Set the waveform
-        self.l1.waveform.set_waveform_data(wfm_power, wfm_range, radar_mode)
+        self.l1.waveform.set_parametric_waveform_data(wfm_power, first_bin_range, self.cfg.range_bin_width, radar_mode)
 
         # Get the valid flags
         # TODO: Find a way to get a valid flag
@@ -307,16 +296,16 @@ class Sentinel3CODAL2Wat(DefaultLoggingClass):
         :return: None
         """
 
-        # Get the reference times for interpolating the range corrections from 1Hz -> 20Hz
-        time_1Hz = self.nc.time_01.values
-        time_20Hz = self.nc.time_20_ku.values
+        # Stack all range correction variables defined in the processor definition file
+        # and interpolate them from 1Hz -> 20Hz in one step
+        keys = list(self.cfg.range_correction_targets.keys())
+        var_names = [self.cfg.range_correction_targets[key] for key in keys]
+        variables_1Hz = np.array([getattr(self.nc, var_name).values for var_name in var_names])
+        variables_20Hz, error_status = self.interp_1Hz_to_20Hz(variables_1Hz)
 
-        # Loop over all range correction variables defined in the processor definition file
-        for key in self.cfg.range_correction_targets.keys():
-            var_name = self.cfg.range_correction_targets[key]
-            variable_1Hz = getattr(self.nc, var_name)
-            variable_20Hz, error_status = self.interp_1Hz_to_20Hz(variable_1Hz.values, time_1Hz, time_20Hz)
-            if error_status:
+        # Transfer the range corrections
+        for key, var_name, variable_20Hz, error in zip(keys, var_names, variables_20Hz, error_status):
+            if error:
                 msg = "- Error in 20Hz interpolation for variable `%s` -> set only dummy" % var_name
                 self.log.warning(msg)
             self.l1.correction.set_parameter(key, variable_20Hz)
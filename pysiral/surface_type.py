@@ -75,6 +75,11 @@ class SurfaceType(object):
     def parameter_list(self):
         return ["flag"]
 
+    @property
+    def record_array_attributes(self):
+        """ Names of the instance attributes with record arrays (used for merging) """
+        return ["_surface_type"]
+
     @property
     def lead(self):
         return self.get_by_name("lead")
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+A filesystem-based work queue for sharding processor runs over independent workers
+
+The items of a processor run (e.g. period segments or input files) are listed in a job
+manifest in a shared directory. Any number of worker invocations (on the same or on
+different nodes with access to the shared directory) with identical arguments can then
+claim the items one by one. No external scheduler or service is required.
+
+Layout of the work queue directory:
+
+    manifest.json           list of item ids (written by the first worker)
+    locks/<item_id>.<n>     lock file of claim attempt n (exclusive creation)
+    status/<item_id>.json   status of each item (running, done, failed)
+
+Items are claimed by exclusive creation of a lock file, which is atomic also on shared
+filesystems. The worker updates the modification time of its lock file in regular
+intervals (heartbeat). A lock is considered abandoned if the heartbeat is older than
+the stale timeout or if the owner process (on the same host) does not exist anymore.
+Abandoned items are reclaimed by creating the lock file of the next claim attempt, thus
+only one worker can reclaim an item.
+
+Items with status `failed` are not reclaimed. To retry such items, the corresponding
+status files need to be removed.
+
+Usage (in all workers):
+
+    queue = FileWorkQueue(directory)
+    queue.create_manifest(item_ids)
+    for work_item in queue:
+        with work_item:
+            process(items[work_item.index])
+"""
+
+import os
+import json
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from pysiral.errorhandler import ErrorStatus
+from pysiral.logging import DefaultLoggingClass
+
+
+class FileWorkQueue(DefaultLoggingClass):
+    """
+    Work queue with the job manifest, lock and status files in a (shared) directory
+    """
+
+    def __init__(self, directory, stale_timeout=600.):
+        """
+        :param directory: the work queue directory (will be created if necessary)
+        :param stale_timeout: time in seconds after which a lock without heartbeat is
+            considered abandoned (heartbeat interval is 1/10 of the timeout)
+        """
+        super(FileWorkQueue, self).__init__(self.__class__.__name__)
+        self.error = ErrorStatus(caller_id=self.__class__.__name__)
+        self._directory = Path(directory)
+        self._stale_timeout = float(stale_timeout)
+        self._hostname = socket.gethostname()
+        self._pid = os.getpid()
+        self._item_ids = None
+        for subdirectory in [self.lock_directory, self.status_directory]:
+            subdirectory.mkdir(parents=True, exist_ok=True)
+
+    def __iter__(self):
+        """ Claims and returns work items until no item is available """
+        while True:
+            work_item = self.claim_next()
+            if work_item is None:
+                break
+            yield work_item
+        self.log.info("Work queue status: %s" % self.get_status_summary())
+
+    def create_manifest(self, item_ids):
+        """
+        Write the job manifest or verify that an existing manifest (from other workers)
+        contains the same items
+        :param item_ids: list of unique item ids
+        :return: None
+        """
+
+        item_ids = [get_item_id(item_id) for item_id in item_ids]
+        if len(set(item_ids)) != len(item_ids):
+            self.error.add_error("invalid-work-queue", "Item ids of work queue are not unique")
+            self.error.raise_on_error()
+
+        # Exclusive creation of the manifest (only the first worker writes the manifest)
+        manifest = dict(created=datetime.now().isoformat(), item_ids=item_ids)
+        tmp_filepath = self._directory / ("manifest.json.%s" % self.worker_id)
+        with open(str(tmp_filepath), "w") as fhandle:
+            json.dump(manifest, fhandle, indent=1)
+        try:
+            os.link(str(tmp_filepath), str(self.manifest_filepath))
+            self.log.info("Created work queue manifest with %g items: %s" % (len(item_ids), self.manifest_filepath))
+        except FileExistsError:
+            pass
+        finally:
+            tmp_filepath.unlink()
+
+        # Workers must have identical items
+        with open(str(self.manifest_filepath), "r") as fhandle:
+            manifest = json.load(fhandle)
+        if manifest["item_ids"] != item_ids:
+            msg = "Items do not match existing work queue manifest: %s" % self.manifest_filepath
+            self.error.add_error("invalid-work-queue", msg)
+            self.error.raise_on_error()
+
+        self._item_ids = item_ids
+
+    def claim_next(self):
+        """
+        Claim the next available item (not started or abandoned)
+        :return: WorkItem instance or None (no more items available)
+        """
+        if self._item_ids is None:
+            raise RuntimeError("work queue manifest has not been created")
+        for index, item_id in enumerate(self._item_ids):
+            lock_filepath = self._claim(item_id)
+            if lock_filepath is None:
+                continue
+            return WorkItem(self, index, item_id, lock_filepath)
+        return None
+
+    def get_status(self, item_id):
+        """ Returns the content of the status file of an item (None if item has not been started) """
+        filepath = self.status_directory / ("%s.json" % item_id)
+        try:
+            with open(str(filepath), "r") as fhandle:
+                return json.load(fhandle)
+        except (IOError, ValueError):
+            return None
+
+    def set_status(self, item_id, status, message=None):
+        """ Write the status file of an item (atomic replacement) """
+        status_dict = dict(status=status, worker=self.worker_id, time=datetime.now().isoformat(),
+                           message=message)
+        filepath = self.status_directory / ("%s.json" % item_id)
+        tmp_filepath = self.status_directory / ("%s.json.%s" % (item_id, self.worker_id))
+        with open(str(tmp_filepath), "w") as fhandle:
+            json.dump(status_dict, fhandle)
+        os.replace(str(tmp_filepath), str(filepath))
+
+    def get_status_summary(self):
+        """ Returns a string with the number of items per status """
+        counter = Counter()
+        for item_id in self._item_ids:
+            status = self.get_status(item_id)
+            counter["pending" if status is None else status["status"]] += 1
+        return ", ".join(["%s: %g" % (status, counter[status]) for status in sorted(counter.keys())])
+
+    def _claim(self, item_id):
+        """ Try to claim an item. Returns the path of the lock file or None """
+
+        # Finished items are never claimed again
+        status = self.get_status(item_id)
+        if status is not None and status["status"] in ["done", "failed"]:
+            return None
+
+        # Get the latest claim attempt
+        attempt = self._get_latest_attempt(item_id)
+        if attempt is not None:
+            if not self._is_abandoned(self._get_lock_filepath(item_id, attempt)):
+                return None
+            next_attempt = attempt + 1
+        else:
+            next_attempt = 0
+
+        # Exclusive creation of the lock file (fails if another worker was faster)
+        lock_filepath = self._get_lock_filepath(item_id, next_attempt)
+        try:
+            fd = os.open(str(lock_filepath), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w") as fhandle:
+            json.dump(dict(hostname=self._hostname, pid=self._pid, worker=self.worker_id), fhandle)
+
+        # The item might have been finished between status check and lock file creation
+        status = self.get_status(item_id)
+        if status is not None and status["status"] in ["done", "failed"]:
+            return None
+
+        if next_attempt > 0:
+            self.log.info("Reclaimed abandoned work item: %s (attempt %g)" % (item_id, next_attempt+1))
+        self.set_status(item_id, "running")
+        return lock_filepath
+
+    def _get_latest_attempt(self, item_id):
+        attempts = []
+        for lock_filepath in self.lock_directory.glob("%s.*" % item_id):
+            suffix = lock_filepath.name[len(item_id)+1:]
+            if suffix.isdigit():
+                attempts.append(int(suffix))
+        return max(attempts) if len(attempts) > 0 else None
+
+    def _get_lock_filepath(self, item_id, attempt):
+        return self.lock_directory / ("%s.%g" % (item_id, attempt))
+
+    def _is_abandoned(self, lock_filepath):
+        """ A lock is abandoned if the heartbeat is too old or the owner process has terminated """
+
+        try:
+            heartbeat_age = time.time() - lock_filepath.stat().st_mtime
+            with open(str(lock_filepath), "r") as fhandle:
+                owner = json.load(fhandle)
+        except (IOError, ValueError):
+            # Lock file is just being written
+            return False
+
+        if heartbeat_age > self._stale_timeout:
+            return True
+
+        # The owner process can only be checked on the same host
+        if owner.get("hostname", None) != self._hostname:
+            return False
+        pid = owner.get("pid", None)
+        if pid is None or pid == self._pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    @property
+    def worker_id(self):
+        return "%s_%g" % (self._hostname, self._pid)
+
+    @property
+    def heartbeat_interval(self):
+        return self._stale_timeout / 10.
+
+    @property
+    def manifest_filepath(self):
+        return self._directory / "manifest.json"
+
+    @property
+    def lock_directory(self):
+        return self._directory / "locks"
+
+    @property
+    def status_directory(self):
+        return self._directory / "status"
+
+
+class WorkItem(object):
+    """
+    A claimed item of the work queue. Must be used as context manager: The lock file
+    is kept alive during the processing of the item and the status is set to `done`
+    or `failed` (on any exception) afterwards.
+    """
+
+    def __init__(self, queue, index, item_id, lock_filepath):
+        self.queue = queue
+        self.index = index
+        self.item_id = item_id
+        self._lock_filepath = lock_filepath
+        self._stop_event = threading.Event()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, name="WorkItemHeartbeat")
+        self._heartbeat.daemon = True
+
+    def __enter__(self):
+        self.queue.log.info("Claimed work item: %s" % self.item_id)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        self._heartbeat.join()
+        if exc_type is None:
+            self.queue.set_status(self.item_id, "done")
+        else:
+            self.queue.set_status(self.item_id, "failed", message="%s: %s" % (exc_type.__name__, str(exc_value)))
+        return False
+
+    def _run_heartbeat(self):
+        while not self._stop_event.wait(self.queue.heartbeat_interval):
+            try:
+                os.utime(str(self._lock_filepath), None)
+            except OSError:
+                pass
+
+
+def get_item_id(label):
+    """ Returns an item id that is safe for use in filenames """
+    return "".join([c if c.isalnum() or c in "-_" else "_" for c in str(label)])
@@ -5,9 +5,27 @@ Created on Mon Jul 06 17:57:33 2015
 @author: Stefan
 """
 
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
 
-from pysiral.auxdata import get_all_auxdata_classes
+import numpy as np
+from netCDF4 import Dataset
+from PIL import Image
+
+import scipy.ndimage as ndimage
+
+from pysiral.auxdata import get_all_auxdata_classes, AuxdataCache, AuxClassConfig, CategoricalTranslator
+from pysiral.auxdata.icechart import ICA
+from pysiral.auxdata.mss import DTU1MinGrid, egm2top_delta_h, egm2wgs_delta_h
+from pysiral.auxdata.rio import RIO_ICE_CLASSES, SIGRID3_RISK_VALUES
+from pysiral.auxdata.sic import OsiSafSIC
+from pysiral.iotools import GridDiskCache
 
 
 class TestAuxdataClasses(unittest.TestCase):
@@ -25,6 +43,239 @@ class TestAuxdataClasses(unittest.TestCase):
             self.assertTrue(hasattr(class_instance, "get_l2_track_vars"))
 
 
+class TestAuxdataCache(unittest.TestCase):
+
+    def testLRUEviction(self):
+        cache = AuxdataCache(maxsize=2)
+        cache.put("day1", 1)
+        cache.put("day2", 2)
+        self.assertEqual(cache.get("day1"), 1)
+        cache.put("day3", 3)
+        self.assertIsNone(cache.get("day2"))
+        self.assertEqual(cache.get("day1"), 1)
+        self.assertEqual(cache.get("day3"), 3)
+        statistics = cache.statistics
+        self.assertEqual(statistics["hits"], 3)
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["size"], 2)
+
+    def testWaitForPrefetch(self):
+        cache = AuxdataCache(maxsize=2)
+        self.assertTrue(cache.reserve("day1"))
+        self.assertFalse(cache.reserve("day1"))
+        timer = threading.Timer(0.05, cache.put, args=("day1", 1), kwargs=dict(prefetched=True))
+        timer.start()
+        self.assertEqual(cache.get("day1"), 1)
+        self.assertEqual(cache.statistics["prefetched"], 1)
+        self.assertTrue(cache.reserve("day2"))
+        cache.release("day2")
+        self.assertIsNone(cache.get("day2"))
+
+
+class FailingOsiSafSIC(OsiSafSIC):
+
+    def load_requested_auxdata(self):
+        # Same as an unreadable netCDF file (ReadNC)
+        self.error.add_error("auxdata-read-error", "Cannot read %s" % self.requested_filepath)
+        self.error.raise_on_error()
+
+
+class TestAuxdataPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        product_defs = [dict(subfolder="v2", filenaming="ice_conc_v2_{year}{month}{day}.nc", long_name="v2"),
+                        dict(subfolder="icdr", filenaming="ice_conc_icdr_{year}{month}{day}.nc", long_name="icdr")]
+        cfg = AuxClassConfig()
+        cfg.set_options(auto_product_change=dict(date_product_change=datetime(2016, 1, 1),
+                                                 osisaf_product_def=product_defs))
+        cfg.set_local_repository(tempfile.gettempdir())
+        cfg.set_filenaming("ice_conc_{year}{month}{day}.nc")
+        cfg.set_subfolder(["year", "month"])
+        self.handler = OsiSafSIC(cfg)
+        self.handler.hemisphere_code = "nh"
+        self.handler.start_time = datetime(2015, 12, 31)
+        self.handler.set_requested_date(2015, 12, 31)
+
+    def testPrefetchHandlerDoesNotChangeConfiguration(self):
+        prefetch_handler = self.handler._get_prefetch_handler([2016, 1, 1])
+        prefetch_handler.start_time = datetime(2016, 1, 1, 12)
+        self.assertEqual(prefetch_handler.requested_filepath.name, "ice_conc_icdr_20160101.nc")
+        self.assertEqual(self.handler.cfg.filenaming, "ice_conc_{year}{month}{day}.nc")
+        self.assertEqual(self.handler.requested_filepath.name, "ice_conc_v2_20151231.nc")
+        self.assertEqual(self.handler.cfg.long_name, "v2")
+
+    def testPrefetchErrorReleasesCacheKey(self):
+        handler = FailingOsiSafSIC(self.handler.cfg)
+        handler.hemisphere_code, handler.start_time = "nh", datetime(2015, 12, 31)
+        cache_key = str(handler._get_prefetch_handler([2015, 12, 30]).requested_filepath)
+        with self.assertRaises(SystemExit):
+            handler._prefetch([2015, 12, 30])
+        # The key is not reserved any more (AuxdataCache.get would otherwise wait forever)
+        self.assertTrue(handler._cache.reserve(cache_key))
+        handler._cache.release(cache_key)
+
+        # The prefetch thread continues after the error
+        handler._prefetch_queue = Queue()
+        thread = threading.Thread(target=handler._run_prefetch)
+        thread.daemon = True
+        thread.start()
+        handler._prefetch_queue.put([2015, 12, 30])
+        handler._prefetch_queue.put([2015, 12, 29])
+        while not handler._prefetch_queue.empty():
+            time.sleep(0.01)
+        self.assertTrue(thread.is_alive())
+        self.assertIsNone(handler._cache.get(cache_key))
+
+
+class TestCategoricalTranslator(unittest.TestCase):
+
+    def testScalarTranslation(self):
+        translator = CategoricalTranslator({2: 0.0, 3: 1.0, 4: 0.5}, fill_value=np.nan)
+        values = translator(np.array([-1, 1, 2, 3, 4, 5]))
+        np.testing.assert_array_equal(values, [np.nan, np.nan, 0.0, 1.0, 0.5, np.nan])
+        values = translator(np.array([3., 3.5, np.nan]))
+        np.testing.assert_array_equal(values, [1.0, np.nan, np.nan])
+        np.testing.assert_array_equal(translator(["2", "4"]), [0.0, 0.5])
+
+    def testSequenceTranslation(self):
+        values = SIGRID3_RISK_VALUES(np.array([0, 95, 99]))
+        self.assertEqual(values.shape, (3, len(RIO_ICE_CLASSES)))
+        np.testing.assert_array_equal(values[0, :], 3.0)
+        self.assertEqual(values[1, RIO_ICE_CLASSES.index("1C")], -8)
+        self.assertTrue(np.all(np.isnan(values[2, :])))
+
+
+class TestGridDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.nc_file = self.tmp_dir / "ice_conc_20190101.nc"
+        rootgrp = Dataset(str(self.nc_file), "w")
+        rootgrp.createDimension("time", 1)
+        rootgrp.createDimension("yc", 3)
+        rootgrp.createDimension("xc", 4)
+        ice_conc = rootgrp.createVariable("ice_conc", "f4", ("time", "yc", "xc"), zlib=True, fill_value=-999.)
+        values = np.arange(12, dtype=np.float32).reshape((1, 3, 4))
+        values[0, 0, 0] = -999.
+        ice_conc[:] = values
+        rootgrp.close()
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def testCachedVariablesMatchSource(self):
+        cache = GridDiskCache(self.tmp_dir / "cache")
+        first = cache.read(self.nc_file)
+        second = cache.read(self.nc_file)
+        self.assertTrue(np.ma.is_masked(second.ice_conc))
+        np.testing.assert_array_equal(np.ma.getmaskarray(second.ice_conc), np.ma.getmaskarray(first.ice_conc))
+        np.testing.assert_array_equal(second.ice_conc.compressed(), first.ice_conc.compressed())
+        self.assertIsInstance(np.ma.getdata(second.ice_conc), np.memmap)
+
+    def testCopyOnWrite(self):
+        cache = GridDiskCache(self.tmp_dir / "cache")
+        data = cache.read(self.nc_file)
+        data.ice_conc[0, 1, 1] = 100.
+        self.assertEqual(cache.read(self.nc_file).ice_conc[0, 1, 1], 5.)
+
+
+class TestDTU1MinGrid(unittest.TestCase):
+
+    def setUp(self):
+        # Synthetic global mss on a 0.5 degree grid
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.nc_file = self.tmp_dir / "mss.nc"
+        self.lon = np.arange(0., 360., 0.5)
+        self.lat = np.arange(-90., 90.01, 0.5)
+        lon2d, lat2d = np.meshgrid(self.lon, self.lat)
+        self.mss = 20.*np.sin(np.deg2rad(2.*lon2d)) * np.cos(np.deg2rad(3.*lat2d))
+        rootgrp = Dataset(str(self.nc_file), "w")
+        rootgrp.createDimension("lat", len(self.lat))
+        rootgrp.createDimension("lon", len(self.lon))
+        rootgrp.createVariable("lat", "f8", ("lat", ))[:] = self.lat
+        rootgrp.createVariable("lon", "f8", ("lon", ))[:] = self.lon
+        rootgrp.createVariable("mss", "f8", ("lat", "lon"))[:] = self.mss
+        rootgrp.close()
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_mss_handler(self, **options):
+        cfg = AuxClassConfig()
+        cfg.set_filename(self.nc_file)
+        cfg.set_options(latitude_range=[50.0, 90.0], latitude_band_size=5.0, **options)
+        return DTU1MinGrid(cfg)
+
+    def testPrecomputedSplineCoefficients(self):
+
+        # Reference: Cubic spline interpolation of the full grid
+        elevation = self.mss + (egm2wgs_delta_h(self.lat) - egm2top_delta_h(self.lat))[:, np.newaxis]
+        track_lon = np.linspace(10., 50., 50)
+        track_lat = np.linspace(60., 88., 50)
+        iy, ix = (track_lat + 90.) / 0.5, track_lon / 0.5
+        reference = ndimage.map_coordinates(elevation, [iy, ix])
+
+        l2 = type("l2", (), {})()
+        l2.track = type("track", (), dict(longitude=track_lon, latitude=track_lat))()
+        for options in [dict(), dict(disk_cache_dir=str(self.tmp_dir / "cache"))]:
+            for _ in range(2):
+                handler = self.get_mss_handler(**options)
+                handler.get_l2_track_vars(l2)
+                np.testing.assert_allclose(handler._auxvars[0]["value"], reference, atol=1.0e-4)
+
+
+class TestICA(unittest.TestCase):
+
+    def setUp(self):
+        # Synthetic AARI charts covering the upper left corner of the 2 km EASE2 grid
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        chart_dir = self.tmp_dir / "2019" / "01"
+        chart_dir.mkdir(parents=True)
+        rng = np.random.default_rng(0)
+        self.charts = rng.integers(-9, 101, size=(len(ICA.CHART_PARAMETERS), 30, 40)).astype(np.int32)
+        self.charts[0, rng.uniform(size=(30, 40)) < 0.2] = ICA.FLAG_CODE
+        for parameter, chart in zip(ICA.CHART_PARAMETERS, self.charts):
+            Image.fromarray(chart).save(str(chart_dir / ("merged_aari_20190115_%s.tif" % parameter)))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_reference_track(self, vec_x, vec_y):
+        """ The per-record lookup of the previous implementation """
+        x_origin, y_origin = ICA.GRID_ORIGIN
+        pixel_width, pixel_height = ICA.GRID_PIXEL_SIZE
+        reference = np.full((self.charts.shape[0], len(vec_x)), np.nan)
+        for i, (x, y) in enumerate(zip(vec_x, vec_y)):
+            x_offset, y_offset = int((x - x_origin) / pixel_width), int((y - y_origin) / pixel_height)
+            if not (0 <= x_offset < self.charts.shape[2] and 0 <= y_offset < self.charts.shape[1]):
+                continue
+            if self.charts[0][y_offset][x_offset] == ICA.FLAG_CODE:
+                continue
+            for j in range(self.charts.shape[0]):
+                reference[j, i] = self.charts[j][y_offset][x_offset]
+        return reference
+
+    def testTrackMatchesPerRecordLookup(self):
+        rng = np.random.default_rng(1)
+        vec_x = ICA.GRID_ORIGIN[0] + rng.uniform(-5., 45., 500) * ICA.GRID_PIXEL_SIZE[0]
+        vec_y = ICA.GRID_ORIGIN[1] + rng.uniform(-5., 35., 500) * ICA.GRID_PIXEL_SIZE[1]
+        cfg = AuxClassConfig()
+        cfg.set_local_repository(str(self.tmp_dir))
+        cfg.set_options()
+        handler = ICA(cfg)
+        longitude, latitude = handler._ease_proj(vec_x, vec_y, inverse=True)
+        l2 = type("l2", (), {})()
+        l2.track = type("track", (), dict(longitude=longitude, latitude=latitude,
+                                          timestamp=[datetime(2019, 1, 16)]))()
+        handler.get_l2_track_vars(l2)
+        self.assertFalse(handler.error.status)
+        self.assertEqual(handler._data.dtype, np.int8)
+        track = np.array([auxvar["value"] for auxvar in handler._auxvars])
+        reference = self.get_reference_track(*handler._ease_proj(longitude, latitude))
+        self.assertTrue(np.any(np.isfinite(reference)))
+        np.testing.assert_array_equal(track, reference)
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestAuxdataClasses)
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the checkpoint files of the Level-2 processor
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from pysiral.checkpoint import Level2CheckpointHandler
+
+
+L2DEF = {
+    "hemisphere": "north",
+    "corrections": ["dry_troposphere", "wet_troposphere"],
+    "auxdata": [{"sic": {"name": "osisaf-operational", "options": None}},
+                {"snow": {"name": "clim_w99amsr2", "options": {"fyi_correction_factor": 0.5}}}],
+    "retracker": {"sea_ice": {"pyclass": "cTFMRA", "options": {"threshold": 0.5}}},
+    "ssa": {"pyclass": "SSASmoothedLinear", "options": {"smooth_filter_width_m": 100000.0}},
+    "frb": {"pyclass": "SnowGeometricCorrection", "options": {"vacuum_light_speed_reduction": 0.22}}}
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.l1p_file = self.tmp_dir / "l1p_orbit.nc"
+        with open(str(self.l1p_file), "wb") as fhandle:
+            fhandle.write(b"l1p content")
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_handler(self, l2def):
+        return Level2CheckpointHandler(self.tmp_dir / "checkpoints", l2def)
+
+    def testResumeFromLatestStage(self):
+        handler = self.get_handler(L2DEF)
+        self.assertIsNone(handler.get_latest(self.l1p_file))
+        handler.write(self.l1p_file, "retracking", {"stage": 1})
+        checkpoint = handler.get_latest(self.l1p_file)
+        self.assertEqual(checkpoint.stage, "retracking")
+        handler.write(self.l1p_file, "ssh", {"stage": 2})
+        checkpoint = handler.get_latest(self.l1p_file)
+        self.assertEqual(checkpoint.stage, "ssh")
+        self.assertEqual(checkpoint.l2, {"stage": 2})
+
+    def testDownstreamSettingsKeepCheckpoints(self):
+        self.get_handler(L2DEF).write(self.l1p_file, "ssh", {"stage": 2})
+        l2def = dict(L2DEF, frb={"pyclass": "SnowGeometricCorrection", "options": {}})
+        checkpoint = self.get_handler(l2def).get_latest(self.l1p_file)
+        self.assertEqual(checkpoint.stage, "ssh")
+
+    def testUpstreamSettingsInvalidateCheckpoints(self):
+        handler = self.get_handler(L2DEF)
+        handler.write(self.l1p_file, "retracking", {"stage": 1})
+        handler.write(self.l1p_file, "ssh", {"stage": 2})
+
+        # Change of ssa settings: resume from retracking checkpoint
+        l2def = dict(L2DEF, ssa={"pyclass": "SSASmoothedLinear", "options": {"smooth_filter_width_m": 50000.0}})
+        checkpoint = self.get_handler(l2def).get_latest(self.l1p_file)
+        self.assertEqual(checkpoint.stage, "retracking")
+
+        # Change of retracker settings: no valid checkpoint
+        l2def = dict(L2DEF, retracker={"sea_ice": {"pyclass": "cTFMRA", "options": {"threshold": 0.6}}})
+        self.assertIsNone(self.get_handler(l2def).get_latest(self.l1p_file))
+
+    def testSnowSettingsKeepCheckpoints(self):
+        handler = self.get_handler(L2DEF)
+        handler.write(self.l1p_file, "retracking", {"stage": 1})
+        handler.write(self.l1p_file, "ssh", {"stage": 2})
+
+        # Change of snow settings: both checkpoints are still valid
+        auxdata = [L2DEF["auxdata"][0], {"snow": {"name": "warren99", "options": {"fyi_correction_factor": 1.0}}}]
+        handler = self.get_handler(dict(L2DEF, auxdata=auxdata))
+        for stage in ["retracking", "ssh"]:
+            self.assertEqual(handler.get_key(self.l1p_file, stage),
+                             self.get_handler(L2DEF).get_key(self.l1p_file, stage))
+        self.assertEqual(handler.get_latest(self.l1p_file).stage, "ssh")
+
+        # Change of other auxdata settings: no valid checkpoint
+        auxdata = [{"sic": {"name": "c3s_v1p2", "options": None}}, L2DEF["auxdata"][1]]
+        self.assertIsNone(self.get_handler(dict(L2DEF, auxdata=auxdata)).get_latest(self.l1p_file))
+
+    def testL1pFileChangeInvalidatesCheckpoints(self):
+        self.get_handler(L2DEF).write(self.l1p_file, "ssh", {"stage": 2})
+        with open(str(self.l1p_file), "wb") as fhandle:
+            fhandle.write(b"reprocessed l1p content")
+        self.assertIsNone(self.get_handler(L2DEF).get_latest(self.l1p_file))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCheckpoint)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -10,6 +10,7 @@ import unittest
 from attrdict import AttrDict
 from pathlib import Path
 from pysiral import psrlcfg
+from pysiral.config import OptionField, AlgorithmOptions, compile_options
 
 
 class TestConfig(unittest.TestCase):
@@ -60,6 +61,37 @@ class TestConfig(unittest.TestCase):
                 self.assertIsInstance(filepath, Path)
                 self.assertTrue(filepath.is_file())
 
+    def testCompileAlgorithmOptions(self):
+        """
+        Test the compilation of option trees into read-only option objects
+        :return:
+        """
+        fields = {"threshold": OptionField((float, dict), default=0.5),
+                  "window_size": OptionField(tuple, required=True),
+                  "range_bias": OptionField(tuple)}
+        opt_dict = {"threshold": 1, "window_size": [11, 11, 21], "uncertainty": {"type": "fixed", "value": 0.1}}
+        options = compile_options(opt_dict, fields=fields, name="cTFMRA")
+
+        # Type conversion, defaults and undeclared options
+        self.assertIsInstance(options, AlgorithmOptions)
+        self.assertIsInstance(options.threshold, float)
+        self.assertEqual(options.window_size, (11, 11, 21))
+        self.assertEqual(options.uncertainty.value, 0.1)
+        self.assertFalse("range_bias" in options)
+        self.assertTrue("uncertainty" in options)
+        self.assertEqual(set(dict(**options).keys()), {"threshold", "window_size", "range_bias", "uncertainty"})
+
+        # Option objects are read-only
+        with self.assertRaises(AttributeError):
+            options.threshold = 0.3
+
+        # Validation of missing and invalid options
+        with self.assertRaises(ValueError):
+            compile_options({}, fields=fields)
+        with self.assertRaises(ValueError):
+            compile_options({"window_size": [11, 11, 21], "threshold": "0.5"}, fields=fields)
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestConfig)
     unittest.TextTestRunner(verbosity=2, descriptions=True).run(suite)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the record subset selection of the CryoSat-2 input adapter
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+from netCDF4 import Dataset
+
+from pysiral.cryosat2.l1_adapter import ESACryoSat2PDSBaselineD
+from pysiral.l1bdata import Level1bData
+from pysiral.l1preproc import get_preproc, L1PreProcPolarOceanCheck
+
+
+class TestPolarOceanRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.latitude = np.array([40., 50., 60., 70., 60., 50., 40., -50., -60., -70.])
+        self.is_ocean = np.array([1, 0, 1, 1, 0, 1, 1, 0, 1, 0], dtype=bool)
+
+    def testSingleHemisphere(self):
+        cfg = AttrDict(polar_latitude_threshold=45., input_file_is_single_hemisphere=True)
+        records = ESACryoSat2PDSBaselineD.get_polar_ocean_records(self.latitude, self.is_ocean, cfg)
+        np.testing.assert_array_equal(records, [2, 3, 4, 5, 7, 8])
+
+    def testTwoHemispheres(self):
+        cfg = AttrDict(polar_latitude_threshold=45., input_file_is_single_hemisphere=False,
+                       target_hemisphere=["north", "south"])
+        records = ESACryoSat2PDSBaselineD.get_polar_ocean_records(self.latitude, self.is_ocean, cfg)
+        np.testing.assert_array_equal(records, [2, 3, 4, 5, 8])
+
+    def testIndexSlices(self):
+        slices = ESACryoSat2PDSBaselineD.get_index_slices(np.array([2, 3, 4, 5, 8]))
+        self.assertEqual(slices, [slice(2, 6), slice(8, 9)])
+        self.assertEqual(ESACryoSat2PDSBaselineD.get_index_slices(np.array([], dtype=int)), [])
+
+
+def write_baseline_d_file(filepath, start_time=datetime(2019, 1, 1)):
+    """
+    Writes a synthetic Baseline-D file with 12 seconds of 1Hz and 20Hz records from mid latitudes
+    towards the north pole
+    :param filepath: The target file path
+    :param start_time: The time of the first record (datetime)
+    :return: None
+    """
+    reference_seconds = (start_time - datetime(2000, 1, 1)).total_seconds()
+    stop_time = start_time + timedelta(seconds=12)
+    time_fmt = "%Y-%m-%dT%H:%M:%S.%f"
+    rng = np.random.default_rng(0)
+    n_1Hz, n_20Hz, n_bins = 12, 240, 256
+    time_1Hz = reference_seconds + np.arange(n_1Hz) + 0.5
+    time_20Hz = reference_seconds + np.arange(n_20Hz) / 20.
+    rootgrp = Dataset(str(filepath), "w")
+    rootgrp.setncatts(dict(abs_orbit_start=1, cycle_number=1, processing_stage="OFFL", sir_op_mode="SAR",
+                           first_record_lat=40000000, last_record_lat=88000000, first_record_lon=0,
+                           last_record_lon=0, open_ocean_percent=5000,
+                           first_record_time="TAI=%s" % start_time.strftime(time_fmt),
+                           last_record_time="TAI=%s" % stop_time.strftime(time_fmt)))
+    rootgrp.createDimension("time_cor_01", n_1Hz)
+    rootgrp.createDimension("time_20_ku", n_20Hz)
+    rootgrp.createDimension("ns_20_ku", n_bins)
+    rootgrp.createDimension("space_3d", 3)
+    units = "seconds since 2000-01-01 00:00:00.0"
+    variables_1Hz = dict(time_cor_01=time_1Hz, surf_type_01=np.array([0, 3, 3, 3, 0, 0, 1, 0, 0, 2, 0, 3]),
+                         mod_dry_tropo_cor_01=rng.uniform(2.2, 2.3, n_1Hz),
+                         inv_bar_cor_01=rng.uniform(-0.1, 0.1, n_1Hz))
+    for name, values in variables_1Hz.items():
+        rootgrp.createVariable(name, values.dtype.str, ("time_cor_01", ))[:] = values
+    rootgrp.variables["time_cor_01"].units = units
+    variables_20Hz = dict(time_20_ku=time_20Hz, lat_20_ku=np.linspace(40., 88., n_20Hz),
+                          lon_20_ku=np.zeros(n_20Hz),
+                          alt_20_ku=rng.uniform(7.2e5, 7.3e5, n_20Hz), orb_alt_rate_20_ku=rng.normal(size=n_20Hz),
+                          off_nadir_pitch_angle_str_20_ku=rng.normal(size=n_20Hz),
+                          off_nadir_roll_angle_str_20_ku=rng.normal(size=n_20Hz),
+                          off_nadir_yaw_angle_str_20_ku=rng.normal(size=n_20Hz),
+                          echo_scale_factor_20_ku=rng.uniform(1., 2., n_20Hz),
+                          echo_scale_pwr_20_ku=rng.integers(-20, -10, n_20Hz).astype(np.int32),
+                          window_del_20_ku=rng.uniform(4.8e-3, 4.9e-3, n_20Hz),
+                          flag_mcd_20_ku=rng.integers(0, 2, n_20Hz).astype(np.int32),
+                          stack_std_20_ku=rng.uniform(size=n_20Hz))
+    for name, values in variables_20Hz.items():
+        rootgrp.createVariable(name, values.dtype.str, ("time_20_ku", ))[:] = values
+    rootgrp.variables["time_20_ku"].units = units
+    waveforms = rng.integers(1, 65535, (n_20Hz, n_bins)).astype(np.int32)
+    rootgrp.createVariable("pwr_waveform_20_ku", "i4", ("time_20_ku", "ns_20_ku"))[:] = waveforms
+    rootgrp.createVariable("sat_vel_vec_20_ku", "f8", ("time_20_ku", "space_3d"))[:] = rng.normal(size=(n_20Hz, 3))
+    rootgrp.close()
+
+
+class TestPolarOceanSubsetRead(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.filepath = self.tmp_dir / "CS_OFFL_SIR_SAR_1B_20190101T000000_20190101T000012_D001.nc"
+        write_baseline_d_file(self.filepath)
+
+        self.preproc_cfg = AttrDict(polar_ocean=dict(target_hemisphere=["north"], polar_latitude_threshold=50.,
+                                                     input_file_is_single_hemisphere=True))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_adapter(self, read_polar_ocean_subset):
+        cfg = AttrDict(range_correction_targets=dict(dry_troposphere="mod_dry_tropo_cor_01",
+                                                     inverse_barometric="inv_bar_cor_01"),
+                       classifier_targets=dict(stack_standard_deviation="stack_std_20_ku"),
+                       read_polar_ocean_subset=read_polar_ocean_subset)
+        return ESACryoSat2PDSBaselineD(cfg)
+
+    def testSubsetMatchesTrimmedFullRead(self):
+        polar_ocean_check = L1PreProcPolarOceanCheck("test", self.preproc_cfg.polar_ocean)
+
+        # Reference: Full read and the polar/ocean trims of the pre-processor
+        adapter = self.get_adapter(False)
+        l1_reference = adapter.get_l1(self.filepath, polar_ocean_check)
+        n_records_full = l1_reference.n_records
+        preproc = get_preproc("half_orbit", adapter, None, self.preproc_cfg)
+        l1_reference = preproc.trim_single_hemisphere_segment_to_polar_region(l1_reference)
+        l1_reference = preproc.trim_non_ocean_data(l1_reference)
+
+        adapter = self.get_adapter(True)
+        l1 = adapter.get_l1(self.filepath, polar_ocean_check)
+        self.assertLess(adapter._bytes_read, adapter._bytes_full)
+        self.assertEqual(adapter._values_20Hz, {})
+
+        self.assertLess(l1.n_records, n_records_full)
+        self.assertEqual(l1.n_records, l1_reference.n_records)
+        self.assertEqual(l1.info.start_time, l1_reference.info.start_time)
+        self.assertEqual(l1.info.lat_min, l1_reference.info.lat_min)
+        for data_group in Level1bData.data_groups:
+            group_reference, group = getattr(l1_reference, data_group), getattr(l1, data_group)
+            self.assertEqual(group.parameter_list, group_reference.parameter_list)
+            for attribute in group.record_array_attributes:
+                # NOTE: CS2LTPP uses the record index as range bin index. The late tail to peak power
+                #       therefore depends on the position of the record in the input file
+                if attribute == "late_tail_to_peak_power":
+                    continue
+                np.testing.assert_array_equal(getattr(group, attribute), getattr(group_reference, attribute),
+                                              err_msg="%s.%s" % (data_group, attribute))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPolarOceanRecords)
+    unittest.TextTestRunner(verbosity=2).run(suite)
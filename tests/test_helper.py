@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the interpolation helper functions
+"""
+
+import unittest
+
+import numpy as np
+from scipy import interpolate
+
+from pysiral.helper import Interp1HzTo20Hz, interpolate_nans
+
+
+class TestInterpolateNans(unittest.TestCase):
+
+    def testInterpolationAndExtrapolation(self):
+        values = np.array([np.nan, 1., 2., np.nan, 6., np.nan])
+        filtered, error = interpolate_nans(values)
+        np.testing.assert_allclose(filtered, [0., 1., 2., 4., 6., 8.])
+        self.assertFalse(error)
+
+    def testRowsWithoutValidValues(self):
+        values = np.array([[np.nan, 1., np.nan], [np.nan, np.nan, np.nan], [1., 2., 3.]])
+        filtered, error = interpolate_nans(values, fill_on_error_value=0.0)
+        np.testing.assert_array_equal(error, [True, True, False])
+        np.testing.assert_array_equal(filtered, [[0., 0., 0.], [0., 0., 0.], [1., 2., 3.]])
+
+
+class TestInterp1HzTo20Hz(unittest.TestCase):
+
+    def setUp(self):
+        self.time_1Hz = np.arange(50.) + np.linspace(0., 0.1, 50)
+        self.time_20Hz = np.linspace(-1., 51., 1041)
+        self.variables_1Hz = np.sin(np.arange(150.)).reshape((3, 50))
+        self.variables_1Hz[1, 10] = np.nan
+
+    def testLinearInterpolation(self):
+        interpolator = Interp1HzTo20Hz(self.time_1Hz, self.time_20Hz)
+        variables_20Hz, error = interpolator(self.variables_1Hz)
+        self.assertEqual(variables_20Hz.shape, (3, len(self.time_20Hz)))
+        for variable_1Hz, variable_20Hz in zip(self.variables_1Hz, variables_20Hz):
+            f = interpolate.interp1d(self.time_1Hz, variable_1Hz, bounds_error=False)
+            np.testing.assert_allclose(variable_20Hz, f(self.time_20Hz), atol=1.0e-12)
+
+    def testNearestInterpolation(self):
+        flag_1Hz = np.arange(50) % 4
+        flag_20Hz, error = Interp1HzTo20Hz(self.time_1Hz, self.time_20Hz)(flag_1Hz, kind="nearest")
+        f = interpolate.interp1d(self.time_1Hz, flag_1Hz, bounds_error=False, kind="nearest")
+        np.testing.assert_array_equal(flag_20Hz, f(self.time_20Hz))
+
+    def testFillNans(self):
+        interpolator = Interp1HzTo20Hz(self.time_1Hz, self.time_20Hz, extrapolate=True)
+        variables_20Hz, error = interpolator(self.variables_1Hz, fill_nans=True, fill_on_error_value=0.0)
+        self.assertFalse(np.any(np.isnan(variables_20Hz)))
+        valid = np.isfinite(self.variables_1Hz[1])
+        f = interpolate.interp1d(self.time_1Hz[valid], self.variables_1Hz[1, valid], fill_value="extrapolate")
+        np.testing.assert_allclose(variables_20Hz[1], f(self.time_20Hz), atol=1.0e-12)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestInterp1HzTo20Hz)
+    unittest.TextTestRunner(verbosity=2).run(suite)
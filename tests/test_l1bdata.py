@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the waveform range representation and the merge of Level-1 segments
+"""
+
+import copy
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from pysiral.l1bdata import Level1bData, Level1bDataMergeBuilder
+
+
+def get_l1b_segment(index, n_records, n_bins=8):
+    l1b = Level1bData()
+    l1b.info.set_attribute("mission_data_source", "segment_%g" % index)
+    start_time = datetime(2019, 1, 1) + timedelta(seconds=index*n_records)
+    l1b.time_orbit.timestamp = np.array([start_time + timedelta(seconds=i) for i in range(n_records)])
+    l1b.time_orbit.set_position(np.full(n_records, float(index)), np.linspace(70., 80., n_records),
+                                np.full(n_records, 720000.))
+    power = np.full((n_records, n_bins), float(index), dtype=np.float32)
+    l1b.waveform.set_waveform_data(power, np.zeros((n_records, n_bins)), "sar" if index % 2 else "sin")
+    l1b.correction.set_parameter("dry_troposphere", np.full(n_records, 2.3))
+    l1b.classifier.add(np.full(n_records, index), "sigma0")
+    l1b.surface_type.add_flag(np.arange(n_records) % 2 == 0, "ocean")
+    l1b.update_l1b_metadata()
+    return l1b
+
+
+class TestParametricWaveformRange(unittest.TestCase):
+
+    def testRangeMatchesFullArray(self):
+        n_records, n_bins = 4, 8
+        l1b = get_l1b_segment(0, n_records, n_bins=n_bins)
+        window_delay = 720000. + np.arange(n_records)
+        l1b.waveform.set_parametric_waveform_data(l1b.waveform.power, window_delay, 0.2, "sar")
+        reference = (window_delay[:, np.newaxis] + np.arange(n_bins)*0.2).astype(np.float32)
+        self.assertTrue(l1b.waveform.is_parametric_range)
+        self.assertEqual(l1b.waveform.parameter_list, ["power", "window_delay", "bin_spacing", "radar_mode",
+                                                       "is_valid"])
+        np.testing.assert_array_equal(l1b.waveform.range, reference)
+        np.testing.assert_array_equal(l1b.waveform.get_range_bins(2), reference[2, :])
+
+        # Range corrections and subsets are applied to the range parameters
+        l1b.waveform.add_range_delta(np.full(n_records, 1.0))
+        l1b.trim_to_subset([1, 3])
+        reference = ((window_delay[[1, 3]] + 1.0)[:, np.newaxis] + np.arange(n_bins)*0.2).astype(np.float32)
+        np.testing.assert_array_equal(l1b.waveform.range, reference)
+
+    def testMergeWithFullRange(self):
+        segments = [get_l1b_segment(i, 3) for i in range(2)]
+        segments[1].waveform.set_parametric_waveform_data(segments[1].waveform.power, np.full(3, 10.), 1.0, "sar")
+        builder = Level1bDataMergeBuilder()
+        for l1b in segments:
+            builder.add(l1b)
+        l1b_merged = builder.build()
+        self.assertFalse(l1b_merged.waveform.is_parametric_range)
+        np.testing.assert_array_equal(l1b_merged.waveform.range[3:, :], np.tile(np.arange(10., 18.), (3, 1)))
+
+
+class TestLevel1bDataMergeBuilder(unittest.TestCase):
+
+    def testBuilderMatchesAppend(self):
+
+        segments = [get_l1b_segment(i, n_records) for i, n_records in enumerate([5, 3, 7])]
+
+        l1b_append = copy.deepcopy(segments[0])
+        for l1b in copy.deepcopy(segments[1:]):
+            l1b_append.append(l1b)
+
+        builder = Level1bDataMergeBuilder()
+        for l1b in segments:
+            builder.add(l1b)
+        l1b_merged = builder.build()
+
+        self.assertEqual(l1b_merged.n_records, 15)
+        self.assertEqual(l1b_merged.info.mission_data_source, "segment_0;segment_1;segment_2")
+        self.assertEqual(l1b_merged.info.stop_time, l1b_append.info.stop_time)
+        self.assertEqual(l1b_merged.info.sar_mode_percent, l1b_append.info.sar_mode_percent)
+        for data_group in Level1bData.data_groups:
+            group_append = getattr(l1b_append, data_group)
+            group_merged = getattr(l1b_merged, data_group)
+            for attribute in group_merged.record_array_attributes:
+                value_merged = getattr(group_merged, attribute)
+                value_append = getattr(group_append, attribute)
+                self.assertEqual(value_merged.dtype, value_append.dtype)
+                np.testing.assert_array_equal(value_merged, value_append)
+
+
+class TestL1bTimeOrbitAttitude(unittest.TestCase):
+
+    def testDefaultAttitudeWithoutAttitudeData(self):
+        n_records = 4
+        l1b = get_l1b_segment(0, n_records)
+        for parameter in ["antenna_pitch", "antenna_roll", "antenna_yaw"]:
+            value = getattr(l1b.time_orbit, parameter)
+            self.assertEqual(value.shape, (n_records,))
+            self.assertTrue(np.all(np.isnan(value)))
+
+    def testExistingAttitudeIsKept(self):
+        n_records = 4
+        l1b = get_l1b_segment(0, n_records)
+        attitude = np.arange(n_records, dtype=float)
+        l1b.time_orbit.set_antenna_attitude(attitude, attitude, attitude)
+        l1b.time_orbit.set_position(l1b.time_orbit.longitude, l1b.time_orbit.latitude, l1b.time_orbit.altitude)
+        np.testing.assert_array_equal(l1b.time_orbit.antenna_pitch, attitude)
+
+    def testMergeWithoutAttitudeData(self):
+        segments = [get_l1b_segment(i, 3) for i in range(2)]
+        builder = Level1bDataMergeBuilder()
+        for l1b in segments:
+            builder.add(l1b)
+        l1b_merged = builder.build()
+        self.assertEqual(l1b_merged.time_orbit.antenna_roll.shape, (6,))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLevel1bDataMergeBuilder)
+    unittest.TextTestRunner(verbosity=2).run(suite)
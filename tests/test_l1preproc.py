@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the serial and parallel mode of the Level-1 pre-processor
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+
+from pysiral.l1preproc import L1PreProcBase, get_preproc_from_job
+from test_cryosat2_l1_adapter import write_baseline_d_file
+
+
+# Start time of the orbit segments in the input files (None: no polar ocean data)
+# -> segments with a gap of less than 10 seconds are connected
+START_TIMES = [0, 65, 1000, None, 1070, 5000, 5062]
+
+
+class DummyL1(object):
+
+    def __init__(self, index, start_seconds):
+        reference_time = datetime(2019, 1, 1)
+        self.info = AttrDict(start_time=reference_time+timedelta(seconds=start_seconds),
+                             stop_time=reference_time+timedelta(seconds=start_seconds+60))
+        self.records = [index]
+        self.post_processed = False
+
+    def append(self, l1):
+        self.records.extend(l1.records)
+        self.info.stop_time = l1.info.stop_time
+
+    @property
+    def n_records(self):
+        return len(self.records)
+
+
+class DummyInputAdapter(object):
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+
+    def get_l1(self, input_file, polar_ocean_check):
+        start_seconds = START_TIMES[input_file]
+        return None if start_seconds is None else DummyL1(input_file, start_seconds)
+
+
+class DummyOutputHandler(object):
+
+    def __init__(self):
+        self.exported = []
+        self.last_written_file = None
+
+    def export_to_netcdf(self, l1):
+        self.exported.append((tuple(l1.records), l1.post_processed))
+
+
+class L1OutputCollector(object):
+
+    def __init__(self):
+        self.exported = []
+        self.last_written_file = None
+
+    def export_to_netcdf(self, l1):
+        self.exported.append(l1)
+
+
+class DummyPreProc(L1PreProcBase):
+
+    def __init__(self, *args):
+        super(DummyPreProc, self).__init__(self.__class__.__name__, *args)
+
+    def extract_polar_ocean_segments(self, l1):
+        return [l1]
+
+    def l1_post_processing(self, l1_segments):
+        for l1 in l1_segments:
+            l1.post_processed = True
+
+    def l1_get_merged_stack(self):
+        l1_merged = self.l1_stack[0]
+        for l1 in self.l1_stack[1:]:
+            l1_merged.append(l1)
+        return l1_merged
+
+
+def get_job(input_adapter, level1_preprocessor):
+    # Only the Level-1 pre-processor definition of the job is used by the pre-processor
+    return AttrDict(l1pprocdef=dict(input_adapter=input_adapter, level1_preprocessor=level1_preprocessor))
+
+
+class TestL1PreProc(unittest.TestCase):
+
+    def get_exported_segments(self, workers):
+        cfg = dict(polar_ocean=dict(), orbit_segment_connectivity=dict(max_connected_segment_timedelta_seconds=10))
+        job = get_job(dict(module_name=__name__, class_name="DummyInputAdapter", options=None),
+                      dict(module_name=__name__, class_name="DummyPreProc", options=cfg))
+        preproc = get_preproc_from_job(job, DummyOutputHandler())
+        preproc.process_input_files(list(range(len(START_TIMES))), workers=workers, job=job)
+        return preproc.output_handler.exported
+
+    def testParallelModeMatchesSerialMode(self):
+        serial = self.get_exported_segments(1)
+        self.assertEqual(serial, [((0, 1), True), ((2, 4), True), ((5, 6), True)])
+        self.assertEqual(self.get_exported_segments(3), serial)
+
+
+class TestL1PreProcCryoSat2(unittest.TestCase):
+
+    def setUp(self):
+        # Three synthetic CryoSat-2 files: The first two are connected, the last one is not
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.input_files = []
+        for start_time in [datetime(2019, 1, 1, 0, 0, 0), datetime(2019, 1, 1, 0, 0, 12),
+                           datetime(2019, 1, 1, 1, 0, 0)]:
+            filename = "CS_OFFL_SIR_SAR_1B_%s_D001.nc" % start_time.strftime("%Y%m%dT%H%M%S")
+            filepath = self.tmp_dir / filename
+            write_baseline_d_file(filepath, start_time=start_time)
+            self.input_files.append(str(filepath))
+        adapter_cfg = dict(range_correction_targets=dict(dry_troposphere="mod_dry_tropo_cor_01",
+                                                         inverse_barometric="inv_bar_cor_01"),
+                           classifier_targets=dict(stack_standard_deviation="stack_std_20_ku"),
+                           read_polar_ocean_subset=True)
+        preproc_cfg = dict(polar_ocean=dict(target_hemisphere=["north"], polar_latitude_threshold=50.,
+                                            input_file_is_single_hemisphere=True,
+                                            allow_nonocean_segment_nrecords=1000),
+                           orbit_segment_connectivity=dict(max_connected_segment_timedelta_seconds=10))
+        self.job = get_job(dict(module_name="pysiral.cryosat2.l1_adapter", class_name="ESACryoSat2PDSBaselineD",
+                                options=adapter_cfg),
+                           dict(type="custom_orbit_segment", options=preproc_cfg))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_exported_segments(self, workers):
+        preproc = get_preproc_from_job(self.job, L1OutputCollector())
+        preproc.process_input_files(self.input_files, workers=workers, job=self.job)
+        return preproc.output_handler.exported
+
+    def testParallelModeMatchesSerialMode(self):
+        serial = self.get_exported_segments(1)
+        self.assertEqual(len(serial), 2)
+        parallel = self.get_exported_segments(2)
+        self.assertEqual(len(parallel), len(serial))
+        for l1_serial, l1_parallel in zip(serial, parallel):
+            self.assertEqual(l1_parallel.n_records, l1_serial.n_records)
+            self.assertEqual(l1_parallel.info.start_time, l1_serial.info.start_time)
+            self.assertEqual(l1_parallel.info.stop_time, l1_serial.info.stop_time)
+            np.testing.assert_array_equal(l1_parallel.time_orbit.latitude, l1_serial.time_orbit.latitude)
+            np.testing.assert_array_equal(l1_parallel.waveform.power, l1_serial.waveform.power)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestL1PreProc)
+    unittest.TextTestRunner(verbosity=2).run(suite)
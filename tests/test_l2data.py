@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the merge of l2i files in the Level-2 pre-processor container and the l2i column cache
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from netCDF4 import Dataset
+
+from pysiral.l2data import Level2PContainer, L2iNCFileImport, L2iColumnCache
+
+
+class TestLevel2PContainer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.l2i_files = []
+        for orbit, n_records in enumerate([50, 20, 35]):
+            rng = np.random.default_rng(orbit)
+            filepath = self.tmp_dir / ("l2i_%g.nc" % orbit)
+            rootgrp = Dataset(str(filepath), "w")
+            rootgrp.setncatts(dict(source_mission_id="cryosat2", source_auxdata_sic="sic",
+                                   source_auxdata_snow="snow", source_auxdata_sitype="sitype",
+                                   source_auxdata_mss="mss"))
+            rootgrp.createDimension("time", n_records)
+            rootgrp.createVariable("time", "f8", ("time", ))[:] = orbit*6000. + np.arange(n_records)
+            rootgrp.createVariable("longitude", "f4", ("time", ))[:] = rng.uniform(-180., 180., n_records)
+            rootgrp.createVariable("latitude", "f4", ("time", ))[:] = rng.uniform(60., 88., n_records)
+            rootgrp.createVariable("radar_mode", "i1", ("time", ))[:] = rng.integers(0, 3, n_records)
+            freeboard = rng.uniform(0., 0.5, n_records)
+            freeboard[rng.uniform(size=n_records) < 0.5] = np.nan
+            rootgrp.createVariable("freeboard", "f4", ("time", ))[:] = freeboard
+            for name in ["freeboard_uncertainty", "snow_depth", "snow_depth_uncertainty", "sea_ice_concentration"]:
+                values = np.ma.masked_greater(rng.uniform(size=n_records), 0.9)
+                rootgrp.createVariable(name, "f4", ("time", ), fill_value=-999.)[:] = values
+            rootgrp.close()
+            self.l2i_files.append(str(filepath))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def testTwoPassMergeMatchesIncrementalMerge(self):
+
+        l2p = Level2PContainer("daily")
+        for l2i_file in self.l2i_files:
+            l2p.append_l2i(L2iNCFileImport(l2i_file))
+        reference = l2p._get_merged_data(valid_mask="freeboard")
+
+        l2p = Level2PContainer("daily")
+        for l2i_file in self.l2i_files:
+            l2p.append_l2i_file(l2i_file)
+        data = l2p._get_merged_data_from_files()
+        self.assertEqual(sorted(data.keys()), sorted(reference.keys()))
+        for name in reference:
+            self.assertEqual(data[name].dtype, reference[name].dtype)
+            np.testing.assert_array_equal(data[name], reference[name])
+
+        # Only the variables of the output parameters (with uncertainties) are read
+        data = l2p._get_merged_data_from_files(parameters=["time", "latitude", "longitude", "snow_depth"])
+        self.assertEqual(sorted(data.keys()), ["latitude", "longitude", "snow_depth", "snow_depth_uncertainty",
+                                               "time"])
+        l2 = l2p.get_merged_l2(parameters=["time", "latitude", "longitude", "snow_depth"])
+        self.assertEqual(l2.n_records, len(reference["time"]))
+        np.testing.assert_array_equal(l2.get_parameter_by_name("snow_depth"), reference["snow_depth"])
+
+    def testColumnCache(self):
+
+        cache = L2iColumnCache(self.tmp_dir / "cache")
+        for l2i_file in self.l2i_files:
+            reference = L2iNCFileImport(l2i_file)
+            for _ in range(2):
+                l2i = L2iNCFileImport(l2i_file, disk_cache=cache)
+                self.assertEqual(l2i.parameter_list, reference.parameter_list)
+                self.assertEqual(l2i.info.source_auxdata_snow, reference.info.source_auxdata_snow)
+                np.testing.assert_array_equal(l2i.time, reference.time)
+                for name in reference.parameter_list:
+                    if name == "time":
+                        continue
+                    np.testing.assert_array_equal(np.ma.getmaskarray(getattr(l2i, name)),
+                                                  np.ma.getmaskarray(getattr(reference, name)))
+                    np.testing.assert_array_equal(getattr(l2i, name), getattr(reference, name))
+            self.assertIsInstance(np.ma.getdata(l2i.freeboard), np.memmap)
+
+        # The l2p merge uses the same cache entries
+        l2p = Level2PContainer("daily")
+        for l2i_file in self.l2i_files:
+            l2p.append_l2i_file(l2i_file)
+        reference = l2p._get_merged_data_from_files()
+        l2p = Level2PContainer("daily", disk_cache=cache)
+        for l2i_file in self.l2i_files:
+            l2p.append_l2i_file(l2i_file)
+        data = l2p._get_merged_data_from_files()
+        self.assertEqual(sorted(data.keys()), sorted(reference.keys()))
+        for name in reference:
+            np.testing.assert_array_equal(data[name], reference[name])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLevel2PContainer)
+    unittest.TextTestRunner(verbosity=2).run(suite)
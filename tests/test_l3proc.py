@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the gridding of the Level-3 processor with the l2i data stack, running grid cell statistics
+the grid cell quantile sketch, the out-of-core l2i data stack, the grid indices stored in l2i files and the
+parallel processing of period segments
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import yaml
+from attrdict import AttrDict
+from logbook import StreamHandler
+from netCDF4 import Dataset
+from scipy import stats
+
+import pysiral
+from pysiral.grid import GridDefinition, L2GridIndices
+from pysiral.l3proc import (Level3Processor, L2iDataStack, L2iTileSpillStack, L3DataGrid, Level3SurfaceTypeStatistics,
+                            Level3TemporalCoverageStatistics, Level3GriddedClassifiers, GridCellQuantileSketch,
+                            Level3OutputHandler, Level3ProductDefinition, Level3GridDefinition,
+                            _init_l3_period_worker, _process_l3_period_in_worker)
+from pysiral.surface_type import SurfaceType
+
+
+L2_PARAMETER = dict(
+    time=dict(grid_method="none", dtype="M", fillvalue=None),
+    surface_type=dict(grid_method="none", dtype="i4", fillvalue=-1),
+    sea_ice_thickness=dict(grid_method="average", dtype="f4", fillvalue=np.nan),
+    radar_freeboard_uncertainty=dict(grid_method="average_uncertainty", dtype="f4", fillvalue=np.nan),
+    radar_freeboard=dict(grid_method="median", dtype="f4", fillvalue=np.nan),
+    freeboard=dict(grid_method="quantile", quantile=0.9, dtype="f4", fillvalue=np.nan),
+    radar_mode=dict(grid_method="median", dtype="i4", fillvalue=-1))
+
+PROCESSING_ITEMS = [
+    dict(label="surface type statistics", module_name="pysiral.l3proc", class_name="Level3SurfaceTypeStatistics",
+         options={}),
+    dict(label="temporal coverage", module_name="pysiral.l3proc", class_name="Level3TemporalCoverageStatistics",
+         options={})]
+
+
+def get_griddef(factor=1):
+    griddef = GridDefinition()
+    griddef.set_projection(proj="laea", lat_0=90, lon_0=0, ellps="WGS84")
+    griddef.set_extent(xoff=0.0, yoff=0.0, xsize=4.0e6, ysize=4.0e6, numx=8*factor, numy=8*factor,
+                       dx=5.0e5/factor, dy=5.0e5/factor)
+    return griddef
+
+
+class DummyL2i(object):
+
+    def __init__(self, seed, n_records=400):
+        rng = np.random.default_rng(seed)
+        self.n_records = n_records
+        self.longitude = rng.uniform(-180., 180., n_records)
+        self.latitude = rng.uniform(72., 89., n_records)
+        self.time = np.array([datetime(2019, 1, 1) + timedelta(hours=h) for h in rng.uniform(0, 700, n_records)])
+        flags = SurfaceType.SURFACE_TYPE_DICT
+        self.surface_type = rng.choice([flags["lead"], flags["sea_ice"], flags["ocean"], flags["land"]],
+                                       n_records)
+        self.sea_ice_thickness = rng.normal(1.0, 1.0, n_records).astype(np.float32)
+        self.sea_ice_thickness[rng.uniform(size=n_records) < 0.3] = np.nan
+        self.radar_freeboard_uncertainty = rng.uniform(0.05, 0.2, n_records).astype(np.float32)
+        self.radar_freeboard = rng.normal(0.2, 0.1, n_records).astype(np.float32)
+        self.freeboard = rng.normal(0.2, 0.1, n_records).astype(np.float32)
+        self.radar_mode = rng.integers(0, 3, n_records)
+        self.mission = "cryosat2"
+        self.timeliness = "NTC"
+        self.info = AttrDict(source_auxdata_sic="sic", source_auxdata_sitype="sitype", source_auxdata_snow="snow")
+
+
+class DummyJob(object):
+
+    def __init__(self, streaming, grids=None, aggregate_nested_grids=False):
+        self.grids = grids if grids is not None else [get_griddef()]
+        self.grid = self.grids[0]
+        self.l2_parameter = L2_PARAMETER
+        self.l3def = AttrDict(l2_parameter=L2_PARAMETER, processing_items=PROCESSING_ITEMS,
+                              grid_settings=dict(minimum_valid_grid_points=2, streaming=streaming,
+                                                 aggregate_nested_grids=aggregate_nested_grids))
+        self.outputs = [AttrDict(time_dim_is_unlimited=False)]
+
+
+class TestL3Streaming(unittest.TestCase):
+
+    def get_l3grid(self, streaming, griddef=None, aggregated_from=None, out_of_core=None):
+        job = DummyJob(streaming)
+        stack_parameters, statistics = Level3Processor(job)._get_l2i_stack_definition()
+        griddef = griddef if griddef is not None else job.grid
+        source_griddef = aggregated_from if aggregated_from is not None else griddef
+        stack_class = L2iTileSpillStack if out_of_core is not None else L2iDataStack
+        # Quantiles of the sketch are exact for the number of records per grid cell
+        stack = stack_class(source_griddef, job.l2_parameter, stack_parameters=stack_parameters,
+                            statistics=statistics, quantile_sketch=dict(exact_max_count=1000), **(out_of_core or {}))
+        for seed in range(5):
+            stack.add(DummyL2i(seed))
+        if aggregated_from is not None:
+            source_stack = stack
+            stack = source_stack.get_aggregated(griddef, griddef.get_nesting_factor(aggregated_from))
+            source_stack.close()
+        period = AttrDict(tcs=AttrDict(dt=datetime(2019, 1, 1)), tce=AttrDict(dt=datetime(2019, 1, 31)),
+                          duration=AttrDict(isoformat="P1M"))
+        return L3DataGrid(job, stack, period)
+
+    def testStackDefinition(self):
+        stack_parameters, statistics = Level3Processor(DummyJob(False))._get_l2i_stack_definition()
+        self.assertEqual(sorted(stack_parameters), sorted(L2_PARAMETER.keys()))
+        self.assertIsNone(statistics)
+        stack_parameters, statistics = Level3Processor(DummyJob(True))._get_l2i_stack_definition()
+        self.assertEqual(sorted(stack_parameters), ["sea_ice_thickness", "time"])
+        self.assertEqual(statistics["sea_ice_thickness"], ["count", "sum", "count_negative"])
+        self.assertEqual(statistics["surface_type"], ["flag_count"])
+        self.assertEqual(statistics["radar_mode"], ["count", "flag_count"])
+        self.assertEqual(statistics["radar_freeboard"], ["count", "quantiles"])
+
+    def testStreamingMatchesStack(self):
+        l3_stack = self.get_l3grid(False)
+        l3_streaming = self.get_l3grid(True)
+        self.assertNotIn("radar_freeboard_uncertainty", l3_streaming.l2.stack)
+        for l3grid in [l3_stack, l3_streaming]:
+            Level3SurfaceTypeStatistics(l3grid).apply()
+        for name in ["sea_ice_thickness", "radar_freeboard_uncertainty", "radar_freeboard", "freeboard",
+                     "radar_mode", "n_total_waveforms",
+                     "n_valid_waveforms", "valid_fraction", "lead_fraction", "ice_fraction",
+                     "negative_thickness_fraction", "is_land"]:
+            self.assertTrue(np.any(np.isfinite(l3_stack.vars[name])))
+            np.testing.assert_allclose(l3_streaming.vars[name], l3_stack.vars[name], rtol=1.0e-6)
+
+
+class TestL3ProcessingItems(unittest.TestCase):
+
+    def setUp(self):
+        self.l3grid = TestL3Streaming().get_l3grid(False)
+        self.stack = self.l3grid.l2.stack
+
+    def testTemporalCoverageStatistics(self):
+        Level3TemporalCoverageStatistics(self.l3grid).apply()
+        for xi, yj in self.l3grid.grid_indices:
+            sea_ice_thickness = np.array(self.stack["sea_ice_thickness"][yj][xi])
+            times = np.array(self.stack["time"][yj][xi])[np.isfinite(sea_ice_thickness)]
+            if len(times) == 0:
+                self.assertTrue(np.isnan(self.l3grid.vars["temporal_coverage_uniformity_factor"][yj, xi]))
+                continue
+            day_number = np.array([(t - datetime(2019, 1, 1)).days for t in times])
+            ks_test_result = stats.kstest(day_number, stats.uniform(loc=0.0, scale=31).cdf)
+            expected = dict(temporal_coverage_uniformity_factor=1.0 - ks_test_result[0],
+                            temporal_coverage_day_fraction=len(np.unique(day_number)) / 31.,
+                            temporal_coverage_period_fraction=(np.amax(day_number) - np.amin(day_number) + 1) / 31.,
+                            temporal_coverage_weighted_center=np.mean(day_number) / 31.)
+            for name, value in expected.items():
+                self.assertAlmostEqual(self.l3grid.vars[name][yj, xi], value, places=6)
+
+    def testGriddedClassifiers(self):
+        Level3GriddedClassifiers(self.l3grid, parameters=["sea_ice_thickness"], surface_types=["sea_ice"],
+                                 statistics=["mean", "sdev"]).apply()
+        sea_ice_flag = SurfaceType.SURFACE_TYPE_DICT["sea_ice"]
+        for xi, yj in self.l3grid.grid_indices:
+            values = np.array(self.stack["sea_ice_thickness"][yj][xi])
+            surface_type = np.array(self.stack["surface_type"][yj][xi])
+            for target_surface_type, subset in [("all", values), ("sea_ice", values[surface_type == sea_ice_flag])]:
+                for statistic, function in [("mean", np.nanmean), ("sdev", np.nanstd)]:
+                    value = self.l3grid.vars["stat_sea_ice_thickness_%s_%s" % (target_surface_type, statistic)][yj, xi]
+                    if len(subset) < 2 or np.all(np.isnan(subset)):
+                        self.assertTrue(np.isnan(value))
+                    else:
+                        self.assertAlmostEqual(value, function(subset), places=5)
+
+
+class TestL3NestedGrids(unittest.TestCase):
+
+    def testNestingFactor(self):
+        griddef, fine_griddef = get_griddef(), get_griddef(factor=2)
+        self.assertEqual(griddef.get_nesting_factor(fine_griddef), 2)
+        self.assertEqual(griddef.get_nesting_factor(get_griddef(factor=4)), 4)
+        self.assertIsNone(fine_griddef.get_nesting_factor(griddef))
+        self.assertIsNone(griddef.get_nesting_factor(griddef))
+        shifted_griddef = get_griddef(factor=2)
+        shifted_griddef.set_extent(**dict(shifted_griddef.extent, xoff=1.0e5))
+        self.assertIsNone(griddef.get_nesting_factor(shifted_griddef))
+        other_projection = get_griddef(factor=2)
+        other_projection.set_projection(proj="laea", lat_0=-90, lon_0=0, ellps="WGS84")
+        self.assertIsNone(griddef.get_nesting_factor(other_projection))
+
+    def testGridSources(self):
+        grids = [get_griddef(), get_griddef(factor=4), get_griddef(factor=2), get_griddef(factor=3)]
+        grid_sources = Level3Processor(DummyJob(False, grids=grids))._get_grid_sources()
+        self.assertEqual([source[1:] for source in grid_sources], [(None, None)] * 4)
+        grid_sources = Level3Processor(DummyJob(False, grids=grids, aggregate_nested_grids=True))._get_grid_sources()
+        self.assertEqual([source[1:] for source in grid_sources], [(1, 4), (None, None), (1, 2), (None, None)])
+
+    def testAggregatedGridMatchesGrid(self):
+        for streaming in [False, True]:
+            l3grid = TestL3Streaming().get_l3grid(streaming)
+            aggregated = TestL3Streaming().get_l3grid(streaming, griddef=get_griddef(),
+                                                      aggregated_from=get_griddef(factor=2))
+            self.assertEqual(aggregated.l2.l2i_count, l3grid.l2.l2i_count)
+            for l3 in [l3grid, aggregated]:
+                Level3SurfaceTypeStatistics(l3).apply()
+                Level3TemporalCoverageStatistics(l3).apply()
+            for name in ["sea_ice_thickness", "radar_freeboard_uncertainty", "radar_freeboard", "freeboard",
+                         "radar_mode", "n_total_waveforms", "lead_fraction", "negative_thickness_fraction",
+                         "temporal_coverage_uniformity_factor", "temporal_coverage_day_fraction"]:
+                self.assertTrue(np.any(np.isfinite(l3grid.vars[name])))
+                np.testing.assert_allclose(aggregated.vars[name], l3grid.vars[name], rtol=1.0e-6)
+
+
+class TestL3OutOfCore(unittest.TestCase):
+
+    def testSpillStackMatchesStack(self):
+        reference = TestL3Streaming().get_l3grid(False)
+        Level3TemporalCoverageStatistics(reference).apply()
+        # Small tiles and memory budget (several spill file appends per tile), serial and parallel gridding
+        for workers in [1, 2]:
+            l3grid = TestL3Streaming().get_l3grid(False, out_of_core=dict(tile_size=3, memory_budget=0.01,
+                                                                          workers=workers))
+            try:
+                self.assertEqual(l3grid.l2.stack, {})
+                self.assertEqual(len(l3grid.l2._tiles), 9)
+                for name in ["time", "sea_ice_thickness", "surface_type", "radar_mode"]:
+                    for records, reference_records in zip(l3grid.l2.get_cell_records(name),
+                                                          reference.l2.get_cell_records(name)):
+                        self.assertEqual(records.dtype, reference_records.dtype)
+                        np.testing.assert_array_equal(records, reference_records)
+                Level3TemporalCoverageStatistics(l3grid).apply()
+                for name in ["sea_ice_thickness", "radar_freeboard_uncertainty", "radar_freeboard", "freeboard",
+                             "radar_mode", "temporal_coverage_uniformity_factor"]:
+                    self.assertTrue(np.any(np.isfinite(reference.vars[name])))
+                    np.testing.assert_array_equal(l3grid.vars[name], reference.vars[name])
+            finally:
+                l3grid.l2.close()
+            self.assertFalse(l3grid.l2.spill_directory.exists())
+
+    def testAggregatedSpillStack(self):
+        reference = TestL3Streaming().get_l3grid(False, griddef=get_griddef(), aggregated_from=get_griddef(factor=2))
+        l3grid = TestL3Streaming().get_l3grid(False, griddef=get_griddef(), aggregated_from=get_griddef(factor=2),
+                                              out_of_core=dict(tile_size=5))
+        l3grid.l2.close()
+        for name in ["sea_ice_thickness", "radar_freeboard", "freeboard", "radar_mode"]:
+            np.testing.assert_allclose(l3grid.vars[name], reference.vars[name], rtol=1.0e-6)
+
+
+class DummyL2iHandler(object):
+    """ The subset of the l2i data handler required by the Level-3 processor """
+
+    def __init__(self, l2i_files):
+        self.l2i_files = l2i_files
+
+    def get_files_from_time_range(self, time_range):
+        return self.l2i_files[time_range.date_label]
+
+
+class TestL3ParallelPeriods(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        griddef = dict(hemisphere="north", grid_id="nh_500km_test", grid_tag="test", resolution_tag="500km",
+                       name="test grid", projection=dict(proj="laea", lat_0=90, lon_0=0, ellps="WGS84"),
+                       extent=dict(xoff=0.0, yoff=0.0, xsize=4.0e6, ysize=4.0e6, numx=8, numy=8, dx=5.0e5, dy=5.0e5),
+                       netcdf_grid_description=dict(Lambert_Azimuthal_Grid=dict(
+                           grid_mapping_name="lambert_azimuthal_equal_area", latitude_of_projection_origin=90.0)))
+        l2_parameter = {name: dict(L2_PARAMETER[name])
+                        for name in ["surface_type", "sea_ice_thickness", "freeboard", "radar_mode"]}
+        l3_settings = dict(l2_parameter=l2_parameter, l2i_prefilter=dict(active=False),
+                           processing_items=PROCESSING_ITEMS[:1], grid_settings=dict(minimum_valid_grid_points=2))
+        variables = {name: dict(long_name=name) for name in ["longitude", "latitude", "sea_ice_thickness",
+                                                             "freeboard", "radar_mode", "n_total_waveforms",
+                                                             "lead_fraction"]}
+        output_def = dict(metadata=dict(output_id="l3_test", data_level=3),
+                          grid_options=dict(flip_yc=False, time_dim_is_unlimited=False),
+                          filenaming="l3-test-{grid_id}-{startdt:%Y%m}.nc", product_level_subfolder="l3_test",
+                          global_attributes=[dict(title="Level-3 test"), dict(date_created="{utcnow}"),
+                                             dict(id="{uuid}"), dict(time_coverage_start="{time_coverage_start}")],
+                          variables=variables)
+        for filename, content in [("griddef.yaml", griddef), ("l3_settings.yaml", l3_settings),
+                                  ("l3_output.yaml", output_def)]:
+            with open(str(self.tmp_dir / filename), "w") as fh:
+                yaml.safe_dump(content, fh)
+
+        # Three monthly periods with two l2i files each
+        self.period_segments, self.l2i_files = [], {}
+        for month in [1, 2, 3]:
+            tcs, tce = datetime(2019, month, 1), datetime(2019, month + 1, 1)
+            period = AttrDict(tcs=AttrDict(dt=tcs), tce=AttrDict(dt=tce - timedelta(microseconds=1)),
+                              duration=AttrDict(isoformat="P1M"), date_label="2019-%02g" % month)
+            self.period_segments.append(period)
+            self.l2i_files[period.date_label] = []
+            for seed in range(2):
+                l2i = DummyL2i(10 * month + seed)
+                filepath = self.tmp_dir / ("l2i_%s_%g.nc" % (period.date_label, seed))
+                rootgrp = Dataset(str(filepath), "w")
+                rootgrp.setncatts(dict(source_mission_id=l2i.mission, source_timeliness=l2i.timeliness,
+                                       **l2i.info))
+                rootgrp.createDimension("time", l2i.n_records)
+                seconds = (tce - tcs).total_seconds() * np.sort(np.random.default_rng(seed).uniform(size=l2i.n_records))
+                rootgrp.createVariable("time", "f8", ("time", ))[:] = (tcs - datetime(1970, 1, 1)).total_seconds() + seconds
+                for name in ["longitude", "latitude", "surface_type", "sea_ice_thickness", "freeboard", "radar_mode"]:
+                    values = getattr(l2i, name)
+                    rootgrp.createVariable(name, values.dtype.str, ("time", ))[:] = values
+                rootgrp.close()
+                self.l2i_files[period.date_label].append(str(filepath))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_l3proc(self, workers, base_directory):
+        output = Level3OutputHandler(output_def=str(self.tmp_dir / "l3_output.yaml"),
+                                     base_directory=str(base_directory), period="month", overwrite_protection=False)
+        product_def = Level3ProductDefinition(str(self.tmp_dir / "l3_settings.yaml"),
+                                              [Level3GridDefinition(str(self.tmp_dir / "griddef.yaml"))],
+                                              [output], "month")
+        return Level3Processor(product_def, workers=workers)
+
+    def process(self, workers):
+        """ Process the period segments and return the list of output files """
+        base_directory = self.tmp_dir / ("workers_%g" % workers)
+        base_directory.mkdir()
+        l3proc = self.get_l3proc(workers, base_directory)
+        l3proc.process_period_segments(DummyL2iHandler(self.l2i_files), self.period_segments, "month")
+        return sorted(base_directory.glob("**/*.nc"))
+
+    def testParallelMatchesSerial(self):
+        serial_files, parallel_files = self.process(1), self.process(3)
+        self.assertEqual(len(serial_files), 3)
+        self.assertEqual([f.name for f in parallel_files], [f.name for f in serial_files])
+        for serial_file, parallel_file in zip(serial_files, parallel_files):
+            serial, parallel = Dataset(str(serial_file)), Dataset(str(parallel_file))
+            serial.set_auto_mask(False)
+            parallel.set_auto_mask(False)
+            # Only the creation time and the uuid differ
+            attributes = [name for name in serial.ncattrs() if name not in ["date_created", "id"]]
+            self.assertEqual({name: serial.getncattr(name) for name in attributes},
+                             {name: parallel.getncattr(name) for name in attributes})
+            self.assertEqual(sorted(serial.variables.keys()), sorted(parallel.variables.keys()))
+            for name in serial.variables:
+                np.testing.assert_array_equal(serial.variables[name][:], parallel.variables[name][:])
+            self.assertTrue(np.any(np.isfinite(serial.variables["sea_ice_thickness"][:])))
+            serial.close()
+            parallel.close()
+
+    def testWorkerLogHandlers(self):
+        base_directory = self.tmp_dir / "worker"
+        base_directory.mkdir()
+        l3proc = self.get_l3proc(1, base_directory)
+        l2i_files = dict(self.l2i_files)
+        l2i_files["2019-02"] = None
+        _init_l3_period_worker(l3proc, DummyL2iHandler(l2i_files), self.period_segments, "month")
+        handlers = list(StreamHandler.stack_manager.iter_context_objects())
+
+        # The log messages of the period are returned and the log handlers are restored
+        log_messages, error_traceback = _process_l3_period_in_worker(0)
+        self.assertIsNone(error_traceback)
+        self.assertIn("# Processing month period (1 of 3): 2019-01", log_messages)
+        self.assertEqual(list(StreamHandler.stack_manager.iter_context_objects()), handlers)
+
+        # The log messages are also returned if the processing of the period fails
+        log_messages, error_traceback = _process_l3_period_in_worker(1)
+        self.assertIn("# Processing month period (2 of 3): 2019-02", log_messages)
+        self.assertIn("TypeError", error_traceback)
+        self.assertEqual(list(StreamHandler.stack_manager.iter_context_objects()), handlers)
+
+        # Errors of the error handler (SystemExit) are also returned with the log messages
+        def process_period_with_error(*args):
+            l3proc.error.add_error("l3-test-error", "Level-3 test error")
+            l3proc.error.raise_on_error()
+        l3proc.process_period = process_period_with_error
+        log_messages, error_traceback = _process_l3_period_in_worker(2)
+        self.assertIn("Level-3 test error", log_messages)
+        self.assertIn("SystemExit", error_traceback)
+        self.assertEqual(list(StreamHandler.stack_manager.iter_context_objects()), handlers)
+
+    def testNoNestedTileWorkers(self):
+        base_directory = self.tmp_dir / "nested"
+        base_directory.mkdir()
+        l3proc = self.get_l3proc(3, base_directory)
+        l3proc._job.l3def.grid_settings["out_of_core"] = AttrDict(active=True, tile_size=5, workers=4)
+        self.assertEqual(l3proc._get_l2i_stack_class()[1]["workers"], 3)
+        _init_l3_period_worker(l3proc, DummyL2iHandler(self.l2i_files), self.period_segments, "month")
+        self.assertEqual(l3proc._get_l2i_stack_class()[1]["workers"], 1)
+
+    def testMultiGridFilenaming(self):
+        grids = [Level3GridDefinition(str(self.tmp_dir / "griddef.yaml")) for _ in range(2)]
+        output_defs = [str(self.tmp_dir / "l3_output.yaml"),
+                       str(Path(pysiral.__file__).parent / "resources" / "pysiral-cfg" / "output" / "l3" / "l3c_c3s.yaml")]
+        outputs = [Level3OutputHandler(output_def=output_def, base_directory=str(self.tmp_dir), period="month",
+                                       overwrite_protection=False) for output_def in output_defs]
+        l3_settings_file = str(self.tmp_dir / "l3_settings.yaml")
+
+        # Filenames with {grid_id} and filenames without {grid_id} for a single grid are fine
+        Level3ProductDefinition(l3_settings_file, grids, outputs[:1], "month")
+        Level3ProductDefinition(l3_settings_file, grids[:1], outputs, "month")
+
+        # Filenames without {grid_id} would be overwritten by the outputs of the next grid
+        with self.assertRaises(SystemExit):
+            Level3ProductDefinition(l3_settings_file, grids, outputs, "month")
+
+
+class DummyL2(object):
+
+    def __init__(self, l2i):
+        self.hemisphere = "north"
+        self.longitude, self.latitude = l2i.longitude, l2i.latitude
+
+    def set_auxiliary_parameter(self, var_id, var_name, value, uncertainty=None, dtype=float):
+        setattr(self, var_id, np.asarray(value, dtype=dtype))
+
+
+class TestL2iGridIndices(unittest.TestCase):
+
+    def testStoredGridIndicesMatchProjection(self):
+        grid_indices = L2GridIndices(griddefs=["nh25kmEASE2", "sh50kmEASE2"])
+        griddef = grid_indices.griddefs[0]
+        xi_name, yj_name = griddef.grid_index_parameter_names
+        self.assertEqual(xi_name, "grid_xi_nh_25km_ease2")
+
+        stack_parameters, statistics = Level3Processor(DummyJob(True))._get_l2i_stack_definition()
+        stacks = [L2iDataStack(griddef, L2_PARAMETER, stack_parameters=[], statistics=statistics)
+                  for _ in range(2)]
+        for seed in range(3):
+            l2i = DummyL2i(seed)
+            l2i.latitude[:5] = np.nan
+            reference_xi, reference_yj = stacks[0].get_grid_indices(l2i)
+            stacks[0].add(l2i)
+
+            # Grid indices of the l2 post-processing item (grids of the other hemisphere are skipped)
+            l2 = DummyL2(l2i)
+            grid_indices.apply(l2)
+            self.assertFalse(hasattr(l2, "grid_xi_sh_50km_ease2"))
+            for name in [xi_name, yj_name]:
+                self.assertEqual(getattr(l2, name).dtype, np.int32)
+                setattr(l2i, name, getattr(l2, name))
+            xi, yj = stacks[1].get_grid_indices(l2i)
+            valid = np.isfinite(reference_xi)
+            np.testing.assert_array_equal(xi[valid], reference_xi[valid])
+            np.testing.assert_array_equal(yj[valid], reference_yj[valid])
+            np.testing.assert_array_equal(xi[~valid], -1)
+            stacks[1].add(l2i)
+
+        self.assertEqual(stacks[0].n_l2i_grid_indices, 0)
+        self.assertEqual(stacks[1].n_l2i_grid_indices, 3)
+        np.testing.assert_array_equal(stacks[1].statistics.n_records, stacks[0].statistics.n_records)
+        np.testing.assert_array_equal(stacks[1].statistics.get("sea_ice_thickness", "sum"),
+                                      stacks[0].statistics.get("sea_ice_thickness", "sum"))
+
+    def testOutOfGridIndicesAreSkipped(self):
+        griddef = get_griddef()
+        l2i = DummyL2i(0, n_records=12)
+        xi_name, yj_name = griddef.grid_index_parameter_names
+        setattr(l2i, xi_name, np.array([0, 1, -1, 2, 8, 3, 7, 0, 100, 4, 5, 6], dtype=np.int32))
+        setattr(l2i, yj_name, np.array([0, 1, 2, -1, 3, 8, 7, -1, 4, 4, 5, 6], dtype=np.int32))
+        in_grid = np.array([1, 1, 0, 0, 0, 0, 1, 0, 0, 1, 1, 1], dtype=bool)
+        xi, yj = getattr(l2i, xi_name)[in_grid], getattr(l2i, yj_name)[in_grid]
+        reference_cell_index = yj * griddef.extent.numx + xi
+        for stack_class, options in [(L2iDataStack, {}), (L2iTileSpillStack, dict(tile_size=3))]:
+            stack = stack_class(griddef, L2_PARAMETER, stack_parameters=["sea_ice_thickness"], **options)
+            try:
+                stack.add(l2i)
+                cell_index, values = stack.get_cell_records("sea_ice_thickness")
+                order = np.argsort(reference_cell_index, kind="stable")
+                np.testing.assert_array_equal(cell_index, reference_cell_index[order])
+                np.testing.assert_array_equal(values, l2i.sea_ice_thickness[in_grid][order])
+            finally:
+                stack.close()
+
+
+class TestGridCellQuantileSketch(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(42)
+
+    def get_sketch(self, values_func, n_cells=20, n_chunks=20, n_values=2000, **options):
+        """ Returns the sketch and the values per cell (added in chunks similar to l2i files) """
+        sketch = GridCellQuantileSketch(n_cells, **options)
+        cell_values = [[] for _ in range(n_cells)]
+        for chunk in range(n_chunks):
+            cell_index = self.rng.integers(0, n_cells, n_values)
+            values = values_func(chunk, n_values)
+            values[self.rng.uniform(size=n_values) < 0.05] = np.nan
+            sketch.add(cell_index, values)
+            for i in range(n_cells):
+                cell_values[i].extend(values[cell_index == i])
+        return sketch, [np.array(values)[np.isfinite(values)] for values in cell_values]
+
+    def testExactForSmallCells(self):
+        sketch, cell_values = self.get_sketch(lambda chunk, n: self.rng.normal(size=n), n_chunks=1, n_values=1000,
+                                              exact_max_count=100)
+        for q in [0.0, 0.1, 0.5, 0.75, 1.0]:
+            np.testing.assert_allclose(sketch.quantile(q), [np.quantile(v, q) for v in cell_values])
+
+    def testErrorBounds(self):
+        # Normal, skewed and drifting distributions (quantile error in terms of rank of the estimate)
+        compression = 50
+        distributions = [lambda chunk, n: self.rng.normal(size=n),
+                         lambda chunk, n: self.rng.lognormal(size=n),
+                         lambda chunk, n: self.rng.normal(size=n) + 0.3 * chunk]
+        for values_func in distributions:
+            sketch, cell_values = self.get_sketch(values_func, compression=compression)
+            for q in [0.1, 0.5, 0.9]:
+                estimate = sketch.quantile(q)
+                errors = [np.searchsorted(np.sort(v), e) / float(len(v)) - q for v, e in zip(cell_values, estimate)]
+                self.assertLess(np.amax(np.abs(errors)), 2. / compression)
+                self.assertLess(np.mean(np.abs(errors)), 1. / compression)
+        self.assertLessEqual(sketch.n_centroids, 20 * 2 * compression + 2000)
+
+    def testIntegerWeights(self):
+        quantile = GridCellQuantileSketch.get_weighted_quantile(
+            np.array([0, 0, 0, 2]), np.array([1., 3., 2., 5.]), np.array([2., 1., 1., 3.]), 0.5, 3)
+        np.testing.assert_array_equal(quantile, [np.median([1., 1., 2., 3.]), np.nan, 5.])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestL3Streaming)
+    unittest.TextTestRunner(verbosity=2).run(suite)
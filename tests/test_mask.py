@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the decoding of the binary land/sea source mask and the resampling of source masks
+to Level-3 grids with the on-disk cache of the kd-tree neighbour information
+"""
+
+import shutil
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from attrdict import AttrDict
+from netCDF4 import Dataset
+from pyresample import image, kd_tree
+
+from pysiral.grid import GridDefinition
+from pysiral.mask import MaskLandSea2Min
+
+
+class SmallMaskLandSea2Min(MaskLandSea2Min):
+    """ The land/sea mask on a 2 degree grid """
+    source_shape = (180, 90)
+    n_bytes_header = 16
+
+
+def get_griddef():
+    griddef = GridDefinition()
+    griddef._metadata["grid_id"] = "nh_250km_test"
+    griddef.set_projection(proj="laea", lat_0=90, lon_0=0, ellps="WGS84")
+    griddef.set_extent(xoff=0.0, yoff=0.0, xsize=6.0e6, ysize=6.0e6, numx=24, numy=24, dx=2.5e5, dy=2.5e5)
+    return griddef
+
+
+class TestMaskLandSea2Min(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        xdim, ydim = SmallMaskLandSea2Min.source_shape
+        rng = np.random.default_rng(42)
+        self.content = rng.integers(0, 4, xdim * ydim).astype(np.uint8).tobytes()
+        with open(str(self.tmp_dir / "landmask.bin"), "wb") as fh:
+            fh.write(b"\xff" * SmallMaskLandSea2Min.n_bytes_header)
+            fh.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_dir))
+
+    def get_mask(self, pyresample_method, pyresample_keyw, disk_cache_dir=None):
+        cfg = AttrDict(filename="landmask.bin", pyresample_method=pyresample_method,
+                       pyresample_keyw=pyresample_keyw, label="land/sea mask", comment="")
+        if disk_cache_dir is not None:
+            cfg["disk_cache_dir"] = str(disk_cache_dir)
+        return SmallMaskLandSea2Min(str(self.tmp_dir), "landsea", cfg)
+
+    def testDecodeSourceMask(self):
+        xdim, ydim = SmallMaskLandSea2Min.source_shape
+        mask = self.get_mask("ImageContainerNearest", dict(radius_of_influence=3.0e5)).source_mask
+        reference = np.array(struct.unpack("<%0.fB" % (xdim * ydim), self.content)).reshape((xdim, ydim))
+        self.assertEqual(mask.shape, (ydim, xdim))
+        np.testing.assert_array_equal(mask, np.int8(reference.transpose() > 0))
+
+    def testCachedResampling(self):
+        griddef = get_griddef()
+        cache_dir = self.tmp_dir / "cache"
+        for i, (method, keyw) in enumerate([
+                ("ImageContainerNearest", dict(radius_of_influence=3.0e5)),
+                ("resample_gauss", dict(radius_of_influence=4.0e5, sigmas=1.0e5, neighbours=4))]):
+
+            # Reference: pyresample resampling functions
+            mask = self.get_mask(method, keyw)
+            if method == "ImageContainerNearest":
+                reference = image.ImageContainerNearest(mask.source_mask, mask.source_area_def, **keyw).resample(
+                    griddef.pyresample_area_def).image_data
+            else:
+                reference, _, _ = kd_tree.resample_gauss(mask.source_area_def, mask.source_mask,
+                                                         griddef.pyresample_area_def, with_uncert=True, **keyw)
+
+            # Without cache, first run (cache is filled) and cached neighbour information
+            for disk_cache_dir in [None, cache_dir, cache_dir]:
+                target_mask = self.get_mask(method, keyw, disk_cache_dir=disk_cache_dir).get_l3_mask(griddef)
+                np.testing.assert_array_equal(target_mask, reference)
+            self.assertEqual(len(list(cache_dir.glob("*.json"))), i + 1)
+            self.assertEqual(len(list(cache_dir.glob("*.npy"))), 4 * (i + 1))
+            self.assertEqual(len(list(cache_dir.glob("*.tmp"))), 0)
+            neighbour_info = self.get_mask(method, keyw, disk_cache_dir=cache_dir).get_neighbour_info(
+                griddef.pyresample_area_def, keyw["radius_of_influence"], neighbours=keyw.get("neighbours", 1))
+            self.assertIsInstance(neighbour_info[2], np.memmap)
+
+        # Post-processing & netCDF export
+        mask = self.get_mask("resample_gauss", dict(radius_of_influence=4.0e5, sigmas=1.0e5, neighbours=4),
+                             disk_cache_dir=cache_dir)
+        mask.cfg["post_processing"] = "pp_classify"
+        target_mask = mask.get_l3_mask(griddef)
+        self.assertEqual(len(list(cache_dir.glob("*.json"))), 2)
+        self.assertEqual(sorted(np.unique(target_mask)), [0, 1, 2])
+        mask.export_l3_mask(griddef)
+        rootgrp = Dataset(str(self.tmp_dir / "landsea_nh_250km_test.nc"))
+        np.testing.assert_array_equal(rootgrp.variables["mask"][:], target_mask)
+        rootgrp.close()
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMaskLandSea2Min)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the I/O pipeline helper classes (prefetch & write-behind)
+"""
+
+import unittest
+
+from pysiral.pipeline import PrefetchReader, WriteBehindQueue
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def testPrefetchReaderOrder(self):
+        items = list(range(20))
+        with PrefetchReader(items, lambda x: x*2, depth=2) as reader:
+            results = [(item, result) for item, result in reader]
+        self.assertEqual(results, [(i, i*2) for i in items])
+
+    def testPrefetchReaderErrorPropagation(self):
+        """ The exception must be raised when the failed item is requested """
+
+        def read_func(item):
+            if item == 5:
+                raise IOError("cannot read item %g" % item)
+            return item
+
+        received = []
+        with self.assertRaises(IOError):
+            with PrefetchReader(range(10), read_func, depth=3) as reader:
+                for item, result in reader:
+                    received.append(item)
+        self.assertEqual(received, [0, 1, 2, 3, 4])
+
+    def testWriteBehindQueue(self):
+        written = []
+        with WriteBehindQueue(written.append, depth=2) as writer:
+            for i in range(20):
+                writer.submit(i)
+        self.assertEqual(written, list(range(20)))
+        self.assertEqual(writer.n_written, 20)
+
+    def testWriteBehindQueueErrorPropagation(self):
+        """ The first failed item is raised, all later items are discarded """
+
+        written = []
+
+        def write_func(item):
+            if item in [3, 6]:
+                raise SystemExit("item %g" % item)
+            written.append(item)
+
+        writer = WriteBehindQueue(write_func, depth=2)
+        with self.assertRaises(SystemExit) as context:
+            for i in range(10):
+                writer.submit(i)
+            writer.close()
+        self.assertEqual(str(context.exception), "item 3")
+        self.assertEqual(written, [0, 1, 2])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPipeline)
+    unittest.TextTestRunner(verbosity=2).run(suite)
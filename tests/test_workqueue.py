@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Testing the filesystem-based work queue
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from pysiral.workqueue import FileWorkQueue
+
+
+ITEM_IDS = ["000_2019-01", "001_2019-02", "002_2019-03"]
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_queue(self, item_ids=ITEM_IDS, stale_timeout=600.):
+        queue = FileWorkQueue(self.directory, stale_timeout=stale_timeout)
+        queue.create_manifest(item_ids)
+        return queue
+
+    def testProcessAllItems(self):
+        processed = []
+        for work_item in self.get_queue():
+            with work_item:
+                processed.append(work_item.index)
+        self.assertEqual(processed, [0, 1, 2])
+        queue = self.get_queue()
+        self.assertIsNone(queue.claim_next())
+        self.assertEqual(queue.get_status_summary(), "done: 3")
+
+    def testItemsAreClaimedOnce(self):
+        queue_a, queue_b = self.get_queue(), self.get_queue()
+        item_a = queue_a.claim_next()
+        item_b = queue_b.claim_next()
+        self.assertEqual(item_a.index, 0)
+        self.assertEqual(item_b.index, 1)
+
+    def testFailedItem(self):
+        queue = self.get_queue()
+        with self.assertRaises(ValueError):
+            for work_item in queue:
+                with work_item:
+                    raise ValueError("processing error")
+        self.assertEqual(queue.get_status(ITEM_IDS[0])["status"], "failed")
+        self.assertEqual(queue.claim_next().index, 1)
+
+    def testReclaimAbandonedItem(self):
+        queue = self.get_queue(stale_timeout=60.)
+        item = queue.claim_next()
+        self.assertEqual(item.index, 0)
+
+        # Simulate a crashed worker: no heartbeat for longer than the timeout
+        lock_filepath = queue.lock_directory / ("%s.0" % ITEM_IDS[0])
+        past = time.time() - 120.
+        os.utime(str(lock_filepath), (past, past))
+        reclaimed = self.get_queue(stale_timeout=60.).claim_next()
+        self.assertEqual(reclaimed.index, 0)
+        self.assertTrue((queue.lock_directory / ("%s.1" % ITEM_IDS[0])).is_file())
+
+    def testManifestMismatch(self):
+        self.get_queue()
+        with self.assertRaises(SystemExit):
+            self.get_queue(item_ids=ITEM_IDS[:2])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestWorkQueue)
+    unittest.TextTestRunner(verbosity=2).run(suite)